@@ -0,0 +1,132 @@
+"""Persistent cache of enrollment results for devices that retry with the same CSR.
+
+A device whose enrollment response got lost (flaky factory Wi-Fi, a reboot at
+the wrong moment) calls ``POST /devices/{id}/enroll`` again with the CSR it
+already sent.  Without this cache every retry signs another certificate,
+queries hawkBit and appends another peer block to ``wg0.conf``.
+
+Entries are keyed by device ID and the SHA-256 fingerprint of the CSR's DER
+encoding (:attr:`app.crypto.ParsedCSR.fingerprint`) and hold the complete
+response.  A retry within ``ttl`` seconds gets the stored certificate, chain
+and WireGuard config back without any upstream call.  A new CSR – or the same
+CSR with a different WireGuard public key – is a miss and enrolls normally.
+
+File structure (``settings.enrollment_cache_path``)::
+
+    {
+        "<device_id>/<csr fingerprint>": {
+            "wg_public_key": "",
+            "expires_at":    1714521600.0,
+            "response":      {"certificate": "...", "ca_chain": "...", ...}
+        }
+    }
+
+Writes take the cross-process file lock and replace the file atomically;
+reads take no lock and re-load the file only when it was replaced, so every
+worker sees the entries the others stored.  Expired entries are pruned on
+every write.  File I/O runs in worker threads, off the event loop.  A file that
+cannot be decoded is treated as an empty cache (logged as a warning) and is
+replaced by the next write, so a corrupt cache costs a re-sign, not a 500.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import Any, cast
+
+from app.file_lock import async_locked, write_atomic
+from app.json_codec import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+
+class EnrollmentCache:
+    """TTL-bounded enrollment results keyed by (device ID, CSR fingerprint)."""
+
+    def __init__(self, path: str | Path, ttl: float = 3600.0) -> None:
+        self._path = Path(path)
+        self._ttl = ttl
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._version: tuple[int, int] | None = None  # (inode, mtime) of the file read
+        # Counters exposed through stats()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _key(device_id: str, fingerprint: str) -> str:
+        return f"{device_id}/{fingerprint}"
+
+    def _load(self) -> None:
+        """Re-load the file if it changed since it was last read (blocking)."""
+        try:
+            stat = self._path.stat()
+        except FileNotFoundError:
+            self._entries, self._version = {}, None
+            return
+        # Every write renames a new file into place, so the inode changes too.
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version == self._version:
+            return
+        try:
+            entries = loads(self._path.read_bytes())
+            if not isinstance(entries, dict):
+                raise ValueError(f"expected a JSON object, got {type(entries).__name__}")
+        except ValueError as exc:
+            logger.warning("Ignoring unreadable enrollment cache %s: %s", self._path, exc)
+            entries = {}
+        self._entries = cast(dict[str, dict[str, Any]], entries)
+        self._version = version
+
+    def _store(self, entries: dict[str, dict[str, Any]]) -> None:
+        """Replace the file with *entries* (blocking; caller holds the file lock)."""
+        write_atomic(self._path, dumps(entries))
+        self._entries = entries
+        stat = self._path.stat()
+        self._version = (stat.st_ino, stat.st_mtime_ns)
+
+    async def get(
+        self, device_id: str, fingerprint: str, wg_public_key: str | None = None
+    ) -> dict[str, Any] | None:
+        """Return the stored response for this device and CSR, or ``None``."""
+        await asyncio.to_thread(self._load)
+        entry = self._entries.get(self._key(device_id, fingerprint))
+        if (
+            entry is None
+            or entry["expires_at"] <= time.time()
+            or entry["wg_public_key"] != (wg_public_key or "")
+        ):
+            self._misses += 1
+            return None
+        self._hits += 1
+        return cast(dict[str, Any], entry["response"])
+
+    async def put(
+        self,
+        device_id: str,
+        fingerprint: str,
+        wg_public_key: str | None,
+        response: dict[str, Any],
+    ) -> None:
+        """Store *response* for ``ttl`` seconds (replacing an older one for the same CSR)."""
+        async with async_locked(self._path):
+            await asyncio.to_thread(self._load)
+            now = time.time()
+            entries = {k: e for k, e in self._entries.items() if e["expires_at"] > now}
+            entries[self._key(device_id, fingerprint)] = {
+                "wg_public_key": wg_public_key or "",
+                "expires_at": now + self._ttl,
+                "response": response,
+            }
+            await asyncio.to_thread(self._store, entries)
+
+    def stats(self) -> dict[str, Any]:
+        """Cache counters for the readiness probe."""
+        return {
+            "ttl_s": self._ttl,
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+        }
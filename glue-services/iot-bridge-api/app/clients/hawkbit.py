@@ -6,7 +6,10 @@ software-update targets (one target per IoT device).
 
 from __future__ import annotations
 
-from typing import Any
+import copy
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any, Self
 
 import httpx
 
@@ -21,10 +24,34 @@ class HawkBitClient:
     def __init__(self, base_url: str, username: str, password: str) -> None:
         self._base_url = base_url.rstrip("/")
         self._auth = (username, password)
+        self._http: httpx.AsyncClient | None = None
+
+    @asynccontextmanager
+    async def pooled(self, max_connections: int) -> AsyncIterator[Self]:
+        """Yield a copy of this client whose requests share one connection pool.
+
+        Without it every call opens (and closes) its own connection, which is
+        fine for one enrollment but not for a batch of hundreds.
+        """
+        limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+        async with httpx.AsyncClient(limits=limits) as http:
+            client = copy.copy(self)
+            client._http = http
+            yield client
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[httpx.AsyncClient]:
+        if self._http is not None:
+            yield self._http
+        else:
+            async with httpx.AsyncClient() as client:
+                yield client
 
     async def get_target(self, controller_id: str) -> dict[str, Any] | None:
         """Return the hawkBit target for *controller_id*, or ``None`` if absent."""
-        async with httpx.AsyncClient() as client:
+        async with self._connection() as client:
             resp = await client.get(
                 f"{self._base_url}/rest/v1/targets/{controller_id}",
                 auth=self._auth,
@@ -56,7 +83,7 @@ class HawkBitClient:
             HawkBitError: on API failures.
         """
         payload: list[dict[str, Any]] = [{"controllerId": controller_id, "name": name}]
-        async with httpx.AsyncClient() as client:
+        async with self._connection() as client:
             resp = await client.post(
                 f"{self._base_url}/rest/v1/targets",
                 json=payload,
@@ -76,9 +103,20 @@ class HawkBitClient:
 
         return target
 
+    async def delete_target(self, controller_id: str) -> None:
+        """Delete the target *controller_id* (already absent is fine)."""
+        async with self._connection() as client:
+            resp = await client.delete(
+                f"{self._base_url}/rest/v1/targets/{controller_id}",
+                auth=self._auth,
+                timeout=10.0,
+            )
+        if resp.status_code != 404 and not resp.is_success:
+            raise HawkBitError(f"hawkBit DELETE target returned {resp.status_code}: {resp.text}")
+
     async def _put_attributes(self, controller_id: str, attributes: dict[str, str]) -> None:
         """Attach key/value attributes to an existing target."""
-        async with httpx.AsyncClient() as client:
+        async with self._connection() as client:
             resp = await client.put(
                 f"{self._base_url}/rest/v1/targets/{controller_id}/attributes",
                 json=attributes,
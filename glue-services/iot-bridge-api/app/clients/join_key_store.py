@@ -23,17 +23,17 @@ File structure (``settings.join_keys_db_path``)::
 
 from __future__ import annotations
 
-import asyncio
-import json
 import secrets
 import string
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from datetime import UTC, datetime, timedelta
 from pathlib import Path
 from typing import Any, cast
 
 from app.config import Settings
-
-_key_lock: asyncio.Lock = asyncio.Lock()
+from app.file_lock import async_locked, write_atomic
+from app.json_codec import dumps, loads
 
 # Key TTL: JOIN keys expire 7 days after generation.
 JOIN_KEY_TTL_HOURS: int = 7 * 24
@@ -56,23 +56,32 @@ def _store_path(settings: Settings) -> Path:
     return Path(settings.join_keys_db_path)
 
 
-async def load_keys(settings: Settings) -> dict[str, Any]:
-    """Return the full key dict from disk.  Returns {} if the file is missing."""
-    path = _store_path(settings)
+def _read(path: Path) -> dict[str, Any]:
     if not path.exists():
         return {}
-    async with _key_lock:
-        return cast(dict[str, Any], json.loads(path.read_text()))
+    return cast(dict[str, Any], loads(path.read_bytes()))
+
+
+async def load_keys(settings: Settings) -> dict[str, Any]:
+    """Return the full key dict from disk.  Returns {} if the file is missing."""
+    return _read(_store_path(settings))
 
 
 async def save_keys(data: dict[str, Any], settings: Settings) -> None:
     """Persist the key dict to disk (atomic rename)."""
     path = _store_path(settings)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    tmp = path.with_suffix(".keys.tmp")
-    async with _key_lock:
-        tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False))
-        tmp.replace(path)
+    async with async_locked(path):
+        write_atomic(path, dumps(data, indent=True))
+
+
+@asynccontextmanager
+async def update_keys(settings: Settings) -> AsyncIterator[dict[str, Any]]:
+    """Yield the key dict under the cross-process store lock and save it on a clean exit."""
+    path = _store_path(settings)
+    async with async_locked(path):
+        data = _read(path)
+        yield data
+        write_atomic(path, dumps(data, indent=True))
 
 
 async def create_key(tenant_id: str, display_name: str, settings: Settings) -> str:
@@ -84,47 +93,45 @@ async def create_key(tenant_id: str, display_name: str, settings: Settings) -> s
     now = datetime.now(UTC)
     expires_at = now + timedelta(hours=JOIN_KEY_TTL_HOURS)
 
-    keys = await load_keys(settings)
-    keys[key] = {
-        "key": key,
-        "tenant_id": tenant_id,
-        "display_name": display_name,
-        "status": "open",
-        "created_at": now.isoformat(),
-        "expires_at": expires_at.isoformat(),
-        "used_at": None,
-    }
-    await save_keys(keys, settings)
+    async with update_keys(settings) as keys:
+        keys[key] = {
+            "key": key,
+            "tenant_id": tenant_id,
+            "display_name": display_name,
+            "status": "open",
+            "created_at": now.isoformat(),
+            "expires_at": expires_at.isoformat(),
+            "used_at": None,
+        }
     return key
 
 
 async def validate_and_consume(key: str, settings: Settings) -> dict[str, Any]:
     """Validate the key and mark it as *used*.
 
-    Returns the key entry dict if valid.
+    Returns the key entry dict if valid.  The check and the update happen under
+    one store lock, so a key is consumed at most once even across workers.
 
     Raises:
         KeyError:   key does not exist.
         ValueError: key is already used, revoked, or expired.
     """
-    keys = await load_keys(settings)
-    entry = keys.get(key)
-    if entry is None:
-        raise KeyError(f"JOIN key not found: {key!r}")
-
-    if entry["status"] != "open":
-        raise ValueError(f"JOIN key is {entry['status']!r} – each key may only be used once.")
-
-    expires_at = datetime.fromisoformat(entry["expires_at"])
-    if datetime.now(UTC) > expires_at:
-        # Expire it in the store too
-        entry["status"] = "expired"
-        keys[key] = entry
-        await save_keys(keys, settings)
+    async with update_keys(settings) as keys:
+        entry = keys.get(key)
+        if entry is None:
+            raise KeyError(f"JOIN key not found: {key!r}")
+
+        if entry["status"] != "open":
+            raise ValueError(f"JOIN key is {entry['status']!r} – each key may only be used once.")
+
+        expires_at = datetime.fromisoformat(entry["expires_at"])
+        expired = datetime.now(UTC) > expires_at
+        if expired:
+            # Expire it in the store too
+            entry["status"] = "expired"
+        else:
+            entry["status"] = "used"
+            entry["used_at"] = datetime.now(UTC).isoformat()
+    if expired:
         raise ValueError("JOIN key has expired.")
-
-    entry["status"] = "used"
-    entry["used_at"] = datetime.now(UTC).isoformat()
-    keys[key] = entry
-    await save_keys(keys, settings)
     return cast(dict[str, Any], entry)
@@ -1,8 +1,9 @@
 """Persistent JSON store for tenant JOIN requests.
 
 A single JSON file at ``settings.join_requests_db_path`` holds the state of
-all tenant JOIN requests.  Access is guarded by an asyncio.Lock so concurrent
-approve/reject calls cannot corrupt the file.
+all tenant JOIN requests.  Updates go through :func:`update_store`, which holds
+a cross-process file lock (:mod:`app.file_lock`) for the whole read-modify-write,
+so concurrent approve/reject calls in any worker cannot lose each other's changes.
 
 Structure::
 
@@ -37,34 +38,49 @@ Structure::
 
 from __future__ import annotations
 
-import asyncio
-import json
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Any, cast
 
 from app.config import Settings
-
-_store_lock: asyncio.Lock = asyncio.Lock()
+from app.file_lock import async_locked, write_atomic
+from app.json_codec import dumps, loads
 
 
 def _store_path(settings: Settings) -> Path:
     return Path(settings.join_requests_db_path)
 
 
-async def load_store(settings: Settings) -> dict[str, Any]:
-    """Return the full JOIN-request dict from disk.  Returns {} if the file is missing."""
-    path = _store_path(settings)
+def _read(path: Path) -> dict[str, Any]:
     if not path.exists():
         return {}
-    async with _store_lock:
-        return cast(dict[str, Any], json.loads(path.read_text()))
+    return cast(dict[str, Any], loads(path.read_bytes()))
+
+
+async def load_store(settings: Settings) -> dict[str, Any]:
+    """Return the full JOIN-request dict from disk.  Returns {} if the file is missing.
+
+    Saves replace the file atomically, so reading needs no lock.
+    """
+    return _read(_store_path(settings))
 
 
 async def save_store(data: dict[str, Any], settings: Settings) -> None:
     """Persist the full JOIN-request dict to disk (atomic rename)."""
     path = _store_path(settings)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    tmp = path.with_suffix(".tmp")
-    async with _store_lock:
-        tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False))
-        tmp.replace(path)
+    async with async_locked(path):
+        write_atomic(path, dumps(data, indent=True))
+
+
+@asynccontextmanager
+async def update_store(settings: Settings) -> AsyncIterator[dict[str, Any]]:
+    """Yield the JOIN-request dict under the store lock and save it on a clean exit.
+
+    An exception inside the block leaves the file untouched.
+    """
+    path = _store_path(settings)
+    async with async_locked(path):
+        data = _read(path)
+        yield data
+        write_atomic(path, dumps(data, indent=True))
@@ -0,0 +1,140 @@
+"""In-process last-value table of device telemetry.
+
+The telemetry webhooks feed every accepted row into :class:`LatestValueCache`,
+which keeps, per ``(tenant_id, device_id)``, the newest ``(time, value,
+raw_type)`` of each metric.  ``GET /devices/{id}/latest`` answers from here
+without touching TimescaleDB.
+
+Memory is bounded by ``max_devices``: devices are kept in LRU order (touched on
+every write and read) and the idle ones are evicted first.
+
+A device first seen through live ingestion only knows the metrics received
+since this process started, so its entry is *incomplete* until it has been
+merged with the newest rows from the database (see
+:func:`app.clients.telemetry_query.query_latest`).  Afterwards reads are served
+purely from memory for ``ttl`` seconds, then the entry is merged with the
+database again – which also picks up rows written by other worker processes.
+A lookup the database has no rows for is not cached at all, so probing
+unknown device IDs neither pins a 404 nor evicts real devices.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from datetime import UTC, datetime
+from typing import Any, NamedTuple
+
+from app.clients.telemetry_ids import RAW_TYPES, raw_type_code_from_tags
+
+
+class LatestValue(NamedTuple):
+    time: datetime
+    value: float | None
+    raw_type: str | None
+
+
+class _DeviceEntry:
+    __slots__ = ("metrics", "complete_until")
+
+    def __init__(self) -> None:
+        self.metrics: dict[str, LatestValue] = {}
+        # Monotonic deadline until which the entry is known to be complete.
+        self.complete_until = 0.0
+
+    def put(self, metric: str, latest: LatestValue) -> None:
+        current = self.metrics.get(metric)
+        if current is None or latest.time >= current.time:
+            self.metrics[metric] = latest
+
+
+class LatestValueCache:
+    """LRU-bounded ``(tenant, device) → {metric: LatestValue}`` table."""
+
+    def __init__(self, max_devices: int = 100_000, ttl: float = 300.0) -> None:
+        self._max_devices = max(1, max_devices)
+        self._ttl = max(0.0, ttl)
+        self._devices: OrderedDict[tuple[str, str], _DeviceEntry] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _entry(self, key: tuple[str, str]) -> _DeviceEntry:
+        entry = self._devices.get(key)
+        if entry is None:
+            entry = self._devices[key] = _DeviceEntry()
+            if len(self._devices) > self._max_devices:
+                self._devices.popitem(last=False)
+                self._evictions += 1
+        else:
+            self._devices.move_to_end(key)
+        return entry
+
+    def update(self, rows: Iterable[dict[str, Any]]) -> None:
+        """Record metric rows as written by the ingestion path."""
+        now = datetime.now(UTC)
+        key: tuple[str, str] | None = None
+        entry: _DeviceEntry | None = None
+        for row in rows:
+            row_key = (row["tenant_id"], row["device_id"])
+            if row_key != key:  # rows arrive grouped by device – skip the lookups
+                key, entry = row_key, self._entry(row_key)
+            assert entry is not None
+            tags = row.get("tags") or {}
+            entry.put(
+                row["metric_name"],
+                LatestValue(row.get("time") or now, row.get("value"), tags.get("raw_type")),
+            )
+
+    def update_records(self, records: Iterable[tuple[Any, ...]]) -> None:
+        """Record ``device_telemetry`` column tuples (the raw webhook's rows)."""
+        key: tuple[str, str] | None = None
+        entry: _DeviceEntry | None = None
+        for time_, tenant_id, device_id, metric, value, tags in records:
+            if (tenant_id, device_id) != key:
+                key = (tenant_id, device_id)
+                entry = self._entry(key)
+            assert entry is not None
+            entry.put(metric, LatestValue(time_, value, RAW_TYPES[raw_type_code_from_tags(tags)]))
+
+    def merge(
+        self, tenant_id: str, device_id: str, values: dict[str, LatestValue]
+    ) -> dict[str, LatestValue]:
+        """Merge the newest values loaded from the database and mark the entry complete.
+
+        Nothing is stored when the database returned no rows: the device may
+        not exist, and its first write creates the entry anyway.
+        """
+        key = (tenant_id, device_id)
+        if not values:
+            entry = self._devices.get(key)
+            return dict(entry.metrics) if entry is not None else {}
+        entry = self._entry(key)
+        for metric, latest in values.items():
+            entry.put(metric, latest)
+        entry.complete_until = time.monotonic() + self._ttl
+        return dict(entry.metrics)
+
+    def get(self, tenant_id: str, device_id: str) -> dict[str, LatestValue] | None:
+        """Return a copy of the device's values, or ``None`` if the DB must be consulted."""
+        entry = self._devices.get((tenant_id, device_id))
+        if entry is None or entry.complete_until <= time.monotonic():
+            self._misses += 1
+            return None
+        self._devices.move_to_end((tenant_id, device_id))
+        self._hits += 1
+        return dict(entry.metrics)
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "devices": len(self._devices),
+            "max_devices": self._max_devices,
+            "ttl_s": self._ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+        }
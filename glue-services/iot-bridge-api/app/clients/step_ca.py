@@ -4,7 +4,19 @@ Communicates with the smallstep step-ca HTTPS API to sign X.509 CSRs using the
 configured JWK provisioner (factory-enrollment flow).
 
 Also provides ``StepCAAdminClient`` which uses the bootstrap admin JWK
-provisioner to call the step-ca Admin API (manage provisioners at runtime).
+provisioner to call the step-ca Admin API (manage provisioners at runtime),
+and ``LocalSigner``, an optional in-process signer for device certificates
+(``step_ca_signing_mode = "local"``) that uses the intermediate CA key directly.
+
+Decrypting a provisioner key (PBES2 key derivation) is deliberately slow, so
+both clients take their keys from a :class:`ProvisionerKeyCache` shared by the
+whole process (``app.deps.get_provisioner_key_cache``).  A rejected token
+(HTTP 401, or a 403 blaming the token) evicts the key, and signing is retried
+once with a fresh one; a policy 403 (e.g. a SAN the provisioner does not
+allow) fails straight away and keeps the key cached.
+CSR parsing, token signing and key decryption run on the
+:class:`~app.crypto.CryptoExecutor` the clients are given
+(``app.deps.get_crypto_executor``), not on the event loop.
 
 TLS note: ``verify=False`` is intentional for local evaluation because the
 step-ca root certificate is not pre-loaded into the container's trust store.
@@ -14,24 +26,121 @@ In production, pin the root CA via ``root_fingerprint`` and use
 
 from __future__ import annotations
 
-import base64
-import hashlib
-import json
+import asyncio
+import copy
 import time
-from typing import Any, cast
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Protocol, Self, cast
 
 import httpx
-from cryptography import x509
-from cryptography.hazmat.primitives.serialization import Encoding
 from jwcrypto import jwk  # type: ignore[import]
-from jwcrypto.jwe import JWE  # type: ignore[import]
-from jwcrypto.jwt import JWT  # type: ignore[import]
+
+from app.crypto import (
+    INLINE,
+    CryptoExecutor,
+    ParsedCSR,
+    decrypt_provisioner_key,
+    issue_certificate,
+    parse_csr,
+    sign_token,
+)
+from app.file_lock import locked
+from app.json_codec import dumps
 
 
 class StepCAError(Exception):
     """Raised when the step-ca API returns an unexpected response."""
 
 
+# Words of a 403 message that blame the token (or the key that signed it), not policy.
+_TOKEN_ERROR_WORDS = ("token", "signature", "jwk", "kid")
+
+
+def _token_rejected(resp: httpx.Response) -> bool:
+    """Whether step-ca refused the provisioner token, so the cached key may be stale."""
+    if resp.status_code == 401:
+        return True
+    if resp.status_code != 403:
+        return False
+    message = resp.text.lower()
+    return any(word in message for word in _TOKEN_ERROR_WORDS)
+
+
+async def fetch_provisioner_key(
+    ca_url: str,
+    name: str,
+    password: str,
+    verify_tls: bool,
+    label: str = "Provisioner",
+    crypto: CryptoExecutor = INLINE,
+) -> jwk.JWK:
+    """Download the JWK provisioner *name* from step-ca and decrypt its private key.
+
+    The decryption (PBKDF2 key derivation) runs on *crypto*.
+    """
+    async with httpx.AsyncClient(verify=verify_tls) as client:
+        resp = await client.get(f"{ca_url}/1.0/provisioners", timeout=10.0)
+        resp.raise_for_status()
+        data: dict[str, Any] = resp.json()
+
+    for prov in data.get("provisioners", []):
+        if prov.get("name") == name and prov.get("type") == "JWK":
+            encrypted_key_str: str = prov.get("encryptedKey", "")
+            if not encrypted_key_str:
+                raise StepCAError(f"{label} '{name}' has no encryptedKey")
+            # Decrypt the JWE (PBES2-HS256+A128KW) using the provisioner password
+            return await crypto.run(decrypt_provisioner_key, encrypted_key_str, password)
+
+    raise StepCAError(f"JWK provisioner '{name}' not found in step-ca")
+
+
+class ProvisionerKeyCache:
+    """TTL-bounded cache of decrypted provisioner keys keyed by (CA URL, provisioner).
+
+    Concurrent misses for the same provisioner share one load (single flight), so
+    a burst of enrollments downloads and decrypts the key once.  Failed loads are
+    not cached.  A ``ttl`` of ``0`` disables caching but keeps the single flight.
+    """
+
+    def __init__(self, ttl: float = 3600.0) -> None:
+        self._ttl = ttl
+        self._keys: dict[tuple[str, str], tuple[jwk.JWK, float]] = {}
+        self._loading: dict[tuple[str, str], asyncio.Future[jwk.JWK]] = {}
+        self.loads = 0
+
+    async def get(self, ca_url: str, name: str, load: Callable[[], Awaitable[jwk.JWK]]) -> jwk.JWK:
+        """Return the cached key of *name*, calling *load* on a miss."""
+        cache_key = (ca_url, name)
+        entry = self._keys.get(cache_key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        future = self._loading.get(cache_key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(cache_key, load))
+            self._loading[cache_key] = future
+        # Shielded: a cancelled request must not abort the load the others wait for.
+        return await asyncio.shield(future)
+
+    async def _load(
+        self, cache_key: tuple[str, str], load: Callable[[], Awaitable[jwk.JWK]]
+    ) -> jwk.JWK:
+        try:
+            self.loads += 1
+            key = await load()
+            if self._ttl > 0:
+                self._keys[cache_key] = (key, time.monotonic() + self._ttl)
+            return key
+        finally:
+            del self._loading[cache_key]
+
+    def invalidate(self, ca_url: str, name: str) -> None:
+        """Forget the key of *name*, e.g. because step-ca rejected a token signed with it."""
+        self._keys.pop((ca_url, name), None)
+
+
 class StepCAClient:
     """Async client for the smallstep step-ca certificate-signing API."""
 
@@ -42,52 +151,52 @@ class StepCAClient:
         provisioner_password: str,
         root_fingerprint: str = "",
         verify_tls: bool = True,
+        key_cache: ProvisionerKeyCache | None = None,
+        crypto: CryptoExecutor = INLINE,
     ) -> None:
         self._url = ca_url.rstrip("/")
         self._provisioner_name = provisioner_name
         self._provisioner_password = provisioner_password
         self._root_fingerprint = root_fingerprint
         self._verify_tls = verify_tls
-        self._signing_key: jwk.JWK | None = None
+        self._key_cache = key_cache or ProvisionerKeyCache()
+        self._crypto = crypto
+        self._http: httpx.AsyncClient | None = None
+
+    @asynccontextmanager
+    async def pooled(self, max_connections: int) -> AsyncIterator[Self]:
+        """Yield a copy of this client whose signing requests share one connection pool."""
+        limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+        async with httpx.AsyncClient(verify=self._verify_tls, limits=limits) as http:
+            client = copy.copy(self)
+            client._http = http
+            yield client
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[httpx.AsyncClient]:
+        if self._http is not None:
+            yield self._http
+        else:
+            async with httpx.AsyncClient(verify=self._verify_tls) as client:
+                yield client
 
     async def _load_signing_key(self) -> jwk.JWK:
-        """Fetch and decrypt the JWK provisioner private key from step-ca."""
-        if self._signing_key is not None:
-            return self._signing_key
+        """Return the decrypted JWK provisioner private key (cached process-wide)."""
+        return await self._key_cache.get(
+            self._url,
+            self._provisioner_name,
+            lambda: fetch_provisioner_key(
+                self._url,
+                self._provisioner_name,
+                self._provisioner_password,
+                self._verify_tls,
+                crypto=self._crypto,
+            ),
+        )
 
-        async with httpx.AsyncClient(verify=self._verify_tls) as client:
-            resp = await client.get(
-                f"{self._url}/1.0/provisioners",
-                timeout=10.0,
-            )
-            resp.raise_for_status()
-            data: dict[str, Any] = resp.json()
-
-        for prov in data.get("provisioners", []):
-            if prov.get("name") == self._provisioner_name and prov.get("type") == "JWK":
-                encrypted_key_str: str = prov.get("encryptedKey", "")
-                if not encrypted_key_str:
-                    raise StepCAError(
-                        f"Provisioner '{self._provisioner_name}' has no encryptedKey"
-                    )
-                # Decrypt the JWE (PBES2-HS256+A128KW) using the provisioner password
-                password_key = jwk.JWK.from_password(self._provisioner_password.encode("utf-8"))
-                jwe_obj = JWE()
-                jwe_obj.deserialize(encrypted_key_str, password_key)
-                private_key_data: dict[str, Any] = json.loads(jwe_obj.payload.decode("utf-8"))
-                self._signing_key = jwk.JWK(**private_key_data)
-                return self._signing_key
-
-        raise StepCAError(f"JWK provisioner '{self._provisioner_name}' not found in step-ca")
-
-    @staticmethod
-    def _csr_fingerprint(csr_pem: str) -> str:
-        """SHA-256 fingerprint of the CSR DER bytes (required in the OTT claims)."""
-        csr = x509.load_pem_x509_csr(csr_pem.encode())
-        der = csr.public_bytes(Encoding.DER)
-        return base64.urlsafe_b64encode(hashlib.sha256(der).digest()).rstrip(b"=").decode()
-
-    async def _make_ott(self, subject: str, sans: list[str], csr_pem: str) -> str:
+    async def _make_ott(self, subject: str, sans: list[str], csr: ParsedCSR) -> str:
         """Build and sign a short-lived one-time token (OTT) for /1.0/sign."""
         key = await self._load_signing_key()
         now = int(time.time())
@@ -99,26 +208,21 @@ class StepCAClient:
             "nbf": now,
             "exp": now + 300,
             "sans": sans,
-            "sha": self._csr_fingerprint(csr_pem),
+            "sha": csr.fingerprint,
         }
-        token = JWT(
-            header={"alg": "ES256", "kid": key.key_id},
-            claims=claims,
-        )
-        token.make_signed_token(key)
-        serialized: str = token.serialize()
-        return serialized
+        return await self._crypto.run(sign_token, key.export_private(), claims)
 
     async def sign_certificate(
         self,
-        csr_pem: str,
+        csr_pem: str | ParsedCSR,
         subject: str,
         sans: list[str],
     ) -> tuple[str, str]:
         """Submit a CSR to step-ca for signing via the JWK provisioner.
 
         Args:
-            csr_pem: PEM-encoded PKCS#10 certificate signing request.
+            csr_pem: PEM-encoded PKCS#10 certificate signing request, or the
+                     :class:`~app.crypto.ParsedCSR` the caller already has.
             subject: Common Name for the leaf certificate.
             sans:    Subject Alternative Names (typically ``[device_id]``).
 
@@ -128,13 +232,23 @@ class StepCAClient:
         Raises:
             StepCAError: on API or authentication failures.
         """
-        ott = await self._make_ott(subject, sans, csr_pem)
-        async with httpx.AsyncClient(verify=self._verify_tls) as client:
-            resp = await client.post(
-                f"{self._url}/1.0/sign",
-                json={"csr": csr_pem, "ott": ott},
-                timeout=30.0,
-            )
+        csr = (
+            csr_pem
+            if isinstance(csr_pem, ParsedCSR)
+            else await self._crypto.run(parse_csr, csr_pem)
+        )
+        async with self._connection() as client:
+            for _ in range(2):
+                ott = await self._make_ott(subject, sans, csr)
+                resp = await client.post(
+                    f"{self._url}/1.0/sign",
+                    json={"csr": csr.pem, "ott": ott},
+                    timeout=30.0,
+                )
+                if not _token_rejected(resp):
+                    break
+                # The cached key may be stale (provisioner re-created): reload once.
+                self._key_cache.invalidate(self._url, self._provisioner_name)
             if not resp.is_success:
                 raise StepCAError(f"step-ca /1.0/sign returned {resp.status_code}: {resp.text}")
             data: dict[str, str] = resp.json()
@@ -142,6 +256,125 @@ class StepCAClient:
         return data["crt"], data["ca"]
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Local signing mode (no step-ca round trip per device certificate)
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class CertificateSigner(Protocol):
+    """What enrollment needs from a signer: :class:`StepCAClient` or :class:`LocalSigner`."""
+
+    async def sign_certificate(
+        self, csr_pem: str | ParsedCSR, subject: str, sans: list[str]
+    ) -> tuple[str, str]: ...
+
+    def pooled(self, max_connections: int) -> AbstractAsyncContextManager[Any]: ...
+
+
+class LocalSigner:
+    """Issues device leaf certificates in-process with the intermediate CA key.
+
+    For mass enrollment: no HTTPS round trip and no OTT per certificate, so
+    step-ca's throughput is off the critical path.  The certificate profile
+    mirrors step-ca's default leaf template (see :func:`app.crypto.issue_certificate`)
+    and the return value keeps the ``(leaf_pem, chain_pem)`` contract of
+    :meth:`StepCAClient.sign_certificate`; the chain is the content of
+    *issuer_cert_path* (intermediate, optionally followed by the root).
+
+    The key is read from *issuer_key_path* – step-ca's own
+    ``secrets/intermediate_ca_key``, encrypted with *issuer_key_password* – or
+    handed in as PEM (*issuer_key_pem*), which is where a PKCS#11 / KMS
+    export would plug in.  Both files are read on the first signature.
+
+    step-ca keeps no record of these certificates, so every issuance is
+    appended to *index_path* as one NDJSON line (serial, subject, SANs,
+    validity, leaf and CSR fingerprints) under the cross-process file lock.
+    """
+
+    def __init__(
+        self,
+        issuer_cert_path: str | Path,
+        issuer_key_path: str | Path | None,
+        index_path: str | Path,
+        issuer_key_password: str = "",
+        validity_hours: float = 24.0,
+        crypto: CryptoExecutor = INLINE,
+        issuer_key_pem: bytes | None = None,
+    ) -> None:
+        self._cert_path = Path(issuer_cert_path)
+        self._key_path = Path(issuer_key_path) if issuer_key_path else None
+        self._key_pem = issuer_key_pem
+        self._password = issuer_key_password.encode() or None
+        self._index_path = Path(index_path)
+        self._validity = timedelta(hours=validity_hours)
+        self._crypto = crypto
+        self._chain_pem: bytes | None = None
+        self.issued = 0
+
+    def _issuer(self) -> tuple[bytes, bytes]:
+        if self._chain_pem is None:
+            self._chain_pem = self._cert_path.read_bytes()
+        if self._key_pem is None:
+            if self._key_path is None:
+                raise StepCAError("Local signer has neither a key file nor a key")
+            self._key_pem = self._key_path.read_bytes()
+        return self._chain_pem, self._key_pem
+
+    @asynccontextmanager
+    async def pooled(self, max_connections: int) -> AsyncIterator[Self]:
+        """No connections to pool; for interchangeability with :class:`StepCAClient`."""
+        yield self
+
+    async def sign_certificate(
+        self,
+        csr_pem: str | ParsedCSR,
+        subject: str,
+        sans: list[str],
+    ) -> tuple[str, str]:
+        """Issue a leaf certificate for the CSR and return ``(leaf_pem, chain_pem)``.
+
+        Raises:
+            StepCAError: if the issuer certificate or key cannot be loaded.
+        """
+        csr = (
+            csr_pem
+            if isinstance(csr_pem, ParsedCSR)
+            else await self._crypto.run(parse_csr, csr_pem)
+        )
+        try:
+            chain_pem, key_pem = self._issuer()
+            issued = await self._crypto.run(
+                issue_certificate,
+                csr,
+                subject,
+                sans,
+                chain_pem,
+                key_pem,
+                self._password,
+                self._validity,
+            )
+        except (OSError, ValueError, TypeError) as exc:
+            # TypeError / ValueError: wrong or missing key password, unusable key.
+            raise StepCAError(f"Local signing failed: {exc}") from exc
+        entry = {
+            "serial": issued.serial,
+            "subject": subject,
+            "sans": sans,
+            "not_before": issued.not_before,
+            "not_after": issued.not_after,
+            "fingerprint": issued.fingerprint,
+            "csr_fingerprint": csr.fingerprint,
+        }
+        await asyncio.to_thread(self._record, entry)
+        self.issued += 1
+        return issued.pem, chain_pem.decode()
+
+    def _record(self, entry: dict[str, Any]) -> None:
+        self._index_path.parent.mkdir(parents=True, exist_ok=True)
+        with locked(self._index_path), self._index_path.open("ab") as fh:
+            fh.write(dumps(entry) + b"\n")
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # step-ca Admin API client
 # ─────────────────────────────────────────────────────────────────────────────
@@ -165,41 +398,36 @@ class StepCAAdminClient:
         admin_provisioner_name: str,
         admin_password: str,
         verify_tls: bool = False,
+        key_cache: ProvisionerKeyCache | None = None,
+        crypto: CryptoExecutor = INLINE,
     ) -> None:
         self._url = ca_url.rstrip("/")
         self._admin_provisioner = admin_provisioner_name
         self._admin_password = admin_password
         self._verify_tls = verify_tls
-        self._admin_key: jwk.JWK | None = None
+        self._key_cache = key_cache or ProvisionerKeyCache()
+        self._crypto = crypto
 
     async def _load_admin_key(self) -> Any:
-        """Fetch and decrypt the admin JWK provisioner private key from step-ca."""
-        if self._admin_key is not None:
-            return self._admin_key
-
-        async with httpx.AsyncClient(verify=self._verify_tls) as client:
-            resp = await client.get(f"{self._url}/1.0/provisioners", timeout=10.0)
-            resp.raise_for_status()
-            data: dict[str, Any] = resp.json()
-
-        for prov in data.get("provisioners", []):
-            if prov.get("name") == self._admin_provisioner and prov.get("type") == "JWK":
-                encrypted_key_str: str = prov.get("encryptedKey", "")
-                if not encrypted_key_str:
-                    raise StepCAError(
-                        f"Admin provisioner '{self._admin_provisioner}' has no encryptedKey"
-                    )
-                password_key = jwk.JWK.from_password(self._admin_password.encode("utf-8"))
-                jwe_obj = JWE()
-                jwe_obj.deserialize(encrypted_key_str, password_key)
-                private_key_data: dict[str, Any] = json.loads(jwe_obj.payload.decode("utf-8"))
-                self._admin_key = jwk.JWK(**private_key_data)
-                return self._admin_key
-
-        raise StepCAError(
-            f"JWK admin provisioner '{self._admin_provisioner}' not found in step-ca"
+        """Return the decrypted admin JWK provisioner private key (cached process-wide)."""
+        return await self._key_cache.get(
+            self._url,
+            self._admin_provisioner,
+            lambda: fetch_provisioner_key(
+                self._url,
+                self._admin_provisioner,
+                self._admin_password,
+                self._verify_tls,
+                label="Admin provisioner",
+                crypto=self._crypto,
+            ),
         )
 
+    def _check_admin_response(self, resp: httpx.Response) -> None:
+        """Evict the admin key when the Admin API rejected the token signed with it."""
+        if _token_rejected(resp):
+            self._key_cache.invalidate(self._url, self._admin_provisioner)
+
     async def _make_admin_token(self) -> str:
         """Build a short-lived JWT for the step-ca Admin API."""
         key = await self._load_admin_key()
@@ -212,12 +440,7 @@ class StepCAAdminClient:
             "nbf": now,
             "exp": now + 300,
         }
-        token = JWT(
-            header={"alg": "ES256", "kid": key.key_id},
-            claims=claims,
-        )
-        token.make_signed_token(key)
-        return str(token.serialize())
+        return await self._crypto.run(sign_token, key.export_private(), claims)
 
     async def list_provisioners(self) -> list[dict]:
         """Return all provisioners registered in step-ca."""
@@ -265,6 +488,7 @@ class StepCAAdminClient:
                 json=payload,
                 timeout=15.0,
             )
+            self._check_admin_response(resp)
             if not resp.is_success:
                 raise StepCAError(
                     f"step-ca add OIDC provisioner failed HTTP {resp.status_code}: {resp.text}"
@@ -290,6 +514,7 @@ class StepCAAdminClient:
                 headers={"Authorization": f"Bearer {admin_token}"},
                 timeout=15.0,
             )
+            self._check_admin_response(resp)
             if resp.status_code not in (200, 204, 404):
                 raise StepCAError(
                     f"step-ca remove provisioner failed HTTP {resp.status_code}: {resp.text}"
@@ -320,61 +545,48 @@ class StepCAAdminClient:
         Raises:
             StepCAError: if the provisioner is not found or signing fails.
         """
-        # ── 1. Fetch and decrypt the sub-CA provisioner JWK ──────────────────
-        async with httpx.AsyncClient(verify=self._verify_tls) as client:
-            resp = await client.get(f"{self._url}/1.0/provisioners", timeout=10.0)
-            resp.raise_for_status()
-            data: dict[str, Any] = resp.json()
-
-        sub_ca_key: jwk.JWK | None = None
-        for prov in data.get("provisioners", []):
-            if prov.get("name") == sub_ca_provisioner_name and prov.get("type") == "JWK":
-                encrypted_key_str: str = prov.get("encryptedKey", "")
-                if not encrypted_key_str:
-                    raise StepCAError(
-                        f"Sub-CA provisioner '{sub_ca_provisioner_name}' has no encryptedKey"
-                    )
-                password_key = jwk.JWK.from_password(sub_ca_provisioner_password.encode())
-                jwe_obj = JWE()
-                jwe_obj.deserialize(encrypted_key_str, password_key)
-                private_key_data: dict[str, Any] = json.loads(jwe_obj.payload.decode())
-                sub_ca_key = jwk.JWK(**private_key_data)
-                break
-
-        if sub_ca_key is None:
-            raise StepCAError(f"JWK provisioner '{sub_ca_provisioner_name}' not found in step-ca")
-
-        # ── 2. Compute CSR fingerprint (binds OTT to this specific CSR) ───────
-        csr = x509.load_pem_x509_csr(csr_pem.encode())
-        der = csr.public_bytes(Encoding.DER)
-        csr_sha = base64.urlsafe_b64encode(hashlib.sha256(der).digest()).rstrip(b"=").decode()
-
-        # ── 3. Build OTT using the sub-CA provisioner key ─────────────────────
-        now = int(time.time())
-        claims: dict[str, Any] = {
-            "iss": sub_ca_provisioner_name,
-            "sub": tenant_id,
-            "aud": [f"{self._url}/1.0/sign"],
-            "iat": now,
-            "nbf": now,
-            "exp": now + 300,
-            "sans": [tenant_id],
-            "sha": csr_sha,
-        }
-        token = JWT(
-            header={"alg": "ES256", "kid": sub_ca_key.key_id},
-            claims=claims,
-        )
-        token.make_signed_token(sub_ca_key)
-        ott: str = token.serialize()
+        # ── 1. Parse the CSR; its fingerprint binds the OTT to this CSR ───────
+        csr = await self._crypto.run(parse_csr, csr_pem)
 
-        # ── 4. Submit to step-ca /1.0/sign ────────────────────────────────────
         async with httpx.AsyncClient(verify=self._verify_tls) as client:
-            resp = await client.post(
-                f"{self._url}/1.0/sign",
-                json={"csr": csr_pem, "ott": ott},
-                timeout=30.0,
-            )
+            for _ in range(2):
+                # ── 2. Fetch and decrypt the sub-CA provisioner JWK (cached) ──
+                sub_ca_key = await self._key_cache.get(
+                    self._url,
+                    sub_ca_provisioner_name,
+                    lambda: fetch_provisioner_key(
+                        self._url,
+                        sub_ca_provisioner_name,
+                        sub_ca_provisioner_password,
+                        self._verify_tls,
+                        label="Sub-CA provisioner",
+                        crypto=self._crypto,
+                    ),
+                )
+
+                # ── 3. Build OTT using the sub-CA provisioner key ─────────────
+                now = int(time.time())
+                claims: dict[str, Any] = {
+                    "iss": sub_ca_provisioner_name,
+                    "sub": tenant_id,
+                    "aud": [f"{self._url}/1.0/sign"],
+                    "iat": now,
+                    "nbf": now,
+                    "exp": now + 300,
+                    "sans": [tenant_id],
+                    "sha": csr.fingerprint,
+                }
+                ott = await self._crypto.run(sign_token, sub_ca_key.export_private(), claims)
+
+                # ── 4. Submit to step-ca /1.0/sign ────────────────────────────
+                resp = await client.post(
+                    f"{self._url}/1.0/sign",
+                    json={"csr": csr_pem, "ott": ott},
+                    timeout=30.0,
+                )
+                if not _token_rejected(resp):
+                    break
+                self._key_cache.invalidate(self._url, sub_ca_provisioner_name)
             if not resp.is_success:
                 raise StepCAError(f"step-ca sub-CA sign returned {resp.status_code}: {resp.text}")
             result: dict[str, str] = resp.json()
@@ -0,0 +1,334 @@
+"""Write-behind telemetry buffer in front of ``TimescaleDBClient.write_metrics``.
+
+Every telemetry webhook used to cost one ``executemany`` round trip (and one
+transaction).  The buffer collects metric rows from many concurrent requests
+and hands them to the writer as a single batch once either threshold is hit:
+
+  • ``max_rows``     – the pending batch reached this many rows, or
+  • ``max_latency``  – the oldest pending row has waited this long (seconds).
+
+Ack modes
+─────────
+  ``flush``   ``submit()`` returns only after the batch containing the rows has
+              been written; write errors propagate to every waiting caller so
+              the webhook can still answer 503 and ThingsBoard retries.
+  ``buffer``  ``submit()`` returns as soon as the rows are queued.  Lowest
+              latency, but rows of a failed batch are logged and dropped.
+
+The flusher task is started and stopped by the FastAPI lifespan.  ``stop()``
+drains everything still pending.  While the buffer is not running (tests,
+CLI use) ``submit()`` writes straight through to the writer.
+
+With a :class:`~app.clients.telemetry_spool.TelemetrySpool` attached, a batch
+the writer rejects is appended to the on-disk spool instead of failing, and
+while the spool still holds a backlog new batches go straight to the spool so
+the replayer can drain it in order.
+
+Admission control
+─────────────────
+Rows that are queued or being written count against ``high_watermark``.  Once
+a submit would push them past it the buffer starts shedding: every ``submit()``
+raises :class:`TelemetryOverloadedError` until the backlog has drained below
+``low_watermark``.  The error carries a ``retry_after`` estimate (seconds)
+derived from the recently observed flush throughput, and whether the writer is
+failing (503) or merely saturated (429).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections.abc import Sequence
+from typing import Any, Literal, Protocol
+
+from app.clients.telemetry_spool import TelemetrySpool
+from app.clients.timescaledb import MetricRow
+
+logger = logging.getLogger(__name__)
+
+AckMode = Literal["buffer", "flush"]
+SubmitStatus = Literal["written", "buffered", "spooled"]
+
+
+class TelemetryOverloadedError(Exception):
+    """Raised by ``submit()`` while the buffer is shedding load."""
+
+    def __init__(self, retry_after: int, writer_failing: bool = False) -> None:
+        super().__init__(f"telemetry ingestion queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+        self.writer_failing = writer_failing
+
+
+class TelemetryWriter(Protocol):
+    """Anything that can persist a batch of metric rows (dicts or column tuples)."""
+
+    async def write_metrics(self, rows: Sequence[MetricRow]) -> None: ...
+
+
+class TelemetryBuffer:
+    """Accumulates metric rows and flushes them to the writer in batches."""
+
+    def __init__(
+        self,
+        writer: TelemetryWriter,
+        max_rows: int = 5000,
+        max_latency: float = 0.2,
+        ack_mode: AckMode = "flush",
+        spool: TelemetrySpool | None = None,
+        high_watermark: int = 0,
+        low_watermark: int = 0,
+    ) -> None:
+        self._writer = writer
+        self._spool = spool
+        # high_watermark=0 disables admission control; low defaults to half of high.
+        self._high_watermark = max(0, high_watermark)
+        self._low_watermark = min(low_watermark or self._high_watermark // 2, self._high_watermark)
+        self._max_rows = max(1, max_rows)
+        self._max_latency = max(0.0, max_latency)
+        self._ack_mode: AckMode = ack_mode
+        self._rows: list[MetricRow] = []
+        self._waiters: list[asyncio.Future[SubmitStatus]] = []
+        self._batch_started = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._stopping = False
+        self._inflight_rows = 0
+        self._shedding = False
+        self._writer_failing = False
+        self._drain_rate = 0.0  # EWMA of rows/s written per flush
+        # Counters exposed through stats()
+        self._batches_flushed = 0
+        self._rows_flushed = 0
+        self._rows_dropped = 0
+        self._last_flush_ms = 0.0
+        self._requests_shed = 0
+        self._rows_shed = 0
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def ack_mode(self) -> AckMode:
+        return self._ack_mode
+
+    async def start(self) -> None:
+        """Start the background flusher (idempotent)."""
+        if self.running:
+            return
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="telemetry-buffer-flusher")
+        logger.info(
+            "Telemetry buffer started (max_rows=%d, max_latency=%.3fs, ack=%s).",
+            self._max_rows,
+            self._max_latency,
+            self._ack_mode,
+        )
+
+    async def stop(self) -> None:
+        """Flush all pending rows and stop the flusher."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await self._task
+        finally:
+            self._task = None
+        # Rows submitted after the flusher's final pass are written here.
+        await self._flush()
+        logger.info("Telemetry buffer drained and stopped.")
+
+    # ── Ingestion ─────────────────────────────────────────────────────────────
+
+    async def submit(
+        self, rows: Sequence[MetricRow], ack_mode: AckMode | None = None
+    ) -> SubmitStatus:
+        """Queue *rows* for the next batch.
+
+        *ack_mode* overrides the buffer's ack mode for this call; the broker
+        consumer passes ``"flush"`` so it only acks messages that are persisted.
+
+        Returns:
+            ``"written"`` if the rows are in TimescaleDB when this call returns,
+            ``"spooled"`` if they were persisted to the on-disk spool instead, or
+            ``"buffered"`` if they were only queued (``ack_mode="buffer"``).
+
+        Raises:
+            Whatever the writer raises for the batch containing *rows*, but only
+            in ``flush`` ack mode or when the buffer is not running, and only if
+            the batch could not be spooled either.
+            :class:`TelemetryOverloadedError` if the rows are not admitted.
+        """
+        if not rows:
+            return "written"
+        self.check_admission(len(rows))
+        if not self.running:
+            self._inflight_rows += len(rows)
+            try:
+                return await self._timed_write(rows)
+            finally:
+                self._inflight_rows -= len(rows)
+
+        if not self._rows:
+            self._batch_started = time.monotonic()
+            self._wakeup.set()
+        self._rows.extend(rows)
+        if len(self._rows) >= self._max_rows:
+            self._wakeup.set()
+
+        if (ack_mode or self._ack_mode) == "buffer":
+            return "buffered"
+        waiter: asyncio.Future[SubmitStatus] = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        return await waiter
+
+    # ── Admission control ─────────────────────────────────────────────────────
+
+    @property
+    def pending_rows(self) -> int:
+        """Rows queued or currently being written."""
+        return len(self._rows) + self._inflight_rows
+
+    def check_admission(self, rows: int = 0) -> None:
+        """Raise :class:`TelemetryOverloadedError` unless *rows* more can be queued.
+
+        Called with ``rows=0`` it only checks whether the buffer is shedding,
+        which lets bulk endpoints reject a request before reading its body.
+        """
+        if not self._high_watermark:
+            return
+        pending = self.pending_rows
+        if self._shedding and pending <= self._low_watermark:
+            self._shedding = False
+            logger.info("Telemetry queue drained to %d row(s); admitting again.", pending)
+        # An oversized request is still admitted into an empty queue.
+        if not self._shedding and pending and pending + rows > self._high_watermark:
+            self._shedding = True
+            logger.warning("Telemetry queue full (%d row(s) pending); shedding load.", pending)
+        if self._shedding:
+            self._requests_shed += 1
+            self._rows_shed += rows
+            raise TelemetryOverloadedError(self._retry_after(pending), self._writer_failing)
+
+    def _retry_after(self, pending: int) -> int:
+        """Seconds until the backlog should have drained to the low watermark."""
+        if self._drain_rate <= 0:
+            return 1
+        excess = max(pending - self._low_watermark, 0)
+        return min(60, max(1, math.ceil(excess / self._drain_rate)))
+
+    # ── Flushing ──────────────────────────────────────────────────────────────
+
+    async def _run(self) -> None:
+        while True:
+            if not self._rows and not self._stopping:
+                await self._wakeup.wait()
+            self._wakeup.clear()
+            # Keep collecting until the batch is full or its oldest row is too old.
+            while not self._stopping and len(self._rows) < self._max_rows:
+                remaining = self._batch_started + self._max_latency - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+                except TimeoutError:
+                    break
+                self._wakeup.clear()
+            await self._flush()
+            if self._stopping and not self._rows:
+                return
+
+    async def _flush(self) -> None:
+        """Write the pending batch and resolve the callers waiting on it."""
+        if not self._rows:
+            return
+        batch, self._rows = self._rows, []
+        waiters, self._waiters = self._waiters, []
+        self._inflight_rows += len(batch)
+        started = time.perf_counter()
+        try:
+            status = await self._timed_write(batch)
+        except Exception as exc:
+            # Counted whichever way the rows were acked: a batch can mix rows queued
+            # with ack_mode="buffer" overrides and rows whose callers get the error.
+            self._rows_dropped += len(batch)
+            logger.error("Dropped %d buffered telemetry row(s): %s", len(batch), exc)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(exc)
+            return
+        finally:
+            self._inflight_rows -= len(batch)
+            self._last_flush_ms = (time.perf_counter() - started) * 1000
+
+        self._batches_flushed += 1
+        self._rows_flushed += len(batch)
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(status)
+
+    async def _timed_write(self, rows: Sequence[MetricRow]) -> SubmitStatus:
+        """``_write`` plus the drain-rate and writer-health bookkeeping."""
+        started = time.perf_counter()
+        try:
+            status = await self._write(rows)
+        except Exception:
+            self._writer_failing = True
+            raise
+        self._writer_failing = status == "spooled"
+        elapsed = time.perf_counter() - started
+        if elapsed > 0:
+            rate = len(rows) / elapsed
+            self._drain_rate = (
+                rate if not self._drain_rate else 0.8 * self._drain_rate + 0.2 * rate
+            )
+        return status
+
+    async def _write(self, rows: Sequence[MetricRow]) -> SubmitStatus:
+        """Write *rows* to the writer, falling back to the spool if one is attached."""
+        spool = self._spool
+        if spool is not None and spool.backlogged:
+            await spool.append(rows)
+            return "spooled"
+        try:
+            await self._writer.write_metrics(rows)
+            return "written"
+        except Exception as exc:
+            if spool is None:
+                raise
+            logger.warning(
+                "Telemetry write failed, spooling %d row(s) to disk: %s", len(rows), exc
+            )
+            try:
+                await spool.append(rows)
+            except OSError as spool_exc:
+                raise exc from spool_exc
+            return "spooled"
+
+    # ── Introspection ─────────────────────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        """Return buffer counters for the readiness probe / metrics."""
+        return {
+            "running": self.running,
+            "ack_mode": self._ack_mode,
+            "pending_rows": len(self._rows),
+            "inflight_rows": self._inflight_rows,
+            "high_watermark": self._high_watermark,
+            "low_watermark": self._low_watermark,
+            "occupancy": (
+                round(self.pending_rows / self._high_watermark, 3) if self._high_watermark else 0.0
+            ),
+            "shedding": self._shedding,
+            "requests_shed": self._requests_shed,
+            "rows_shed": self._rows_shed,
+            "batches_flushed": self._batches_flushed,
+            "rows_flushed": self._rows_flushed,
+            "rows_dropped": self._rows_dropped,
+            "last_flush_ms": round(self._last_flush_ms, 3),
+        }
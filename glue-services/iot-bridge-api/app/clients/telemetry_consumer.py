@@ -0,0 +1,272 @@
+"""Direct AMQP telemetry consumer for the per-tenant RabbitMQ vHosts.
+
+Instead of one ThingsBoard rule-chain REST call per message, the consumer
+subscribes to a durable queue in every tenant vHost (created by
+:meth:`app.clients.rabbitmq.RabbitMQClient.provision_tenant`), bound to the
+``amq.topic`` exchange that the RabbitMQ MQTT plugin publishes to, and feeds
+the write-behind buffer directly:
+
+  • ``prefetch``       – at most this many unacked messages per vHost are in
+                         flight; the broker stops delivering until a batch is
+                         settled, which is the consumer's flow control.
+  • ``max_latency``    – a batch is processed once it holds ``prefetch``
+                         messages or its oldest message has waited this long.
+
+Each batch is decoded message by message, from the body plus the routing key
+and headers that name the device of a plain MQTT payload.  Messages that are
+undecodable or yield no rows are rejected without requeue (dead-lettered if
+the queue has a DLX) and counted, never acked as written.  The rest is
+submitted to the :class:`~app.clients.telemetry_buffer.TelemetryBuffer` in
+``flush`` ack mode and acked with a single ``multiple`` ack once it is
+written or spooled.  A failed write nacks the batch back onto the queue;
+while the buffer sheds load the batch is held (and the broker paused) until
+it is admitted.  Delivery is
+at-least-once: messages in flight at shutdown are redelivered.
+
+The tenant of every row is the vHost it was consumed from.  vHosts are listed
+by the *vhosts* callable and re-listed every ``refresh_interval`` seconds, so
+tenants provisioned later are picked up without a restart.
+
+``aio-pika`` is only needed by :func:`amqp_connector`; tests inject their own
+*connect* factory.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import Awaitable, Callable, Iterable, Mapping
+from typing import Any
+from urllib.parse import quote
+
+from app.clients.latest_values import LatestValueCache
+from app.clients.telemetry_buffer import TelemetryBuffer, TelemetryOverloadedError
+
+logger = logging.getLogger(__name__)
+
+MessageDecoder = Callable[[bytes, str, str, Mapping[str, Any]], list[dict[str, Any]]]
+Connector = Callable[[str], Awaitable[Any]]
+VHostLister = Callable[[], Awaitable[Iterable[str]]]
+
+
+def amqp_connector(url: str) -> Connector:
+    """Return a *connect* factory opening robust aio-pika connections to a vHost of *url*.
+
+    Raises:
+        RuntimeError: aio-pika is not installed.
+    """
+    try:
+        import aio_pika
+    except ImportError as exc:
+        raise RuntimeError("the telemetry consumer requires the aio-pika package") from exc
+
+    async def connect(vhost: str) -> Any:
+        return await aio_pika.connect_robust(f"{url.rstrip('/')}/{quote(vhost, safe='')}")
+
+    return connect
+
+
+class TelemetryConsumer:
+    """Consumes telemetry messages from every tenant vHost into the write buffer."""
+
+    def __init__(
+        self,
+        buffer: TelemetryBuffer,
+        decode: MessageDecoder,
+        connect: Connector,
+        vhosts: VHostLister,
+        queue: str = "iot-bridge.telemetry",
+        exchange: str = "amq.topic",
+        binding_key: str = "#.telemetry",
+        prefetch: int = 1000,
+        max_latency: float = 0.2,
+        latest: LatestValueCache | None = None,
+        refresh_interval: float = 60.0,
+        retry_interval: float = 5.0,
+    ) -> None:
+        self._buffer = buffer
+        self._decode = decode
+        self._connect = connect
+        self._list_vhosts = vhosts
+        self._queue = queue
+        self._exchange = exchange
+        self._binding_key = binding_key
+        self._prefetch = max(1, prefetch)
+        self._max_latency = max(0.0, max_latency)
+        self._latest = latest
+        self._refresh_interval = refresh_interval
+        self._retry_interval = retry_interval
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+        self._supervisor: asyncio.Task[None] | None = None
+        # Counters exposed through stats()
+        self._batches = 0
+        self._messages_acked = 0
+        self._messages_rejected = 0
+        self._messages_requeued = 0
+        self._rows_written = 0
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return self._supervisor is not None and not self._supervisor.done()
+
+    @property
+    def vhosts(self) -> list[str]:
+        """vHosts currently being consumed."""
+        return sorted(self._tasks)
+
+    async def start(self) -> None:
+        """Start consuming (idempotent)."""
+        if self.running:
+            return
+        self._supervisor = asyncio.create_task(self._supervise(), name="telemetry-consumer")
+        logger.info(
+            "Telemetry consumer started (queue=%s, binding=%s, prefetch=%d).",
+            self._queue,
+            self._binding_key,
+            self._prefetch,
+        )
+
+    async def stop(self) -> None:
+        """Stop all vHost consumers; unacked messages are redelivered by the broker."""
+        tasks = [t for t in (self._supervisor, *self._tasks.values()) if t is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._supervisor = None
+        self._tasks.clear()
+        logger.info("Telemetry consumer stopped.")
+
+    async def refresh(self) -> None:
+        """Start consumers for new vHosts and stop those of removed ones."""
+        wanted = set(await self._list_vhosts())
+        for vhost in set(self._tasks) - wanted:
+            task = self._tasks.pop(vhost)
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            logger.info("Stopped consuming telemetry from vHost '%s'.", vhost)
+        for vhost in wanted - set(self._tasks):
+            self._tasks[vhost] = asyncio.create_task(
+                self._consume(vhost), name=f"telemetry-consumer-{vhost}"
+            )
+
+    async def _supervise(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as exc:
+                logger.warning("Could not list telemetry vHosts: %s", exc)
+            await asyncio.sleep(self._refresh_interval)
+
+    # ── Consuming ─────────────────────────────────────────────────────────────
+
+    async def _consume(self, vhost: str) -> None:
+        """Consume *vhost* until cancelled, reconnecting after failures."""
+        while True:
+            try:
+                connection = await self._connect(vhost)
+            except Exception as exc:
+                logger.warning("Cannot connect to RabbitMQ vHost '%s': %s", vhost, exc)
+                await asyncio.sleep(self._retry_interval)
+                continue
+            try:
+                channel = await connection.channel()
+                await channel.set_qos(prefetch_count=self._prefetch)
+                queue = await channel.declare_queue(self._queue, durable=True)
+                await queue.bind(self._exchange, routing_key=self._binding_key)
+                inbox: asyncio.Queue[Any] = asyncio.Queue()
+                await queue.consume(inbox.put)
+                logger.info("Consuming telemetry from vHost '%s'.", vhost)
+                while True:
+                    await self._process(vhost, await self._collect(inbox))
+            except Exception as exc:
+                logger.error("Telemetry consumer for vHost '%s' failed: %s", vhost, exc)
+                await asyncio.sleep(self._retry_interval)
+            finally:
+                with contextlib.suppress(Exception):
+                    await connection.close()
+
+    async def _collect(self, inbox: asyncio.Queue[Any]) -> list[Any]:
+        """Wait for one message, then gather more until the batch is full or too old."""
+        batch = [await inbox.get()]
+        deadline = time.monotonic() + self._max_latency
+        while len(batch) < self._prefetch:
+            if inbox.empty():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(inbox.get(), timeout=remaining))
+                except TimeoutError:
+                    break
+            else:
+                batch.append(inbox.get_nowait())
+        return batch
+
+    async def _process(self, vhost: str, batch: list[Any]) -> None:
+        """Decode, write and settle one batch of messages."""
+        rows: list[dict[str, Any]] = []
+        accepted: list[Any] = []
+        for message in batch:
+            try:
+                rows.extend(
+                    self._decode(
+                        message.body, vhost, message.routing_key or "", message.headers or {}
+                    )
+                )
+            except ValueError as exc:
+                logger.warning("Dead-lettered telemetry message in '%s': %s", vhost, exc)
+                self._messages_rejected += 1
+                await message.reject(requeue=False)
+                continue
+            accepted.append(message)
+        if not accepted:
+            return
+
+        while True:
+            try:
+                await self._buffer.submit(rows, ack_mode="flush")
+            except TelemetryOverloadedError as exc:
+                # Holding the batch keeps the prefetch window full, pausing the broker.
+                await asyncio.sleep(exc.retry_after)
+                continue
+            except Exception as exc:
+                logger.error(
+                    "Telemetry write for vHost '%s' failed, requeueing %d message(s): %s",
+                    vhost,
+                    len(accepted),
+                    exc,
+                )
+                self._messages_requeued += len(accepted)
+                await accepted[-1].nack(multiple=True, requeue=True)
+                await asyncio.sleep(self._retry_interval)
+                return
+            break
+
+        # Rejected messages are already settled, so this acks exactly the batch.
+        await accepted[-1].ack(multiple=True)
+        self._batches += 1
+        self._messages_acked += len(accepted)
+        self._rows_written += len(rows)
+        if self._latest is not None:
+            self._latest.update(rows)
+
+    # ── Introspection ─────────────────────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        """Consumer counters for the readiness probe."""
+        return {
+            "running": self.running,
+            "vhosts": self.vhosts,
+            "batches": self._batches,
+            "messages_acked": self._messages_acked,
+            "messages_rejected": self._messages_rejected,
+            "messages_requeued": self._messages_requeued,
+            "rows_written": self._rows_written,
+        }
@@ -0,0 +1,148 @@
+"""Bounded duplicate detection for retried telemetry messages.
+
+ThingsBoard's REST API Call node retries a request that timed out, so a
+message that was in fact written can arrive a second time.  Every telemetry
+event that carries an identity gets a 64-bit key:
+
+  • its message ID (``msgId`` / ``messageId`` in the metadata, or the
+    ``X-Message-Id`` header), scoped to the tenant, or
+  • a BLAKE2b hash of tenant, device, metadata ``ts`` and payload bytes.
+
+Events with neither are never treated as duplicates: two identical readings
+without a timestamp are legitimately two samples.
+
+Keys live in two generations of plain hash sets.  The current generation is
+retired once it holds ``max_keys`` keys or is ``window`` seconds old, the
+previous one is dropped at the same time, so a check or insert is O(1) and the
+filter never holds more than ``2 * max_keys`` keys (about 100 bytes each).
+A key is remembered for at least ``window`` seconds unless more than
+``max_keys`` events arrive within one window.  Exact sets rather than Bloom
+filters are used on purpose: a false positive would silently drop telemetry.
+
+A key is only a duplicate once its write succeeded.  :meth:`DuplicateFilter.seen`
+reserves a new key as *in flight*; the caller then either
+:meth:`~DuplicateFilter.commit`-s it after the write or
+:meth:`~DuplicateFilter.forget`-s it when the write fails, so the retry of a
+rejected message is written.  A retry arriving while the original is still in
+flight raises :class:`DuplicateInFlightError` – it must be retried later, not
+acknowledged, because the original may yet fail.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+
+class DuplicateInFlightError(Exception):
+    """The same message is being written by another request right now."""
+
+    def __init__(self, retry_after: int = 1) -> None:
+        super().__init__("the same telemetry message is still being written")
+        self.retry_after = retry_after
+
+
+def message_key(
+    tenant_id: str,
+    device_id: str,
+    metadata: Mapping[str, Any],
+    payload: bytes,
+    message_id: str | None = None,
+) -> int | None:
+    """Return the duplicate-detection key of one event, or ``None`` if it has no identity."""
+    message_id = message_id or metadata.get("msgId") or metadata.get("messageId")
+    digest = hashlib.blake2b(digest_size=8)
+    if message_id:
+        digest.update(f"{tenant_id}\0id\0{message_id}".encode())
+    else:
+        ts = metadata.get("ts")
+        if ts is None:
+            return None
+        digest.update(f"{tenant_id}\0{device_id}\0{ts}\0".encode())
+        digest.update(payload)
+    return int.from_bytes(digest.digest(), "big")
+
+
+class DuplicateFilter:
+    """Time-windowed, memory-bounded set of recently seen message keys.
+
+    A ``window`` of ``0`` disables the filter: nothing is ever a duplicate.
+    """
+
+    def __init__(self, window: float = 600.0, max_keys: int = 200_000) -> None:
+        self._window = max(0.0, window)
+        self._max_keys = max(1, max_keys)
+        self._current: set[int] = set()
+        self._previous: set[int] = set()
+        # Reserved by seen(), not yet committed or forgotten.
+        self._inflight: set[int] = set()
+        self._rotated = time.monotonic()
+        # Counters exposed through stats()
+        self._checked = 0
+        self._duplicates = 0
+        self._rotations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._window > 0
+
+    def __len__(self) -> int:
+        return len(self._current) + len(self._previous)
+
+    def _rotate(self, now: float) -> None:
+        age = now - self._rotated
+        if len(self._current) < self._max_keys and age < self._window:
+            return
+        # After two idle windows the current generation has expired as well.
+        self._previous = self._current if age < 2 * self._window else set()
+        self._current = set()
+        self._rotated = now
+        self._rotations += 1
+
+    def seen(self, key: int | None) -> bool:
+        """Return whether *key* was written within the window, else reserve it as in flight.
+
+        Raises:
+            DuplicateInFlightError: *key* is reserved by a write still in progress.
+        """
+        if key is None or not self.enabled:
+            return False
+        self._rotate(time.monotonic())
+        self._checked += 1
+        if key in self._current or key in self._previous:
+            self._duplicates += 1
+            return True
+        if key in self._inflight:
+            raise DuplicateInFlightError()
+        self._inflight.add(key)
+        return False
+
+    def commit(self, keys: Iterable[int | None]) -> None:
+        """Mark reserved *keys* as written: from now on they are duplicates."""
+        for key in keys:
+            if key is not None and key in self._inflight:
+                self._inflight.discard(key)
+                self._current.add(key)
+
+    def forget(self, keys: Iterable[int | None]) -> None:
+        """Drop *keys* again, e.g. because their write was rejected."""
+        for key in keys:
+            if key is not None:
+                self._inflight.discard(key)
+                self._current.discard(key)
+                self._previous.discard(key)
+
+    def stats(self) -> dict[str, Any]:
+        """Filter counters for the readiness probe."""
+        return {
+            "enabled": self.enabled,
+            "window_s": self._window,
+            "keys": len(self),
+            "in_flight": len(self._inflight),
+            "max_keys": 2 * self._max_keys,
+            "checked": self._checked,
+            "duplicates": self._duplicates,
+            "rotations": self._rotations,
+        }
@@ -0,0 +1,132 @@
+"""Constant-memory export of raw telemetry rows.
+
+Rows are read through an asyncpg server-side cursor inside a read-only
+transaction and handed out in batches of ``batch_rows``; the caller encodes
+each batch and yields it to a ``StreamingResponse``.  The next batch is only
+fetched once the previous one has been sent, so a slow client slows the query
+down instead of making the bridge buffer the result (backpressure), and memory
+stays at one batch regardless of the export size.
+
+Exported columns: ``time, tenant_id, device_id, metric_name, value, tags``
+(``tags`` as JSON text; in the dictionary storage mode it is rebuilt from the
+``raw_type`` code).  The text encoders live here; the columnar ``arrow`` /
+``parquet`` formats are encoded by :mod:`app.clients.telemetry_arrow`.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+from collections.abc import AsyncGenerator, Sequence
+from datetime import datetime
+from typing import Any, Literal
+
+from app.clients.timescaledb import StorageMode, TimescaleDBClient
+from app.json_codec import dumps
+
+ExportFormat = Literal["ndjson", "csv", "arrow", "parquet"]
+
+EXPORT_COLUMNS = ("time", "tenant_id", "device_id", "metric_name", "value", "tags")
+
+MEDIA_TYPES: dict[str, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def build_export_query(
+    storage_mode: StorageMode = "wide",
+    device_filter: bool = False,
+    metric_filter: bool = False,
+) -> str:
+    """``$1`` tenant, ``$2`` start, ``$3`` end, then device / metric ``text[]`` filters."""
+    if storage_mode == "wide":
+        table, tags = "device_telemetry", "tags::text"
+    else:
+        table, tags = "device_telemetry_decoded", "json_build_object('raw_type', raw_type)::text"
+    where = ["tenant_id = $1", "time >= $2", "time < $3"]
+    n = 3
+    if device_filter:
+        n += 1
+        where.append(f"device_id = ANY(${n}::text[])")
+    if metric_filter:
+        n += 1
+        where.append(f"metric_name = ANY(${n}::text[])")
+    return (
+        f"SELECT time, tenant_id, device_id, metric_name, value, {tags} AS tags "
+        f"FROM {table} WHERE {' AND '.join(where)} ORDER BY time"
+    )
+
+
+async def iter_export_batches(
+    client: TimescaleDBClient,
+    tenant_id: str,
+    start: datetime,
+    end: datetime,
+    device_ids: list[str] | None = None,
+    metrics: list[str] | None = None,
+    batch_rows: int = 5000,
+) -> AsyncGenerator[Sequence[Any], None]:
+    """Yield batches of export records from a server-side cursor.
+
+    The pooled connection is held for the lifetime of the iterator and released
+    when it is exhausted or closed (e.g. the HTTP client disconnected).
+
+    Raises:
+        TimescaleDBError: on any database error.
+    """
+    sql = build_export_query(
+        client.storage_mode, device_filter=bool(device_ids), metric_filter=bool(metrics)
+    )
+    args: list[Any] = [tenant_id, start, end]
+    if device_ids:
+        args.append(device_ids)
+    if metrics:
+        args.append(metrics)
+    async with client.connection() as conn, conn.transaction(readonly=True):
+        cursor = await conn.cursor(sql, *args)
+        while batch := await cursor.fetch(batch_rows):
+            yield batch
+
+
+def encode_ndjson(batch: Sequence[Any]) -> bytes:
+    """One JSON object per line, encoded with the service-wide orjson codec.
+
+    ``tags`` is already JSON text and is spliced in as it is.
+    """
+    return b"".join(
+        dumps(
+            {
+                "time": r["time"],
+                "tenant_id": r["tenant_id"],
+                "device_id": r["device_id"],
+                "metric_name": r["metric_name"],
+                "value": r["value"],
+            }
+        )[:-1]
+        + b',"tags":'
+        + (r["tags"] or "null").encode()
+        + b"}\n"
+        for r in batch
+    )
+
+
+def encode_csv(batch: Sequence[Any], header: bool = False) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(
+        (
+            r["time"].isoformat(),
+            r["tenant_id"],
+            r["device_id"],
+            r["metric_name"],
+            "" if r["value"] is None else repr(r["value"]),
+            r["tags"] or "",
+        )
+        for r in batch
+    )
+    return buf.getvalue().encode()
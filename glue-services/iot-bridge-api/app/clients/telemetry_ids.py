@@ -0,0 +1,167 @@
+"""Dictionary encoding of telemetry identifiers.
+
+In the ``dictionary`` storage mode the tenant, device and metric names are not
+repeated as TEXT on every ``device_telemetry_compact`` row.  They are interned
+once into small lookup tables and referenced by integer ID; the JSONB ``tags``
+blob (in practice only ``{"raw_type": ...}``) becomes a SMALLINT enum code.
+
+    telemetry_tenants (id, name)
+    telemetry_devices (id, tenant_id → telemetry_tenants.id, name)
+    telemetry_metrics (id, name)
+    telemetry_raw_types (code, name)
+
+``TelemetryIdCache`` keeps a bounded, bidirectional in-process map of those IDs
+so a write only goes to the lookup tables for names it has not seen recently;
+all misses of a batch are resolved with a single upsert per table.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable
+from functools import lru_cache
+from typing import Any, Literal
+
+from app.json_codec import loads
+
+Kind = Literal["tenant", "device", "metric"]
+
+# Codes stored in device_telemetry_compact.raw_type (index = code).
+RAW_TYPES: tuple[str, ...] = ("unknown", "float", "int", "bool", "str", "NoneType", "dict", "list")
+_RAW_TYPE_CODES = {name: code for code, name in enumerate(RAW_TYPES)}
+
+_UPSERT_TENANTS_SQL = """
+INSERT INTO telemetry_tenants (name) SELECT unnest($1::text[])
+ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+RETURNING id, name
+"""
+
+_UPSERT_METRICS_SQL = """
+INSERT INTO telemetry_metrics (name) SELECT unnest($1::text[])
+ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+RETURNING id, name
+"""
+
+_UPSERT_DEVICES_SQL = """
+INSERT INTO telemetry_devices (tenant_id, name) SELECT * FROM unnest($1::int[], $2::text[])
+ON CONFLICT (tenant_id, name) DO UPDATE SET name = EXCLUDED.name
+RETURNING id, tenant_id, name
+"""
+
+
+def raw_type_code(name: str | None) -> int:
+    """Return the SMALLINT code for a Python type name (``0`` if unknown)."""
+    return _RAW_TYPE_CODES.get(name or "", 0)
+
+
+@lru_cache(maxsize=256)
+def raw_type_code_from_tags(tags_json: str | bytes) -> int:
+    """Return the raw_type code of a JSON-encoded tags blob.
+
+    Tags strings repeat almost verbatim across rows, so the parse is cached.
+    """
+    try:
+        tags = loads(tags_json)
+    except ValueError:
+        return 0
+    return raw_type_code(tags.get("raw_type") if isinstance(tags, dict) else None)
+
+
+class TelemetryIdCache:
+    """Bidirectional name ↔ ID cache for the telemetry lookup tables.
+
+    Keys are the tenant name, the metric name, or ``(tenant_id, device_name)``
+    for devices (device names are only unique within a tenant).  Each kind is
+    an LRU capped at ``max_entries``: the least recently written name is
+    evicted first and simply costs one upsert round trip when it shows up again.
+    """
+
+    def __init__(self, max_entries: int = 100_000) -> None:
+        self._max_entries = max(1, max_entries)
+        self._ids: dict[Kind, OrderedDict[Hashable, int]] = {
+            "tenant": OrderedDict(),
+            "device": OrderedDict(),
+            "metric": OrderedDict(),
+        }
+        self._keys: dict[Kind, dict[int, Hashable]] = {"tenant": {}, "device": {}, "metric": {}}
+
+    def get_id(self, kind: Kind, key: Hashable) -> int | None:
+        ident = self._ids[kind].get(key)
+        if ident is not None:
+            self._ids[kind].move_to_end(key)
+        return ident
+
+    def get_key(self, kind: Kind, ident: int) -> Hashable | None:
+        return self._keys[kind].get(ident)
+
+    def put(self, kind: Kind, key: Hashable, ident: int) -> None:
+        ids = self._ids[kind]
+        ids[key] = ident
+        ids.move_to_end(key)
+        self._keys[kind][ident] = key
+        if len(ids) > self._max_entries:
+            _, evicted = ids.popitem(last=False)
+            self._keys[kind].pop(evicted, None)
+
+    def missing(self, kind: Kind, keys: Iterable[Hashable]) -> list[Hashable]:
+        """Return the distinct *keys* that have no cached ID yet."""
+        known = self._ids[kind]
+        return list({key for key in keys if key not in known})
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._ids.values())
+
+    async def resolve(
+        self,
+        conn: Any,
+        tenants: Iterable[str],
+        devices: Iterable[tuple[str, str]],
+        metrics: Iterable[str],
+    ) -> dict[Kind, dict[Hashable, int]]:
+        """Return the IDs of every given name, upserting unseen ones.
+
+        The result holds exactly the requested names, so a batch with more
+        distinct names than ``max_entries`` still resolves completely.
+
+        Args:
+            conn:    asyncpg connection.
+            tenants: Tenant names.
+            devices: ``(tenant_name, device_name)`` pairs.
+            metrics: Metric names.
+
+        Returns:
+            ``{"tenant": {name: id}, "device": {(tenant_id, name): id},
+            "metric": {name: id}}``.
+        """
+        devices = set(devices)
+        tenant_ids = await self._resolve_names(
+            conn, "tenant", _UPSERT_TENANTS_SQL, {*tenants, *(t for t, _ in devices)}
+        )
+        metric_ids = await self._resolve_names(conn, "metric", _UPSERT_METRICS_SQL, set(metrics))
+
+        device_keys = {(tenant_ids[t], d) for t, d in devices}
+        device_ids = self._cached("device", device_keys)
+        new_devices = list(device_keys - device_ids.keys())
+        if new_devices:
+            ids = [t for t, _ in new_devices]
+            names = [d for _, d in new_devices]
+            for rec in await conn.fetch(_UPSERT_DEVICES_SQL, ids, names):
+                key = (rec["tenant_id"], rec["name"])
+                device_ids[key] = rec["id"]
+                self.put("device", key, rec["id"])
+        return {"tenant": tenant_ids, "device": device_ids, "metric": metric_ids}
+
+    def _cached(self, kind: Kind, keys: Iterable[Hashable]) -> dict[Hashable, int]:
+        found = {key: self.get_id(kind, key) for key in keys}
+        return {key: ident for key, ident in found.items() if ident is not None}
+
+    async def _resolve_names(
+        self, conn: Any, kind: Kind, sql: str, names: set[Hashable]
+    ) -> dict[Hashable, int]:
+        ids = self._cached(kind, names)
+        new_names = list(names - ids.keys())
+        if new_names:
+            for rec in await conn.fetch(sql, new_names):
+                ids[rec["name"]] = rec["id"]
+                self.put(kind, rec["name"], rec["id"])
+        return ids
@@ -0,0 +1,175 @@
+"""Downsampled telemetry reads with ``time_bucket`` and continuous aggregates.
+
+Every query is scoped to one tenant (``WHERE tenant_id = $n``) and returns one
+row per bucket, metric and – unless rolled up across the tenant – device, with
+``avg`` / ``min`` / ``max`` / ``count`` of the values in the bucket.
+
+Sources
+───────
+  ``raw``  ``device_telemetry`` (or the ``device_telemetry_decoded`` view in the
+           dictionary storage mode) – used for buckets below one minute.
+  ``1m``   ``device_telemetry_1m`` continuous aggregate – buckets of whole minutes.
+  ``1h``   ``device_telemetry_1h`` (hierarchical, built on ``1m``) – whole hours.
+
+The aggregates keep ``count``/``sum``/``min``/``max`` so they can be re-bucketed
+exactly: ``avg = sum(sum) / sum(count)``.  They are created by
+:mod:`app.clients.telemetry_schema` with real-time aggregation enabled, so the
+newest, not yet materialised data is still included.
+
+:func:`query_latest` backs the latest-value cache: the newest row per metric
+of one device within a look-back window, found via the
+``(tenant_id, device_id, time DESC)`` index.
+"""
+
+from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+from typing import Any, Literal
+
+from app.clients.latest_values import LatestValue
+from app.clients.timescaledb import StorageMode, TimescaleDBClient
+
+Source = Literal["raw", "1m", "1h"]
+
+# Widths of the continuous aggregates, coarsest first.
+AGGREGATES: dict[Source, tuple[str, timedelta]] = {
+    "1h": ("device_telemetry_1h", timedelta(hours=1)),
+    "1m": ("device_telemetry_1m", timedelta(minutes=1)),
+}
+
+# "Nice" bucket widths offered when the caller does not ask for one.
+_BUCKET_LADDER = [
+    timedelta(seconds=s)
+    for s in (1, 5, 10, 30, 60, 300, 900, 1800, 3600, 6 * 3600, 12 * 3600, 86400, 7 * 86400)
+]
+
+# Default origin of time_bucket() for timestamptz (a Monday, so weeks start on Mondays).
+_BUCKET_ORIGIN = datetime(2000, 1, 3, tzinfo=UTC)
+
+
+def choose_bucket(start: datetime, end: datetime, max_points: int) -> timedelta:
+    """Return the narrowest ladder width giving at most *max_points* buckets."""
+    span = end - start
+    for width in _BUCKET_LADDER:
+        if span / width <= max_points:
+            return width
+    return _BUCKET_LADDER[-1]
+
+
+def choose_source(
+    bucket: timedelta, storage_mode: StorageMode = "wide", use_aggregates: bool = True
+) -> Source:
+    """Pick the coarsest continuous aggregate whose width divides *bucket*."""
+    if use_aggregates and storage_mode == "wide":
+        for source, (_, width) in AGGREGATES.items():
+            if bucket >= width and bucket % width == timedelta(0):
+                return source
+    return "raw"
+
+
+def align(ts: datetime, bucket: timedelta) -> datetime:
+    """Floor *ts* to the ``time_bucket`` boundary of a *bucket* wide bucket."""
+    return ts - (ts - _BUCKET_ORIGIN) % bucket
+
+
+def build_query(
+    source: Source,
+    storage_mode: StorageMode = "wide",
+    per_device: bool = True,
+    device_filter: bool = False,
+    metric_filter: bool = False,
+) -> str:
+    """Build the bucketed SELECT.
+
+    Parameters: ``$1`` bucket, ``$2`` tenant_id, ``$3`` start, ``$4`` end, then the
+    device list and metric list (``text[]``) when the respective filter is on.
+    """
+    if source == "raw":
+        table = "device_telemetry" if storage_mode == "wide" else "device_telemetry_decoded"
+        time_col = "time"
+        aggs = "avg(value) AS avg, min(value) AS min, max(value) AS max, count(value) AS count"
+    else:
+        table, _ = AGGREGATES[source]
+        time_col = "bucket"
+        aggs = (
+            "sum(sum) / NULLIF(sum(count), 0) AS avg, min(min) AS min, max(max) AS max, "
+            "sum(count)::bigint AS count"
+        )
+    device_col = "device_id" if per_device else "NULL::text AS device_id"
+    where = ["tenant_id = $2", f"{time_col} >= $3", f"{time_col} < $4"]
+    n = 4
+    if device_filter:
+        n += 1
+        where.append(f"device_id = ANY(${n}::text[])")
+    if metric_filter:
+        n += 1
+        where.append(f"metric_name = ANY(${n}::text[])")
+    group = "1, 2, 3" if per_device else "1, 3"
+    return (
+        f"SELECT time_bucket($1, {time_col}) AS bucket, {device_col}, metric_name, {aggs} "
+        f"FROM {table} WHERE {' AND '.join(where)} "
+        f"GROUP BY {group} ORDER BY 1, 3, 2"
+    )
+
+
+async def query_buckets(
+    client: TimescaleDBClient,
+    tenant_id: str,
+    start: datetime,
+    end: datetime,
+    bucket: timedelta,
+    device_ids: list[str] | None = None,
+    metrics: list[str] | None = None,
+    per_device: bool = True,
+    use_aggregates: bool = True,
+) -> tuple[Source, list[dict[str, Any]]]:
+    """Return ``(source, rows)`` for one tenant's bucketed telemetry.
+
+    Raises:
+        TimescaleDBError: on any database error.
+    """
+    source = choose_source(bucket, client.storage_mode, use_aggregates)
+    sql = build_query(
+        source,
+        client.storage_mode,
+        per_device=per_device,
+        device_filter=bool(device_ids),
+        metric_filter=bool(metrics),
+    )
+    args: list[Any] = [bucket, tenant_id, align(start, bucket), end]
+    if device_ids:
+        args.append(device_ids)
+    if metrics:
+        args.append(metrics)
+    async with client.connection() as conn:
+        records = await conn.fetch(sql, *args)
+    return source, [dict(r) for r in records]
+
+
+def build_latest_query(storage_mode: StorageMode = "wide") -> str:
+    """Newest row per metric of one device: ``$1`` tenant, ``$2`` device, ``$3`` since."""
+    if storage_mode == "wide":
+        table, raw_type = "device_telemetry", "tags ->> 'raw_type'"
+    else:
+        table, raw_type = "device_telemetry_decoded", "raw_type"
+    return (
+        f"SELECT DISTINCT ON (metric_name) metric_name, time, value, {raw_type} AS raw_type "
+        f"FROM {table} WHERE tenant_id = $1 AND device_id = $2 AND time >= $3 "
+        "ORDER BY metric_name, time DESC"
+    )
+
+
+async def query_latest(
+    client: TimescaleDBClient, tenant_id: str, device_id: str, lookback: timedelta
+) -> dict[str, LatestValue]:
+    """Return ``{metric: LatestValue}`` of the newest rows within *lookback*.
+
+    Raises:
+        TimescaleDBError: on any database error.
+    """
+    since = datetime.now(UTC) - lookback
+    async with client.connection() as conn:
+        records = await conn.fetch(
+            build_latest_query(client.storage_mode), tenant_id, device_id, since
+        )
+    return {r["metric_name"]: LatestValue(r["time"], r["value"], r["raw_type"]) for r in records}
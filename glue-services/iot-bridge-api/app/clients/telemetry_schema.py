@@ -0,0 +1,317 @@
+"""Idempotent bootstrapper for the telemetry hypertable and its policies.
+
+Creates or migrates, for the table of the configured storage mode
+(``device_telemetry`` or ``device_telemetry_compact``):
+
+  • the table itself and its conversion into a hypertable on ``time`` (plus, in
+    dictionary mode, the lookup tables and the ``device_telemetry_decoded`` view),
+  • the chunk interval (``set_chunk_time_interval`` – applies to new chunks),
+  • the ``(tenant_id, device_id, time DESC)`` index used by per-device queries,
+  • native compression (``segmentby tenant_id, device_id``; set when compression
+    is first enabled) and the compression policy,
+  • the drop-chunks retention policy,
+  • (wide mode) the ``device_telemetry_1m`` / ``device_telemetry_1h`` continuous
+    aggregates read by :mod:`app.clients.telemetry_query`, with refresh policies.
+
+Every step compares the live catalog with the desired state first, so running
+it on every startup is cheap and only changed settings are touched.  The whole
+run holds a transaction-scoped advisory lock so concurrent replicas do not race.
+
+Run automatically from the app lifespan (``TSDB_SCHEMA_BOOTSTRAP``) or by hand::
+
+    python -m app.clients.telemetry_schema
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Any
+
+from app.clients.telemetry_ids import RAW_TYPES
+from app.clients.timescaledb import (
+    _COMPACT_TABLE,
+    _TABLE,
+    StorageMode,
+    TimescaleDBClient,
+)
+from app.config import Settings
+
+logger = logging.getLogger(__name__)
+
+_WIDE_SCHEMA_SQL = f"""
+CREATE TABLE IF NOT EXISTS {_TABLE} (
+    time        TIMESTAMPTZ NOT NULL,
+    tenant_id   TEXT        NOT NULL,
+    device_id   TEXT        NOT NULL,
+    metric_name TEXT        NOT NULL,
+    value       DOUBLE PRECISION,
+    tags        JSONB
+)
+"""
+
+# Lookup tables, compact table and decoded view of the dictionary storage mode.
+_COMPACT_SCHEMA_SQL = f"""
+CREATE TABLE IF NOT EXISTS telemetry_tenants (
+    id   INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS telemetry_devices (
+    id        INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    tenant_id INTEGER NOT NULL REFERENCES telemetry_tenants (id),
+    name      TEXT    NOT NULL,
+    UNIQUE (tenant_id, name)
+);
+CREATE TABLE IF NOT EXISTS telemetry_metrics (
+    id   INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS telemetry_raw_types (
+    code SMALLINT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+INSERT INTO telemetry_raw_types (code, name) VALUES
+    {", ".join(f"({code}, '{name}')" for code, name in enumerate(RAW_TYPES))}
+ON CONFLICT (code) DO NOTHING;
+CREATE TABLE IF NOT EXISTS device_telemetry_compact (
+    time      TIMESTAMPTZ      NOT NULL,
+    tenant_id INTEGER          NOT NULL,
+    device_id INTEGER          NOT NULL,
+    metric_id INTEGER          NOT NULL,
+    value     DOUBLE PRECISION,
+    raw_type  SMALLINT         NOT NULL DEFAULT 0
+);
+CREATE OR REPLACE VIEW device_telemetry_decoded AS
+SELECT c.time, t.name AS tenant_id, d.name AS device_id, m.name AS metric_name,
+       c.value, r.name AS raw_type
+FROM device_telemetry_compact c
+JOIN telemetry_tenants t ON t.id = c.tenant_id
+JOIN telemetry_devices d ON d.id = c.device_id
+JOIN telemetry_metrics m ON m.id = c.metric_id
+LEFT JOIN telemetry_raw_types r ON r.code = c.raw_type;
+"""
+
+# Per storage mode: (table, DDL, compress_orderby)
+_TABLES: dict[StorageMode, tuple[str, str, str]] = {
+    "wide": (_TABLE, _WIDE_SCHEMA_SQL, "metric_name, time DESC"),
+    "dictionary": (_COMPACT_TABLE, _COMPACT_SCHEMA_SQL, "metric_id, time DESC"),
+}
+
+_SEGMENT_BY = "tenant_id, device_id"
+
+# Continuous aggregates: (view, DDL, refresh end_offset, schedule).  Real-time
+# aggregation (materialized_only = false) only covers data after the watermark, so
+# the refresh window (start_offset) spans the whole retention period: backfills,
+# spool replays and late broker messages land in already materialised buckets and
+# are re-aggregated on the next policy run.  TimescaleDB only recomputes buckets
+# its invalidation log marks as changed, so the wide window costs nothing at rest.
+_AGGREGATES = [
+    (
+        "device_telemetry_1m",
+        f"""
+CREATE MATERIALIZED VIEW IF NOT EXISTS device_telemetry_1m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket('1 minute', time) AS bucket, tenant_id, device_id, metric_name,
+       count(value) AS count, sum(value) AS sum, min(value) AS min, max(value) AS max
+FROM {_TABLE}
+GROUP BY 1, 2, 3, 4
+WITH NO DATA
+""",
+        timedelta(minutes=1),
+        timedelta(minutes=1),
+    ),
+    (
+        "device_telemetry_1h",
+        """
+CREATE MATERIALIZED VIEW IF NOT EXISTS device_telemetry_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket('1 hour', bucket) AS bucket, tenant_id, device_id, metric_name,
+       sum(count)::bigint AS count, sum(sum) AS sum, min(min) AS min, max(max) AS max
+FROM device_telemetry_1m
+GROUP BY 1, 2, 3, 4
+WITH NO DATA
+""",
+        timedelta(hours=1),
+        timedelta(minutes=30),
+    ),
+]
+
+_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('cdm telemetry schema'))"
+
+_CHUNK_INTERVAL_SQL = """
+SELECT time_interval FROM timescaledb_information.dimensions
+WHERE hypertable_name = $1 AND column_name = 'time'
+"""
+
+_COMPRESSION_ENABLED_SQL = """
+SELECT compression_enabled FROM timescaledb_information.hypertables
+WHERE hypertable_name = $1
+"""
+
+# The refresh policy of a continuous aggregate belongs to its materialization hypertable.
+_REFRESH_POLICY_SQL = """
+SELECT (j.config ->> 'start_offset')::interval AS start_offset
+FROM timescaledb_information.jobs j
+JOIN timescaledb_information.continuous_aggregates ca
+  ON ca.materialization_hypertable_name = j.hypertable_name
+WHERE j.proc_name = 'policy_refresh_continuous_aggregate' AND ca.view_name = $1
+"""
+
+# Policy jobs keep their interval in the JSON config (compress_after / drop_after).
+_POLICY_SQL = """
+SELECT (config ->> $3)::interval FROM timescaledb_information.jobs
+WHERE proc_name = $2 AND hypertable_name = $1
+"""
+
+
+async def bootstrap_schema(
+    conn: Any,
+    storage_mode: StorageMode = "wide",
+    chunk_interval: timedelta = timedelta(days=7),
+    compress_after: timedelta | None = timedelta(days=7),
+    retention: timedelta | None = None,
+    continuous_aggregates: bool = True,
+) -> list[str]:
+    """Bring the telemetry hypertable in line with the given settings.
+
+    Args:
+        conn:           asyncpg connection (needs ownership of the table).
+        storage_mode:   Selects ``device_telemetry`` or ``device_telemetry_compact``.
+        chunk_interval: ``chunk_time_interval`` of the hypertable.
+        compress_after: Age after which chunks are compressed (``None`` removes the
+                        policy; compression stays enabled on already compressed data).
+        retention:      Age after which chunks are dropped (``None`` keeps data forever).
+        continuous_aggregates: Create the 1m/1h rollups (``wide`` storage mode only),
+                        refreshed over the whole *retention* period (all data
+                        without one).
+
+    Returns:
+        Human-readable descriptions of the changes made (empty when up to date).
+    """
+    table, ddl, orderby = _TABLES[storage_mode]
+    changes: list[str] = []
+    async with conn.transaction():
+        await conn.execute(_LOCK_SQL)
+
+        index = f"{table}_tenant_device_time_idx"
+        table_existed = await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", table)
+        index_existed = await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", index)
+
+        await conn.execute(ddl)
+        await conn.execute(
+            f"SELECT create_hypertable('{table}', 'time', chunk_time_interval => $1::interval, "
+            "if_not_exists => TRUE, migrate_data => TRUE)",
+            chunk_interval,
+        )
+        if not table_existed:
+            changes.append(f"created hypertable {table}")
+
+        current_interval = await conn.fetchval(_CHUNK_INTERVAL_SQL, table)
+        if current_interval != chunk_interval:
+            await conn.execute(
+                f"SELECT set_chunk_time_interval('{table}', $1::interval)", chunk_interval
+            )
+            changes.append(f"chunk interval {current_interval} -> {chunk_interval}")
+
+        await conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {index} ON {table} (tenant_id, device_id, time DESC)"
+        )
+        if not index_existed:
+            changes.append(f"created index {index}")
+
+        if compress_after is not None and not await conn.fetchval(_COMPRESSION_ENABLED_SQL, table):
+            await conn.execute(
+                f"ALTER TABLE {table} SET (timescaledb.compress, "
+                f"timescaledb.compress_segmentby = '{_SEGMENT_BY}', "
+                f"timescaledb.compress_orderby = '{orderby}')"
+            )
+            changes.append(f"enabled compression (segmentby {_SEGMENT_BY})")
+
+        changes += await _sync_policy(
+            conn, table, "policy_compression", "compress_after", compress_after
+        )
+        changes += await _sync_policy(conn, table, "policy_retention", "drop_after", retention)
+
+        if continuous_aggregates and storage_mode == "wide":
+            for view, view_ddl, end_offset, schedule in _AGGREGATES:
+                created = not await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", view)
+                if created:
+                    await conn.execute(view_ddl)
+                    changes.append(f"created continuous aggregate {view}")
+                policy = await conn.fetchrow(_REFRESH_POLICY_SQL, view)
+                if policy is not None:
+                    if policy["start_offset"] == retention:
+                        continue
+                    await conn.execute(
+                        f"SELECT remove_continuous_aggregate_policy('{view}', if_exists => TRUE)"
+                    )
+                # start_offset NULL refreshes from the oldest data on.
+                await conn.execute(
+                    f"SELECT add_continuous_aggregate_policy('{view}', "
+                    "start_offset => $1::interval, end_offset => $2::interval, "
+                    "schedule_interval => $3::interval, if_not_exists => TRUE)",
+                    retention,
+                    end_offset,
+                    schedule,
+                )
+                if not created:
+                    old = policy["start_offset"] if policy is not None else "none"
+                    changes.append(f"{view} refresh window {old} -> {retention or 'all data'}")
+
+    for change in changes:
+        logger.info("Telemetry schema: %s.", change)
+    return changes
+
+
+async def _sync_policy(
+    conn: Any, table: str, proc: str, key: str, desired: timedelta | None
+) -> list[str]:
+    """Add, replace or remove the *proc* policy job so its *key* equals *desired*."""
+    kind = "compression" if proc == "policy_compression" else "retention"
+    current = await conn.fetchval(_POLICY_SQL, table, proc, key)
+    if current == desired:
+        return []
+    if current is not None:
+        await conn.execute(f"SELECT remove_{kind}_policy('{table}', if_exists => TRUE)")
+    if desired is None:
+        return [f"removed {kind} policy"]
+    await conn.execute(f"SELECT add_{kind}_policy('{table}', $1::interval)", desired)
+    return [f"{kind} policy {current} -> {desired}"]
+
+
+async def bootstrap_from_settings(client: TimescaleDBClient, settings: Settings) -> list[str]:
+    """Run :func:`bootstrap_schema` with the ``TSDB_*`` settings of this deployment."""
+    async with client.connection() as conn:
+        return await bootstrap_schema(
+            conn,
+            storage_mode=client.storage_mode,
+            chunk_interval=timedelta(hours=settings.tsdb_chunk_interval_hours),
+            compress_after=(
+                timedelta(days=settings.tsdb_compress_after_days)
+                if settings.tsdb_compress_after_days > 0
+                else None
+            ),
+            retention=(
+                timedelta(days=settings.tsdb_retention_days)
+                if settings.tsdb_retention_days > 0
+                else None
+            ),
+            continuous_aggregates=settings.tsdb_continuous_aggregates,
+        )
+
+
+async def _main() -> None:
+    from app.deps import get_settings, get_timescaledb_client
+
+    client = get_timescaledb_client()
+    try:
+        changes = await bootstrap_from_settings(client, get_settings())
+    finally:
+        await client.close()
+    print("\n".join(changes) if changes else "Telemetry schema is up to date.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
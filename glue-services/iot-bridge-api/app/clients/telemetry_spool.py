@@ -0,0 +1,328 @@
+"""Durable on-disk spool for telemetry that could not be written to TimescaleDB.
+
+When a batch write fails (database down, or slower than ``TSDB_COMMAND_TIMEOUT``)
+the write-behind buffer appends the batch here instead of dropping it, and a
+background replayer drains the spool back into TimescaleDB with large COPY
+batches once the database accepts writes again.
+
+On-disk layout (``settings.telemetry_spool_dir``)::
+
+    segment-0000000000000001.log      closed segment, waiting for replay
+    segment-0000000000000001.offset   replay progress (byte offset) of that segment
+    segment-0000000000000002.log      segment currently appended to
+
+Each segment line is one JSON-encoded batch of ``device_telemetry`` tuples:
+``[[time_iso, tenant_id, device_id, metric_name, value, tags], ...]``.  Rows
+are stamped with their final timestamp *before* spooling so replaying an hour
+later does not move them in time.
+
+Durability: appends are group-committed – every append waits for an fsync, but
+all appends arriving within ``fsync_interval`` share a single fsync call.
+Closed segments can optionally be read through ``mmap`` during replay.  fsync,
+segment reads and offset updates run in worker threads, so a slow disk delays
+the replayer but never the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import mmap
+import os
+import time
+from collections.abc import Generator, Sequence
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Protocol
+
+from app.clients.timescaledb import MetricRow
+from app.json_codec import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+_SEGMENT_GLOB = "segment-*.log"
+
+
+class SpoolWriter(Protocol):
+    """The replay target – normally the shared ``TimescaleDBClient``."""
+
+    async def write_metrics(self, rows: Sequence[MetricRow], mode: Any = None) -> None: ...
+
+
+def _encode_rows(rows: Sequence[MetricRow], now: datetime) -> bytes:
+    batch = [
+        [
+            (row.get("time") or now).isoformat(),
+            row["tenant_id"],
+            row["device_id"],
+            row["metric_name"],
+            row.get("value"),
+            row.get("tags"),
+        ]
+        if isinstance(row, dict)
+        else [(row[0] or now).isoformat(), *row[1:5], loads(row[5])]
+        for row in rows
+    ]
+    return dumps(batch) + b"\n"
+
+
+def _decode_line(line: bytes) -> list[dict[str, Any]]:
+    return [
+        {
+            "time": datetime.fromisoformat(ts),
+            "tenant_id": tenant,
+            "device_id": device,
+            "metric_name": metric,
+            "value": value,
+            "tags": tags,
+        }
+        for ts, tenant, device, metric, value, tags in loads(line)
+    ]
+
+
+def _sync_and_close(fh: Any) -> None:
+    fh.flush()
+    os.fsync(fh.fileno())
+    fh.close()
+
+
+def _read_offset(offset_file: Path) -> int:
+    return int(offset_file.read_text()) if offset_file.exists() else 0
+
+
+def _remove_segment(segment: Path, offset_file: Path) -> None:
+    segment.unlink()
+    offset_file.unlink(missing_ok=True)
+
+
+class TelemetrySpool:
+    """Append-only, segment-based spool with a background replayer."""
+
+    def __init__(
+        self,
+        directory: str,
+        segment_max_bytes: int = 16 * 1024 * 1024,
+        fsync_interval: float = 0.05,
+        use_mmap: bool = False,
+        replay_batch_rows: int = 20_000,
+        replay_interval: float = 5.0,
+    ) -> None:
+        self._dir = Path(directory)
+        self._segment_max_bytes = segment_max_bytes
+        self._fsync_interval = fsync_interval
+        self._use_mmap = use_mmap
+        self._replay_batch_rows = replay_batch_rows
+        self._replay_interval = replay_interval
+        self._fh: Any = None
+        self._segment: Path | None = None
+        self._segment_bytes = 0
+        self._pending_sync: asyncio.Future[None] | None = None
+        # Held while the active segment is fsynced or closed, so neither closes a file
+        # the other is still syncing in a worker thread.
+        self._fsync_lock = asyncio.Lock()
+        self._replay_task: asyncio.Task[None] | None = None
+        self._writer: SpoolWriter | None = None
+        self._stopping = False
+        self._replay_lock = asyncio.Lock()
+        # Closed segments waiting for replay (cached to keep directory scans off the hot path).
+        self._closed_backlog = bool(self._segments())
+        # Metrics
+        self._rows_spooled = 0
+        self._rows_replayed = 0
+        self._replay_rate = 0.0
+        self._last_replay_error: str | None = None
+
+    # ── Segments ──────────────────────────────────────────────────────────────
+
+    def _segments(self) -> list[Path]:
+        if not self._dir.exists():
+            return []
+        return sorted(self._dir.glob(_SEGMENT_GLOB))
+
+    def _open_segment(self) -> None:
+        self._dir.mkdir(parents=True, exist_ok=True)
+        existing = self._segments()
+        seq = int(existing[-1].stem.split("-")[1]) + 1 if existing else 1
+        self._segment = self._dir / f"segment-{seq:016d}.log"
+        self._fh = self._segment.open("ab")
+        self._segment_bytes = 0
+
+    async def _close_segment(self) -> None:
+        fh, self._fh, self._segment = self._fh, None, None
+        if fh is not None:
+            # Appends arriving meanwhile open the next segment.
+            async with self._fsync_lock:
+                await asyncio.to_thread(_sync_and_close, fh)
+            self._closed_backlog = True
+
+    @property
+    def backlogged(self) -> bool:
+        """``True`` while spooled data is waiting for replay."""
+        return self._fh is not None or self._closed_backlog
+
+    # ── Appending ─────────────────────────────────────────────────────────────
+
+    async def append(self, rows: Sequence[MetricRow]) -> None:
+        """Durably append a batch of metric rows (returns after fsync)."""
+        if not rows:
+            return
+        if self._fh is None:
+            self._open_segment()
+        data = _encode_rows(rows, datetime.now(UTC))
+        self._fh.write(data)
+        self._segment_bytes += len(data)
+        self._rows_spooled += len(rows)
+        if self._pending_sync is None:
+            self._pending_sync = asyncio.ensure_future(self._group_sync())
+        await asyncio.shield(self._pending_sync)
+
+    async def _group_sync(self) -> None:
+        """fsync once on behalf of every append that arrived in the interval."""
+        try:
+            await asyncio.sleep(self._fsync_interval)
+        finally:
+            # Appends from now on need a sync of their own and start the next group.
+            self._pending_sync = None
+        async with self._fsync_lock:
+            # Read under the lock: a segment closed meanwhile was synced by the close.
+            fh = self._fh
+            if fh is None:
+                return
+            fh.flush()
+            await asyncio.to_thread(os.fsync, fh.fileno())
+        if self._segment_bytes >= self._segment_max_bytes and fh is self._fh:
+            await self._close_segment()
+
+    # ── Replay ────────────────────────────────────────────────────────────────
+
+    async def start(self, writer: SpoolWriter) -> None:
+        """Start the background replayer that drains the spool into *writer*."""
+        self._writer = writer
+        self._stopping = False
+        if self._replay_task is None or self._replay_task.done():
+            self._replay_task = asyncio.create_task(self._replay_loop(), name="telemetry-spool")
+
+    async def stop(self) -> None:
+        """Stop the replayer and close the open segment (its data stays on disk)."""
+        self._stopping = True
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._replay_task
+            self._replay_task = None
+        if self._pending_sync is not None:
+            await asyncio.shield(self._pending_sync)
+        await self._close_segment()
+
+    async def _replay_loop(self) -> None:
+        while not self._stopping:
+            # Keep draining without pausing while replay makes progress, so the
+            # spool catches up with live traffic that is still being routed to it.
+            if self.backlogged and await self.replay():
+                continue
+            await asyncio.sleep(self._replay_interval)
+
+    async def replay(self) -> int:
+        """Replay every spooled segment into the writer.
+
+        Stops at the first failing batch and returns the rows replayed.  Progress
+        is kept in the ``.offset`` sidecar after every written batch, so a failed
+        batch is retried from there.  Delivery is at-least-once: a crash between
+        a write and its offset update replays that batch again.
+        """
+        if self._writer is None:
+            return 0
+        async with self._replay_lock:
+            # Close the active segment so everything spooled so far becomes replayable.
+            if self._fh is not None and self._pending_sync is None:
+                await self._close_segment()
+            replayed = 0
+            started = time.perf_counter()
+            for segment in await asyncio.to_thread(self._segments):
+                if segment == self._segment:
+                    break
+                try:
+                    replayed += await self._replay_segment(segment)
+                except Exception as exc:
+                    self._last_replay_error = str(exc)
+                    logger.warning("Telemetry spool replay paused: %s", exc)
+                    break
+            remaining = await asyncio.to_thread(self._segments)
+            self._closed_backlog = any(p != self._segment for p in remaining)
+        elapsed = time.perf_counter() - started
+        if replayed:
+            self._rows_replayed += replayed
+            self._replay_rate = replayed / elapsed if elapsed > 0 else float(replayed)
+            self._last_replay_error = None
+            logger.info("Replayed %d spooled telemetry row(s) from disk.", replayed)
+        return replayed
+
+    async def _replay_segment(self, segment: Path) -> int:
+        """Replay one closed segment; disk I/O runs in a thread, not on the loop."""
+        assert self._writer is not None
+        offset_file = segment.with_suffix(".offset")
+        offset = await asyncio.to_thread(_read_offset, offset_file)
+        replayed = 0
+        while True:
+            offset, batch = await asyncio.to_thread(self._read_batch, segment, offset)
+            if not batch:
+                break
+            await self._writer.write_metrics(batch, mode="copy")
+            replayed += len(batch)
+            await asyncio.to_thread(offset_file.write_text, str(offset))
+        await asyncio.to_thread(_remove_segment, segment, offset_file)
+        return replayed
+
+    def _read_batch(self, segment: Path, offset: int) -> tuple[int, list[dict[str, Any]]]:
+        """Decode the lines after *offset* until a replay batch is full.
+
+        Returns the offset after the last line read and the decoded rows.
+        """
+        end, batch = offset, []
+        with contextlib.closing(self._read_lines(segment, offset)) as lines:
+            for line_end, line in lines:
+                batch.extend(_decode_line(line))
+                end = line_end
+                if len(batch) >= self._replay_batch_rows:
+                    break
+        return end, batch
+
+    def _read_lines(self, segment: Path, offset: int) -> Generator[tuple[int, bytes], None, None]:
+        """Yield ``(end_offset, line)`` for every complete line after *offset*."""
+        with segment.open("rb") as fh:
+            if self._use_mmap and segment.stat().st_size > 0:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    mm.seek(offset)
+                    while line := mm.readline():
+                        if line.endswith(b"\n"):
+                            yield mm.tell(), line
+                return
+            fh.seek(offset)
+            pos = offset
+            for line in fh:
+                pos += len(line)
+                if line.endswith(b"\n"):  # a torn final line from a crash is skipped
+                    yield pos, line
+
+    # ── Introspection ─────────────────────────────────────────────────────────
+
+    def writable(self) -> bool:
+        """Whether rows can be spooled: the directory exists (or can be made) and is writable."""
+        try:
+            self._dir.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            return False
+        return os.access(self._dir, os.W_OK | os.X_OK)
+
+    def stats(self) -> dict[str, Any]:
+        """Spool depth and replay metrics."""
+        segments = self._segments()
+        return {
+            "segments": len(segments),
+            "bytes": sum(p.stat().st_size for p in segments),
+            "rows_spooled": self._rows_spooled,
+            "rows_replayed": self._rows_replayed,
+            "replay_rows_per_s": round(self._replay_rate, 1),
+            "last_replay_error": self._last_replay_error,
+        }
@@ -0,0 +1,42 @@
+"""Canonical tenant key of telemetry rows.
+
+Every ``device_telemetry`` row is keyed by the tenant's **Keycloak realm**,
+which is also its RabbitMQ vHost: the broker consumer tags rows with the vHost
+they were consumed from, and the read API authorises callers by the realm of
+their credential.
+
+ThingsBoard webhooks identify the tenant by ThingsBoard's own tenant UUID
+(``metadata.tenantId`` in the rule chains) instead.  :class:`TenantMap`
+translates it at ingest:
+
+  • a ThingsBoard tenant id listed in ``telemetry_tenant_map_json`` maps to
+    the realm given there;
+  • any other UUID belongs to the realm of this stack (``keycloak_realm``) –
+    every tenant stack runs its own ThingsBoard;
+  • a ``tenantId`` that is not a UUID already names a realm and is kept.
+"""
+
+from __future__ import annotations
+
+import uuid
+from collections.abc import Mapping
+from typing import Any
+
+
+class TenantMap:
+    """Maps the ``tenantId`` of ThingsBoard events to the tenant's realm."""
+
+    def __init__(self, default_realm: str, mapping: Mapping[str, str] | None = None) -> None:
+        self._default = default_realm
+        self._mapping = {key.lower(): realm for key, realm in (mapping or {}).items()}
+
+    def resolve(self, tenant_id: Any) -> str:
+        """Return the realm owning the telemetry of ThingsBoard tenant *tenant_id*."""
+        if tenant_id is None or tenant_id == "":
+            return self._default
+        value = str(tenant_id)
+        try:
+            uuid.UUID(value)
+        except ValueError:
+            return value
+        return self._mapping.get(value.lower(), self._default)
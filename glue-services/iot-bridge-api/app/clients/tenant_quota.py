@@ -0,0 +1,192 @@
+"""Per-tenant telemetry quotas (token buckets for points/s and requests/s).
+
+Every tenant gets two token buckets: one refilled at ``points_per_s`` up to
+``points_burst`` tokens, charged one token per metric row, and one refilled at
+``requests_per_s`` up to ``requests_burst``, charged one token per webhook.
+A request is admitted only if *both* buckets of *every* tenant it touches hold
+enough tokens; otherwise nothing is charged and :class:`TenantThrottledError`
+reports how long until the request would fit.  A request whose write is then
+rejected gets its tokens back through :meth:`TenantQuota.release_many`, so a
+client retrying a failed write is not throttled for it.
+
+Buckets are refilled lazily from the elapsed monotonic time when a tenant is
+touched, so a check is O(1) and there is no background task.  Tenant state lives
+in an LRU-ordered dict capped at ``max_tenants``: the least recently seen tenant
+is evicted first, which at worst hands it a fresh (full) bucket and resets its
+usage counters.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any
+
+
+class TenantThrottledError(Exception):
+    """Raised when a tenant exceeded its telemetry quota."""
+
+    def __init__(self, tenant_id: str, retry_after: int) -> None:
+        super().__init__(f"telemetry quota exceeded for tenant {tenant_id}")
+        self.tenant_id = tenant_id
+        self.retry_after = retry_after
+
+
+class _TenantState:
+    __slots__ = (
+        "points",
+        "requests",
+        "updated",
+        "points_admitted",
+        "requests_admitted",
+        "points_throttled",
+        "requests_throttled",
+    )
+
+    def __init__(self, points: float, requests: float, now: float) -> None:
+        self.points = points
+        self.requests = requests
+        self.updated = now
+        self.points_admitted = 0
+        self.requests_admitted = 0
+        self.points_throttled = 0
+        self.requests_throttled = 0
+
+
+class TenantQuota:
+    """Token-bucket rate limiter keyed by tenant ID.
+
+    A rate of ``0`` disables the corresponding bucket.
+    """
+
+    def __init__(
+        self,
+        points_per_s: float = 0.0,
+        points_burst: float = 0.0,
+        requests_per_s: float = 0.0,
+        requests_burst: float = 0.0,
+        max_tenants: int = 10_000,
+    ) -> None:
+        self._points_rate = max(0.0, points_per_s)
+        self._points_burst = max(points_burst, self._points_rate)
+        self._requests_rate = max(0.0, requests_per_s)
+        self._requests_burst = max(requests_burst, self._requests_rate, 1.0)
+        self._max_tenants = max(1, max_tenants)
+        self._tenants: OrderedDict[str, _TenantState] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._points_rate or self._requests_rate)
+
+    def _state(self, tenant_id: str, now: float) -> _TenantState:
+        state = self._tenants.get(tenant_id)
+        if state is None:
+            state = _TenantState(self._points_burst, self._requests_burst, now)
+            self._tenants[tenant_id] = state
+            if len(self._tenants) > self._max_tenants:
+                self._tenants.popitem(last=False)
+            return state
+        self._tenants.move_to_end(tenant_id)
+        elapsed = now - state.updated
+        if elapsed > 0:
+            state.points = min(self._points_burst, state.points + elapsed * self._points_rate)
+            state.requests = min(
+                self._requests_burst, state.requests + elapsed * self._requests_rate
+            )
+            state.updated = now
+        return state
+
+    def _wait(self, state: _TenantState, points: int, requests: int = 1) -> float:
+        """Seconds until *state* can admit *requests* request(s) of *points* rows (0 = now)."""
+        wait = 0.0
+        if self._points_rate and state.points < points:
+            # A request larger than the burst is admitted once the bucket is full.
+            needed = min(points, self._points_burst) - state.points
+            wait = max(wait, needed / self._points_rate)
+        if self._requests_rate and requests and state.requests < requests:
+            wait = max(wait, (requests - state.requests) / self._requests_rate)
+        return wait
+
+    def acquire(self, tenant_id: str, points: int, requests: int = 1) -> None:
+        """Charge *requests* request(s) of *points* rows to *tenant_id*."""
+        self.acquire_many({tenant_id: points}, requests)
+
+    def acquire_many(self, usage: Mapping[str, int], requests: int = 1) -> None:
+        """Charge *requests* request(s) to every tenant in *usage* (``tenant → points``).
+
+        All-or-nothing: if any tenant is over quota nothing is charged.
+        ``requests=0`` charges points only – used for the later parts of a
+        streamed request whose request token was taken by its first part.
+
+        Raises:
+            TenantThrottledError: for the tenant that has to wait longest.
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        states = {tenant: self._state(tenant, now) for tenant in usage}
+        waits = {
+            tenant: self._wait(states[tenant], points, requests)
+            for tenant, points in usage.items()
+        }
+        throttled = max(waits, key=waits.__getitem__, default=None)
+        if throttled is not None and waits[throttled] > 0:
+            for tenant, points in usage.items():
+                if waits[tenant] > 0:
+                    states[tenant].requests_throttled += requests
+                    states[tenant].points_throttled += points
+            raise TenantThrottledError(throttled, max(1, math.ceil(waits[throttled])))
+        for tenant, points in usage.items():
+            state = states[tenant]
+            if self._points_rate:
+                state.points -= points
+            if self._requests_rate:
+                state.requests -= requests
+            state.points_admitted += points
+            state.requests_admitted += requests
+
+    def release_many(self, usage: Mapping[str, int], requests: int = 1) -> None:
+        """Give back a charge of :meth:`acquire_many` whose rows were not written.
+
+        Tokens are refunded up to the burst; a tenant evicted in the meantime
+        already starts over with a full bucket and is skipped.
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        for tenant, points in usage.items():
+            if tenant not in self._tenants:
+                continue
+            state = self._state(tenant, now)
+            if self._points_rate:
+                state.points = min(self._points_burst, state.points + points)
+            if self._requests_rate:
+                state.requests = min(self._requests_burst, state.requests + requests)
+            state.points_admitted = max(0, state.points_admitted - points)
+            state.requests_admitted = max(0, state.requests_admitted - requests)
+
+    def usage(self) -> dict[str, dict[str, Any]]:
+        """Per-tenant counters and current bucket levels (for the admin portal)."""
+        return {
+            tenant: {
+                "points_admitted": s.points_admitted,
+                "requests_admitted": s.requests_admitted,
+                "points_throttled": s.points_throttled,
+                "requests_throttled": s.requests_throttled,
+                "points_available": round(s.points, 1) if self._points_rate else None,
+                "requests_available": round(s.requests, 1) if self._requests_rate else None,
+            }
+            for tenant, s in self._tenants.items()
+        }
+
+    def limits(self) -> dict[str, Any]:
+        return {
+            "points_per_s": self._points_rate,
+            "points_burst": self._points_burst,
+            "requests_per_s": self._requests_rate,
+            "requests_burst": self._requests_burst,
+            "max_tenants": self._max_tenants,
+            "tracked_tenants": len(self._tenants),
+        }
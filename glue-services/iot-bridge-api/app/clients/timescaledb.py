@@ -1,10 +1,12 @@
 """TimescaleDB (PostgreSQL 17) async write client.
 
 Uses asyncpg for high-performance, fully async PostgreSQL connectivity.
-The client writes device telemetry into the ``device_telemetry`` hypertable
-that is created by the TimescaleDB init script on first container start.
+The client writes device telemetry into the ``device_telemetry`` hypertable.
+The init script only creates the database and users; the table, its index and
+its compression / retention policies are created and migrated by the schema
+bootstrapper in :mod:`app.clients.telemetry_schema` (at startup or via CLI).
 
-Schema (created in monitoring/timescaledb/init-scripts/01-init-schema.sh):
+Schema:
 
     CREATE TABLE device_telemetry (
         time        TIMESTAMPTZ NOT NULL,
@@ -17,17 +19,55 @@ Schema (created in monitoring/timescaledb/init-scripts/01-init-schema.sh):
 
 The ``telegraf`` PostgreSQL user has INSERT / CREATE on this schema.
 The ``grafana`` user has SELECT only.
+
+A single client instance (and therefore a single asyncpg pool) is shared by the
+whole process: :func:`app.deps.get_timescaledb_client` returns the same object
+for every request and the FastAPI lifespan handler in :mod:`app.main` opens the
+pool on startup and closes it on shutdown.
+
+Write modes
+───────────
+  ``insert``  ``executemany`` of a parameterised INSERT – cheapest for a handful
+              of rows (no COPY setup round trip).
+  ``copy``    binary COPY via ``copy_records_to_table`` – several times faster
+              for large batches such as those produced by the telemetry buffer.
+  ``auto``    COPY for batches of at least ``copy_min_rows`` rows, INSERT below.
+
+Rows may carry their own ``time`` (device timestamp); rows without one are
+stamped with the time of the write.  :meth:`TimescaleDBClient.write_backfill`
+streams large historical backlogs, sorting each window of rows by time and
+writing it one hypertable chunk at a time.
+
+``tags`` are encoded to JSON bytes once per row with orjson and handed to
+PostgreSQL through a binary JSONB codec registered on every pooled connection,
+for INSERT and COPY alike; JSONB values read back are decoded the same way.
+
+Storage modes
+─────────────
+  ``wide``        one ``device_telemetry`` row with TEXT identifiers and JSONB tags.
+  ``dictionary``  one ``device_telemetry_compact`` row with integer tenant / device /
+                  metric IDs and a SMALLINT ``raw_type`` code (see
+                  :mod:`app.clients.telemetry_ids`).  The ``device_telemetry_decoded``
+                  view joins the names back for ad-hoc and Grafana queries.
+
+Both schemas are created by the bootstrapper; the write path only runs DML.
 """
 
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
-from datetime import UTC, datetime
-from typing import Any
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Sequence
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from itertools import groupby
+from typing import Any, Literal
 
 import asyncpg
 
+from app.clients.telemetry_ids import TelemetryIdCache, raw_type_code_from_tags
+from app.json_codec import dumps, loads
+
 logger = logging.getLogger(__name__)
 
 _INSERT_SQL = """
@@ -35,6 +75,24 @@ INSERT INTO device_telemetry (time, tenant_id, device_id, metric_name, value, ta
 VALUES ($1, $2, $3, $4, $5, $6)
 """
 
+_TABLE = "device_telemetry"
+_COLUMNS = ["time", "tenant_id", "device_id", "metric_name", "value", "tags"]
+
+WriteMode = Literal["auto", "copy", "insert"]
+
+# A metric row dict (see ``write_metrics``) or an already built column tuple
+# ``(time, tenant_id, device_id, metric_name, value, tags_json_bytes)``.
+MetricRow = dict[str, Any] | tuple[Any, ...]
+StorageMode = Literal["wide", "dictionary"]
+
+_COMPACT_TABLE = "device_telemetry_compact"
+_COMPACT_COLUMNS = ["time", "tenant_id", "device_id", "metric_id", "value", "raw_type"]
+
+_COMPACT_INSERT_SQL = """
+INSERT INTO device_telemetry_compact (time, tenant_id, device_id, metric_id, value, raw_type)
+VALUES ($1, $2, $3, $4, $5, $6)
+"""
+
 
 class TimescaleDBError(Exception):
     """Raised when a TimescaleDB write operation fails."""
@@ -50,38 +108,119 @@ class TimescaleDBClient:
         database: str,
         user: str = "telegraf",
         password: str = "",
+        min_pool_size: int = 1,
+        max_pool_size: int = 10,
+        command_timeout: float = 10.0,
+        max_inactive_connection_lifetime: float = 300.0,
+        write_mode: WriteMode = "auto",
+        copy_min_rows: int = 100,
+        storage_mode: StorageMode = "wide",
+        id_cache_size: int = 100_000,
     ) -> None:
         self._dsn = f"postgresql://{user}:{password}@{host}:{port}/{database}"
+        self._min_pool_size = min_pool_size
+        self._max_pool_size = max(max_pool_size, min_pool_size)
+        self._command_timeout = command_timeout
+        self._max_inactive_lifetime = max_inactive_connection_lifetime
+        self._write_mode: WriteMode = write_mode
+        self._copy_min_rows = copy_min_rows
+        self._storage_mode: StorageMode = storage_mode
+        self._ids = TelemetryIdCache(id_cache_size)
         self._pool: asyncpg.Pool | None = None
+        # Serialises pool creation so a burst of first requests opens one pool, not N.
+        self._pool_lock = asyncio.Lock()
 
     async def _get_pool(self) -> asyncpg.Pool:
-        if self._pool is None:
-            try:
-                self._pool = await asyncpg.create_pool(
-                    self._dsn,
-                    min_size=1,
-                    max_size=5,
-                    command_timeout=10,
+        if self._pool is not None:
+            return self._pool
+        async with self._pool_lock:
+            if self._pool is None:
+                try:
+                    self._pool = await asyncpg.create_pool(
+                        self._dsn,
+                        min_size=self._min_pool_size,
+                        max_size=self._max_pool_size,
+                        command_timeout=self._command_timeout,
+                        # Idle connections are recycled so connections silently dropped
+                        # by PostgreSQL restarts or NAT timeouts do not linger in the pool.
+                        max_inactive_connection_lifetime=self._max_inactive_lifetime,
+                        init=_init_connection,
+                    )
+                except Exception as exc:
+                    raise TimescaleDBError(f"Failed to connect to TimescaleDB: {exc}") from exc
+                logger.info(
+                    "TimescaleDB pool opened (min=%d, max=%d).",
+                    self._min_pool_size,
+                    self._max_pool_size,
                 )
-            except Exception as exc:
-                raise TimescaleDBError(f"Failed to connect to TimescaleDB: {exc}") from exc
         return self._pool
 
+    async def connect(self) -> None:
+        """Open the connection pool eagerly (called from the app lifespan).
+
+        A database that is not reachable yet is not fatal: the failure is logged
+        and the pool is created lazily on the first write instead.
+        """
+        try:
+            await self._get_pool()
+        except TimescaleDBError as exc:
+            logger.warning("TimescaleDB not reachable at startup – will retry lazily: %s", exc)
+
+    async def ping(self) -> bool:
+        """Health check: return ``True`` if a pooled connection answers ``SELECT 1``."""
+        try:
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                return bool(await conn.fetchval("SELECT 1") == 1)
+        except (TimescaleDBError, asyncpg.PostgresError, OSError) as exc:
+            logger.warning("TimescaleDB health check failed: %s", exc)
+            return False
+
+    @property
+    def storage_mode(self) -> StorageMode:
+        return self._storage_mode
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Any]:
+        """Yield a pooled connection; database errors surface as ``TimescaleDBError``."""
+        try:
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                yield conn
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError) as exc:
+            raise TimescaleDBError(f"TimescaleDB query failed: {exc}") from exc
+
+    def pool_stats(self) -> dict[str, int]:
+        """Return current pool occupancy (all zeros while the pool is not open)."""
+        if self._pool is None:
+            return {"size": 0, "idle": 0, "min_size": 0, "max_size": 0}
+        return {
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+        }
+
     async def write_metrics(
         self,
-        rows: list[dict[str, Any]],
+        rows: Sequence[MetricRow],
+        mode: WriteMode | None = None,
     ) -> None:
         """Insert a batch of metric rows into ``device_telemetry``.
 
-        Each row dict must contain:
+        Rows that are already column tuples (the raw telemetry webhook) are
+        written as they are.  Each row dict must contain:
             tenant_id   (str)
             device_id   (str)
             metric_name (str)
             value       (float | None)
             tags        (dict | None)  – stored as JSONB
+            time        (datetime | None, optional) – defaults to now
 
         Args:
             rows: Non-empty list of metric row dicts.
+            mode: ``auto`` / ``copy`` / ``insert``; defaults to the client's
+                  configured write mode.
 
         Raises:
             TimescaleDBError: on any database error.
@@ -96,27 +235,153 @@ class TimescaleDBClient:
             return
 
         now = datetime.now(UTC)
-        records = [
-            (
-                now,
-                row["tenant_id"],
-                row["device_id"],
-                row["metric_name"],
-                float(row["value"]) if row.get("value") is not None else None,
-                json.dumps(row.get("tags") or {}),
-            )
-            for row in rows
-        ]
+        records = [row if isinstance(row, tuple) else _to_record(row, now) for row in rows]
 
+        await self._write_records(records, mode or self._write_mode)
+
+    async def write_backfill(
+        self,
+        rows: AsyncIterable[dict[str, Any]],
+        batch_rows: int = 10_000,
+        chunk_interval: timedelta = timedelta(days=7),
+        on_flush: Callable[[], None] | None = None,
+    ) -> int:
+        """Stream historical rows (with device timestamps) into ``device_telemetry``.
+
+        Rows are consumed lazily: at most *batch_rows* rows are held in memory.
+        Each window is sorted by time and split on hypertable chunk boundaries
+        (TimescaleDB aligns chunks to multiples of *chunk_interval* since the
+        epoch), so every COPY touches exactly one chunk instead of scattering
+        inserts across a week of chunks.
+
+        Args:
+            rows:           Async iterable of row dicts (see :meth:`write_metrics`).
+            batch_rows:     Sort/write window size.
+            chunk_interval: The hypertable's ``chunk_time_interval``.
+            on_flush:       Called after each window is written, i.e. once every
+                            row consumed so far is in the database.
+
+        Returns:
+            Number of rows written.
+
+        Raises:
+            TimescaleDBError: on any database error (earlier windows stay written).
+        """
+        if not self._dsn:
+            return 0
+        interval = chunk_interval.total_seconds()
+        window: list[tuple[Any, ...]] = []
+        written = 0
+
+        async def flush() -> int:
+            window.sort(key=lambda rec: rec[0])
+            for _, chunk in groupby(window, key=lambda rec: rec[0].timestamp() // interval):
+                await self._write_records(list(chunk), self._write_mode)
+            count = len(window)
+            window.clear()
+            if count and on_flush is not None:
+                on_flush()
+            return count
+
+        async for row in rows:
+            window.append(_to_record(row, datetime.now(UTC)))
+            if len(window) >= batch_rows:
+                written += await flush()
+        written += await flush()
+        return written
+
+    def _use_copy(self, n_records: int, mode: WriteMode) -> bool:
+        if mode == "auto":
+            return n_records >= self._copy_min_rows
+        return mode == "copy"
+
+    async def _write_records(self, records: list[tuple[Any, ...]], mode: WriteMode) -> None:
+        """Write pre-built ``device_telemetry`` tuples with COPY or INSERT."""
         try:
             pool = await self._get_pool()
             async with pool.acquire() as conn:
-                await conn.executemany(_INSERT_SQL, records)
-        except asyncpg.PostgresError as exc:
+                if self._storage_mode == "dictionary":
+                    await self._write_compact(conn, records, mode)
+                elif self._use_copy(len(records), mode):
+                    await conn.copy_records_to_table(_TABLE, records=records, columns=_COLUMNS)
+                else:
+                    await conn.executemany(_INSERT_SQL, records)
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError) as exc:
             raise TimescaleDBError(f"TimescaleDB write failed: {exc}") from exc
 
+    async def _write_compact(
+        self, conn: Any, records: list[tuple[Any, ...]], mode: WriteMode
+    ) -> None:
+        """Dictionary-encode wide tuples and write them to ``device_telemetry_compact``.
+
+        The tables are created by :mod:`app.clients.telemetry_schema`; this path
+        only upserts lookup rows and inserts telemetry.
+        """
+        ids = await self._ids.resolve(
+            conn,
+            tenants=set(),
+            devices={(rec[1], rec[2]) for rec in records},
+            metrics={rec[3] for rec in records},
+        )
+        tenants, devices, metrics = ids["tenant"], ids["device"], ids["metric"]
+        compact = []
+        for time_, tenant, device, metric, value, tags in records:
+            tenant_id = tenants[tenant]
+            compact.append(
+                (
+                    time_,
+                    tenant_id,
+                    devices[(tenant_id, device)],
+                    metrics[metric],
+                    value,
+                    raw_type_code_from_tags(tags),
+                )
+            )
+        if self._use_copy(len(compact), mode):
+            await conn.copy_records_to_table(
+                _COMPACT_TABLE, records=compact, columns=_COMPACT_COLUMNS
+            )
+        else:
+            await conn.executemany(_COMPACT_INSERT_SQL, compact)
+
     async def close(self) -> None:
         """Close the connection pool gracefully."""
         if self._pool is not None:
             await self._pool.close()
             self._pool = None
+
+
+# Binary JSONB wire format: a version byte followed by the JSON text.
+_JSONB_VERSION = b"\x01"
+
+
+def _encode_jsonb(value: Any) -> bytes:
+    """JSONB codec encoder: pre-encoded JSON bytes pass through untouched."""
+    return _JSONB_VERSION + (value if isinstance(value, bytes) else dumps(value))
+
+
+def _decode_jsonb(data: bytes) -> Any:
+    return loads(data[1:])
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    """Register the orjson-backed binary JSONB codec on every pooled connection."""
+    await conn.set_type_codec(
+        "jsonb",
+        schema="pg_catalog",
+        encoder=_encode_jsonb,
+        decoder=_decode_jsonb,
+        format="binary",
+    )
+
+
+def _to_record(row: dict[str, Any], now: datetime) -> tuple[Any, ...]:
+    """Convert a metric row dict into a ``device_telemetry`` column tuple."""
+    return (
+        row.get("time") or now,
+        row["tenant_id"],
+        row["device_id"],
+        row["metric_name"],
+        float(row["value"]) if row.get("value") is not None else None,
+        dumps(row.get("tags") or {}),
+    )
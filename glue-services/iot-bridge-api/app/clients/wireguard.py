@@ -3,6 +3,9 @@
 Maintains a ``cdm_peers.json`` file in the WireGuard config directory to track
 device-to-IP assignments across service restarts.  The linuxserver/wireguard
 container stores its data at ``/config`` (mounted as ``wg-data`` volume).
+
+Allocation and ``wg0.conf`` appends hold a cross-process file lock
+(:mod:`app.file_lock`), so several API workers never hand out the same IP.
 """
 
 from __future__ import annotations
@@ -11,6 +14,8 @@ import ipaddress
 import json
 from pathlib import Path
 
+from app.file_lock import locked, write_atomic
+
 
 class WireGuardError(Exception):
     """Raised when a WireGuard operation cannot be completed."""
@@ -43,8 +48,7 @@ class WireGuardConfig:
         return {}
 
     def _save_peers(self, peers: dict[str, str]) -> None:
-        self._dir.mkdir(parents=True, exist_ok=True)
-        self._peers_db.write_text(json.dumps(peers, indent=2))
+        write_atomic(self._peers_db, json.dumps(peers, indent=2).encode())
 
     def allocate_ip(self, device_id: str) -> str:
         """Return the assigned IP for *device_id*, allocating a new one if needed.
@@ -52,21 +56,33 @@ class WireGuardConfig:
         The server IP and already-assigned IPs are excluded.  Raises
         ``WireGuardError`` if the subnet is exhausted.
         """
-        peers = self._load_peers()
-        if device_id in peers:
-            return peers[device_id]
+        return self.reserve_ip(device_id)[0]
 
-        used = {ipaddress.ip_address(ip) for ip in peers.values()}
-        used.add(self._server_ip)
+    def reserve_ip(self, device_id: str) -> tuple[str, bool]:
+        """Like :meth:`allocate_ip`, but also report whether the IP was newly allocated."""
+        with locked(self._peers_db):
+            peers = self._load_peers()
+            if device_id in peers:
+                return peers[device_id], False
 
-        for host in self._subnet.hosts():
-            if host not in used:
-                peers[device_id] = str(host)
-                self._save_peers(peers)
-                return str(host)
+            used = {ipaddress.ip_address(ip) for ip in peers.values()}
+            used.add(self._server_ip)
+
+            for host in self._subnet.hosts():
+                if host not in used:
+                    peers[device_id] = str(host)
+                    self._save_peers(peers)
+                    return str(host), True
 
         raise WireGuardError(f"No available IPs in subnet {self._subnet}")
 
+    def release_ip(self, device_id: str) -> None:
+        """Return the IP of *device_id* to the pool (no-op if it has none)."""
+        with locked(self._peers_db):
+            peers = self._load_peers()
+            if peers.pop(device_id, None) is not None:
+                self._save_peers(peers)
+
     # ── Config generation ─────────────────────────────────────────────────────
 
     def get_server_pubkey(self) -> str:
@@ -87,7 +103,7 @@ class WireGuardConfig:
             f"PublicKey = {device_pubkey}\n"
             f"AllowedIPs = {device_ip}/32\n"
         )
-        with wg_conf.open("a") as fh:
+        with locked(wg_conf), wg_conf.open("a") as fh:
             fh.write(peer_block)
 
     def generate_client_config(
@@ -0,0 +1,250 @@
+"""CPU-bound X.509 / JOSE work and the executor that keeps it off the event loop.
+
+Enrollment parses and signature-checks a CSR, fingerprints it for the step-ca
+one-time token, signs that token with ES256 and – on a key-cache miss –
+derives the provisioner key-encryption key with PBKDF2.  Run inline, every one
+of these stalls all other requests (telemetry webhooks included) for its
+duration.  The functions below are plain, picklable top-level functions so a
+:class:`CryptoExecutor` can run them in a thread or a process pool:
+
+  :func:`parse_csr`               PEM → :class:`ParsedCSR` (parsed once, then
+                                  passed through the whole pipeline).
+  :func:`sign_token`              ES256 JWT for step-ca (OTT / admin token).
+  :func:`decrypt_provisioner_key` PBES2 JWE → provisioner private JWK.
+  :func:`issue_certificate`       device leaf certificate signed in-process
+                                  (local signing mode of ``app.clients.step_ca``).
+
+Threads are the default: OpenSSL releases the GIL during PBKDF2, by far the
+most expensive step, and nothing has to be pickled.  ``process`` buys real
+parallelism for signature-heavy bursts at the cost of pickling arguments;
+``inline`` runs on the loop (tests, debugging).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import datetime
+import hashlib
+import ipaddress
+import json
+import multiprocessing
+import os
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Literal, TypeVar, cast
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ed448, ed25519, rsa
+from cryptography.hazmat.primitives.asymmetric.types import CertificatePublicKeyTypes
+from cryptography.hazmat.primitives.serialization import (
+    Encoding,
+    PublicFormat,
+    load_der_public_key,
+    load_pem_private_key,
+)
+from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+from jwcrypto import jwa, jwk  # type: ignore[import]
+from jwcrypto.jwe import JWE  # type: ignore[import]
+from jwcrypto.jwt import JWT  # type: ignore[import]
+
+T = TypeVar("T")
+
+CryptoMode = Literal["inline", "thread", "process"]
+
+# step-ca encrypts provisioner keys with up to 600 000 PBKDF2 iterations;
+# jwcrypto refuses more than 16 384 by default.
+_MAX_PBES2_ITERATIONS = 600_000
+jwa.default_max_pbkdf2_iterations = max(jwa.default_max_pbkdf2_iterations, _MAX_PBES2_ITERATIONS)
+
+
+@dataclass(frozen=True, slots=True)
+class ParsedCSR:
+    """A PKCS#10 CSR whose encoding and self-signature have been checked."""
+
+    pem: str
+    # base64url SHA-256 of the DER encoding: the ``sha`` claim of a step-ca OTT.
+    fingerprint: str
+    common_name: str | None
+    # SubjectPublicKeyInfo (DER) of the requested key, for in-process issuance.
+    public_key_der: bytes
+
+
+def parse_csr(csr_pem: str) -> ParsedCSR:
+    """Parse *csr_pem* and verify its signature; raise ``ValueError`` if it is invalid."""
+    csr = x509.load_pem_x509_csr(csr_pem.encode())
+    if not csr.is_signature_valid:
+        raise ValueError("CSR signature is invalid")
+    digest = hashlib.sha256(csr.public_bytes(Encoding.DER)).digest()
+    cn = csr.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
+    return ParsedCSR(
+        pem=csr_pem,
+        fingerprint=base64.urlsafe_b64encode(digest).rstrip(b"=").decode(),
+        common_name=str(cn[0].value) if cn else None,
+        public_key_der=csr.public_key().public_bytes(
+            Encoding.DER, PublicFormat.SubjectPublicKeyInfo
+        ),
+    )
+
+
+@lru_cache(maxsize=32)
+def _signing_key(key_json: str) -> jwk.JWK:
+    return jwk.JWK.from_json(key_json)
+
+
+def sign_token(key_json: str, claims: dict[str, Any]) -> str:
+    """Return *claims* as a compact ES256 JWT signed with the private JWK *key_json*.
+
+    The key travels as JSON because a used ``JWK`` cannot be pickled into a
+    worker process; each thread or process imports it once.
+    """
+    key = _signing_key(key_json)
+    token = JWT(header={"alg": "ES256", "kid": key.key_id}, claims=claims)
+    token.make_signed_token(key)
+    return str(token.serialize())
+
+
+def decrypt_provisioner_key(encrypted_key: str, password: str) -> jwk.JWK:
+    """Decrypt a step-ca ``encryptedKey`` (PBES2-HS256+A128KW JWE) with *password*."""
+    # jwcrypto takes the password as str and encodes it itself
+    jwe_obj = JWE()
+    jwe_obj.deserialize(encrypted_key, jwk.JWK.from_password(password))
+    return jwk.JWK(**json.loads(jwe_obj.payload.decode("utf-8")))
+
+
+@dataclass(frozen=True, slots=True)
+class IssuedCertificate:
+    """A leaf certificate from :func:`issue_certificate` plus its index fields."""
+
+    pem: str
+    serial: str  # hex
+    fingerprint: str  # hex SHA-256 of the DER encoding
+    not_before: datetime.datetime
+    not_after: datetime.datetime
+
+
+@lru_cache(maxsize=4)
+def _issuer(
+    cert_pem: bytes, key_pem: bytes, password: bytes | None
+) -> tuple[x509.Certificate, Any]:
+    # Decrypting the CA key is slow; each thread or process does it once.
+    return x509.load_pem_x509_certificate(cert_pem), load_pem_private_key(key_pem, password)
+
+
+def _san(name: str) -> x509.GeneralName:
+    try:
+        return x509.IPAddress(ipaddress.ip_address(name))
+    except ValueError:
+        return x509.DNSName(name)
+
+
+def issue_certificate(
+    csr: ParsedCSR,
+    subject: str,
+    sans: list[str],
+    issuer_cert_pem: bytes,
+    issuer_key_pem: bytes,
+    issuer_key_password: bytes | None = None,
+    validity: datetime.timedelta = datetime.timedelta(hours=24),
+) -> IssuedCertificate:
+    """Sign a device leaf certificate for the public key of *csr*.
+
+    The profile follows step-ca's default leaf template: CN and SANs from the
+    request, digital-signature key usage, server + client auth, not a CA.
+    Only the CSR's public key is taken over; its subject and extensions are
+    ignored.  The issuer key comes in as PEM so the call can run in a worker
+    process.
+    """
+    issuer_cert, issuer_key = _issuer(issuer_cert_pem, issuer_key_pem, issuer_key_password)
+    public_key = cast(CertificatePublicKeyTypes, load_der_public_key(csr.public_key_der))
+    now = datetime.datetime.now(datetime.UTC)
+    not_before = now - datetime.timedelta(minutes=1)  # tolerate device clock skew
+    not_after = min(now + validity, issuer_cert.not_valid_after_utc)
+    key_usage = x509.KeyUsage(
+        digital_signature=True,
+        key_encipherment=isinstance(public_key, rsa.RSAPublicKey),
+        content_commitment=False,
+        data_encipherment=False,
+        key_agreement=False,
+        key_cert_sign=False,
+        crl_sign=False,
+        encipher_only=False,
+        decipher_only=False,
+    )
+    builder = (
+        x509.CertificateBuilder()
+        .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, subject)]))
+        .issuer_name(issuer_cert.subject)
+        .public_key(public_key)
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(not_before)
+        .not_valid_after(not_after)
+        .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+        .add_extension(key_usage, critical=True)
+        .add_extension(
+            x509.ExtendedKeyUsage(
+                [ExtendedKeyUsageOID.SERVER_AUTH, ExtendedKeyUsageOID.CLIENT_AUTH]
+            ),
+            critical=False,
+        )
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(public_key), critical=False)
+        .add_extension(
+            x509.AuthorityKeyIdentifier.from_issuer_public_key(issuer_key.public_key()),
+            critical=False,
+        )
+    )
+    if sans:
+        builder = builder.add_extension(
+            x509.SubjectAlternativeName([_san(name) for name in sans]), critical=False
+        )
+    ed_key = isinstance(issuer_key, ed25519.Ed25519PrivateKey | ed448.Ed448PrivateKey)
+    cert = builder.sign(issuer_key, None if ed_key else hashes.SHA256())
+    return IssuedCertificate(
+        pem=cert.public_bytes(Encoding.PEM).decode(),
+        serial=f"{cert.serial_number:x}",
+        fingerprint=cert.fingerprint(hashes.SHA256()).hex(),
+        not_before=not_before,
+        not_after=not_after,
+    )
+
+
+class CryptoExecutor:
+    """Runs the CPU-bound functions above away from the event loop.
+
+    ``max_workers`` of ``0`` means one per CPU.  The pool is created on first
+    use, so an executor built in the launcher parent is not forked half-started.
+    """
+
+    def __init__(self, mode: CryptoMode = "thread", max_workers: int = 0) -> None:
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool: Executor | None = None
+
+    def _executor(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process":
+                # spawn: forking a process that runs an event loop and threads is unsafe.
+                self._pool = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="crypto")
+        return self._pool
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Return ``fn(*args)``, computed in the pool unless the mode is ``inline``."""
+        if self.mode == "inline":
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+
+    def shutdown(self) -> None:
+        """Stop the pool; queued calls are cancelled, running ones finish."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+INLINE = CryptoExecutor("inline")
@@ -4,15 +4,31 @@ All client singletons are created here and injected via ``Depends``.
 Tests override these functions via ``app.dependency_overrides``.
 """
 
+import json
+import logging
 from functools import lru_cache
+from pathlib import Path
 
 from fastapi import Depends
 
+from app.clients.enrollment_cache import EnrollmentCache
 from app.clients.hawkbit import HawkBitClient
-from app.clients.step_ca import StepCAClient
+from app.clients.latest_values import LatestValueCache
+from app.clients.rabbitmq import RabbitMQClient
+from app.clients.step_ca import LocalSigner, ProvisionerKeyCache, StepCAClient
+from app.clients.telemetry_buffer import TelemetryBuffer
+from app.clients.telemetry_consumer import TelemetryConsumer, amqp_connector
+from app.clients.telemetry_dedup import DuplicateFilter
+from app.clients.telemetry_spool import TelemetrySpool
+from app.clients.tenant_map import TenantMap
+from app.clients.tenant_quota import TenantQuota
 from app.clients.timescaledb import TimescaleDBClient
 from app.clients.wireguard import WireGuardConfig
 from app.config import Settings
+from app.crypto import CryptoExecutor
+from app.serve import worker_count, worker_id
+
+logger = logging.getLogger(__name__)
 
 
 @lru_cache(maxsize=1)
@@ -20,13 +36,49 @@ def get_settings() -> Settings:
     return Settings()
 
 
-def get_step_ca_client(settings: Settings = Depends(get_settings)) -> StepCAClient:
+@lru_cache(maxsize=1)
+def get_provisioner_key_cache() -> ProvisionerKeyCache:
+    """Return the process-wide cache of decrypted step-ca provisioner keys.
+
+    Step-ca clients are built per request; sharing the cache keeps them from
+    downloading and decrypting the provisioner key for every signature.
+    """
+    return ProvisionerKeyCache(ttl=get_settings().step_ca_key_cache_ttl_s)
+
+
+@lru_cache(maxsize=1)
+def get_crypto_executor() -> CryptoExecutor:
+    """Return the process-wide pool for CPU-bound crypto (shut down by the lifespan)."""
+    settings = get_settings()
+    return CryptoExecutor(settings.crypto_executor, settings.crypto_workers)
+
+
+@lru_cache(maxsize=1)
+def get_local_signer() -> LocalSigner:
+    """Return the process-wide in-process device-certificate signer."""
+    settings = get_settings()
+    return LocalSigner(
+        issuer_cert_path=settings.local_ca_cert_path,
+        issuer_key_path=settings.local_ca_key_path,
+        issuer_key_password=settings.local_ca_key_password,
+        index_path=settings.local_ca_index_path,
+        validity_hours=settings.local_ca_cert_validity_hours,
+        crypto=get_crypto_executor(),
+    )
+
+
+def get_step_ca_client(settings: Settings = Depends(get_settings)) -> StepCAClient | LocalSigner:
+    """Return the device-certificate signer selected by ``step_ca_signing_mode``."""
+    if settings.step_ca_signing_mode == "local":
+        return get_local_signer()
     return StepCAClient(
         ca_url=settings.step_ca_url,
         provisioner_name=settings.step_ca_provisioner_name,
         provisioner_password=settings.step_ca_provisioner_password,
         root_fingerprint=settings.step_ca_fingerprint,
         verify_tls=settings.step_ca_verify_tls,
+        key_cache=get_provisioner_key_cache(),
+        crypto=get_crypto_executor(),
     )
 
 
@@ -48,13 +100,185 @@ def get_wg_config(settings: Settings = Depends(get_settings)) -> WireGuardConfig
     )
 
 
-def get_timescaledb_client(
-    settings: Settings = Depends(get_settings),
-) -> TimescaleDBClient:
+@lru_cache(maxsize=1)
+def get_enrollment_cache() -> EnrollmentCache | None:
+    """Return the process-wide enrollment retry cache (``None`` when disabled).
+
+    The file is shared by every worker of the launcher (``app.serve``).
+    """
+    settings = get_settings()
+    if settings.enrollment_cache_ttl_s <= 0:
+        return None
+    return EnrollmentCache(settings.enrollment_cache_path, ttl=settings.enrollment_cache_ttl_s)
+
+
+@lru_cache(maxsize=1)
+def get_timescaledb_client() -> TimescaleDBClient:
+    """Return the process-wide TimescaleDB client.
+
+    The client owns the asyncpg pool, so it must be shared: building one per
+    request would open (and leak) a new pool for every telemetry webhook.
+    The pool itself is opened and closed by the lifespan handler in ``app.main``.
+    """
+    settings = get_settings()
     return TimescaleDBClient(
         host=settings.tsdb_host,
         port=settings.tsdb_port,
         database=settings.tsdb_database,
         user="telegraf",
         password=settings.tsdb_telegraf_password,
+        min_pool_size=settings.tsdb_pool_min_size,
+        max_pool_size=settings.tsdb_pool_max_size,
+        command_timeout=settings.tsdb_command_timeout,
+        max_inactive_connection_lifetime=settings.tsdb_pool_max_inactive_lifetime,
+        write_mode=settings.tsdb_write_mode,
+        copy_min_rows=settings.tsdb_copy_min_rows,
+        storage_mode=settings.tsdb_storage_mode,
+        id_cache_size=settings.tsdb_id_cache_max_entries,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_telemetry_spool() -> TelemetrySpool | None:
+    """Return the process-wide on-disk telemetry spool (``None`` when disabled).
+
+    The replayer is started by the lifespan handler in ``app.main``.  Under the
+    multi-worker launcher (``app.serve``) every worker spools to its own subdirectory.
+    """
+    settings = get_settings()
+    if not settings.telemetry_spool_enabled:
+        return None
+    directory = Path(settings.telemetry_spool_dir)
+    if (worker := worker_id()) is not None:
+        directory /= f"worker-{worker}"
+    return TelemetrySpool(
+        str(directory),
+        segment_max_bytes=settings.telemetry_spool_segment_mb * 1024 * 1024,
+        fsync_interval=settings.telemetry_spool_fsync_interval_ms / 1000,
+        use_mmap=settings.telemetry_spool_mmap,
+        replay_batch_rows=settings.telemetry_spool_replay_batch_rows,
+        replay_interval=settings.telemetry_spool_replay_interval_s,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_telemetry_buffer() -> TelemetryBuffer:
+    """Return the process-wide write-behind buffer in front of TimescaleDB.
+
+    The flusher is started by the lifespan handler when
+    ``telemetry_buffer_enabled`` is set; otherwise rows are written through.
+    """
+    settings = get_settings()
+    return TelemetryBuffer(
+        get_timescaledb_client(),
+        max_rows=settings.telemetry_buffer_max_rows,
+        max_latency=settings.telemetry_buffer_max_latency_ms / 1000,
+        ack_mode=settings.telemetry_ack_mode,
+        spool=get_telemetry_spool(),
+        high_watermark=settings.telemetry_queue_high_watermark_rows,
+        low_watermark=settings.telemetry_queue_low_watermark_rows,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_tenant_quota() -> TenantQuota:
+    """Return the process-wide per-tenant telemetry rate limiter.
+
+    Each of the ``n`` launcher workers enforces ``1/n`` of the configured limits;
+    ``SO_REUSEPORT`` spreads a tenant's connections across all of them.
+    """
+    settings = get_settings()
+    share = worker_count()
+    return TenantQuota(
+        points_per_s=settings.telemetry_quota_points_per_s / share,
+        points_burst=settings.telemetry_quota_points_burst / share,
+        requests_per_s=settings.telemetry_quota_requests_per_s / share,
+        requests_burst=settings.telemetry_quota_requests_burst / share,
+        max_tenants=settings.telemetry_quota_max_tenants,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_tenant_map() -> TenantMap:
+    """Return the ThingsBoard tenant id → realm mapping applied to webhook telemetry."""
+    settings = get_settings()
+    try:
+        mapping = json.loads(settings.telemetry_tenant_map_json)
+        if not isinstance(mapping, dict):
+            raise ValueError("not a JSON object")
+    except ValueError:
+        logger.error("TELEMETRY_TENANT_MAP_JSON is not a JSON object – ignoring it")
+        mapping = {}
+    return TenantMap(settings.keycloak_realm, {str(k): str(v) for k, v in mapping.items()})
+
+
+@lru_cache(maxsize=1)
+def get_duplicate_filter() -> DuplicateFilter:
+    """Return the process-wide filter of recently seen telemetry message keys.
+
+    Disabled under several launcher workers: a retry lands on any worker, so a
+    per-process filter would only catch some duplicates and mislead operators.
+    """
+    settings = get_settings()
+    window = settings.telemetry_dedup_window_s
+    if window and worker_count() > 1:
+        logger.warning(
+            "Telemetry duplicate filter disabled: it is per process (%d workers).", worker_count()
+        )
+        window = 0
+    return DuplicateFilter(
+        window=window,
+        max_keys=settings.telemetry_dedup_max_keys,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_latest_value_cache() -> LatestValueCache:
+    """Return the process-wide last-value table fed by the telemetry webhooks.
+
+    Under several launcher workers each one only sees the writes it ingested
+    itself, so reads are never answered from the table alone (``ttl=0``): every
+    lookup is merged with the database.
+    """
+    settings = get_settings()
+    return LatestValueCache(
+        max_devices=settings.telemetry_latest_max_devices,
+        ttl=settings.telemetry_latest_ttl_s if worker_count() == 1 else 0,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_telemetry_consumer() -> TelemetryConsumer | None:
+    """Return the process-wide AMQP telemetry consumer (``None`` when disabled).
+
+    It is started by the lifespan handler in ``app.main``.
+    """
+    settings = get_settings()
+    if not settings.telemetry_consumer_enabled:
+        return None
+    # The webhook router owns the event decoding and imports this module itself.
+    from app.routers.webhooks import message_rows
+
+    static = [v.strip() for v in settings.telemetry_consumer_vhosts.split(",") if v.strip()]
+    excluded = {v.strip() for v in settings.telemetry_consumer_exclude_vhosts.split(",")}
+    rabbitmq = RabbitMQClient(
+        settings.rabbitmq_mgmt_url, settings.rabbitmq_admin_user, settings.rabbitmq_admin_password
+    )
+
+    async def vhosts() -> list[str]:
+        if static:
+            return static
+        return [v["name"] for v in await rabbitmq.list_vhosts() if v["name"] not in excluded]
+
+    return TelemetryConsumer(
+        get_telemetry_buffer(),
+        message_rows,
+        amqp_connector(settings.telemetry_consumer_amqp_url),
+        vhosts,
+        queue=settings.telemetry_consumer_queue,
+        binding_key=settings.telemetry_consumer_binding_key,
+        prefetch=settings.telemetry_consumer_prefetch,
+        max_latency=settings.telemetry_consumer_max_latency_ms / 1000,
+        latest=get_latest_value_cache(),
+        refresh_interval=settings.telemetry_consumer_refresh_interval_s,
     )
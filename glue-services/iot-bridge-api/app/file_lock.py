@@ -0,0 +1,72 @@
+"""Cross-process locks and atomic writes for the service's JSON state files.
+
+The JOIN-request and JOIN-key stores and the WireGuard ``cdm_peers.json`` are
+read-modify-write files shared by every worker process (:mod:`app.serve`), so
+each update runs under an exclusive ``flock(2)`` on a sidecar ``<name>.lock``
+file.  The data file itself is replaced by rename and cannot carry the lock.
+
+  :func:`locked`        blocking context manager for synchronous callers.
+  :func:`async_locked`  for coroutines: serialises on an in-process
+                        ``asyncio.Lock`` first, then waits for the OS lock in a
+                        thread so a contended lock never blocks the event loop.
+  :func:`write_atomic`  writes to a per-process temp file and renames it over
+                        the target, so readers need no lock at all.
+
+Without ``fcntl`` (Windows dev machines) only in-process serialisation applies.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import IO
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+_async_locks: dict[Path, asyncio.Lock] = {}
+
+
+def _acquire(path: Path) -> IO[bytes]:
+    lock_path = path.with_name(path.name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    fh = lock_path.open("ab")
+    if fcntl is not None:
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            fh.close()
+            raise
+    return fh
+
+
+@contextmanager
+def locked(path: Path) -> Iterator[None]:
+    """Hold the exclusive cross-process lock of *path* (closing the file releases it)."""
+    with _acquire(path):
+        yield
+
+
+@asynccontextmanager
+async def async_locked(path: Path) -> AsyncIterator[None]:
+    """Async variant of :func:`locked`."""
+    lock = _async_locks.setdefault(path, asyncio.Lock())
+    async with lock:
+        fh = await asyncio.to_thread(_acquire, path)
+        try:
+            yield
+        finally:
+            fh.close()
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Replace *path* with *data* in one rename."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
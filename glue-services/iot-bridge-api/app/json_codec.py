@@ -0,0 +1,62 @@
+"""orjson-backed JSON encoding and decoding for the whole API.
+
+  :class:`FastJSONResponse`  default response class (``app.main``); explicit
+                             JSON responses such as the join-request list use
+                             it too.
+  :class:`FastJSONRoute`     route class of every router: request bodies that
+                             FastAPI parses as JSON are decoded with orjson.
+  :func:`dumps` / ``loads``  for the JSON the service handles itself (NDJSON
+                             webhooks, spool segments, JSONB tags).
+
+``dumps`` returns ``bytes``; orjson serialises ``datetime`` natively and maps
+NaN / infinity to ``null``.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+JSONDecodeError = orjson.JSONDecodeError  # subclass of json.JSONDecodeError
+
+loads = orjson.loads
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """Encode *obj* as compact (or two-space indented) UTF-8 JSON."""
+    return orjson.dumps(obj, option=_OPTIONS | orjson.OPT_INDENT_2 if indent else _OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` rendered with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=_OPTIONS)
+
+
+class FastJSONRequest(Request):
+    """Request whose ``json()`` is decoded with orjson."""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+
+class FastJSONRoute(APIRoute):
+    """API route that hands its endpoint a :class:`FastJSONRequest`."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            return await handler(FastJSONRequest(request.scope, request.receive))
+
+        return route_handler
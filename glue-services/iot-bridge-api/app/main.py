@@ -1,13 +1,62 @@
+import logging
 import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.datastructures import Default
 from starlette.middleware.sessions import SessionMiddleware
 
-from app.deps import get_settings
-from app.routers import admin_portal, enrollment, health, join, portal, webhooks
+from app.clients.telemetry_schema import bootstrap_from_settings
+from app.clients.timescaledb import TimescaleDBError
+from app.deps import (
+    get_crypto_executor,
+    get_settings,
+    get_telemetry_buffer,
+    get_telemetry_consumer,
+    get_telemetry_spool,
+    get_timescaledb_client,
+)
+from app.json_codec import FastJSONResponse
+from app.routers import admin_portal, enrollment, health, join, portal, telemetry, webhooks
+
+logger = logging.getLogger(__name__)
 
 _settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """Open process-wide resources on startup and release them on shutdown."""
+    tsdb = get_timescaledb_client()
+    await tsdb.connect()
+    if _settings.tsdb_schema_bootstrap:
+        try:
+            await bootstrap_from_settings(tsdb, _settings)
+        except TimescaleDBError as exc:
+            logger.warning("Telemetry schema bootstrap skipped: %s", exc)
+    spool = get_telemetry_spool()
+    if spool is not None:
+        await spool.start(tsdb)
+    buffer = get_telemetry_buffer()
+    if _settings.telemetry_buffer_enabled:
+        await buffer.start()
+    consumer = get_telemetry_consumer()
+    if consumer is not None:
+        await consumer.start()
+    try:
+        yield
+    finally:
+        if consumer is not None:
+            await consumer.stop()
+        # Drain buffered telemetry before the pool it writes through is closed.
+        await buffer.stop()
+        if spool is not None:
+            await spool.stop()
+        await tsdb.close()
+        get_crypto_executor().shutdown()
+
+
 app = FastAPI(
     title="IoT Bridge API",
     description=(
@@ -18,6 +67,10 @@ app = FastAPI(
     # root_path allows FastAPI to generate correct OpenAPI URLs when served
     # behind a reverse proxy at a sub-path (e.g. nginx /api/ prefix).
     root_path=os.getenv("ROOT_PATH", ""),
+    lifespan=lifespan,
+    # orjson for plain-dict responses.  Wrapped in Default() so routes with a
+    # response model keep FastAPI's own serialisation straight to JSON bytes.
+    default_response_class=Default(FastJSONResponse),
 )
 
 # Session middleware is required for the tenant portal OIDC flow.
@@ -34,6 +87,7 @@ app.add_middleware(
 app.include_router(health.router)
 app.include_router(enrollment.router)
 app.include_router(webhooks.router)
+app.include_router(telemetry.router)
 app.include_router(portal.router)
 app.include_router(admin_portal.router)
 app.include_router(join.router)
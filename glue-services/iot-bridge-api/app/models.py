@@ -1,6 +1,7 @@
 """Pydantic request / response models for the IoT Bridge API."""
 
-from typing import Any
+from datetime import datetime
+from typing import Any, Literal
 
 from pydantic import BaseModel, Field
 
@@ -26,6 +27,28 @@ class EnrollmentResponse(BaseModel):
     wireguard_config: str = Field(..., description="Client-side WireGuard config (INI)")
 
 
+class BatchEnrollmentItem(EnrollmentRequest):
+    """One device of a bulk enrollment."""
+
+    device_id: str = Field(..., min_length=1, description="Device / controller ID")
+
+
+class BatchEnrollmentRequest(BaseModel):
+    """Devices enrolled by one POST /devices/enroll:batch (each ID at most once)."""
+
+    devices: list[BatchEnrollmentItem] = Field(..., min_length=1)
+
+
+class BatchEnrollmentResult(BaseModel):
+    """One NDJSON line of the bulk enrollment response, written as the device finishes."""
+
+    device_id: str
+    status: Literal["enrolled", "failed"]
+    status_code: int = Field(..., description="HTTP status the single-device endpoint returns")
+    detail: str | None = Field(default=None, description="Error message of a failed device")
+    enrollment: EnrollmentResponse | None = None
+
+
 # ── ThingsBoard webhook ───────────────────────────────────────────────────────
 
 
@@ -39,7 +62,9 @@ class ThingsboardWebhookEvent(BaseModel):
 
     msgType: str = Field("UNKNOWN", description="ThingsBoard message type")
     metadata: dict[str, Any] = Field(default_factory=dict)
-    data: dict[str, Any] | str = Field(default_factory=dict)
+    # Telemetry data is either flat ``{"key": value}``, a single timestamped sample
+    # ``{"ts": <ms>, "values": {...}}`` or a list of such samples.
+    data: dict[str, Any] | list[Any] | str = Field(default_factory=dict)
 
 
 class WebhookResponse(BaseModel):
@@ -50,13 +75,63 @@ class WebhookResponse(BaseModel):
 
 
 class TelemetryWebhookResponse(BaseModel):
-    status: str
+    status: str = Field(
+        ..., description="written | buffered | spooled | duplicate | ignored | invalid"
+    )
     device_id: str | None = None
     tenant_id: str | None = None
     points_written: int = 0
     reason: str | None = None
 
 
+class TelemetryBatchResponse(BaseModel):
+    """Returned by the batched telemetry webhook – one entry per received event."""
+
+    status: str = Field(..., description="written | buffered | spooled | ignored")
+    events: list[TelemetryWebhookResponse] = Field(default_factory=list)
+    points_written: int = 0
+
+
+# ── Telemetry read API ────────────────────────────────────────────────────────
+
+
+class TelemetryBucket(BaseModel):
+    time: datetime = Field(..., description="Start of the time bucket")
+    device_id: str | None = Field(None, description="None when rolled up across the tenant")
+    metric_name: str
+    avg: float | None = None
+    min: float | None = None
+    max: float | None = None
+    count: int = 0
+
+
+class TelemetryQueryResponse(BaseModel):
+    """Bucketed telemetry of one device or one tenant."""
+
+    tenant_id: str
+    device_id: str | None = None
+    start: datetime
+    end: datetime
+    bucket_seconds: float
+    source: str = Field(..., description="raw | 1m | 1h (continuous aggregate read)")
+    buckets: list[TelemetryBucket] = Field(default_factory=list)
+
+
+class LatestTelemetryValue(BaseModel):
+    time: datetime
+    value: float | None = None
+    raw_type: str | None = None
+
+
+class LatestTelemetryResponse(BaseModel):
+    """Newest value of every metric of one device."""
+
+    tenant_id: str
+    device_id: str
+    source: str = Field(..., description="cache | database")
+    values: dict[str, LatestTelemetryValue] = Field(default_factory=dict)
+
+
 # ── Health ────────────────────────────────────────────────────────────────────
 
 
@@ -65,6 +140,32 @@ class HealthResponse(BaseModel):
     service: str = "iot-bridge-api"
 
 
+class ReadinessResponse(BaseModel):
+    status: str = Field(..., description="ok | degraded")
+    timescaledb: bool = Field(..., description="Shared TimescaleDB pool answered SELECT 1")
+    tsdb_pool: dict[str, int] = Field(
+        default_factory=dict, description="Pool occupancy (size, idle, min_size, max_size)"
+    )
+    telemetry_buffer: dict[str, Any] = Field(
+        default_factory=dict, description="Write-behind buffer counters"
+    )
+    telemetry_spool_writable: bool | None = Field(
+        None, description="Disk spool accepts writes (null when the spool is disabled)"
+    )
+    telemetry_spool: dict[str, Any] = Field(
+        default_factory=dict, description="Disk spool depth and replay rate"
+    )
+    telemetry_consumer: dict[str, Any] = Field(
+        default_factory=dict, description="AMQP telemetry consumer counters"
+    )
+    telemetry_dedup: dict[str, Any] = Field(
+        default_factory=dict, description="Duplicate-detection filter size and hit counters"
+    )
+    enrollment_cache: dict[str, Any] = Field(
+        default_factory=dict, description="Enrollment retry cache size and hit counters"
+    )
+
+
 # ── JOIN workflow ─────────────────────────────────────────────────────────────
 
 
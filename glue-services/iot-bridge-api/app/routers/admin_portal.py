@@ -9,6 +9,7 @@ Routes
   POST  /portal/admin/tenants             → Create a new tenant
   DELETE /portal/admin/tenants/{id}       → Remove a tenant
   POST  /portal/admin/tenants/{id}/provisioner  → Add step-ca OIDC provisioner
+  GET   /portal/admin/telemetry/usage     → Per-tenant telemetry quota usage
 
 Each modifying endpoint returns JSON so the dashboard can call them via fetch().
 
@@ -28,18 +29,20 @@ from typing import Any, cast
 
 import httpx
 from fastapi import APIRouter, Depends, Request
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
 from app.clients.join_store import load_store
 from app.clients.rabbitmq import RabbitMQClient, RabbitMQError
 from app.clients.step_ca import StepCAAdminClient, StepCAError
+from app.clients.tenant_quota import TenantQuota
 from app.config import Settings
-from app.deps import get_settings
+from app.deps import get_crypto_executor, get_provisioner_key_cache, get_settings, get_tenant_quota
+from app.json_codec import FastJSONResponse, FastJSONRoute
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/portal/admin", tags=["admin-portal"])
+router = APIRouter(prefix="/portal/admin", tags=["admin-portal"], route_class=FastJSONRoute)
 templates = Jinja2Templates(directory="app/templates")
 
 ADMIN_ROLES = {"cdm-admin", "platform-admin"}
@@ -140,6 +143,8 @@ def _step_ca_admin(settings: Settings) -> StepCAAdminClient:
         settings.step_ca_admin_provisioner,
         settings.step_ca_admin_password,
         verify_tls=settings.step_ca_verify_tls,
+        key_cache=get_provisioner_key_cache(),
+        crypto=get_crypto_executor(),
     )
 
 
@@ -462,12 +467,12 @@ async def create_tenant(
     """
     user = _get_cdm_admin(request)
     if not user:
-        return JSONResponse({"error": "Unauthorized"}, status_code=403)
+        return FastJSONResponse({"error": "Unauthorized"}, status_code=403)
 
     try:
         body = await request.json()
     except Exception:
-        return JSONResponse({"error": "Invalid JSON body"}, status_code=400)
+        return FastJSONResponse({"error": "Invalid JSON body"}, status_code=400)
 
     realm_id = str(body.get("realm_id", "")).strip().lower()
     display_name = str(body.get("display_name", realm_id)).strip()
@@ -475,14 +480,14 @@ async def create_tenant(
     admin_user = str(body.get("admin_user", f"{realm_id}-admin")).strip()
 
     if not realm_id or not realm_id.isidentifier():
-        return JSONResponse(
+        return FastJSONResponse(
             {"error": "realm_id must be a valid identifier (letters, digits, underscores)"},
             status_code=400,
         )
 
     protected = {"master", "cdm"}
     if realm_id in protected:
-        return JSONResponse({"error": f"Realm '{realm_id}' is protected"}, status_code=400)
+        return FastJSONResponse({"error": f"Realm '{realm_id}' is protected"}, status_code=400)
 
     results: dict[str, str] = {}
     errors: dict[str, str] = {}
@@ -512,7 +517,7 @@ async def create_tenant(
         logger.exception("RabbitMQ provisioning failed for '%s': %s", realm_id, exc)
         errors["rabbitmq"] = str(exc)
 
-    return JSONResponse(
+    return FastJSONResponse(
         {
             "realm_id": realm_id,
             "display_name": display_name,
@@ -537,11 +542,11 @@ async def delete_tenant(
 ):
     user = _get_cdm_admin(request)
     if not user:
-        return JSONResponse({"error": "Unauthorized"}, status_code=403)
+        return FastJSONResponse({"error": "Unauthorized"}, status_code=403)
 
     protected = {"master", "cdm"}
     if realm_id in protected:
-        return JSONResponse({"error": f"Realm '{realm_id}' is protected"}, status_code=400)
+        return FastJSONResponse({"error": f"Realm '{realm_id}' is protected"}, status_code=400)
 
     results: dict[str, str] = {}
     errors: dict[str, str] = {}
@@ -560,7 +565,7 @@ async def delete_tenant(
     except RabbitMQError as exc:
         errors["rabbitmq"] = str(exc)
 
-    return JSONResponse({"realm_id": realm_id, "results": results, "errors": errors})
+    return FastJSONResponse({"realm_id": realm_id, "results": results, "errors": errors})
 
 
 @router.post("/tenants/{realm_id}/provisioner", name="admin_add_provisioner")
@@ -580,12 +585,12 @@ async def add_oidc_provisioner(
     """
     user = _get_cdm_admin(request)
     if not user:
-        return JSONResponse({"error": "Unauthorized"}, status_code=403)
+        return FastJSONResponse({"error": "Unauthorized"}, status_code=403)
 
     try:
         body = await request.json()
     except Exception:
-        return JSONResponse({"error": "Invalid JSON body"}, status_code=400)
+        return FastJSONResponse({"error": "Invalid JSON body"}, status_code=400)
 
     client_id = str(body.get("client_id", "step-ca")).strip()
     client_secret = str(body.get("client_secret", "")).strip()
@@ -606,7 +611,7 @@ async def add_oidc_provisioner(
             configuration_endpoint=configuration_endpoint,
             admin_emails=admin_emails or None,
         )
-        return JSONResponse(
+        return FastJSONResponse(
             {
                 "realm_id": realm_id,
                 "provisioner_name": provisioner_name,
@@ -616,4 +621,14 @@ async def add_oidc_provisioner(
         )
     except StepCAError as exc:
         logger.exception("step-ca provisioner creation failed: %s", exc)
-        return JSONResponse({"error": str(exc)}, status_code=502)
+        return FastJSONResponse({"error": str(exc)}, status_code=502)
+
+
+@router.get("/telemetry/usage", name="admin_telemetry_usage")
+async def telemetry_usage(
+    request: Request,
+    quota: TenantQuota = Depends(get_tenant_quota),
+):
+    """Return the per-tenant telemetry quota limits and usage counters."""
+    await _require_cdm_admin(request)
+    return FastJSONResponse({"limits": quota.limits(), "tenants": quota.usage()})
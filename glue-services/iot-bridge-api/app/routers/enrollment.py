@@ -2,73 +2,106 @@
 
 Flow
 ----
-1.  Validate the incoming PKCS#10 CSR (reject malformed requests early).
-2.  Forward the CSR to step-ca for signing via the JWK provisioner OTT flow.
-3.  Create the corresponding target in hawkBit (idempotent – skip if exists).
-4.  Allocate a WireGuard VPN IP and generate the client-side peer config.
-5.  Return the signed certificate, CA chain, VPN IP and WireGuard config.
+1.  Validate the incoming PKCS#10 CSR (reject malformed requests early).  It is
+    parsed once, on the crypto executor, and the parsed CSR is what step-ca gets.
+2.  Concurrently, in one task group:
+    a.  forward the CSR to step-ca for signing via the JWK provisioner OTT flow
+        (or, with ``step_ca_signing_mode = "local"``, sign it in-process);
+    b.  create the corresponding target in hawkBit (idempotent – skip if exists);
+    c.  allocate a WireGuard VPN IP.
+3.  Generate the client-side WireGuard peer config.
+4.  Return the signed certificate, CA chain, VPN IP and WireGuard config.
+
+Enrollment therefore takes about as long as the slowest upstream rather than
+the sum of all of them.  If any stage fails, the others are cancelled and what
+this request created is undone: a newly allocated IP is released and a newly
+created hawkBit target deleted.  (A certificate step-ca already issued stays
+valid; it is not handed out.)
+
+A device that retries with the same CSR within ``enrollment_cache_ttl_s`` (its
+first response got lost) gets the stored result back without any upstream
+call – see :mod:`app.clients.enrollment_cache`.
+
+``POST /devices/enroll:batch`` runs the same flow for a production-line burst:
+``enrollment_batch_concurrency`` devices at a time over one connection pool
+per upstream, streaming one NDJSON result line per device as it finishes.
 """
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import logging
+from collections import Counter
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+
 import httpx
+from cryptography.exceptions import UnsupportedAlgorithm
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 
+from app.clients.enrollment_cache import EnrollmentCache
 from app.clients.hawkbit import HawkBitClient, HawkBitError
-from app.clients.step_ca import StepCAClient, StepCAError
-from app.clients.wireguard import WireGuardConfig
-from app.deps import get_hawkbit_client, get_step_ca_client, get_wg_config
-from app.models import EnrollmentRequest, EnrollmentResponse
+from app.clients.step_ca import CertificateSigner, StepCAError
+from app.clients.wireguard import WireGuardConfig, WireGuardError
+from app.config import Settings
+from app.crypto import CryptoExecutor, ParsedCSR, parse_csr
+from app.deps import (
+    get_crypto_executor,
+    get_enrollment_cache,
+    get_hawkbit_client,
+    get_settings,
+    get_step_ca_client,
+    get_wg_config,
+)
+from app.json_codec import FastJSONRoute, dumps
+from app.models import (
+    BatchEnrollmentItem,
+    BatchEnrollmentRequest,
+    BatchEnrollmentResult,
+    EnrollmentRequest,
+    EnrollmentResponse,
+)
+
+logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/devices", tags=["enrollment"])
+router = APIRouter(prefix="/devices", tags=["enrollment"], route_class=FastJSONRoute)
 
 
-def _validate_csr(csr_pem: str) -> None:
-    """Parse the CSR PEM and raise HTTP 422 if it is malformed."""
-    from cryptography import x509
-    from cryptography.exceptions import InvalidSignature
+async def _parse_csr(crypto: CryptoExecutor, csr_pem: str) -> ParsedCSR:
+    """Parse the CSR PEM off the event loop and raise HTTP 422 if it is malformed.
 
+    Besides ``ValueError`` for garbage, ``cryptography`` raises
+    ``UnsupportedAlgorithm`` for keys or signature algorithms it cannot handle
+    and ``TypeError`` for some malformed structures – the client's fault too.
+    """
     try:
-        csr = x509.load_pem_x509_csr(csr_pem.encode())
-        if not csr.is_signature_valid:
-            raise ValueError("CSR signature is invalid")
-    except (InvalidSignature, ValueError, Exception) as exc:
+        return await crypto.run(parse_csr, csr_pem)
+    except (ValueError, TypeError, UnsupportedAlgorithm) as exc:
         raise HTTPException(status_code=422, detail=f"Invalid CSR: {exc}") from exc
 
 
-@router.post(
-    "/{device_id}/enroll",
-    response_model=EnrollmentResponse,
-    summary="Enroll a device (factory/simulation)",
-    description=(
-        "Accepts a PKCS#10 CSR, signs it via step-ca, "
-        "creates a hawkBit target, and allocates a WireGuard VPN IP."
-    ),
-)
-async def enroll_device(
-    device_id: str,
-    body: EnrollmentRequest,
-    step_ca: StepCAClient = Depends(get_step_ca_client),
-    hawkbit: HawkBitClient = Depends(get_hawkbit_client),
-    wg: WireGuardConfig = Depends(get_wg_config),
-) -> EnrollmentResponse:
-    """Enroll a new device into the platform."""
-    # ── 1. Validate CSR ──────────────────────────────────────────────────────
-    _validate_csr(body.csr)
+@dataclass
+class _Created:
+    """Side effects of one enrollment that are undone if a later stage fails."""
+
+    target: bool = False
+    ip: bool = False
+
 
-    # ── 2. Sign via step-ca ──────────────────────────────────────────────────
+async def _sign(step_ca: CertificateSigner, device_id: str, csr: ParsedCSR) -> tuple[str, str]:
     try:
-        cert_pem, ca_chain_pem = await step_ca.sign_certificate(
-            csr_pem=body.csr,
-            subject=device_id,
-            sans=[device_id],
-        )
+        return await step_ca.sign_certificate(csr_pem=csr, subject=device_id, sans=[device_id])
     except httpx.RequestError as exc:
         raise HTTPException(status_code=503, detail=f"step-ca unreachable: {exc}") from exc
     except StepCAError as exc:
         raise HTTPException(status_code=502, detail=f"PKI signing failed: {exc}") from exc
 
-    # ── 3. Create / ensure hawkBit target ────────────────────────────────────
+
+async def _ensure_target(
+    hawkbit: HawkBitClient, device_id: str, body: EnrollmentRequest, created: _Created
+) -> None:
     try:
         existing = await hawkbit.get_target(device_id)
         if not existing:
@@ -77,22 +110,222 @@ async def enroll_device(
                 name=body.device_name,
                 attributes={"device_type": body.device_type},
             )
+            # Flagged only once the POST succeeded: a rejected create (e.g. a concurrent
+            # enrollment of the same device won the race) must not delete its target.
+            created.target = True
     except httpx.RequestError as exc:
         raise HTTPException(status_code=503, detail=f"hawkBit unreachable: {exc}") from exc
     except HawkBitError as exc:
         raise HTTPException(status_code=502, detail=f"hawkBit provisioning failed: {exc}") from exc
 
-    # ── 4. WireGuard IP + config ─────────────────────────────────────────────
-    wg_ip = wg.allocate_ip(device_id)
-    wg_cfg = wg.generate_client_config(
+
+async def _reserve_ip(wg: WireGuardConfig, device_id: str, created: _Created) -> str:
+    # File I/O under a cross-process lock: keep it off the event loop.
+    reservation = asyncio.ensure_future(asyncio.to_thread(wg.reserve_ip, device_id))
+    try:
+        ip, created.ip = await asyncio.shield(reservation)
+    except asyncio.CancelledError:
+        # The thread cannot be stopped; record its allocation so it is released.
+        with contextlib.suppress(WireGuardError):
+            _, created.ip = await reservation
+        raise
+    except WireGuardError as exc:
+        raise HTTPException(status_code=503, detail=f"WireGuard: {exc}") from exc
+    return ip
+
+
+async def _compensate(
+    hawkbit: HawkBitClient, wg: WireGuardConfig, device_id: str, created: _Created
+) -> None:
+    """Undo what a failed enrollment created; failures are logged, not raised."""
+    if created.ip:
+        try:
+            await asyncio.to_thread(wg.release_ip, device_id)
+        except Exception as exc:
+            logger.error("Could not release the WireGuard IP of %s: %s", device_id, exc)
+    if created.target:
+        try:
+            await hawkbit.delete_target(device_id)
+        except Exception as exc:
+            logger.error("Could not delete the hawkBit target of %s: %s", device_id, exc)
+
+
+async def _enroll(
+    device_id: str,
+    body: EnrollmentRequest,
+    step_ca: CertificateSigner,
+    hawkbit: HawkBitClient,
+    wg: WireGuardConfig,
+    crypto: CryptoExecutor,
+    cache: EnrollmentCache | None,
+) -> EnrollmentResponse:
+    # ── 1. Validate CSR (parsed once, then handed to step-ca) ────────────────
+    csr = await _parse_csr(crypto, body.csr)
+    if cache is not None:
+        cached = await cache.get(device_id, csr.fingerprint, body.wg_public_key)
+        if cached is not None:
+            logger.info("Enrollment retry of %s with the same CSR served from cache.", device_id)
+            return EnrollmentResponse(**cached)
+
+    # ── 2. step-ca, hawkBit and WireGuard concurrently ───────────────────────
+    created = _Created()
+    try:
+        async with asyncio.TaskGroup() as stages:
+            signed = stages.create_task(_sign(step_ca, device_id, csr))
+            stages.create_task(_ensure_target(hawkbit, device_id, body, created))
+            reserved = stages.create_task(_reserve_ip(wg, device_id, created))
+    except BaseException as exc:
+        # Shielded so a cancelled request still undoes its side effects.
+        await asyncio.shield(_compensate(hawkbit, wg, device_id, created))
+        if isinstance(exc, BaseExceptionGroup):
+            http_error = next((e for e in exc.exceptions if isinstance(e, HTTPException)), None)
+            if http_error is not None:
+                raise http_error from None
+        raise
+    cert_pem, ca_chain_pem = signed.result()
+    wg_ip = reserved.result()
+
+    # ── 3. WireGuard client config (adds the server-side peer) ───────────────
+    # Appending the peer waits for the cross-process wg0.conf lock – off the loop.
+    wg_cfg = await asyncio.to_thread(
+        wg.generate_client_config,
         device_id=device_id,
         device_ip=wg_ip,
         device_pubkey=body.wg_public_key or "",
     )
 
-    return EnrollmentResponse(
+    response = EnrollmentResponse(
         certificate=cert_pem,
         ca_chain=ca_chain_pem,
         wireguard_ip=wg_ip,
         wireguard_config=wg_cfg,
     )
+    if cache is not None:
+        try:
+            await cache.put(device_id, csr.fingerprint, body.wg_public_key, response.model_dump())
+        except OSError as exc:
+            # The device is enrolled; only a lost response would now cost a re-sign.
+            logger.warning("Could not cache the enrollment of %s: %s", device_id, exc)
+    return response
+
+
+@router.post(
+    "/{device_id}/enroll",
+    response_model=EnrollmentResponse,
+    summary="Enroll a device (factory/simulation)",
+    description=(
+        "Accepts a PKCS#10 CSR, signs it via step-ca, "
+        "creates a hawkBit target, and allocates a WireGuard VPN IP."
+    ),
+)
+async def enroll_device(
+    device_id: str,
+    body: EnrollmentRequest,
+    step_ca: CertificateSigner = Depends(get_step_ca_client),
+    hawkbit: HawkBitClient = Depends(get_hawkbit_client),
+    wg: WireGuardConfig = Depends(get_wg_config),
+    crypto: CryptoExecutor = Depends(get_crypto_executor),
+    cache: EnrollmentCache | None = Depends(get_enrollment_cache),
+) -> EnrollmentResponse:
+    """Enroll a new device into the platform."""
+    return await _enroll(device_id, body, step_ca, hawkbit, wg, crypto, cache)
+
+
+async def _enroll_one(
+    item: BatchEnrollmentItem,
+    step_ca: CertificateSigner,
+    hawkbit: HawkBitClient,
+    wg: WireGuardConfig,
+    crypto: CryptoExecutor,
+    cache: EnrollmentCache | None,
+) -> BatchEnrollmentResult:
+    """Enroll one device of a batch; a failure becomes its result line."""
+    try:
+        enrollment = await _enroll(item.device_id, item, step_ca, hawkbit, wg, crypto, cache)
+    except HTTPException as exc:
+        return BatchEnrollmentResult(
+            device_id=item.device_id,
+            status="failed",
+            status_code=exc.status_code,
+            detail=str(exc.detail),
+        )
+    except Exception as exc:
+        logger.exception("Bulk enrollment of %s failed.", item.device_id)
+        return BatchEnrollmentResult(
+            device_id=item.device_id,
+            status="failed",
+            status_code=500,
+            detail=f"Internal error: {exc}",
+        )
+    return BatchEnrollmentResult(
+        device_id=item.device_id, status="enrolled", status_code=200, enrollment=enrollment
+    )
+
+
+@router.post(
+    "/enroll:batch",
+    response_class=StreamingResponse,
+    summary="Enroll many devices at once (production line)",
+    description=(
+        "Runs every device through the single-device enrollment, "
+        "`enrollment_batch_concurrency` at a time, and streams one "
+        "`BatchEnrollmentResult` per device as NDJSON in completion order."
+    ),
+    responses={
+        200: {"content": {"application/x-ndjson": {}}},
+        422: {"description": "Empty or oversized batch, or a device ID given twice"},
+    },
+)
+async def enroll_devices_batch(
+    body: BatchEnrollmentRequest,
+    step_ca: CertificateSigner = Depends(get_step_ca_client),
+    hawkbit: HawkBitClient = Depends(get_hawkbit_client),
+    wg: WireGuardConfig = Depends(get_wg_config),
+    crypto: CryptoExecutor = Depends(get_crypto_executor),
+    cache: EnrollmentCache | None = Depends(get_enrollment_cache),
+    settings: Settings = Depends(get_settings),
+) -> StreamingResponse:
+    """Enroll a batch of devices, streaming per-device results."""
+    if len(body.devices) > settings.enrollment_batch_max_devices:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.enrollment_batch_max_devices} devices per batch",
+        )
+    counts = Counter(item.device_id for item in body.devices)
+    duplicates = sorted(device_id for device_id, n in counts.items() if n > 1)
+    if duplicates:
+        # Two concurrent enrollments of one device would race for its target and IP.
+        raise HTTPException(
+            status_code=422, detail=f"Duplicate device IDs: {', '.join(duplicates)}"
+        )
+    concurrency = max(1, settings.enrollment_batch_concurrency)
+
+    async def results() -> AsyncIterator[bytes]:
+        enrolled = 0
+        # One connection pool per upstream for the whole batch, not one per call.
+        async with (
+            step_ca.pooled(concurrency) as pooled_step_ca,
+            hawkbit.pooled(concurrency) as pooled_hawkbit,
+        ):
+            gate = asyncio.Semaphore(concurrency)
+
+            async def run(item: BatchEnrollmentItem) -> BatchEnrollmentResult:
+                async with gate:
+                    return await _enroll_one(
+                        item, pooled_step_ca, pooled_hawkbit, wg, crypto, cache
+                    )
+
+            tasks = [asyncio.create_task(run(item)) for item in body.devices]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    result = await next_done
+                    enrolled += result.status == "enrolled"
+                    yield dumps(result.model_dump(mode="json", exclude_none=True)) + b"\n"
+            finally:
+                # Client gone: stop the rest; running enrollments still compensate.
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Bulk enrollment: %d of %d device(s) enrolled.", enrolled, len(tasks))
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -1,13 +1,69 @@
-"""GET /health – liveness probe."""
+"""GET /health – liveness probe.  GET /health/ready – readiness probe."""
 
-from fastapi import APIRouter
+import asyncio
 
-from app.models import HealthResponse
+from fastapi import APIRouter, Depends
 
-router = APIRouter(tags=["ops"])
+from app.clients.enrollment_cache import EnrollmentCache
+from app.clients.telemetry_buffer import TelemetryBuffer
+from app.clients.telemetry_consumer import TelemetryConsumer
+from app.clients.telemetry_dedup import DuplicateFilter
+from app.clients.telemetry_spool import TelemetrySpool
+from app.clients.timescaledb import TimescaleDBClient
+from app.deps import (
+    get_duplicate_filter,
+    get_enrollment_cache,
+    get_telemetry_buffer,
+    get_telemetry_consumer,
+    get_telemetry_spool,
+    get_timescaledb_client,
+)
+from app.json_codec import FastJSONResponse, FastJSONRoute
+from app.models import HealthResponse, ReadinessResponse
+
+router = APIRouter(tags=["ops"], route_class=FastJSONRoute)
 
 
 @router.get("/health", response_model=HealthResponse)
 async def health() -> HealthResponse:
     """Return service liveness status."""
     return HealthResponse()
+
+
+@router.get(
+    "/health/ready",
+    response_model=ReadinessResponse,
+    responses={503: {"model": ReadinessResponse}},
+)
+async def ready(
+    tsdb: TimescaleDBClient = Depends(get_timescaledb_client),
+    buffer: TelemetryBuffer = Depends(get_telemetry_buffer),
+    spool: TelemetrySpool | None = Depends(get_telemetry_spool),
+    consumer: TelemetryConsumer | None = Depends(get_telemetry_consumer),
+    dedup: DuplicateFilter = Depends(get_duplicate_filter),
+    enrollment_cache: EnrollmentCache | None = Depends(get_enrollment_cache),
+) -> FastJSONResponse:
+    """Return 200 while telemetry can be accepted, else 503.
+
+    That is the case when the shared TimescaleDB pool answers a health check,
+    and also while it does not but the disk spool is enabled and writable:
+    writes are then spooled and replayed later, so taking the pod out of the
+    load balancer would only turn them into errors.  The body reports the
+    database (``timescaledb``) and the spool (``telemetry_spool_writable``)
+    separately, with ``status`` ``degraded`` while the database is down.
+    """
+    tsdb_ok = await tsdb.ping()
+    spool_ok = await asyncio.to_thread(spool.writable) if spool is not None else None
+    ready = tsdb_ok or bool(spool_ok)
+    body = ReadinessResponse(
+        status="ok" if tsdb_ok else "degraded",
+        timescaledb=tsdb_ok,
+        telemetry_spool_writable=spool_ok,
+        tsdb_pool=tsdb.pool_stats(),
+        telemetry_buffer=buffer.stats(),
+        telemetry_spool=spool.stats() if spool is not None else {},
+        telemetry_consumer=consumer.stats() if consumer is not None else {},
+        telemetry_dedup=dedup.stats(),
+        enrollment_cache=enrollment_cache.stats() if enrollment_cache is not None else {},
+    )
+    return FastJSONResponse(status_code=200 if ready else 503, content=body.model_dump())
@@ -39,14 +39,14 @@ from typing import Any, cast
 
 import httpx
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse
 
 from app.clients.join_key_store import JOIN_KEY_TTL_HOURS, create_key, validate_and_consume
-from app.clients.join_store import load_store, save_store
+from app.clients.join_store import load_store, update_store
 from app.clients.rabbitmq import RabbitMQClient
 from app.clients.step_ca import StepCAAdminClient, StepCAClient, StepCAError
 from app.config import Settings
-from app.deps import get_settings
+from app.deps import get_crypto_executor, get_provisioner_key_cache, get_settings
+from app.json_codec import FastJSONResponse, FastJSONRoute
 from app.models import (
     JoinApproveRequest,
     JoinHandshakePayload,
@@ -68,7 +68,7 @@ from app.routers.admin_portal import (
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/portal/admin", tags=["join"])
+router = APIRouter(prefix="/portal/admin", tags=["join"], route_class=FastJSONRoute)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -202,6 +202,8 @@ def _step_ca_client(settings: Settings) -> StepCAClient:
         provisioner_password=settings.step_ca_provisioner_password,
         root_fingerprint=settings.step_ca_fingerprint,
         verify_tls=settings.step_ca_verify_tls,
+        key_cache=get_provisioner_key_cache(),
+        crypto=get_crypto_executor(),
     )
 
 
@@ -416,7 +418,7 @@ async def submit_join_request(
     tenant_id: str,
     payload: JoinRequestPayload,
     request: Request,
-) -> JSONResponse:
+) -> FastJSONResponse:
     """Receive a JOIN request from a Tenant-Stack and store it as *pending*.
 
     This endpoint is intentionally **unauthenticated** so that a freshly booted
@@ -432,42 +434,41 @@ async def submit_join_request(
             detail="tenant_id must be lowercase alphanumeric with optional hyphens",
         )
 
-    store = await load_store(settings)
-    if tenant_id in store and store[tenant_id].get("status") == "approved":
-        raise HTTPException(
-            status_code=409,
-            detail=f"Tenant '{tenant_id}' is already approved.",
-        )
+    async with update_store(settings) as store:
+        if tenant_id in store and store[tenant_id].get("status") == "approved":
+            raise HTTPException(
+                status_code=409,
+                detail=f"Tenant '{tenant_id}' is already approved.",
+            )
 
-    store[tenant_id] = {
-        "tenant_id": tenant_id,
-        "display_name": payload.display_name,
-        "sub_ca_csr": payload.sub_ca_csr,
-        "mqtt_bridge_csr": payload.mqtt_bridge_csr,
-        "wg_pubkey": payload.wg_pubkey,
-        "keycloak_url": payload.keycloak_url,
-        "status": "pending",
-        "requested_at": datetime.now(UTC).isoformat(),
-        "approved_at": None,
-        "rejected_at": None,
-        "rejected_reason": None,
-        "signed_cert": None,
-        "root_ca_cert": None,
-        "rabbitmq_url": None,
-        "rabbitmq_vhost": None,
-        "rabbitmq_user": None,
-        "mqtt_bridge_cert": None,
-        "cdm_idp_client_id": None,
-        "cdm_idp_client_secret": None,
-        "cdm_discovery_url": None,
-        "wg_server_pubkey": None,
-        "wg_server_endpoint": None,
-        "wg_client_ip": None,
-    }
-    await save_store(store, settings)
+        store[tenant_id] = {
+            "tenant_id": tenant_id,
+            "display_name": payload.display_name,
+            "sub_ca_csr": payload.sub_ca_csr,
+            "mqtt_bridge_csr": payload.mqtt_bridge_csr,
+            "wg_pubkey": payload.wg_pubkey,
+            "keycloak_url": payload.keycloak_url,
+            "status": "pending",
+            "requested_at": datetime.now(UTC).isoformat(),
+            "approved_at": None,
+            "rejected_at": None,
+            "rejected_reason": None,
+            "signed_cert": None,
+            "root_ca_cert": None,
+            "rabbitmq_url": None,
+            "rabbitmq_vhost": None,
+            "rabbitmq_user": None,
+            "mqtt_bridge_cert": None,
+            "cdm_idp_client_id": None,
+            "cdm_idp_client_secret": None,
+            "cdm_discovery_url": None,
+            "wg_server_pubkey": None,
+            "wg_server_endpoint": None,
+            "wg_client_ip": None,
+        }
 
     logger.info("JOIN request from tenant '%s' stored as pending.", tenant_id)
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=202,
         content={
             "status": "pending",
@@ -482,7 +483,7 @@ async def submit_join_request(
     "/join-requests",
     summary="List all JOIN requests (CDM admin only)",
 )
-async def list_join_requests(request: Request) -> JSONResponse:
+async def list_join_requests(request: Request) -> FastJSONResponse:
     """Return all JOIN requests (pending, approved, and rejected)."""
     _get_cdm_admin(request)
     settings: Settings = get_settings()
@@ -494,7 +495,7 @@ async def list_join_requests(request: Request) -> JSONResponse:
         key=lambda e: e.get("requested_at", ""),
         reverse=True,
     )
-    return JSONResponse({"join_requests": entries, "total": len(entries)})
+    return FastJSONResponse({"join_requests": entries, "total": len(entries)})
 
 
 @router.post(
@@ -505,7 +506,7 @@ async def approve_join_request(
     tenant_id: str,
     body: JoinApproveRequest,
     request: Request,
-) -> JSONResponse:
+) -> FastJSONResponse:
     """Sign the Sub-CA CSR, provision RabbitMQ, create Keycloak federation client.
 
     The Keycloak federation direction is:
@@ -628,25 +629,24 @@ async def approve_join_request(
         logger.error("Keycloak federation client creation failed for '%s': %s", tenant_id, exc)
 
     # ── 4. Persist the provisioning bundle ────────────────────────────────────
-    store = await load_store(settings)
-    store[tenant_id].update(
-        {
-            "status": "approved",
-            "approved_at": datetime.now(UTC).isoformat(),
-            "signed_cert": signed_cert,
-            "root_ca_cert": root_ca_cert,
-            "rabbitmq_url": rmq_url,
-            "rabbitmq_vhost": rmq_vhost,
-            "rabbitmq_user": rmq_mqtt_user,
-            "mqtt_bridge_cert": mqtt_bridge_cert,
-            "cdm_idp_client_id": cdm_idp_client_id,
-            "cdm_idp_client_secret": cdm_idp_client_secret,
-            "cdm_discovery_url": cdm_discovery_url,
-        }
-    )
-    await save_store(store, settings)
+    async with update_store(settings) as store:
+        store[tenant_id].update(
+            {
+                "status": "approved",
+                "approved_at": datetime.now(UTC).isoformat(),
+                "signed_cert": signed_cert,
+                "root_ca_cert": root_ca_cert,
+                "rabbitmq_url": rmq_url,
+                "rabbitmq_vhost": rmq_vhost,
+                "rabbitmq_user": rmq_mqtt_user,
+                "mqtt_bridge_cert": mqtt_bridge_cert,
+                "cdm_idp_client_id": cdm_idp_client_id,
+                "cdm_idp_client_secret": cdm_idp_client_secret,
+                "cdm_discovery_url": cdm_discovery_url,
+            }
+        )
 
-    return JSONResponse(
+    return FastJSONResponse(
         {
             "tenant_id": tenant_id,
             "status": "approved",
@@ -676,27 +676,28 @@ async def reject_join_request(
     tenant_id: str,
     body: JoinRejectRequest,
     request: Request,
-) -> JSONResponse:
+) -> FastJSONResponse:
     """Mark a pending JOIN request as rejected."""
     _get_cdm_admin(request)
     settings: Settings = get_settings()
 
-    entry = await _get_request(tenant_id, settings)
-    if entry["status"] == "approved":
-        raise HTTPException(status_code=409, detail="Cannot reject an already approved request.")
-
-    store = await load_store(settings)
-    store[tenant_id].update(
-        {
-            "status": "rejected",
-            "rejected_at": datetime.now(UTC).isoformat(),
-            "rejected_reason": body.reason or "Rejected by provider admin.",
-        }
-    )
-    await save_store(store, settings)
+    await _get_request(tenant_id, settings)
+    async with update_store(settings) as store:
+        # Re-checked under the store lock: an approval may have landed meanwhile.
+        if store[tenant_id]["status"] == "approved":
+            raise HTTPException(
+                status_code=409, detail="Cannot reject an already approved request."
+            )
+        store[tenant_id].update(
+            {
+                "status": "rejected",
+                "rejected_at": datetime.now(UTC).isoformat(),
+                "rejected_reason": body.reason or "Rejected by provider admin.",
+            }
+        )
 
     logger.info("JOIN request for tenant '%s' rejected: %s", tenant_id, body.reason)
-    return JSONResponse({"tenant_id": tenant_id, "status": "rejected"})
+    return FastJSONResponse({"tenant_id": tenant_id, "status": "rejected"})
 
 
 @router.get(
@@ -35,10 +35,11 @@ from fastapi.templating import Jinja2Templates
 
 from app.config import Settings
 from app.deps import get_settings
+from app.json_codec import FastJSONRoute
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/portal", tags=["portal"])
+router = APIRouter(prefix="/portal", tags=["portal"], route_class=FastJSONRoute)
 templates = Jinja2Templates(directory="app/templates")
 
 # ── Role definitions ─────────────────────────────────────────────────────────
@@ -0,0 +1,393 @@
+"""Telemetry read API – downsampled series from TimescaleDB.
+
+Routes
+──────
+  GET /devices/{device_id}/telemetry               → one device's series
+  GET /tenants/{tenant_id}/telemetry                → tenant-wide rollup or per device
+  GET /devices/{device_id}/latest                  → newest value of every metric
+  GET /tenants/{tenant_id}/telemetry/export         → raw rows as NDJSON / CSV / Arrow / Parquet
+
+Every route requires a portal session or an ``Authorization: Bearer`` access
+token of a tenant realm, validated against that realm's Keycloak userinfo
+endpoint, and a cdm admin / operator / viewer role.  The tenant is the realm
+of that credential: the ``tenant_id`` path or query parameter (optional on
+the device routes) must name it or is answered with 403.  Only platform
+admins (``cdm`` realm) may read any tenant.  Stored rows carry the same key:
+the broker consumer tags them with their vHost and the webhooks translate
+ThingsBoard's tenant UUID to the realm (:mod:`app.clients.tenant_map`).
+
+Both return ``time_bucket`` aggregates (avg / min / max / count) per bucket and
+metric.  Without an explicit ``bucket`` the width is chosen so each series has
+at most ``TELEMETRY_QUERY_MAX_POINTS`` buckets; whole-minute and whole-hour
+buckets are read from the 1m / 1h continuous aggregates instead of raw rows
+(see :mod:`app.clients.telemetry_query`).  Every query is filtered by the
+authorised tenant, so one tenant can never read another tenant's devices.
+
+``/latest`` is answered from the in-process latest-value table fed by the
+telemetry webhooks; a device not fully known there is loaded from TimescaleDB
+once and cached.
+
+``/export`` streams raw rows through a server-side cursor
+(:mod:`app.clients.telemetry_export`) with constant memory; the columnar
+``arrow`` / ``parquet`` formats (:mod:`app.clients.telemetry_arrow`) need
+pyarrow and answer 501 without it.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from collections.abc import AsyncIterator, Callable, Sequence
+from datetime import UTC, datetime, timedelta
+from functools import partial
+from typing import Any, Literal, cast
+
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.clients.latest_values import LatestValueCache
+from app.clients.telemetry_arrow import ArrowEncoder, ArrowUnavailableError, Compression
+from app.clients.telemetry_export import (
+    MEDIA_TYPES,
+    ExportFormat,
+    encode_csv,
+    encode_ndjson,
+    iter_export_batches,
+)
+from app.clients.telemetry_query import choose_bucket, query_buckets, query_latest
+from app.clients.timescaledb import TimescaleDBClient, TimescaleDBError
+from app.config import Settings
+from app.deps import get_latest_value_cache, get_settings, get_timescaledb_client
+from app.json_codec import FastJSONRoute
+from app.models import (
+    LatestTelemetryResponse,
+    LatestTelemetryValue,
+    TelemetryBucket,
+    TelemetryQueryResponse,
+)
+from app.routers.portal import ADMIN_ROLES, OPERATOR_ROLES, VIEWER_ROLES, _decode_jwt_payload
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["telemetry"], route_class=FastJSONRoute)
+
+_DEFAULT_RANGE = timedelta(hours=24)
+
+READER_ROLES = ADMIN_ROLES | OPERATOR_ROLES | VIEWER_ROLES
+_PLATFORM_REALM = "cdm"
+_REALM_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# ── Auth guard ───────────────────────────────────────────────────────────────
+
+
+async def require_telemetry_reader(
+    request: Request, settings: Settings = Depends(get_settings)
+) -> dict:
+    """Return the caller from a portal session or a Bearer token of its realm.
+
+    Raises:
+        HTTPException(401): No credentials, or Keycloak rejects the token.
+        HTTPException(403): No cdm admin / operator / viewer role.
+    """
+    user = request.session.get("user")
+    if not user:
+        auth = request.headers.get("Authorization", "")
+        if not auth.startswith("Bearer "):
+            raise HTTPException(status_code=401, detail="Authentication required")
+        token = auth[7:]
+        # The issuer names the realm; Keycloak then verifies the token for that realm.
+        claims = _decode_jwt_payload(token)
+        realm = str(claims.get("iss", "")).rpartition("/realms/")[2]
+        if not _REALM_RE.fullmatch(realm):
+            raise HTTPException(status_code=401, detail="Malformed token")
+        async with httpx.AsyncClient() as http:
+            resp = await http.get(
+                f"{settings.keycloak_url}/realms/{realm}/protocol/openid-connect/userinfo",
+                headers={"Authorization": f"Bearer {token}"},
+                timeout=10,
+            )
+        if not resp.is_success:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        roles = claims.get("realm_access", {}).get("roles", []) or claims.get("roles", [])
+        user = {
+            "realm": realm,
+            "roles": roles,
+            "preferred_username": claims.get("preferred_username", ""),
+        }
+    if not set(user.get("roles", [])) & READER_ROLES:
+        raise HTTPException(status_code=403, detail="Access denied – cdm role required")
+    return cast(dict, user)
+
+
+def _authorized_tenant(user: dict, tenant_id: str | None) -> str:
+    """Return the tenant *user* may read: its own realm, or any for platform admins."""
+    realm = user.get("realm")
+    platform_admin = realm == _PLATFORM_REALM and set(user.get("roles", [])) & ADMIN_ROLES
+    if tenant_id is None:
+        if platform_admin:
+            raise HTTPException(status_code=422, detail="tenant_id is required")
+        return str(realm)
+    if tenant_id != realm and not platform_admin:
+        raise HTTPException(status_code=403, detail=f"Access denied to tenant {tenant_id}")
+    return tenant_id
+
+
+async def _path_tenant(tenant_id: str, user: dict = Depends(require_telemetry_reader)) -> str:
+    return _authorized_tenant(user, tenant_id)
+
+
+async def _query_tenant(
+    tenant_id: str | None = Query(
+        None, description="Tenant owning the device; defaults to the caller's tenant"
+    ),
+    user: dict = Depends(require_telemetry_reader),
+) -> str:
+    return _authorized_tenant(user, tenant_id)
+
+
+def _time_range(start: datetime | None, end: datetime | None) -> tuple[datetime, datetime]:
+    end = end or datetime.now(UTC)
+    start = start or end - _DEFAULT_RANGE
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=UTC)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=UTC)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+
+def _bucket_width(
+    bucket: float | None, start: datetime, end: datetime, settings: Settings
+) -> timedelta:
+    max_points = settings.telemetry_query_max_points
+    if bucket is None:
+        return choose_bucket(start, end, max_points)
+    width = timedelta(seconds=bucket)
+    if (end - start) / width > max_points:
+        raise HTTPException(
+            status_code=400,
+            detail=f"bucket too small: range would yield more than {max_points} buckets",
+        )
+    return width
+
+
+async def _query(
+    tsdb: TimescaleDBClient,
+    settings: Settings,
+    tenant_id: str,
+    start: datetime | None,
+    end: datetime | None,
+    bucket: float | None,
+    device_ids: list[str] | None,
+    metrics: list[str] | None,
+    per_device: bool,
+) -> TelemetryQueryResponse:
+    start, end = _time_range(start, end)
+    width = _bucket_width(bucket, start, end, settings)
+    try:
+        source, rows = await query_buckets(
+            tsdb,
+            tenant_id,
+            start,
+            end,
+            width,
+            device_ids=device_ids,
+            metrics=metrics,
+            per_device=per_device,
+            use_aggregates=settings.tsdb_continuous_aggregates,
+        )
+    except TimescaleDBError as exc:
+        logger.error("Telemetry query for tenant %s failed: %s", tenant_id, exc)
+        raise HTTPException(status_code=503, detail=f"TimescaleDB query failed: {exc}") from exc
+    return TelemetryQueryResponse(
+        tenant_id=tenant_id,
+        start=start,
+        end=end,
+        bucket_seconds=width.total_seconds(),
+        source=source,
+        buckets=[TelemetryBucket(time=row.pop("bucket"), **row) for row in rows],
+    )
+
+
+@router.get(
+    "/devices/{device_id}/telemetry",
+    response_model=TelemetryQueryResponse,
+    summary="Downsampled telemetry of one device",
+)
+async def device_telemetry(
+    device_id: str,
+    tenant_id: str = Depends(_query_tenant),
+    start: datetime | None = Query(None, description="Inclusive; default end - 24 h"),
+    end: datetime | None = Query(None, description="Exclusive; default now"),
+    metric: list[str] | None = Query(None, description="Restrict to these metrics"),
+    bucket: float | None = Query(None, gt=0, description="Bucket width in seconds"),
+    tsdb: TimescaleDBClient = Depends(get_timescaledb_client),
+    settings: Settings = Depends(get_settings),
+) -> TelemetryQueryResponse:
+    """Return bucketed avg / min / max / count per metric for one device."""
+    result = await _query(
+        tsdb, settings, tenant_id, start, end, bucket, [device_id], metric, per_device=True
+    )
+    result.device_id = device_id
+    return result
+
+
+@router.get(
+    "/tenants/{tenant_id}/telemetry",
+    response_model=TelemetryQueryResponse,
+    summary="Downsampled telemetry aggregated over a tenant's devices",
+)
+async def tenant_telemetry(
+    tenant_id: str = Depends(_path_tenant),
+    start: datetime | None = Query(None, description="Inclusive; default end - 24 h"),
+    end: datetime | None = Query(None, description="Exclusive; default now"),
+    metric: list[str] | None = Query(None, description="Restrict to these metrics"),
+    device_id: list[str] | None = Query(None, description="Restrict to these devices"),
+    bucket: float | None = Query(None, gt=0, description="Bucket width in seconds"),
+    group_by: Literal["tenant", "device"] = Query(
+        "tenant", description="Roll up across devices, or one series per device"
+    ),
+    tsdb: TimescaleDBClient = Depends(get_timescaledb_client),
+    settings: Settings = Depends(get_settings),
+) -> TelemetryQueryResponse:
+    """Return bucketed avg / min / max / count per metric for a whole tenant."""
+    return await _query(
+        tsdb,
+        settings,
+        tenant_id,
+        start,
+        end,
+        bucket,
+        device_id,
+        metric,
+        per_device=group_by == "device",
+    )
+
+
+@router.get(
+    "/devices/{device_id}/latest",
+    response_model=LatestTelemetryResponse,
+    summary="Newest value of every metric of one device",
+    responses={404: {"description": "No telemetry for this device in the look-back window"}},
+)
+async def device_latest(
+    device_id: str,
+    tenant_id: str = Depends(_query_tenant),
+    metric: list[str] | None = Query(None, description="Restrict to these metrics"),
+    cache: LatestValueCache = Depends(get_latest_value_cache),
+    tsdb: TimescaleDBClient = Depends(get_timescaledb_client),
+    settings: Settings = Depends(get_settings),
+) -> LatestTelemetryResponse:
+    """Return the newest value per metric, from memory when possible."""
+    source = "cache"
+    values = cache.get(tenant_id, device_id)
+    if values is None:
+        source = "database"
+        try:
+            loaded = await query_latest(
+                tsdb,
+                tenant_id,
+                device_id,
+                timedelta(hours=settings.telemetry_latest_lookback_hours),
+            )
+        except TimescaleDBError as exc:
+            logger.error("Latest-value query for device %s failed: %s", device_id, exc)
+            raise HTTPException(
+                status_code=503, detail=f"TimescaleDB query failed: {exc}"
+            ) from exc
+        values = cache.merge(tenant_id, device_id, loaded)
+    if metric:
+        values = {name: v for name, v in values.items() if name in metric}
+    if not values:
+        raise HTTPException(status_code=404, detail=f"No telemetry for device {device_id}")
+    return LatestTelemetryResponse(
+        tenant_id=tenant_id,
+        device_id=device_id,
+        source=source,
+        values={name: LatestTelemetryValue(**v._asdict()) for name, v in values.items()},
+    )
+
+
+@router.get(
+    "/tenants/{tenant_id}/telemetry/export",
+    summary="Stream a tenant's raw telemetry as NDJSON, CSV, Arrow IPC or Parquet",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {media: {} for media in MEDIA_TYPES.values()}},
+        400: {"description": "Compression not supported by the format"},
+        501: {"description": "Columnar format requested but pyarrow is not installed"},
+        503: {"description": "TimescaleDB unreachable"},
+    },
+)
+async def export_telemetry(
+    tenant_id: str = Depends(_path_tenant),
+    start: datetime = Query(..., description="Inclusive"),
+    end: datetime | None = Query(None, description="Exclusive; default now"),
+    format: ExportFormat = Query("ndjson"),
+    compression: Compression = Query(
+        "zstd", description="Codec of the arrow / parquet formats (arrow: none, lz4, zstd)"
+    ),
+    metric: list[str] | None = Query(None, description="Restrict to these metrics"),
+    device_id: list[str] | None = Query(None, description="Restrict to these devices"),
+    tsdb: TimescaleDBClient = Depends(get_timescaledb_client),
+    settings: Settings = Depends(get_settings),
+) -> StreamingResponse:
+    """Stream every matching row, ordered by time, in constant memory."""
+    start, end = _time_range(start, end)
+    encode: Callable[[Sequence[Any]], bytes] = encode_ndjson
+    header: Callable[[Sequence[Any]], bytes] = encode_ndjson
+    finish: Callable[[], bytes] = bytes
+    if format == "csv":
+        encode, header = encode_csv, partial(encode_csv, header=True)
+    elif format in ("arrow", "parquet"):
+        try:
+            encoder = ArrowEncoder(format, compression)
+        except ArrowUnavailableError as exc:
+            raise HTTPException(status_code=501, detail=str(exc)) from exc
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        encode = header = encoder.encode
+        finish = encoder.close
+
+    batches = iter_export_batches(
+        tsdb,
+        tenant_id,
+        start,
+        end,
+        device_ids=device_id,
+        metrics=metric,
+        batch_rows=settings.telemetry_export_batch_rows,
+    )
+    # Fetch the first batch up front so an unreachable database is still a 503.
+    try:
+        first: Sequence[Any] = await anext(batches, [])
+    except TimescaleDBError as exc:
+        logger.error("Telemetry export for tenant %s failed: %s", tenant_id, exc)
+        raise HTTPException(status_code=503, detail=f"TimescaleDB query failed: {exc}") from exc
+
+    async def body() -> AsyncIterator[bytes]:
+        rows = len(first)
+        try:
+            yield header(first)
+            async for batch in batches:
+                rows += len(batch)
+                yield encode(batch)
+            yield finish()
+        except TimescaleDBError as exc:
+            # Headers are already sent; a truncated body is all that can signal it.
+            logger.error(
+                "Telemetry export for tenant %s aborted after %d row(s): %s", tenant_id, rows, exc
+            )
+            raise
+        finally:
+            await batches.aclose()
+        logger.info("Exported %d telemetry row(s) of tenant %s.", rows, tenant_id)
+
+    filename = f"telemetry-{tenant_id}-{start:%Y%m%dT%H%M%S}.{format}"
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
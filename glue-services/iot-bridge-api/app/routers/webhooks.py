@@ -12,21 +12,70 @@ On receipt, the service:
 
 POST /webhooks/thingsboard/telemetry receives POST_TELEMETRY_REQUEST events and
 writes the device metrics to TimescaleDB with tenant_id and device_id tags for
-multi-tenant data isolation.
+multi-tenant data isolation.  The tenant_id stored is the tenant's realm, mapped
+from ThingsBoard's tenant UUID by :mod:`app.clients.tenant_map`.
+POST /webhooks/thingsboard/telemetry/batch accepts many such events at once
+(JSON array or NDJSON), and
+POST /webhooks/thingsboard/telemetry/backfill replays historical device data
+with its original timestamps.  Rows pass through the process-wide write-behind
+buffer (:mod:`app.clients.telemetry_buffer`) so concurrent webhooks share one
+batched insert.  Telemetry, backfills included, is charged to per-tenant token
+buckets (:mod:`app.clients.tenant_quota`); a tenant over its quota gets 429, and rows
+whose write is rejected are refunded.  Accepted rows also refresh the in-process latest-value table
+(:mod:`app.clients.latest_values`).  Live events ThingsBoard retries after a
+timeout – and backfill events written before a retried backfill was cut off –
+are recognised by :mod:`app.clients.telemetry_dedup` and answered with
+``duplicate`` instead of being written twice.  :func:`message_rows` applies the
+same decoding to messages of the RabbitMQ consumer
+(:mod:`app.clients.telemetry_consumer`).
+
+The opt-in POST /webhooks/thingsboard/telemetry/raw skips model validation and
+builds ``device_telemetry`` column tuples straight from the body.
 """
 
 from __future__ import annotations
 
+import asyncio
+import codecs
+import json
 import logging
+from collections import Counter
+from collections.abc import AsyncIterator, Iterator, Mapping, Sequence
+from datetime import UTC, datetime, timedelta
+from typing import Any, NamedTuple
 
 import httpx
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from pydantic import ValidationError
 
+from app import json_codec
 from app.clients.hawkbit import HawkBitClient, HawkBitError
-from app.clients.timescaledb import TimescaleDBClient, TimescaleDBError
+from app.clients.latest_values import LatestValueCache
+from app.clients.telemetry_buffer import (
+    SubmitStatus,
+    TelemetryBuffer,
+    TelemetryOverloadedError,
+)
+from app.clients.telemetry_dedup import DuplicateFilter, DuplicateInFlightError, message_key
+from app.clients.tenant_map import TenantMap
+from app.clients.tenant_quota import TenantQuota, TenantThrottledError
+from app.clients.timescaledb import MetricRow, TimescaleDBClient, TimescaleDBError
 from app.clients.wireguard import WireGuardConfig
-from app.deps import get_hawkbit_client, get_timescaledb_client, get_wg_config
+from app.config import Settings
+from app.deps import (
+    get_duplicate_filter,
+    get_hawkbit_client,
+    get_latest_value_cache,
+    get_settings,
+    get_telemetry_buffer,
+    get_tenant_map,
+    get_tenant_quota,
+    get_timescaledb_client,
+    get_wg_config,
+)
+from app.json_codec import FastJSONRoute
 from app.models import (
+    TelemetryBatchResponse,
     TelemetryWebhookResponse,
     ThingsboardWebhookEvent,
     WebhookResponse,
@@ -34,7 +83,7 @@ from app.models import (
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/webhooks", tags=["webhooks"])
+router = APIRouter(prefix="/webhooks", tags=["webhooks"], route_class=FastJSONRoute)
 
 
 def _extract_device_id(event: ThingsboardWebhookEvent) -> str | None:
@@ -85,7 +134,8 @@ async def thingsboard_webhook(
 
     if existing:
         logger.info("Device %s already provisioned in hawkBit – skipping.", device_id)
-        wg_ip = wg.allocate_ip(device_id)  # idempotent – returns existing allocation
+        # Idempotent – returns the existing allocation; the peers lock is taken off the loop.
+        wg_ip = await asyncio.to_thread(wg.allocate_ip, device_id)
         return WebhookResponse(
             status="already_provisioned",
             device_id=device_id,
@@ -107,7 +157,7 @@ async def thingsboard_webhook(
     logger.info("Created hawkBit target for device %s.", device_id)
 
     # ── Allocate WireGuard IP ────────────────────────────────────────────────
-    wg_ip = wg.allocate_ip(device_id)
+    wg_ip = await asyncio.to_thread(wg.allocate_ip, device_id)
     logger.info("Assigned WireGuard IP %s to device %s.", wg_ip, device_id)
 
     return WebhookResponse(
@@ -117,79 +167,786 @@ async def thingsboard_webhook(
     )
 
 
-@router.post(
-    "/thingsboard/telemetry",
-    response_model=TelemetryWebhookResponse,
-    summary="ThingsBoard device telemetry webhook",
-    description=(
-        "Receives POST_TELEMETRY_REQUEST events from the ThingsBoard Rule Engine "
-        "and writes the metrics to TimescaleDB with tenant_id and device_id columns "
-        "to enforce multi-tenant data isolation."
-    ),
-)
-async def thingsboard_telemetry(
+def _parse_ts(value: Any) -> datetime | None:
+    """Convert a ThingsBoard ``ts`` (epoch milliseconds, int or string) to a datetime."""
+    try:
+        return datetime.fromtimestamp(int(value) / 1000, tz=UTC)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def _samples(
+    data: dict[str, Any] | list[Any] | str, default_time: datetime | None
+) -> Iterator[tuple[datetime | None, dict[str, Any]]]:
+    """Yield ``(time, values)`` pairs from the supported ThingsBoard data shapes.
+
+    ``{"ts": ..., "values": {...}}`` samples and lists of them carry their own
+    timestamp; a flat ``{"key": value}`` dict is stamped with *default_time*.
+    """
+    items = data if isinstance(data, list) else [data]
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        values = item.get("values")
+        if "ts" in item and isinstance(values, dict):
+            yield _parse_ts(item["ts"]) or default_time, values
+        else:
+            yield default_time, item
+
+
+def _telemetry_rows(
     event: ThingsboardWebhookEvent,
-    tsdb: TimescaleDBClient = Depends(get_timescaledb_client),
-) -> TelemetryWebhookResponse:
-    """Write device telemetry from ThingsBoard to TimescaleDB.
+    use_metadata_ts: bool = False,
+    tenants: TenantMap | None = None,
+) -> tuple[TelemetryWebhookResponse, list[dict[str, Any]]]:
+    """Turn one telemetry event into metric rows.
 
-    Extracts tenant and device identifiers from the ThingsBoard metadata and
-    stores them as column values in ``device_telemetry`` for per-tenant isolation.
+    Returns the per-event response (``ignored`` with a reason when nothing can be
+    written) together with the rows to write, one per field in ``event.data``.
+    Samples in ``ts``/``values`` form keep their device timestamp; with
+    *use_metadata_ts* flat payloads are stamped with the message's metadata ``ts``
+    instead of the time of the write.  With *tenants* the ThingsBoard tenant id
+    is translated to the tenant's realm (:mod:`app.clients.tenant_map`).
     """
     device_id = _extract_device_id(event)
     if not device_id:
         logger.warning("Telemetry webhook received with no identifiable device_id: %s", event)
-        return TelemetryWebhookResponse(
-            status="ignored",
-            reason="No device_id found in event metadata",
+        return (
+            TelemetryWebhookResponse(
+                status="ignored",
+                reason="No device_id found in event metadata",
+            ),
+            [],
         )
 
-    tenant_id = str(event.metadata.get("tenantId", "unknown"))
+    tb_tenant = event.metadata.get("tenantId")
+    tenant_id = tenants.resolve(tb_tenant) if tenants else str(tb_tenant or "unknown")
 
-    # ── Build metric rows from payload data ──────────────────────────────────
-    data = event.data if isinstance(event.data, dict) else {}
+    default_time = _parse_ts(event.metadata.get("ts")) if use_metadata_ts else None
     rows = [
         {
+            "time": ts,
             "tenant_id": tenant_id,
             "device_id": device_id,
             "metric_name": key,
             "value": float(val) if isinstance(val, (int, float)) else None,
             "tags": {"raw_type": type(val).__name__},
         }
-        for key, val in data.items()
+        for ts, values in _samples(event.data, default_time)
+        for key, val in values.items()
     ]
     if not rows:
-        return TelemetryWebhookResponse(
-            status="ignored",
+        return (
+            TelemetryWebhookResponse(
+                status="ignored",
+                device_id=device_id,
+                tenant_id=tenant_id,
+                reason="No fields in telemetry payload",
+            ),
+            [],
+        )
+    return (
+        TelemetryWebhookResponse(
+            status="written",
             device_id=device_id,
             tenant_id=tenant_id,
-            reason="No fields in telemetry payload",
-        )
+            points_written=len(rows),
+        ),
+        rows,
+    )
+
+
+def _topic_device(routing_key: str, headers: Mapping[str, Any]) -> str | None:
+    """Device of a plain MQTT payload, from a ``deviceId`` header or the topic.
+
+    The RabbitMQ MQTT plugin maps ``/`` to ``.``, so a device publishing to
+    ``devices/<device>/telemetry`` arrives as ``devices.<device>.telemetry``.
+    ThingsBoard's ``me`` placeholder (``v1/devices/me/telemetry``) names no device.
+    """
+    for key in ("deviceId", "device_id", "deviceName"):
+        value = headers.get(key)
+        if value:
+            return value.decode() if isinstance(value, bytes) else str(value)
+    parts = routing_key.split(".")
+    if len(parts) >= 2 and parts[-1] == "telemetry" and parts[-2] not in ("", "me"):
+        return parts[-2]
+    return None
+
+
+def message_rows(
+    body: bytes,
+    tenant_id: str,
+    routing_key: str = "",
+    headers: Mapping[str, Any] | None = None,
+) -> list[dict[str, Any]]:
+    """Turn one broker message into metric rows for :mod:`app.clients.telemetry_consumer`.
+
+    The body is a ThingsBoard telemetry event, a JSON array of them or NDJSON.
+    Anything without a ``data`` envelope is a plain MQTT payload (``{"cpu": 5}``
+    or ``ts``/``values`` samples) of the device named by the message *headers*
+    or *routing_key*.  The tenant is the vHost the message was consumed from,
+    whatever the event metadata claims, and flat payloads are stamped with the
+    metadata ``ts`` because a message may sit in the queue for a while.
+
+    Raises:
+        ValueError: The body is not valid JSON, not a telemetry event, names no
+            device or carries no fields – the consumer dead-letters it.
+    """
+    try:
+        decoded = json_codec.loads(body)
+    except ValueError:
+        decoded = [json_codec.loads(line) for line in body.splitlines() if line.strip()]
+    rows: list[dict[str, Any]] = []
+    for value in decoded if isinstance(decoded, list) else [decoded]:
+        if isinstance(value, dict) and "data" in value:
+            event = ThingsboardWebhookEvent.model_validate(value)
+        else:
+            device_id = _topic_device(routing_key, headers or {})
+            if device_id is None:
+                raise ValueError(f"no device in routing key {routing_key!r} or headers")
+            event = ThingsboardWebhookEvent(
+                msgType="POST_TELEMETRY_REQUEST", metadata={"deviceName": device_id}, data=value
+            )
+        event.metadata["tenantId"] = tenant_id
+        event_rows = _telemetry_rows(event, use_metadata_ts=True)[1]
+        if not event_rows:
+            raise ValueError("message carries no device or no telemetry fields")
+        rows.extend(event_rows)
+    return rows
+
 
-    # ── Write to TimescaleDB ─────────────────────────────────────────────────
+async def _submit_rows(
+    buffer: TelemetryBuffer, rows: Sequence[MetricRow], what: str
+) -> SubmitStatus:
+    """Hand *rows* to the write-behind buffer, mapping DB failures to HTTP 503.
+
+    Rows the buffer refuses to admit are shed with 429 (503 while the database
+    is failing) and a ``Retry-After`` header so the ThingsBoard REST node backs off.
+    """
     try:
-        await tsdb.write_metrics(rows)
+        return await buffer.submit(rows)
+    except TelemetryOverloadedError as exc:
+        raise _overloaded(exc) from exc
     except TimescaleDBError as exc:
-        logger.error(
-            "Failed to write telemetry for device %s (tenant %s) to TimescaleDB: %s",
-            device_id,
-            tenant_id,
-            exc,
-        )
+        logger.error("Failed to write telemetry for %s to TimescaleDB: %s", what, exc)
         raise HTTPException(
             status_code=503,
             detail=f"TimescaleDB write failed: {exc}",
         ) from exc
 
+
+def _charge_quota(quota: TenantQuota, usage: Mapping[str, int], requests: int = 1) -> None:
+    """Charge ``tenant → points`` to the per-tenant quotas, mapping throttling to 429."""
+    try:
+        quota.acquire_many(usage, requests)
+    except TenantThrottledError as exc:
+        logger.info("Throttled telemetry of tenant %s: %s", exc.tenant_id, exc)
+        raise HTTPException(
+            status_code=429,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+
+
+async def _submit_charged(
+    buffer: TelemetryBuffer,
+    quota: TenantQuota,
+    usage: Mapping[str, int],
+    rows: Sequence[MetricRow],
+    what: str,
+) -> SubmitStatus:
+    """Charge *usage* to the tenant quotas, then submit *rows*; refunded if the write fails."""
+    _charge_quota(quota, usage)
+    try:
+        return await _submit_rows(buffer, rows, what)
+    except BaseException:
+        quota.release_many(usage)
+        raise
+
+
+def _is_duplicate(dedup: DuplicateFilter, key: int | None) -> bool:
+    """``dedup.seen(key)``, answering 409 while the same message is still being written.
+
+    The original write may yet fail, so the retry must not be acknowledged now.
+    """
+    try:
+        return dedup.seen(key)
+    except DuplicateInFlightError as exc:
+        raise HTTPException(
+            status_code=409, detail=str(exc), headers={"Retry-After": str(exc.retry_after)}
+        ) from exc
+
+
+def _mark_duplicate(result: TelemetryWebhookResponse) -> TelemetryWebhookResponse:
+    result.status = "duplicate"
+    result.points_written = 0
+    result.reason = "Message already received within the duplicate-detection window"
+    return result
+
+
+def _overloaded(exc: TelemetryOverloadedError) -> HTTPException:
+    return HTTPException(
+        status_code=503 if exc.writer_failing else 429,
+        detail=str(exc),
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@router.post(
+    "/thingsboard/telemetry",
+    response_model=TelemetryWebhookResponse,
+    summary="ThingsBoard device telemetry webhook",
+    description=(
+        "Receives POST_TELEMETRY_REQUEST events from the ThingsBoard Rule Engine "
+        "and writes the metrics to TimescaleDB with tenant_id and device_id columns "
+        "to enforce multi-tenant data isolation."
+    ),
+)
+async def thingsboard_telemetry(
+    event: ThingsboardWebhookEvent,
+    buffer: TelemetryBuffer = Depends(get_telemetry_buffer),
+    quota: TenantQuota = Depends(get_tenant_quota),
+    latest: LatestValueCache = Depends(get_latest_value_cache),
+    dedup: DuplicateFilter = Depends(get_duplicate_filter),
+    tenants: TenantMap = Depends(get_tenant_map),
+    x_message_id: str | None = Header(default=None),
+) -> TelemetryWebhookResponse:
+    """Write device telemetry from ThingsBoard to TimescaleDB.
+
+    Extracts tenant and device identifiers from the ThingsBoard metadata and
+    stores them as column values in ``device_telemetry`` for per-tenant isolation;
+    the tenant is stored as its realm, the key the read API authorises against.
+    """
+    result, rows = _telemetry_rows(event, tenants=tenants)
+    if not rows:
+        return result
+
+    key = message_key(
+        str(result.tenant_id),
+        str(result.device_id),
+        event.metadata,
+        json_codec.dumps(event.data),
+        x_message_id,
+    )
+    if _is_duplicate(dedup, key):
+        return _mark_duplicate(result)
+    try:
+        # ── Write to TimescaleDB (batched by the write-behind buffer) ────────
+        result.status = await _submit_charged(
+            buffer,
+            quota,
+            {str(result.tenant_id): len(rows)},
+            rows,
+            f"device {result.device_id} (tenant {result.tenant_id})",
+        )
+    except BaseException:
+        dedup.forget([key])  # let the retry of a rejected message through
+        raise
+    dedup.commit([key])
+    latest.update(rows)
     logger.debug(
-        "Wrote %d metric(s) for device %s (tenant %s) to TimescaleDB.",
+        "%s %d metric(s) for device %s (tenant %s).",
+        result.status.capitalize(),
         len(rows),
-        device_id,
-        tenant_id,
+        result.device_id,
+        result.tenant_id,
     )
+    return result
+
+
+# ── Raw telemetry fast path ───────────────────────────────────────────────────
+
+# Pre-encoded JSONB tags of the numeric types the raw path keeps (bool before int).
+_RAW_TAGS: dict[type, bytes] = {
+    t: json_codec.dumps({"raw_type": t.__name__}) for t in (bool, int, float)
+}
+
+
+class RawEvent(NamedTuple):
+    """One telemetry event decoded by :func:`raw_event_records`."""
+
+    device_id: str | None  # None when the metadata does not identify the device
+    tenant_id: str
+    metadata: dict[str, Any]
+    records: list[tuple[Any, ...]]
+
+
+def raw_event_records(body: bytes, now: datetime, tenants: TenantMap | None = None) -> RawEvent:
+    """Decode one telemetry event straight into ``device_telemetry`` column tuples.
+
+    Single pass over the parsed body without building a ``ThingsboardWebhookEvent``
+    or row dicts.  Only numeric (and boolean) fields are kept.  Flat payloads are
+    stamped with *now*, ``ts``/``values`` samples with their device timestamp.
+    With *tenants* the ThingsBoard tenant id is translated to the tenant's realm.
+
+    Raises:
+        ValueError: The body is not a JSON object.
+    """
+    event = json_codec.loads(body)
+    if not isinstance(event, dict):
+        raise ValueError("telemetry event must be a JSON object")
+    meta = event.get("metadata")
+    if not isinstance(meta, dict):
+        meta = {}
+    tb_tenant = meta.get("tenantId")
+    tenant_id = tenants.resolve(tb_tenant) if tenants else str(tb_tenant or "unknown")
+    device_id = next(
+        (str(meta[k]) for k in ("deviceId", "clientId", "deviceName") if meta.get(k)), None
+    )
+    if device_id is None:
+        return RawEvent(None, tenant_id, meta, [])
+
+    data = event.get("data")
+    records: list[tuple[Any, ...]] = []
+    for item in data if isinstance(data, list) else [data]:
+        if not isinstance(item, dict):
+            continue
+        values = item.get("values")
+        if "ts" in item and isinstance(values, dict):
+            ts = _parse_ts(item["ts"]) or now
+        else:
+            ts, values = now, item
+        for key, val in values.items():
+            tags = _RAW_TAGS.get(type(val))
+            if tags is not None:
+                records.append((ts, tenant_id, device_id, key, float(val), tags))
+    return RawEvent(device_id, tenant_id, meta, records)
+
+
+@router.post(
+    "/thingsboard/telemetry/raw",
+    response_model=TelemetryWebhookResponse,
+    summary="ThingsBoard device telemetry webhook (raw fast path)",
+    description=(
+        "Opt-in (TELEMETRY_RAW_WEBHOOK_ENABLED) variant of /webhooks/thingsboard/telemetry "
+        "for high event rates.  The body is not validated against the event model; "
+        "only numeric and boolean fields are written."
+    ),
+    responses={404: {"description": "Raw webhook disabled"}},
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    "schema": {"$ref": "#/components/schemas/ThingsboardWebhookEvent"}
+                }
+            },
+            "required": True,
+        }
+    },
+)
+async def thingsboard_telemetry_raw(
+    request: Request,
+    buffer: TelemetryBuffer = Depends(get_telemetry_buffer),
+    quota: TenantQuota = Depends(get_tenant_quota),
+    latest: LatestValueCache = Depends(get_latest_value_cache),
+    settings: Settings = Depends(get_settings),
+    dedup: DuplicateFilter = Depends(get_duplicate_filter),
+    tenants: TenantMap = Depends(get_tenant_map),
+    x_message_id: str | None = Header(default=None),
+) -> TelemetryWebhookResponse:
+    """Write one event's numeric metrics as column tuples through the write buffer."""
+    if not settings.telemetry_raw_webhook_enabled:
+        raise HTTPException(status_code=404, detail="Raw telemetry webhook is disabled")
+    body = await request.body()
+    try:
+        device_id, tenant_id, meta, records = raw_event_records(body, datetime.now(UTC), tenants)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Malformed telemetry event: {exc}") from exc
+    if device_id is None:
+        return TelemetryWebhookResponse(
+            status="ignored", reason="No device_id found in event metadata"
+        )
+    if not records:
+        return TelemetryWebhookResponse(
+            status="ignored",
+            device_id=device_id,
+            tenant_id=tenant_id,
+            reason="No numeric fields in telemetry payload",
+        )
+
+    # A retry resends the same bytes, so the body stands in for the payload.
+    key = message_key(tenant_id, device_id, meta, body, x_message_id)
+    if _is_duplicate(dedup, key):
+        return _mark_duplicate(
+            TelemetryWebhookResponse(status="duplicate", device_id=device_id, tenant_id=tenant_id)
+        )
+    try:
+        status = await _submit_charged(
+            buffer,
+            quota,
+            {tenant_id: len(records)},
+            records,
+            f"device {device_id} (tenant {tenant_id})",
+        )
+    except BaseException:
+        dedup.forget([key])
+        raise
+    dedup.commit([key])
+    latest.update_records(records)
     return TelemetryWebhookResponse(
-        status="written",
-        device_id=device_id,
-        tenant_id=tenant_id,
+        status=status, device_id=device_id, tenant_id=tenant_id, points_written=len(records)
+    )
+
+
+# ── Batched telemetry (JSON array / NDJSON) ───────────────────────────────────
+
+# Upper bound for a single event while it is being reassembled from the stream.
+_MAX_EVENT_BYTES = 1024 * 1024
+
+# Streamed arrays need raw_decode(), which only the stdlib decoder offers.
+_json_decoder = json.JSONDecoder()
+
+# The streamed endpoints read the raw body, so document it for OpenAPI by hand.
+_STREAMED_EVENTS_BODY: dict[str, Any] = {
+    "requestBody": {
+        "content": {
+            "application/json": {
+                "schema": {
+                    "type": "array",
+                    "items": {"$ref": "#/components/schemas/ThingsboardWebhookEvent"},
+                }
+            },
+            "application/x-ndjson": {"schema": {"type": "string"}},
+        },
+        "required": True,
+    }
+}
+
+
+def _exceeds_event_limit(text: str) -> bool:
+    """Whether *text* takes more than ``_MAX_EVENT_BYTES`` bytes in the UTF-8 body."""
+    # A character is 1–4 bytes, so only a long text has to be encoded to tell.
+    return len(text) > _MAX_EVENT_BYTES or (
+        4 * len(text) > _MAX_EVENT_BYTES and len(text.encode()) > _MAX_EVENT_BYTES
+    )
+
+
+async def _iter_ndjson(chunks: AsyncIterator[str]) -> AsyncIterator[Any]:
+    """Yield one decoded value (or the ``ValueError`` it raised) per NDJSON line."""
+    pending = ""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split("\n")
+        if _exceeds_event_limit(pending):
+            raise ValueError(f"NDJSON line exceeds {_MAX_EVENT_BYTES} bytes")
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json_codec.loads(line)
+                except ValueError as exc:
+                    yield exc
+    if pending.strip():
+        try:
+            yield json_codec.loads(pending)
+        except ValueError as exc:
+            yield exc
+
+
+async def _iter_json_array(chunks: AsyncIterator[str], head: str) -> AsyncIterator[Any]:
+    """Yield the elements of a streamed top-level JSON array one at a time.
+
+    Only the element currently being decoded is held in memory.  Raises
+    ``ValueError`` if the body is not a well-formed array.
+    """
+    buf = head.lstrip()[1:]  # drop the opening "["
+    expect_comma = False
+    exhausted = False
+    while True:
+        buf = buf.lstrip()
+        if buf.startswith("]"):
+            if buf[1:].strip():
+                raise ValueError("Unexpected data after the closing ']'")
+            async for chunk in chunks:
+                if chunk.strip():
+                    raise ValueError("Unexpected data after the closing ']'")
+            return
+        if expect_comma and buf:
+            if not buf.startswith(","):
+                raise ValueError("Expected ',' between array elements")
+            buf = buf[1:].lstrip()
+            expect_comma = False
+        if buf and not expect_comma:
+            try:
+                value, end = _json_decoder.raw_decode(buf)
+            except ValueError:
+                end = 0  # element (probably) split across chunks – read more below
+            else:
+                # A number ending the buffer may go on in the next chunk ("12" + "34").
+                if end == len(buf) and not exhausted and not isinstance(value, dict | list | str):
+                    end = 0
+            if end:
+                yield value
+                buf = buf[end:]
+                expect_comma = True
+                continue
+            if _exceeds_event_limit(buf):
+                raise ValueError(f"Array element exceeds {_MAX_EVENT_BYTES} bytes")
+        if exhausted:
+            raise ValueError("Truncated or malformed JSON array")
+        try:
+            buf += await anext(chunks)
+        except StopAsyncIteration:
+            exhausted = True
+
+
+async def _iter_events(request: Request) -> AsyncIterator[Any]:
+    """Stream decoded values from a JSON-array or NDJSON request body.
+
+    The body format is detected from its first non-whitespace character, so the
+    endpoint accepts ``application/json`` and ``application/x-ndjson`` alike.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    async def text_chunks() -> AsyncIterator[str]:
+        async for raw in request.stream():
+            if raw:
+                yield decoder.decode(raw)
+        yield decoder.decode(b"", final=True)
+
+    chunks = text_chunks()
+    head = ""
+    async for chunk in chunks:
+        head += chunk
+        if head.strip():
+            break
+    if head.lstrip().startswith("["):
+        async for value in _iter_json_array(chunks, head):
+            yield value
+        return
+
+    async def replay() -> AsyncIterator[str]:
+        yield head
+        async for chunk in chunks:
+            yield chunk
+
+    async for value in _iter_ndjson(replay()):
+        yield value
+
+
+async def _iter_event_rows(
+    request: Request,
+    results: list[TelemetryWebhookResponse],
+    use_metadata_ts: bool = False,
+    dedup: DuplicateFilter | None = None,
+    keys: list[int | None] | None = None,
+    tenants: TenantMap | None = None,
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Yield the metric rows of each streamed event, appending its status to *results*.
+
+    With *dedup*, events already written yield no rows and are reported as
+    ``duplicate``; the others are reserved in the filter and their keys appended
+    to *keys* for the caller to commit or forget.  An event still being written
+    by another request aborts the stream with 409; a repeat within the stream
+    itself is reported as ``duplicate``.
+    """
+    reserved: set[int] = set()
+    async for value in _iter_events(request):
+        if isinstance(value, ValueError):
+            results.append(
+                TelemetryWebhookResponse(status="invalid", reason=f"Malformed JSON: {value}")
+            )
+            continue
+        try:
+            event = ThingsboardWebhookEvent.model_validate(value)
+        except ValidationError as exc:
+            results.append(
+                TelemetryWebhookResponse(
+                    status="invalid",
+                    reason=f"Invalid event: {exc.error_count()} validation error(s)",
+                )
+            )
+            continue
+        result, event_rows = _telemetry_rows(
+            event, use_metadata_ts=use_metadata_ts, tenants=tenants
+        )
+        results.append(result)
+        if event_rows and dedup is not None:
+            key = message_key(
+                str(result.tenant_id),
+                str(result.device_id),
+                event.metadata,
+                json_codec.dumps(event.data),
+            )
+            if key in reserved or _is_duplicate(dedup, key):
+                _mark_duplicate(result)
+                continue
+            if key is not None:
+                reserved.add(key)
+            if keys is not None:
+                keys.append(key)
+        yield event_rows
+
+
+@router.post(
+    "/thingsboard/telemetry/batch",
+    response_model=TelemetryBatchResponse,
+    summary="ThingsBoard batched telemetry webhook",
+    description=(
+        "Bulk variant of /webhooks/thingsboard/telemetry.  Accepts a JSON array or "
+        "an NDJSON stream of ThingsBoard telemetry events, parses them incrementally "
+        "and writes all resulting metric rows to TimescaleDB in a single batch."
+    ),
+    openapi_extra=_STREAMED_EVENTS_BODY,
+)
+async def thingsboard_telemetry_batch(
+    request: Request,
+    buffer: TelemetryBuffer = Depends(get_telemetry_buffer),
+    quota: TenantQuota = Depends(get_tenant_quota),
+    latest: LatestValueCache = Depends(get_latest_value_cache),
+    dedup: DuplicateFilter = Depends(get_duplicate_filter),
+    tenants: TenantMap = Depends(get_tenant_map),
+) -> TelemetryBatchResponse:
+    """Write a batch of ThingsBoard telemetry events in one go.
+
+    The batch counts as one request for every tenant it contains and is
+    rejected as a whole if any of them is over quota.  Events seen before are
+    reported as ``duplicate`` and skipped.
+    """
+    # Shed before reading a potentially large body.
+    try:
+        buffer.check_admission()
+    except TelemetryOverloadedError as exc:
+        raise _overloaded(exc) from exc
+    results: list[TelemetryWebhookResponse] = []
+    rows: list[dict[str, Any]] = []
+    keys: list[int | None] = []
+    try:
+        try:
+            async for event_rows in _iter_event_rows(
+                request, results, dedup=dedup, keys=keys, tenants=tenants
+            ):
+                rows.extend(event_rows)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"Malformed batch body: {exc}") from exc
+
+        if not rows:
+            duplicate = any(result.status == "duplicate" for result in results)
+            return TelemetryBatchResponse(
+                status="duplicate" if duplicate else "ignored", events=results
+            )
+
+        status = await _submit_charged(
+            buffer,
+            quota,
+            Counter(row["tenant_id"] for row in rows),
+            rows,
+            f"batch of {len(results)} event(s)",
+        )
+    except BaseException:
+        dedup.forget(keys)
+        raise
+    dedup.commit(keys)
+    latest.update(rows)
+    for result in results:
+        if result.status == "written":
+            result.status = status
+    logger.debug("Batch: %d event(s), %d metric(s) %s.", len(results), len(rows), status)
+    return TelemetryBatchResponse(
+        status=status,
+        events=results,
         points_written=len(rows),
     )
+
+
+@router.post(
+    "/thingsboard/telemetry/backfill",
+    response_model=TelemetryBatchResponse,
+    summary="Historical telemetry backfill",
+    description=(
+        "Replays buffered device telemetry with its original timestamps "
+        "(ThingsBoard ``ts``/``values`` samples, falling back to the metadata ``ts``).  "
+        "Accepts the same JSON-array / NDJSON bodies as the batch endpoint, streams "
+        "the rows straight to TimescaleDB and writes them sorted by time, one "
+        "hypertable chunk at a time."
+    ),
+    openapi_extra=_STREAMED_EVENTS_BODY,
+)
+async def thingsboard_telemetry_backfill(
+    request: Request,
+    tsdb: TimescaleDBClient = Depends(get_timescaledb_client),
+    settings: Settings = Depends(get_settings),
+    quota: TenantQuota = Depends(get_tenant_quota),
+    dedup: DuplicateFilter = Depends(get_duplicate_filter),
+    tenant_map: TenantMap = Depends(get_tenant_map),
+) -> TelemetryBatchResponse:
+    """Stream a historical backlog into TimescaleDB, bypassing the write buffer.
+
+    Rows are charged to the tenant quotas event by event as they stream in
+    (one request per tenant, then points only), so a backlog larger than the
+    burst is cut off with 429 part-way.  Windows written before that stay
+    written and their events are remembered by the duplicate filter: the
+    client retries the same body after ``Retry-After`` and only the rest is
+    written.  Rows charged but not written when the request fails are refunded,
+    as is the request of a tenant none of whose rows were written.
+    """
+    results: list[TelemetryWebhookResponse] = []
+    tenants: set[str] = set()
+    # (rows yielded once the event is through, key) of events not yet completely
+    # written; a window can be flushed part-way through an event.  Forgotten on failure.
+    pending: list[tuple[int, int | None]] = []
+    # (first row, rows yielded once through, tenant) of charged events not yet written.
+    charged: list[tuple[int, int, str]] = []
+    written_tenants: set[str] = set()
+    yielded = 0
+
+    async def rows() -> AsyncIterator[dict[str, Any]]:
+        nonlocal yielded
+        keys: list[int | None] = []
+        async for event_rows in _iter_event_rows(
+            request, results, use_metadata_ts=True, dedup=dedup, keys=keys, tenants=tenant_map
+        ):
+            pending.extend((yielded + len(event_rows), key) for key in keys)
+            keys.clear()
+            if not event_rows:
+                continue
+            tenant = results[-1].tenant_id or ""
+            _charge_quota(quota, {tenant: len(event_rows)}, requests=int(tenant not in tenants))
+            charged.append((yielded, yielded + len(event_rows), tenant))
+            tenants.add(tenant)
+            for row in event_rows:
+                yielded += 1
+                yield row
+
+    def on_flush() -> None:
+        # Every row yielded so far is written: commit the events that are complete.
+        dedup.commit(key for end, key in pending if end <= yielded)
+        pending[:] = [(end, key) for end, key in pending if end > yielded]
+        written_tenants.update(tenant for start, _, tenant in charged if start < yielded)
+        charged[:] = [
+            (max(start, yielded), end, tenant) for start, end, tenant in charged if end > yielded
+        ]
+
+    def refund() -> None:
+        unwritten: Counter[str] = Counter()
+        for start, end, tenant in charged:
+            unwritten[tenant] += end - start
+        quota.release_many({t: n for t, n in unwritten.items() if t in written_tenants}, 0)
+        quota.release_many({t: n for t, n in unwritten.items() if t not in written_tenants})
+
+    try:
+        try:
+            written = await tsdb.write_backfill(
+                rows(),
+                batch_rows=settings.telemetry_backfill_batch_rows,
+                chunk_interval=timedelta(hours=settings.tsdb_chunk_interval_hours),
+                on_flush=on_flush,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"Malformed backfill body: {exc}") from exc
+        except TimescaleDBError as exc:
+            logger.error("Telemetry backfill failed after %d event(s): %s", len(results), exc)
+            raise HTTPException(
+                status_code=503, detail=f"TimescaleDB write failed: {exc}"
+            ) from exc
+    except BaseException:
+        dedup.forget(key for _, key in pending)
+        refund()
+        raise
+    dedup.commit(key for _, key in pending)
+
+    logger.info("Backfilled %d metric(s) from %d event(s).", written, len(results))
+    return TelemetryBatchResponse(
+        status="written" if written else "ignored",
+        events=results,
+        points_written=written,
+    )
@@ -0,0 +1,172 @@
+"""Multi-process launcher: ``python -m app.serve --workers 4``.
+
+A single uvicorn worker uses one core.  This launcher runs several:
+
+  • the app is imported once in the parent (preload) and workers are forked
+    from it, so routers, pydantic models and settings are built once and shared
+    copy-on-write (``gc.freeze()`` keeps the collector from touching them);
+  • every worker binds its own listening socket with ``SO_REUSEPORT`` and the
+    kernel spreads new connections across them – no shared accept queue;
+  • the parent restarts workers that die and forwards SIGTERM / SIGINT, so each
+    worker runs its lifespan shutdown and drains its telemetry buffer.
+
+Everything the lifespan opens (TimescaleDB pool, write buffer, spool, AMQP
+consumer) is created per worker after the fork.  The worker index is exported
+as ``IOT_BRIDGE_WORKER_ID`` and the worker count as ``IOT_BRIDGE_WORKERS``:
+each worker spools to its own ``worker-<n>`` subdirectory (a restarted worker
+replays what its predecessor left) and gets ``1/n`` of every tenant quota.
+The duplicate filter and latest-value cache are per process, so with several
+workers the filter is disabled (a retry may land on any worker) and latest
+values are always merged with the database.  Shared JSON state is guarded by
+OS file locks (:mod:`app.file_lock`).
+
+With one worker (the default, ``WEB_CONCURRENCY`` overrides it) the server runs
+in-process exactly like ``uvicorn app.main:app``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Any
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID_ENV = "IOT_BRIDGE_WORKER_ID"
+WORKERS_ENV = "IOT_BRIDGE_WORKERS"
+
+# A worker that dies sooner than this after its start is restarted with a delay.
+_MIN_UPTIME = 1.0
+
+
+def worker_id() -> int | None:
+    """Index of the current worker process, ``None`` outside the launcher."""
+    value = os.environ.get(WORKER_ID_ENV)
+    return int(value) if value else None
+
+
+def worker_count() -> int:
+    """Number of workers sharing the listening port (1 outside the launcher)."""
+    return max(1, int(os.environ.get(WORKERS_ENV) or 1))
+
+
+def reuseport_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Return a listening TCP socket bound with ``SO_REUSEPORT``."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def _config(app: Any, args: argparse.Namespace) -> uvicorn.Config:
+    return uvicorn.Config(app, host=args.host, port=args.port, log_level=args.log_level)
+
+
+def _run_worker(app: Any, index: int, args: argparse.Namespace) -> None:
+    """Body of a forked worker; never returns."""
+    status = 0
+    try:
+        # Own process group: a terminal Ctrl-C reaches the parent only, which
+        # forwards it once (a second signal would make uvicorn skip the lifespan
+        # shutdown that drains the telemetry buffer).
+        os.setpgid(0, 0)
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+        os.environ[WORKER_ID_ENV] = str(index)
+        sock = reuseport_socket(args.host, args.port)
+        uvicorn.Server(_config(app, args)).run(sockets=[sock])
+    except BaseException:
+        logger.exception("Worker %d crashed.", index)
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def _spawn(app: Any, index: int, args: argparse.Namespace) -> int:
+    pid = os.fork()
+    if pid == 0:
+        _run_worker(app, index, args)
+    logger.info("Started worker %d (pid %d).", index, pid)
+    return pid
+
+
+def _supervise(app: Any, args: argparse.Namespace) -> None:
+    workers: dict[int, tuple[int, float]] = {}  # pid → (index, started)
+    stopping = False
+
+    def stop(signum: int, _frame: Any) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(args.workers):
+        workers[_spawn(app, index, args)] = (index, time.monotonic())
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index, started = workers.pop(pid)
+        if stopping:
+            continue
+        logger.warning(
+            "Worker %d (pid %d) exited with status %d; restarting.",
+            index,
+            pid,
+            os.waitstatus_to_exitcode(status),
+        )
+        if time.monotonic() - started < _MIN_UPTIME:
+            time.sleep(_MIN_UPTIME)
+        workers[_spawn(app, index, args)] = (index, time.monotonic())
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", "1")),
+        help="worker processes (0 = one per CPU)",
+    )
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    args = parser.parse_args(argv)
+    if args.workers <= 0:
+        args.workers = os.cpu_count() or 1
+
+    if args.workers == 1:
+        from app.main import app
+
+        uvicorn.Server(_config(app, args)).run()
+        return
+
+    if not hasattr(socket, "SO_REUSEPORT") or not hasattr(os, "fork"):
+        sys.exit("multi-worker mode needs SO_REUSEPORT and fork() (Linux)")
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s:     %(message)s")
+    os.environ[WORKERS_ENV] = str(args.workers)
+    from app.main import app  # preload before forking
+
+    gc.freeze()
+    _supervise(app, args)
+
+
+if __name__ == "__main__":
+    main()
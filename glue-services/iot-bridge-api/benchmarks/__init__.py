@@ -0,0 +1 @@
+"""Stand-alone performance benchmarks (not collected by pytest)."""
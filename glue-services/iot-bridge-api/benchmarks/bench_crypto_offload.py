@@ -0,0 +1,108 @@
+"""Benchmark: event-loop lag during an enrollment burst, crypto inline vs. offloaded.
+
+Runs the CPU-bound part of ``--enrollments`` enrollments, ``--concurrency`` at a
+time: parse and signature-check the CSR, then sign the step-ca OTT.  Every
+``--miss-every``-th enrollment also decrypts the provisioner key (a key-cache
+miss: PBKDF2 with ``--p2c`` iterations).  Meanwhile a probe task sleeps 1 ms in
+a loop; how late it wakes up is the lag every other request – a telemetry
+webhook, a health check – would see.
+
+Usage::
+
+    python -m benchmarks.bench_crypto_offload --enrollments 400 --p2c 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Any
+
+from jwcrypto import jwk  # type: ignore[import]
+from jwcrypto.jwe import JWE  # type: ignore[import]
+
+from app.crypto import CryptoExecutor, decrypt_provisioner_key, parse_csr, sign_token
+from tests.conftest import make_test_csr
+
+_PROBE_INTERVAL = 0.001
+
+
+async def _probe(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(_PROBE_INTERVAL)
+        lags.append((time.perf_counter() - started - _PROBE_INTERVAL) * 1000)
+
+
+async def _burst(executor: CryptoExecutor, args: argparse.Namespace, fixtures: Any) -> dict:
+    csrs, key_json, encrypted_key = fixtures
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def enroll(i: int) -> None:
+        async with gate:
+            csr = await executor.run(parse_csr, csrs[i % len(csrs)])
+            if i % args.miss_every == 0:
+                await executor.run(decrypt_provisioner_key, encrypted_key, "secret")
+            claims = {"sub": f"dev-{i}", "sans": [f"dev-{i}"], "sha": csr.fingerprint}
+            await executor.run(sign_token, key_json, claims)
+
+    await executor.run(parse_csr, csrs[0])  # start the pool outside the measurement
+    lags: list[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(enroll(i) for i in range(args.enrollments)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    return {
+        "elapsed": elapsed,
+        "p50": statistics.median(lags),
+        # Inline, the probe may not get to run at all until the burst is over.
+        "p99": statistics.quantiles(lags, n=100)[-1] if len(lags) > 1 else lags[0],
+        "max": max(lags),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--enrollments", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--miss-every", type=int, default=100, help="key-cache miss rate")
+    parser.add_argument("--p2c", type=int, default=100_000, help="PBKDF2 iterations")
+    parser.add_argument("--workers", type=int, default=0, help="pool size (0 = CPUs)")
+    args = parser.parse_args()
+
+    key = jwk.JWK.generate(kty="EC", crv="P-256", kid="bench")
+    jwe = JWE(
+        key.export_private().encode(),
+        json.dumps({"alg": "PBES2-HS256+A128KW", "enc": "A128GCM", "p2c": args.p2c}),
+    )
+    jwe.add_recipient(jwk.JWK.from_password("secret"))
+    fixtures = (
+        [make_test_csr(f"dev-{i}") for i in range(32)],
+        key.export_private(),
+        jwe.serialize(compact=True),
+    )
+
+    print(
+        f"{args.enrollments} enrollments, {args.concurrency} concurrent, "
+        f"1 key decrypt ({args.p2c} iterations) per {args.miss_every}"
+    )
+    print(f"{'executor':<10} {'seconds':>8} {'lag p50 ms':>11} {'p99 ms':>8} {'max ms':>8}")
+    for mode in ("inline", "thread", "process"):
+        executor = CryptoExecutor(mode, args.workers)  # type: ignore[arg-type]
+        try:
+            r = await _burst(executor, args, fixtures)
+        finally:
+            executor.shutdown()
+        print(
+            f"{mode:<10} {r['elapsed']:>8.2f} {r['p50']:>11.2f} {r['p99']:>8.2f} {r['max']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+"""Benchmark: sequential vs. concurrent enrollment stages against simulated upstreams.
+
+step-ca and hawkBit are replaced by fakes that sleep for the configured round
+trip; WireGuard allocates real IPs in a temporary directory.  The
+``sequential`` baseline awaits the stages one after another, as the endpoint
+used to; ``concurrent`` is POST /devices/{id}/enroll through the ASGI app.  A
+new device costs one step-ca round trip and three hawkBit round trips (GET
+target, POST target, PUT attributes).
+
+``--batch N`` additionally enrolls N devices one request after another and
+then as one POST /devices/enroll:batch.
+
+Usage::
+
+    python -m benchmarks.bench_enroll --step-ca-ms 120 --hawkbit-ms 40 --batch 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Any, Self
+
+import httpx
+
+from app.clients.wireguard import WireGuardConfig
+from app.config import Settings
+from app.crypto import parse_csr
+from app.deps import get_hawkbit_client, get_settings, get_step_ca_client, get_wg_config
+from app.main import app
+from tests.conftest import FAKE_CA_CHAIN_PEM, FAKE_CERT_PEM, make_test_csr
+
+
+class _Fake:
+    def __init__(self, delay: float) -> None:
+        self._delay = delay
+
+    @asynccontextmanager
+    async def pooled(self, max_connections: int) -> AsyncIterator[Self]:
+        yield self
+
+
+class _FakeStepCA(_Fake):
+    async def sign_certificate(self, **_kwargs: Any) -> tuple[str, str]:
+        await asyncio.sleep(self._delay)
+        return FAKE_CERT_PEM, FAKE_CA_CHAIN_PEM
+
+
+class _FakeHawkBit(_Fake):
+    async def get_target(self, controller_id: str) -> None:
+        await asyncio.sleep(self._delay)
+
+    async def create_target(self, **_kwargs: Any) -> dict[str, Any]:
+        await asyncio.sleep(2 * self._delay)  # POST target + PUT attributes
+        return {}
+
+
+async def _sequential(
+    step_ca: _FakeStepCA, hawkbit: _FakeHawkBit, wg: WireGuardConfig, device_id: str, csr: str
+) -> None:
+    parse_csr(csr)
+    await step_ca.sign_certificate(csr_pem=csr, subject=device_id, sans=[device_id])
+    if not await hawkbit.get_target(device_id):
+        await hawkbit.create_target(controller_id=device_id, name=device_id)
+    ip = wg.allocate_ip(device_id)
+    wg.generate_client_config(device_id=device_id, device_ip=ip)
+
+
+async def _latencies(enroll: Callable[[int], Awaitable[None]], rounds: int) -> list[float]:
+    samples = []
+    for i in range(rounds):
+        started = time.perf_counter()
+        await enroll(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--step-ca-ms", type=float, default=120.0, help="step-ca round trip")
+    parser.add_argument("--hawkbit-ms", type=float, default=40.0, help="hawkBit round trip")
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=0, help="devices of the bulk comparison")
+    parser.add_argument("--concurrency", type=int, default=16, help="batch concurrency")
+    args = parser.parse_args()
+
+    step_ca = _FakeStepCA(args.step_ca_ms / 1000)
+    hawkbit = _FakeHawkBit(args.hawkbit_ms / 1000)
+    csr = make_test_csr("bench-device")
+
+    with tempfile.TemporaryDirectory() as tmp:
+
+        def wg(subdir: str) -> WireGuardConfig:
+            return WireGuardConfig(f"{tmp}/{subdir}", "10.0.0.0/16", "10.0.0.1")
+
+        sequential = await _latencies(
+            lambda i: _sequential(step_ca, hawkbit, wg("seq"), f"seq-{i}", csr), args.rounds
+        )
+
+        wg_concurrent = wg("con")
+        app.dependency_overrides[get_step_ca_client] = lambda: step_ca
+        app.dependency_overrides[get_hawkbit_client] = lambda: hawkbit
+        app.dependency_overrides[get_wg_config] = lambda: wg_concurrent
+        app.dependency_overrides[get_settings] = lambda: Settings(
+            enrollment_batch_concurrency=args.concurrency
+        )
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+                async def enroll(i: int) -> None:
+                    resp = await client.post(
+                        f"/devices/con-{i}/enroll", json={"csr": csr, "device_name": "bench"}
+                    )
+                    resp.raise_for_status()
+
+                concurrent = await _latencies(enroll, args.rounds)
+
+                if args.batch:
+                    started = time.perf_counter()
+                    for i in range(args.batch):
+                        await enroll(args.rounds + i)
+                    one_by_one = time.perf_counter() - started
+
+                    devices = [
+                        {"device_id": f"bulk-{i}", "csr": csr, "device_name": "bench"}
+                        for i in range(args.batch)
+                    ]
+                    started = time.perf_counter()
+                    resp = await client.post(
+                        "/devices/enroll:batch", json={"devices": devices}, timeout=None
+                    )
+                    resp.raise_for_status()
+                    assert resp.text.count('"enrolled"') == args.batch
+                    batched = time.perf_counter() - started
+        finally:
+            app.dependency_overrides.clear()
+
+    slowest = max(args.step_ca_ms, 3 * args.hawkbit_ms)
+    total = args.step_ca_ms + 3 * args.hawkbit_ms
+    print(f"upstream round trips: slowest stage {slowest:.0f} ms, sum {total:.0f} ms")
+    print(f"{'stages':<12} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, samples in (("sequential", sequential), ("concurrent", concurrent)):
+        p95 = statistics.quantiles(samples, n=20)[-1]
+        print(f"{name:<12} {statistics.median(samples):>8.1f} {p95:>8.1f}")
+    print(f"speed-up: {statistics.median(sequential) / statistics.median(concurrent):.1f}x")
+    if args.batch:
+        print(f"\n{f'{args.batch} devices':<30} {'seconds':>8} {'devices/s':>10}")
+        print(
+            f"{'one request per device':<30} {one_by_one:>8.2f} {args.batch / one_by_one:>10.1f}"
+        )
+        label = f"enroll:batch (concurrency {args.concurrency})"
+        print(f"{label:<30} {batched:>8.2f} {args.batch / batched:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
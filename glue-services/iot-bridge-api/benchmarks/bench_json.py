@@ -0,0 +1,154 @@
+"""Benchmark: stdlib json vs. orjson on the telemetry webhook and join-request list.
+
+Runs in-process without any database.  For each endpoint it times the JSON
+work the request does – decoding the telemetry event body and encoding the
+JSONB tags of its rows, or rendering the PEM-heavy join-request list – with
+the stdlib codec and with :mod:`app.json_codec`, then reports requests/s of
+the real endpoints through the ASGI app (TimescaleDB write mocked out).
+
+Usage::
+
+    python -m benchmarks.bench_json --tenants 200 --metrics 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from collections.abc import Callable
+from typing import Any
+from unittest.mock import patch
+
+import httpx
+from fastapi.responses import JSONResponse
+
+from app.clients.telemetry_buffer import TelemetryBuffer
+from app.clients.tenant_quota import TenantQuota
+from app.config import Settings
+from app.deps import get_telemetry_buffer, get_telemetry_spool, get_tenant_quota
+from app.json_codec import FastJSONResponse, dumps, loads
+from app.main import app
+
+_PEM = (
+    "-----BEGIN CERTIFICATE-----\n"
+    + ("MIIB" + "A" * 60 + "\n") * 40
+    + "-----END CERTIFICATE-----\n"
+)
+
+
+def _telemetry_body(metrics: int) -> bytes:
+    event = {
+        "msgType": "POST_TELEMETRY_REQUEST",
+        "metadata": {"deviceName": "bench-dev", "tenantId": "bench", "ts": "1714521600000"},
+        "data": {f"metric_{i}": i * 1.5 for i in range(metrics)},
+    }
+    return json.dumps(event).encode()
+
+
+def _join_store(tenants: int) -> dict[str, Any]:
+    return {
+        f"tenant-{i:04d}": {
+            "tenant_id": f"tenant-{i:04d}",
+            "display_name": f"Tenant {i}",
+            "status": "approved",
+            "requested_at": f"2024-05-01T00:{i % 60:02d}:00+00:00",
+            "sub_ca_csr": _PEM,
+            "signed_cert": _PEM,
+            "root_ca_cert": _PEM,
+        }
+        for i in range(tenants)
+    }
+
+
+def _rate(fn: Callable[[], Any], rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return rounds / (time.perf_counter() - started)
+
+
+def _row(name: str, std: float, fast: float) -> None:
+    print(f"{name:<34} {std:>12,.0f} {fast:>12,.0f} {fast / std:>8.1f}x")
+
+
+class _NullWriter:
+    async def write_metrics(self, rows: list[dict[str, Any]]) -> None:
+        for row in rows:
+            dumps(row["tags"])
+
+
+async def _endpoint_rate(method: str, url: str, rounds: int, **kwargs: Any) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            resp = await client.request(method, url, **kwargs)
+            resp.raise_for_status()
+        return rounds / (time.perf_counter() - started)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=200, help="join requests in the list")
+    parser.add_argument("--metrics", type=int, default=20, help="fields per telemetry event")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    body = _telemetry_body(args.metrics)
+    tags = [{"raw_type": "float"}] * args.metrics
+    store = _join_store(args.tenants)
+    listing = {"join_requests": list(store.values()), "total": len(store)}
+    list_rounds = max(10, args.rounds // 20)
+
+    print(f"{'codec step':<34} {'stdlib/s':>12} {'orjson/s':>12} {'speed-up':>9}")
+    _row(
+        "telemetry: decode event body",
+        _rate(lambda: json.loads(body), args.rounds),
+        _rate(lambda: loads(body), args.rounds),
+    )
+    _row(
+        "telemetry: encode JSONB tags",
+        _rate(lambda: [json.dumps(t) for t in tags], args.rounds),
+        _rate(lambda: [dumps(t) for t in tags], args.rounds),
+    )
+    _row(
+        f"join-requests: render {args.tenants} entries",
+        _rate(lambda: JSONResponse(listing), list_rounds),
+        _rate(lambda: FastJSONResponse(listing), list_rounds),
+    )
+
+    # ── Whole endpoints through the ASGI app ──────────────────────────────────
+    with tempfile.NamedTemporaryFile(suffix=".json") as db:
+        db.write(dumps(store))
+        db.flush()
+        app.dependency_overrides[get_telemetry_buffer] = lambda: TelemetryBuffer(_NullWriter())
+        app.dependency_overrides[get_telemetry_spool] = lambda: None
+        app.dependency_overrides[get_tenant_quota] = TenantQuota  # unlimited
+        try:
+            telemetry = await _endpoint_rate(
+                "POST",
+                "/webhooks/thingsboard/telemetry",
+                args.rounds,
+                content=body,
+                headers={"content-type": "application/json"},
+            )
+            with (
+                patch(
+                    "app.routers.join.get_settings",
+                    lambda: Settings(join_requests_db_path=db.name),
+                ),
+                patch("app.routers.join._get_cdm_admin", lambda request: {}),
+            ):
+                join = await _endpoint_rate("GET", "/portal/admin/join-requests", list_rounds)
+        finally:
+            app.dependency_overrides.clear()
+    print(f"\n{'endpoint':<34} {'requests/s':>12}")
+    print(f"{'POST /webhooks/thingsboard/telemetry':<34} {telemetry:>12,.0f}")
+    print(f"{'GET /portal/admin/join-requests':<34} {join:>12,.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+"""Benchmark: device certificates from step-ca over HTTPS vs. the in-process LocalSigner.
+
+``step-ca`` is :class:`StepCAClient` (CSR parse, OTT minting, POST /1.0/sign
+over one pooled connection set) against a fake CA that answers after
+``--rtt-ms``, the network plus step-ca's own signing time.  ``local`` is
+:class:`LocalSigner` with a freshly generated intermediate CA, writing its
+issuance index to a temporary directory.  Both run ``--certs`` signatures,
+``--concurrency`` at a time, with the crypto on a thread pool.
+
+Usage::
+
+    python -m benchmarks.bench_local_signer --certs 500 --concurrency 16 --rtt-ms 15
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from jwcrypto import jwk  # type: ignore[import]
+from jwcrypto.jwe import JWE  # type: ignore[import]
+
+from app.clients import step_ca
+from app.clients.step_ca import CertificateSigner, LocalSigner, StepCAClient
+from app.crypto import CryptoExecutor
+from tests.conftest import FAKE_CA_CHAIN_PEM, FAKE_CERT_PEM, make_test_csr
+
+
+def _intermediate(directory: Path) -> tuple[Path, Path]:
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Bench Intermediate CA")])
+    now = datetime.datetime.now(datetime.UTC)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(1)
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=0), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = directory / "intermediate_ca.crt", directory / "intermediate_ca_key"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return cert_path, key_path
+
+
+def _fake_step_ca(rtt: float) -> Any:
+    """Install an httpx transport that plays step-ca, answering after *rtt* seconds."""
+    key = jwk.JWK.generate(kty="EC", crv="P-256", kid="bench")
+    jwe = JWE(
+        key.export_private().encode(),
+        json.dumps({"alg": "PBES2-HS256+A128KW", "enc": "A128GCM", "p2c": 1000}),
+    )
+    jwe.add_recipient(jwk.JWK.from_password("secret"))
+    provisioners = {
+        "provisioners": [
+            {"name": "bench", "type": "JWK", "encryptedKey": jwe.serialize(compact=True)}
+        ]
+    }
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(rtt)
+        if request.url.path == "/1.0/provisioners":
+            return httpx.Response(200, json=provisioners)
+        return httpx.Response(200, json={"crt": FAKE_CERT_PEM, "ca": FAKE_CA_CHAIN_PEM})
+
+    real_client = httpx.AsyncClient
+
+    def client(**kwargs: Any) -> httpx.AsyncClient:
+        kwargs.pop("verify", None)
+        return real_client(transport=httpx.MockTransport(handler), **kwargs)
+
+    return client
+
+
+async def _run(signer: CertificateSigner, csrs: list[str], concurrency: int) -> dict[str, float]:
+    latencies: list[float] = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def sign(i: int, pooled: CertificateSigner) -> None:
+        async with gate:
+            started = time.perf_counter()
+            await pooled.sign_certificate(csrs[i % len(csrs)], f"dev-{i}", [f"dev-{i}"])
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async with signer.pooled(concurrency) as pooled:
+        await sign(0, pooled)  # load keys, open the pool
+        latencies.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(sign(i, pooled) for i in range(len(csrs))))
+        elapsed = time.perf_counter() - started
+    return {
+        "rate": len(csrs) / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": statistics.quantiles(latencies, n=100)[-1],
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--certs", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rtt-ms", type=float, default=15.0, help="step-ca round trip")
+    args = parser.parse_args()
+
+    csrs = [make_test_csr(f"dev-{i}") for i in range(args.certs)]
+    executor = CryptoExecutor("thread")
+    step_ca.httpx.AsyncClient = _fake_step_ca(args.rtt_ms / 1000)  # type: ignore[misc]
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cert_path, key_path = _intermediate(Path(tmp))
+            signers: dict[str, CertificateSigner] = {
+                "step-ca": StepCAClient(
+                    "https://ca.bench:9000", "bench", "secret", crypto=executor
+                ),
+                "local": LocalSigner(
+                    cert_path, key_path, Path(tmp) / "issued.ndjson", crypto=executor
+                ),
+            }
+            print(
+                f"{args.certs} certificates, {args.concurrency} concurrent, "
+                f"step-ca round trip {args.rtt_ms:.0f} ms"
+            )
+            print(f"{'signer':<8} {'certs/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+            for name, signer in signers.items():
+                r = await _run(signer, csrs, args.concurrency)
+                print(f"{name:<8} {r['rate']:>9,.0f} {r['p50']:>8.2f} {r['p99']:>8.2f}")
+    finally:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
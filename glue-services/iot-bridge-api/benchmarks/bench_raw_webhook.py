@@ -0,0 +1,83 @@
+"""Benchmark: validated vs. raw telemetry webhook ingestion at a target event rate.
+
+Runs in-process without any database.  Both paths turn the same request bodies
+into ``device_telemetry`` column tuples, as handed to the writer:
+
+  ``validated``  ``ThingsboardWebhookEvent`` model → row dicts → ``_to_record``
+                 (POST /webhooks/thingsboard/telemetry)
+  ``raw``        ``raw_event_records`` straight from the body bytes
+                 (POST /webhooks/thingsboard/telemetry/raw)
+
+For each it reports the sustainable events/s of one core and the CPU share the
+path needs at ``--rate`` events/s.
+
+Usage::
+
+    python -m benchmarks.bench_raw_webhook --rate 10000 --metrics 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+from typing import Any
+
+from app.clients.timescaledb import _to_record
+from app.json_codec import dumps, loads
+from app.models import ThingsboardWebhookEvent
+from app.routers.webhooks import _telemetry_rows, raw_event_records
+
+
+def _bodies(n: int, metrics: int) -> list[bytes]:
+    return [
+        dumps(
+            {
+                "msgType": "POST_TELEMETRY_REQUEST",
+                "metadata": {"deviceId": f"dev-{i % 500:03d}", "tenantId": "bench"},
+                "data": {f"metric_{m}": (i + m) * 0.5 for m in range(metrics)},
+            }
+        )
+        for i in range(n)
+    ]
+
+
+def _validated(body: bytes) -> list[tuple[Any, ...]]:
+    event = ThingsboardWebhookEvent.model_validate(loads(body))
+    _, rows = _telemetry_rows(event)
+    now = datetime.now(UTC)
+    return [_to_record(row, now) for row in rows]
+
+
+def _raw(body: bytes) -> list[tuple[Any, ...]]:
+    return raw_event_records(body, datetime.now(UTC)).records
+
+
+def _events_per_s(path: Callable[[bytes], list[tuple[Any, ...]]], bodies: list[bytes]) -> float:
+    started = time.process_time()
+    for body in bodies:
+        path(body)
+    return len(bodies) / (time.process_time() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=10_000, help="target events/s")
+    parser.add_argument("--metrics", type=int, default=8, help="numeric fields per event")
+    parser.add_argument("--events", type=int, default=50_000)
+    args = parser.parse_args()
+
+    bodies = _bodies(args.events, args.metrics)
+    assert len(_validated(bodies[0])) == len(_raw(bodies[0])) == args.metrics
+
+    print(f"{'path':<10} {'events/s/core':>14} {f'CPU @ {args.rate:,}/s':>16}")
+    results = {}
+    for name, path in (("validated", _validated), ("raw", _raw)):
+        results[name] = rate = _events_per_s(path, bodies)
+        print(f"{name:<10} {rate:>14,.0f} {args.rate / rate:>15.1%}")
+    print(f"speed-up: {results['raw'] / results['validated']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark: rows/s of ``executemany`` INSERT vs. binary COPY into device_telemetry.
+
+Requires a reachable TimescaleDB/PostgreSQL database.  Point it at a scratch
+database – the script creates ``device_telemetry`` if it is missing and deletes
+its own rows (``tenant_id = 'bench'``) when done.
+
+Usage::
+
+    TSDB_HOST=localhost TSDB_TELEGRAF_PASSWORD=changeme \\
+        python -m benchmarks.bench_tsdb_write --batches 1 10 100 1000 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Any
+
+from app.clients.timescaledb import TimescaleDBClient, WriteMode
+from app.config import Settings
+
+_CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS device_telemetry (
+    time        TIMESTAMPTZ NOT NULL,
+    tenant_id   TEXT        NOT NULL,
+    device_id   TEXT        NOT NULL,
+    metric_name TEXT        NOT NULL,
+    value       DOUBLE PRECISION,
+    tags        JSONB
+)
+"""
+
+
+def _rows(n: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "tenant_id": "bench",
+            "device_id": f"dev-{i % 100:03d}",
+            "metric_name": f"metric_{i % 8}",
+            "value": float(i),
+            "tags": {"raw_type": "float"},
+        }
+        for i in range(n)
+    ]
+
+
+async def _measure(client: TimescaleDBClient, batch: int, mode: WriteMode, total: int) -> float:
+    rows = _rows(batch)
+    rounds = max(1, total // batch)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await client.write_metrics(rows, mode=mode)
+    return rounds * batch / (time.perf_counter() - started)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--total", type=int, default=50_000, help="rows written per case")
+    args = parser.parse_args()
+
+    settings = Settings()
+    client = TimescaleDBClient(
+        host=settings.tsdb_host,
+        port=settings.tsdb_port,
+        database=settings.tsdb_database,
+        password=settings.tsdb_telegraf_password,
+    )
+    pool = await client._get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(_CREATE_SQL)
+
+    print(f"{'batch':>8} {'insert rows/s':>15} {'copy rows/s':>15} {'speed-up':>9}")
+    try:
+        for batch in args.batches:
+            insert = await _measure(client, batch, "insert", min(args.total, batch * 200))
+            copy = await _measure(client, batch, "copy", min(args.total, batch * 200))
+            print(f"{batch:>8} {insert:>15,.0f} {copy:>15,.0f} {copy / insert:>8.1f}x")
+    finally:
+        async with pool.acquire() as conn:
+            await conn.execute("DELETE FROM device_telemetry WHERE tenant_id = 'bench'")
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -18,11 +18,27 @@ from cryptography.x509.oid import NameOID
 from fastapi.testclient import TestClient
 
 from app.clients.hawkbit import HawkBitClient
+from app.clients.latest_values import LatestValueCache
 from app.clients.step_ca import StepCAClient
+from app.clients.telemetry_buffer import TelemetryBuffer
+from app.clients.telemetry_dedup import DuplicateFilter
+from app.clients.tenant_quota import TenantQuota
 from app.clients.timescaledb import TimescaleDBClient
 from app.clients.wireguard import WireGuardConfig
-from app.deps import get_hawkbit_client, get_step_ca_client, get_timescaledb_client, get_wg_config
+from app.deps import (
+    get_duplicate_filter,
+    get_enrollment_cache,
+    get_hawkbit_client,
+    get_latest_value_cache,
+    get_step_ca_client,
+    get_telemetry_buffer,
+    get_telemetry_spool,
+    get_tenant_quota,
+    get_timescaledb_client,
+    get_wg_config,
+)
 from app.main import app
+from app.routers.telemetry import require_telemetry_reader
 
 # ── Constants ─────────────────────────────────────────────────────────────────
 
@@ -36,6 +52,7 @@ FAKE_CA_CHAIN_PEM = (
     "MIIBFAKECA000000000000000000000000000000000000000000000000000\n"
     "-----END CERTIFICATE-----\n"
 )
+PLATFORM_ADMIN = {"realm": "cdm", "roles": ["platform-admin"], "preferred_username": "root"}
 
 # ── CSR helper ────────────────────────────────────────────────────────────────
 
@@ -72,6 +89,7 @@ def mock_step_ca() -> StepCAClient:
     client.sign_certificate = AsyncMock(  # type: ignore[method-assign]
         return_value=(FAKE_CERT_PEM, FAKE_CA_CHAIN_PEM)
     )
+    client.pooled.return_value.__aenter__.return_value = client
     return client
 
 
@@ -82,6 +100,8 @@ def mock_hawkbit() -> HawkBitClient:
     client.create_target = AsyncMock(  # type: ignore[method-assign]
         return_value={"controllerId": "device-test-001", "name": "Test Device 001"}
     )
+    client.delete_target = AsyncMock(return_value=None)  # type: ignore[method-assign]
+    client.pooled.return_value.__aenter__.return_value = client
     return client
 
 
@@ -100,6 +120,10 @@ def mock_wg_config(tmp_path: Path) -> WireGuardConfig:
 def mock_timescaledb() -> TimescaleDBClient:
     client: TimescaleDBClient = MagicMock(spec=TimescaleDBClient)
     client.write_metrics = AsyncMock(return_value=None)  # type: ignore[method-assign]
+    client.ping = AsyncMock(return_value=True)  # type: ignore[method-assign]
+    client.pool_stats = MagicMock(  # type: ignore[method-assign]
+        return_value={"size": 1, "idle": 1, "min_size": 1, "max_size": 10}
+    )
     return client
 
 
@@ -113,6 +137,17 @@ def test_client(
     app.dependency_overrides[get_step_ca_client] = lambda: mock_step_ca
     app.dependency_overrides[get_hawkbit_client] = lambda: mock_hawkbit
     app.dependency_overrides[get_wg_config] = lambda: mock_wg_config
+    app.dependency_overrides[get_enrollment_cache] = lambda: None
     app.dependency_overrides[get_timescaledb_client] = lambda: mock_timescaledb
+    # Not started → rows are written straight through to the mocked client.
+    app.dependency_overrides[get_telemetry_buffer] = lambda: TelemetryBuffer(mock_timescaledb)
+    app.dependency_overrides[get_telemetry_spool] = lambda: None
+    app.dependency_overrides[get_tenant_quota] = TenantQuota
+    cache = LatestValueCache()
+    app.dependency_overrides[get_latest_value_cache] = lambda: cache
+    dedup = DuplicateFilter()
+    app.dependency_overrides[get_duplicate_filter] = lambda: dedup
+    # Telemetry reads act as a platform admin unless a test overrides the caller.
+    app.dependency_overrides[require_telemetry_reader] = lambda: PLATFORM_ADMIN
     yield TestClient(app)  # type: ignore[misc]
     app.dependency_overrides.clear()
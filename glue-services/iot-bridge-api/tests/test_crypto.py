@@ -0,0 +1,96 @@
+"""Unit tests for the CPU-bound crypto helpers and their executor."""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from jwcrypto import jwk  # type: ignore[import]
+from jwcrypto.jwe import JWE  # type: ignore[import]
+from jwcrypto.jwt import JWT  # type: ignore[import]
+
+from app.crypto import (
+    CryptoExecutor,
+    ParsedCSR,
+    decrypt_provisioner_key,
+    parse_csr,
+    sign_token,
+)
+
+from .conftest import FAKE_CERT_PEM, make_test_csr
+
+
+def test_parse_csr_fingerprints_the_der_encoding() -> None:
+    pem = make_test_csr("dev-42")
+    parsed = parse_csr(pem)
+    csr = x509.load_pem_x509_csr(pem.encode())
+    digest = hashlib.sha256(csr.public_bytes(Encoding.DER)).digest()
+    assert parsed == ParsedCSR(
+        pem=pem,
+        fingerprint=base64.urlsafe_b64encode(digest).rstrip(b"=").decode(),
+        common_name="dev-42",
+        public_key_der=csr.public_key().public_bytes(
+            Encoding.DER, PublicFormat.SubjectPublicKeyInfo
+        ),
+    )
+
+
+@pytest.mark.parametrize("pem", ["not-a-csr", FAKE_CERT_PEM])
+def test_parse_csr_rejects_malformed_input(pem: str) -> None:
+    with pytest.raises(ValueError):
+        parse_csr(pem)
+
+
+def test_sign_token_verifies_with_the_public_key() -> None:
+    key = jwk.JWK.generate(kty="EC", crv="P-256", kid="prov-1")
+    token = sign_token(key.export_private(), {"sub": "dev-1"})
+    verified = JWT(jwt=token, key=jwk.JWK.from_json(key.export_public()))
+    assert json.loads(verified.claims) == {"sub": "dev-1"}
+    assert json.loads(verified.token.objects["protected"])["kid"] == "prov-1"
+
+
+def test_decrypt_provisioner_key_accepts_step_ca_iteration_counts() -> None:
+    key = jwk.JWK.generate(kty="EC", crv="P-256", kid="prov-1")
+    jwe = JWE(
+        key.export_private().encode(),
+        json.dumps({"alg": "PBES2-HS256+A128KW", "enc": "A128GCM", "p2c": 100_000}),
+    )
+    jwe.add_recipient(jwk.JWK.from_password("secret"))
+    decrypted = decrypt_provisioner_key(jwe.serialize(compact=True), "secret")
+    assert decrypted.thumbprint() == key.thumbprint()
+
+
+async def test_thread_executor_runs_off_the_event_loop() -> None:
+    executor = CryptoExecutor("thread", max_workers=2)
+    try:
+        assert await executor.run(threading.get_ident) != threading.get_ident()
+        results = await asyncio.gather(
+            *(executor.run(parse_csr, make_test_csr()) for _ in range(4))
+        )
+        assert len({r.fingerprint for r in results}) == 4
+    finally:
+        executor.shutdown()
+
+
+async def test_inline_executor_runs_on_the_event_loop() -> None:
+    assert await CryptoExecutor("inline").run(threading.get_ident) == threading.get_ident()
+
+
+async def test_process_executor_round_trips_csrs_and_tokens() -> None:
+    executor = CryptoExecutor("process", max_workers=1)
+    key = jwk.JWK.generate(kty="EC", crv="P-256", kid="prov-1")
+    try:
+        pem = make_test_csr("dev-proc")
+        assert await executor.run(parse_csr, pem) == parse_csr(pem)
+        token = await executor.run(sign_token, key.export_private(), {"sub": "dev-proc"})
+        assert JWT(jwt=token, key=jwk.JWK.from_json(key.export_public())).claims
+        with pytest.raises(ValueError):
+            await executor.run(parse_csr, "not-a-csr")
+    finally:
+        executor.shutdown()
@@ -1,14 +1,24 @@
-"""Unit tests for POST /devices/{device_id}/enroll."""
+"""Unit tests for POST /devices/{device_id}/enroll and /devices/enroll:batch."""
 
 from __future__ import annotations
 
+import asyncio
+import json
+from pathlib import Path
 from unittest.mock import AsyncMock
 
 import pytest
+from cryptography.exceptions import UnsupportedAlgorithm
 from fastapi.testclient import TestClient
 
-from app.clients.hawkbit import HawkBitClient
+from app.clients.enrollment_cache import EnrollmentCache
+from app.clients.hawkbit import HawkBitClient, HawkBitError
 from app.clients.step_ca import StepCAClient, StepCAError
+from app.clients.wireguard import WireGuardConfig
+from app.config import Settings
+from app.deps import get_enrollment_cache, get_settings
+from app.main import app
+from app.routers import enrollment
 from tests.conftest import FAKE_CA_CHAIN_PEM, FAKE_CERT_PEM, make_test_csr
 
 # ── Happy path ────────────────────────────────────────────────────────────────
@@ -99,6 +109,21 @@ def test_enroll_invalid_csr_returns_422(test_client: TestClient) -> None:
     assert resp.status_code == 422
 
 
+@pytest.mark.parametrize(
+    "error", [UnsupportedAlgorithm("unsupported signature algorithm"), TypeError("bad key")]
+)
+def test_enroll_unparseable_csr_key_returns_422(
+    test_client: TestClient, csr_pem: str, monkeypatch: pytest.MonkeyPatch, error: Exception
+) -> None:
+    def parse_csr(pem: str) -> None:
+        raise error
+
+    monkeypatch.setattr(enrollment, "parse_csr", parse_csr)
+    resp = test_client.post("/devices/dev-alg/enroll", json={"csr": csr_pem, "device_name": "A"})
+    assert resp.status_code == 422
+    assert resp.json()["detail"].startswith("Invalid CSR")
+
+
 def test_enroll_step_ca_error_returns_502(
     test_client: TestClient,
     csr_pem: str,
@@ -115,6 +140,114 @@ def test_enroll_step_ca_error_returns_502(
     assert "PKI signing failed" in resp.json()["detail"]
 
 
+def _peers(wg: WireGuardConfig) -> dict[str, str]:
+    peers_db = Path(wg._dir) / "cdm_peers.json"
+    return json.loads(peers_db.read_text()) if peers_db.exists() else {}
+
+
+def test_enroll_runs_upstream_stages_concurrently(
+    test_client: TestClient,
+    csr_pem: str,
+    mock_step_ca: StepCAClient,
+    mock_hawkbit: HawkBitClient,
+) -> None:
+    """Signing waits for the hawkBit lookup – only possible if both run at once."""
+    looked_up = asyncio.Event()
+
+    async def get_target(controller_id: str) -> None:
+        looked_up.set()
+
+    async def sign_certificate(**kwargs: object) -> tuple[str, str]:
+        await asyncio.wait_for(looked_up.wait(), timeout=2)
+        return FAKE_CERT_PEM, FAKE_CA_CHAIN_PEM
+
+    mock_hawkbit.get_target = AsyncMock(side_effect=get_target)  # type: ignore[method-assign]
+    mock_step_ca.sign_certificate = AsyncMock(  # type: ignore[method-assign]
+        side_effect=sign_certificate
+    )
+    resp = test_client.post("/devices/dev-par/enroll", json={"csr": csr_pem, "device_name": "P"})
+    assert resp.status_code == 200
+
+
+def test_enroll_failure_releases_ip_and_deletes_new_target(
+    test_client: TestClient,
+    csr_pem: str,
+    mock_step_ca: StepCAClient,
+    mock_hawkbit: HawkBitClient,
+    mock_wg_config: WireGuardConfig,
+) -> None:
+    mock_step_ca.sign_certificate = AsyncMock(  # type: ignore[method-assign]
+        side_effect=StepCAError("step-ca unavailable")
+    )
+    resp = test_client.post("/devices/dev-undo/enroll", json={"csr": csr_pem, "device_name": "U"})
+    assert resp.status_code == 502
+    assert "dev-undo" not in _peers(mock_wg_config)
+    mock_hawkbit.delete_target.assert_awaited_once_with("dev-undo")  # type: ignore[attr-defined]
+
+
+def test_enroll_failure_keeps_state_of_already_enrolled_device(
+    test_client: TestClient,
+    csr_pem: str,
+    mock_hawkbit: HawkBitClient,
+    mock_wg_config: WireGuardConfig,
+) -> None:
+    ip = mock_wg_config.allocate_ip("dev-known")
+    mock_hawkbit.get_target = AsyncMock(  # type: ignore[method-assign]
+        side_effect=HawkBitError("hawkBit GET target returned 500")
+    )
+    resp = test_client.post("/devices/dev-known/enroll", json={"csr": csr_pem, "device_name": "K"})
+    assert resp.status_code == 502
+    assert "hawkBit provisioning failed" in resp.json()["detail"]
+    assert _peers(mock_wg_config) == {"dev-known": ip}
+    mock_hawkbit.delete_target.assert_not_called()  # type: ignore[attr-defined]
+
+
+def test_enroll_failed_create_does_not_delete_a_target_it_did_not_create(
+    test_client: TestClient,
+    csr_pem: str,
+    mock_hawkbit: HawkBitClient,
+    mock_wg_config: WireGuardConfig,
+) -> None:
+    mock_hawkbit.create_target = AsyncMock(  # type: ignore[method-assign]
+        side_effect=HawkBitError("hawkBit POST target returned 409")
+    )
+    resp = test_client.post("/devices/dev-race/enroll", json={"csr": csr_pem, "device_name": "R"})
+    assert resp.status_code == 502
+    assert "dev-race" not in _peers(mock_wg_config)
+    mock_hawkbit.delete_target.assert_not_called()  # type: ignore[attr-defined]
+
+
+def test_enroll_retry_with_same_csr_is_served_from_cache(
+    test_client: TestClient,
+    csr_pem: str,
+    tmp_path: Path,
+    mock_step_ca: StepCAClient,
+    mock_hawkbit: HawkBitClient,
+    mock_wg_config: WireGuardConfig,
+) -> None:
+    app.dependency_overrides[get_enrollment_cache] = lambda: EnrollmentCache(
+        tmp_path / "enrollment_cache.json"
+    )
+    wg_conf = tmp_path / "wg_confs" / "wg0.conf"
+    wg_conf.parent.mkdir()
+    wg_conf.write_text("[Interface]\n")
+    payload = {"csr": csr_pem, "device_name": "R", "wg_public_key": "pubkey=="}
+    first = test_client.post("/devices/dev-retry/enroll", json=payload)
+    assert wg_conf.read_text().count("[Peer]") == 1
+
+    retry = test_client.post("/devices/dev-retry/enroll", json=payload)
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert mock_step_ca.sign_certificate.await_count == 1  # type: ignore[attr-defined]
+    assert mock_hawkbit.get_target.await_count == 1  # type: ignore[attr-defined]
+    assert wg_conf.read_text().count("[Peer]") == 1
+
+    # A new CSR is a new enrollment
+    payload["csr"] = make_test_csr("dev-retry")
+    assert test_client.post("/devices/dev-retry/enroll", json=payload).status_code == 200
+    assert mock_step_ca.sign_certificate.await_count == 2  # type: ignore[attr-defined]
+
+
 @pytest.mark.parametrize(
     "payload",
     [
@@ -128,3 +261,82 @@ def test_enroll_missing_required_fields_returns_422(
 ) -> None:
     resp = test_client.post("/devices/dev-x/enroll", json=payload)
     assert resp.status_code == 422
+
+
+# ── Bulk enrollment ───────────────────────────────────────────────────────────
+
+
+def _batch(*device_ids: str, csr: str) -> dict:
+    return {"devices": [{"device_id": d, "csr": csr, "device_name": d} for d in device_ids]}
+
+
+def test_batch_streams_one_result_per_device(
+    test_client: TestClient,
+    csr_pem: str,
+    mock_step_ca: StepCAClient,
+    mock_hawkbit: HawkBitClient,
+) -> None:
+    payload = _batch("line-1", "line-2", "line-3", csr=csr_pem)
+    payload["devices"][1]["csr"] = "not-a-csr"
+    resp = test_client.post("/devices/enroll:batch", json=payload)
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    results = {r["device_id"]: r for r in map(json.loads, resp.text.splitlines())}
+    assert set(results) == {"line-1", "line-2", "line-3"}
+    assert results["line-2"]["status"] == "failed"
+    assert results["line-2"]["status_code"] == 422
+    assert "Invalid CSR" in results["line-2"]["detail"]
+    for device_id in ("line-1", "line-3"):
+        assert results[device_id]["status"] == "enrolled"
+        assert results[device_id]["enrollment"]["certificate"] == FAKE_CERT_PEM
+    ips = {results[d]["enrollment"]["wireguard_ip"] for d in ("line-1", "line-3")}
+    assert len(ips) == 2
+    # One pooled client per upstream for the whole batch
+    mock_step_ca.pooled.assert_called_once()  # type: ignore[attr-defined]
+    mock_hawkbit.pooled.assert_called_once()  # type: ignore[attr-defined]
+
+
+def test_batch_bounds_concurrency(
+    test_client: TestClient, csr_pem: str, mock_step_ca: StepCAClient
+) -> None:
+    app.dependency_overrides[get_settings] = lambda: Settings(enrollment_batch_concurrency=2)
+    in_flight = peak = 0
+
+    async def sign_certificate(**kwargs: object) -> tuple[str, str]:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return FAKE_CERT_PEM, FAKE_CA_CHAIN_PEM
+
+    mock_step_ca.sign_certificate = AsyncMock(  # type: ignore[method-assign]
+        side_effect=sign_certificate
+    )
+    devices = [f"burst-{i}" for i in range(6)]
+    resp = test_client.post("/devices/enroll:batch", json=_batch(*devices, csr=csr_pem))
+
+    assert resp.status_code == 200
+    assert len(resp.text.splitlines()) == 6
+    assert peak == 2
+
+
+@pytest.mark.parametrize(
+    ("device_ids", "message"),
+    [(("twin", "twin"), "Duplicate device IDs: twin"), ((), None)],
+)
+def test_batch_rejects_duplicate_or_empty_batches(
+    test_client: TestClient, csr_pem: str, device_ids: tuple[str, ...], message: str | None
+) -> None:
+    resp = test_client.post("/devices/enroll:batch", json=_batch(*device_ids, csr=csr_pem))
+    assert resp.status_code == 422
+    if message:
+        assert resp.json()["detail"] == message
+
+
+def test_batch_rejects_oversized_batch(test_client: TestClient, csr_pem: str) -> None:
+    app.dependency_overrides[get_settings] = lambda: Settings(enrollment_batch_max_devices=2)
+    resp = test_client.post("/devices/enroll:batch", json=_batch("a", "b", "c", csr=csr_pem))
+    assert resp.status_code == 422
+    assert "At most 2 devices" in resp.json()["detail"]
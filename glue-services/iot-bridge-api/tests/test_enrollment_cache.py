@@ -0,0 +1,63 @@
+"""Unit tests for the persistent enrollment retry cache."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from app.clients import enrollment_cache
+from app.clients.enrollment_cache import EnrollmentCache
+
+RESPONSE = {"certificate": "CERT", "ca_chain": "CA", "wireguard_ip": "10.0.0.2"}
+
+
+async def test_hit_requires_same_device_csr_and_wg_key(tmp_path: Path) -> None:
+    cache = EnrollmentCache(tmp_path / "cache.json")
+    await cache.put("dev-1", "fp-1", "wg-key", RESPONSE)
+
+    assert await cache.get("dev-1", "fp-1", "wg-key") == RESPONSE
+    assert await cache.get("dev-1", "fp-2", "wg-key") is None
+    assert await cache.get("dev-2", "fp-1", "wg-key") is None
+    assert await cache.get("dev-1", "fp-1", "other-key") is None
+    assert cache.stats() == {"ttl_s": 3600.0, "entries": 1, "hits": 1, "misses": 3}
+
+
+async def test_entries_are_shared_through_the_file(tmp_path: Path) -> None:
+    path = tmp_path / "cache.json"
+    worker_a, worker_b = EnrollmentCache(path), EnrollmentCache(path)
+    assert await worker_b.get("dev-1", "fp-1") is None
+
+    await worker_a.put("dev-1", "fp-1", None, RESPONSE)
+    assert await worker_b.get("dev-1", "fp-1") == RESPONSE
+    await worker_b.put("dev-2", "fp-2", None, RESPONSE)
+    assert set(json.loads(path.read_bytes())) == {"dev-1/fp-1", "dev-2/fp-2"}
+
+
+async def test_expired_entries_miss_and_are_pruned(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    now = 1_000_000.0
+    monkeypatch.setattr(enrollment_cache.time, "time", lambda: now)
+    cache = EnrollmentCache(tmp_path / "cache.json", ttl=60)
+    await cache.put("dev-1", "fp-1", None, RESPONSE)
+
+    now += 61
+    assert await cache.get("dev-1", "fp-1") is None
+    await cache.put("dev-2", "fp-2", None, RESPONSE)
+    assert cache.stats()["entries"] == 1
+
+
+async def test_corrupt_file_is_an_empty_cache_until_rewritten(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    path = tmp_path / "cache.json"
+    path.write_bytes(b'{"dev-1/fp-1": {"wg_public_key"')  # torn by a full disk
+    cache = EnrollmentCache(path)
+    assert await cache.get("dev-1", "fp-1") is None
+    assert "Ignoring unreadable enrollment cache" in caplog.text
+
+    await cache.put("dev-2", "fp-2", None, RESPONSE)
+    assert set(json.loads(path.read_bytes())) == {"dev-2/fp-2"}
+    assert await EnrollmentCache(path).get("dev-2", "fp-2") == RESPONSE
@@ -0,0 +1,108 @@
+"""Unit tests for the cross-process file locks and the JSON stores built on them."""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import socket
+from pathlib import Path
+
+import pytest
+
+from app import deps, serve
+from app.clients.join_key_store import create_key, load_keys, validate_and_consume
+from app.clients.join_store import load_store, update_store
+from app.config import Settings
+from app.file_lock import locked, write_atomic
+
+
+def _increment(path: str, rounds: int) -> None:
+    counter = Path(path)
+    for _ in range(rounds):
+        with locked(counter):
+            value = int(counter.read_text()) if counter.exists() else 0
+            write_atomic(counter, str(value + 1).encode())
+
+
+def test_locked_serialises_read_modify_write_across_processes(tmp_path: Path) -> None:
+    counter = tmp_path / "counter"
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_increment, args=(str(counter), 50)) for _ in range(4)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    assert counter.read_text() == "200"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["counter", "counter.lock"]
+
+
+@pytest.fixture()
+def settings(tmp_path: Path) -> Settings:
+    return Settings(
+        join_requests_db_path=str(tmp_path / "join_requests.json"),
+        join_keys_db_path=str(tmp_path / "join_keys.json"),
+    )
+
+
+async def test_update_store_saves_only_on_clean_exit(settings: Settings) -> None:
+    async with update_store(settings) as store:
+        store["acme"] = {"status": "pending"}
+    with pytest.raises(RuntimeError):
+        async with update_store(settings) as store:
+            store["acme"]["status"] = "approved"
+            raise RuntimeError("approval failed")
+    assert await load_store(settings) == {"acme": {"status": "pending"}}
+
+
+async def test_concurrent_updates_are_not_lost(settings: Settings) -> None:
+    async def add(tenant: str) -> None:
+        async with update_store(settings) as store:
+            await asyncio.sleep(0)
+            store[tenant] = {"status": "pending"}
+
+    await asyncio.gather(*(add(f"t{i}") for i in range(10)))
+    assert len(await load_store(settings)) == 10
+
+
+async def test_join_key_is_consumed_exactly_once(settings: Settings) -> None:
+    key = await create_key("acme", "ACME", settings)
+    results = await asyncio.gather(
+        *(validate_and_consume(key, settings) for _ in range(5)), return_exceptions=True
+    )
+    assert sum(isinstance(r, dict) for r in results) == 1
+    assert sum(isinstance(r, ValueError) for r in results) == 4
+    assert (await load_keys(settings))[key]["status"] == "used"
+
+
+def test_reuseport_sockets_share_a_port() -> None:
+    first = serve.reuseport_socket("127.0.0.1", 0)
+    port = first.getsockname()[1]
+    second = serve.reuseport_socket("127.0.0.1", port)
+    try:
+        assert second.getsockname()[1] == port
+        assert second.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_worker_environment(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert serve.worker_id() is None
+    assert serve.worker_count() == 1
+    monkeypatch.setenv(serve.WORKER_ID_ENV, "2")
+    monkeypatch.setenv(serve.WORKERS_ENV, "4")
+    assert (serve.worker_id(), serve.worker_count()) == (2, 4)
+
+
+def test_per_process_telemetry_caches_are_bypassed_under_several_workers(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv(serve.WORKERS_ENV, "4")
+    deps.get_duplicate_filter.cache_clear()
+    deps.get_latest_value_cache.cache_clear()
+    try:
+        assert not deps.get_duplicate_filter().enabled
+        assert deps.get_latest_value_cache().stats()["ttl_s"] == 0
+    finally:
+        deps.get_duplicate_filter.cache_clear()
+        deps.get_latest_value_cache.cache_clear()
@@ -0,0 +1,60 @@
+"""Unit tests for the orjson-backed request / response codec."""
+
+from __future__ import annotations
+
+import json
+from datetime import UTC, datetime
+
+from fastapi import FastAPI
+from fastapi.datastructures import Default
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from app.json_codec import FastJSONResponse, FastJSONRoute, dumps, loads
+
+
+class Item(BaseModel):
+    name: str
+    values: list[float]
+
+
+def _app() -> FastAPI:
+    app = FastAPI(default_response_class=Default(FastJSONResponse))
+    app.router.route_class = FastJSONRoute
+
+    @app.post("/items", response_model=Item)
+    async def create(item: Item) -> Item:
+        return item
+
+    @app.get("/plain")
+    async def plain() -> FastJSONResponse:
+        return FastJSONResponse({"at": datetime(2024, 5, 1, tzinfo=UTC), 1: "int key"})
+
+    return app
+
+
+def test_dumps_and_loads_round_trip() -> None:
+    data = {"pem": "-----BEGIN CERTIFICATE-----\nMIIB\n", "n": [1, 2.5, None]}
+    assert loads(dumps(data)) == data
+    assert json.loads(dumps(data, indent=True)) == data
+    assert b"\n  " in dumps(data, indent=True)
+
+
+def test_request_body_is_parsed_and_validated() -> None:
+    client = TestClient(_app())
+    resp = client.post("/items", json={"name": "cpu", "values": [1, 2.5]})
+    assert resp.status_code == 200
+    assert resp.json() == {"name": "cpu", "values": [1.0, 2.5]}
+
+
+def test_malformed_body_is_still_a_422() -> None:
+    client = TestClient(_app())
+    resp = client.post("/items", content=b"{broken", headers={"content-type": "application/json"})
+    assert resp.status_code == 422
+    assert resp.json()["detail"][0]["type"] == "json_invalid"
+
+
+def test_fast_response_handles_datetimes_and_non_str_keys() -> None:
+    resp = TestClient(_app()).get("/plain")
+    assert resp.headers["content-type"] == "application/json"
+    assert resp.json() == {"at": "2024-05-01T00:00:00+00:00", "1": "int key"}
@@ -0,0 +1,169 @@
+"""Unit tests for the latest-value cache and GET /devices/{id}/latest."""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.clients import latest_values
+from app.clients.latest_values import LatestValue, LatestValueCache
+from app.clients.timescaledb import TimescaleDBClient
+
+_T0 = datetime(2024, 5, 1, tzinfo=UTC)
+
+
+def _row(device: str, metric: str, value: float, time: datetime, tenant: str = "t1") -> dict:
+    return {
+        "time": time,
+        "tenant_id": tenant,
+        "device_id": device,
+        "metric_name": metric,
+        "value": value,
+        "tags": {"raw_type": "float"},
+    }
+
+
+# ── Cache ─────────────────────────────────────────────────────────────────────
+
+
+def test_cache_keeps_newest_value_per_metric() -> None:
+    cache = LatestValueCache()
+    cache.update([_row("d1", "cpu", 1.0, _T0 + timedelta(seconds=5))])
+    cache.update([_row("d1", "cpu", 0.5, _T0)])  # late, older sample
+    values = cache.merge("t1", "d1", {"temp": LatestValue(_T0, 21.0, "float")})
+    assert values["cpu"].value == 1.0
+    assert values["temp"].value == 21.0
+
+
+_TEMP = {"temp": LatestValue(_T0, 21.0, "float")}
+
+
+def test_cache_accepts_column_tuples() -> None:
+    cache = LatestValueCache()
+    cache.update_records([(_T0, "t1", "d1", "cpu", 3.0, b'{"raw_type":"int"}')])
+    values = cache.merge("t1", "d1", _TEMP)
+    assert values["cpu"] == LatestValue(_T0, 3.0, "int")
+
+
+def test_cache_entry_incomplete_until_merged() -> None:
+    cache = LatestValueCache()
+    cache.update([_row("d1", "cpu", 1.0, _T0)])
+    assert cache.get("t1", "d1") is None
+    cache.merge("t1", "d1", _TEMP)
+    assert cache.get("t1", "d1") == {"cpu": LatestValue(_T0, 1.0, "float")} | _TEMP
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_empty_database_result_is_not_cached() -> None:
+    cache = LatestValueCache(max_devices=1)
+    cache.update([_row("d1", "cpu", 1.0, _T0)])
+    assert cache.merge("t1", "ghost", {}) == {}
+    assert cache.get("t1", "ghost") is None  # asked again next time
+    assert cache.merge("t1", "d1", {}) == {"cpu": LatestValue(_T0, 1.0, "float")}
+    assert cache.get("t1", "d1") is None  # live values only: still incomplete
+    assert cache.stats()["evictions"] == 0
+
+
+def test_complete_entry_expires_after_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(latest_values.time, "monotonic", lambda: now[0])
+    cache = LatestValueCache(ttl=60)
+    cache.merge("t1", "d1", _TEMP)
+    assert cache.get("t1", "d1") == _TEMP
+    now[0] += 60
+    assert cache.get("t1", "d1") is None
+
+
+def test_cache_is_tenant_scoped() -> None:
+    cache = LatestValueCache()
+    cache.update([_row("d1", "cpu", 1.0, _T0, tenant="a")])
+    cache.merge("a", "d1", _TEMP)
+    assert cache.get("b", "d1") is None
+
+
+def test_cache_evicts_least_recently_used_device() -> None:
+    cache = LatestValueCache(max_devices=2)
+    for device in ("d1", "d2"):
+        cache.update([_row(device, "cpu", 1.0, _T0)])
+        cache.merge("t1", device, _TEMP)
+    cache.get("t1", "d1")  # d2 is now the idle one
+    cache.update([_row("d3", "cpu", 1.0, _T0)])
+    assert len(cache) == 2
+    assert cache.get("t1", "d2") is None
+    assert cache.get("t1", "d1") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+# ── Endpoint ──────────────────────────────────────────────────────────────────
+
+
+class RecordingConnection:
+    def __init__(self, rows: list[dict[str, Any]]) -> None:
+        self.rows = rows
+        self.calls: list[tuple[Any, ...]] = []
+
+    async def fetch(self, sql: str, *args: Any) -> list[dict[str, Any]]:
+        self.calls.append((sql, *args))
+        return self.rows
+
+
+@pytest.fixture()
+def db(mock_timescaledb: TimescaleDBClient) -> RecordingConnection:
+    conn = RecordingConnection(
+        [{"metric_name": "temp", "time": _T0, "value": 21.5, "raw_type": "float"}]
+    )
+
+    @asynccontextmanager
+    async def connection() -> AsyncIterator[RecordingConnection]:
+        yield conn
+
+    mock_timescaledb.connection = connection  # type: ignore[method-assign]
+    mock_timescaledb.storage_mode = "wide"  # type: ignore[misc]
+    return conn
+
+
+def test_latest_loads_from_db_once_then_serves_from_memory(
+    test_client: TestClient, db: RecordingConnection
+) -> None:
+    posted = test_client.post(
+        "/webhooks/thingsboard/telemetry",
+        json={
+            "msgType": "POST_TELEMETRY_REQUEST",
+            "metadata": {"deviceId": "dev-1", "tenantId": "t1"},
+            "data": {"cpu": 0.7},
+        },
+    )
+    assert posted.status_code == 200
+
+    first = test_client.get("/devices/dev-1/latest", params={"tenant_id": "t1"})
+    assert first.status_code == 200
+    assert first.json()["source"] == "database"
+    assert set(first.json()["values"]) == {"cpu", "temp"}
+    sql, tenant, device, _since = db.calls[0]
+    assert "DISTINCT ON (metric_name)" in sql
+    assert (tenant, device) == ("t1", "dev-1")
+
+    second = test_client.get("/devices/dev-1/latest", params={"tenant_id": "t1", "metric": "cpu"})
+    assert second.json()["source"] == "cache"
+    assert second.json()["values"]["cpu"]["value"] == 0.7
+    assert list(second.json()["values"]) == ["cpu"]
+    assert len(db.calls) == 1
+
+
+def test_latest_unknown_device_returns_404(
+    test_client: TestClient, db: RecordingConnection
+) -> None:
+    db.rows = []
+    resp = test_client.get("/devices/ghost/latest", params={"tenant_id": "t1"})
+    assert resp.status_code == 404
+    # Not cached: the database is asked again once the device has data.
+    db.rows = [{"metric_name": "temp", "time": _T0, "value": 20.0, "raw_type": "float"}]
+    resp = test_client.get("/devices/ghost/latest", params={"tenant_id": "t1"})
+    assert resp.status_code == 200
+    assert len(db.calls) == 2
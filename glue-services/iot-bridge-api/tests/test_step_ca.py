@@ -0,0 +1,246 @@
+"""Unit tests for the step-ca provisioner key cache against a fake CA and the local signer."""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+from pathlib import Path
+from typing import Any
+
+import httpx
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+from jwcrypto import jwk  # type: ignore[import]
+from jwcrypto.jwe import JWE  # type: ignore[import]
+
+from app.clients import step_ca
+from app.clients.step_ca import LocalSigner, ProvisionerKeyCache, StepCAClient, StepCAError
+from app.crypto import CryptoExecutor
+
+from .conftest import make_test_csr
+
+CA_URL = "https://ca.test:9000"
+
+
+def _encrypted_key(key: jwk.JWK, password: str) -> str:
+    jwe = JWE(
+        key.export_private().encode(),
+        json.dumps({"alg": "PBES2-HS256+A128KW", "enc": "A128GCM", "p2c": 1000}),
+    )
+    jwe.add_recipient(jwk.JWK.from_password(password))
+    return str(jwe.serialize(compact=True))
+
+
+class FakeCA:
+    """Serves /1.0/provisioners and /1.0/sign; can reject the next signatures."""
+
+    def __init__(self) -> None:
+        self.key = jwk.JWK.generate(kty="EC", crv="P-256", kid="prov-1")
+        self.provisioner_fetches = 0
+        self.signs = 0
+        self.reject = 0
+        self.rejection = httpx.Response(401, json={"message": "invalid token"})
+        self.clients_opened = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/1.0/provisioners":
+            self.provisioner_fetches += 1
+            prov = {
+                "name": "iot-bridge",
+                "type": "JWK",
+                "encryptedKey": _encrypted_key(self.key, "secret"),
+            }
+            return httpx.Response(200, json={"provisioners": [prov]})
+        self.signs += 1
+        if self.reject:
+            self.reject -= 1
+            return self.rejection
+        return httpx.Response(200, json={"crt": "CERT", "ca": "CA"})
+
+
+@pytest.fixture()
+def fake_ca(monkeypatch: pytest.MonkeyPatch) -> FakeCA:
+    ca = FakeCA()
+    real_client = httpx.AsyncClient
+
+    def client(**kwargs: Any) -> httpx.AsyncClient:
+        kwargs.pop("verify", None)
+        ca.clients_opened += 1
+        return real_client(transport=httpx.MockTransport(ca.handler), **kwargs)
+
+    monkeypatch.setattr(step_ca.httpx, "AsyncClient", client)
+    return ca
+
+
+def _client(cache: ProvisionerKeyCache) -> StepCAClient:
+    return StepCAClient(CA_URL, "iot-bridge", "secret", key_cache=cache)
+
+
+async def test_single_flight_load_for_concurrent_misses() -> None:
+    cache = ProvisionerKeyCache()
+    calls = 0
+
+    async def load() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "key"
+
+    keys = await asyncio.gather(*(cache.get(CA_URL, "p", load) for _ in range(20)))
+    assert keys == ["key"] * 20
+    assert calls == 1
+    assert await cache.get(CA_URL, "p", load) == "key"
+    assert calls == 1
+    await cache.get(CA_URL, "other", load)
+    assert calls == 2
+
+
+async def test_failed_loads_and_zero_ttl_are_not_cached() -> None:
+    cache = ProvisionerKeyCache(ttl=0)
+
+    async def fail() -> str:
+        raise StepCAError("down")
+
+    with pytest.raises(StepCAError):
+        await cache.get(CA_URL, "p", fail)
+
+    async def load() -> str:
+        return "key"
+
+    assert await cache.get(CA_URL, "p", load) == "key"
+    await cache.get(CA_URL, "p", load)
+    assert cache.loads == 3
+
+
+async def test_clients_share_one_decrypted_key(fake_ca: FakeCA) -> None:
+    cache = ProvisionerKeyCache()
+    csr = make_test_csr("dev-1")
+    results = await asyncio.gather(
+        *(_client(cache).sign_certificate(csr, "dev-1", ["dev-1"]) for _ in range(5))
+    )
+    assert results == [("CERT", "CA")] * 5
+    assert fake_ca.provisioner_fetches == 1
+    assert fake_ca.signs == 5
+
+
+async def test_pooled_client_signs_over_one_connection_pool(fake_ca: FakeCA) -> None:
+    csr = make_test_csr("dev-1")
+    async with _client(ProvisionerKeyCache()).pooled(4) as client:
+        results = await asyncio.gather(
+            *(client.sign_certificate(csr, "dev-1", ["dev-1"]) for _ in range(5))
+        )
+    assert results == [("CERT", "CA")] * 5
+    assert fake_ca.clients_opened == 2  # the pool + the provisioner key fetch
+
+
+async def test_rejected_token_reloads_the_key_and_retries_once(fake_ca: FakeCA) -> None:
+    cache = ProvisionerKeyCache()
+    csr = make_test_csr("dev-1")
+    await _client(cache).sign_certificate(csr, "dev-1", ["dev-1"])
+    fake_ca.reject = 1
+    assert await _client(cache).sign_certificate(csr, "dev-1", ["dev-1"]) == ("CERT", "CA")
+    assert fake_ca.provisioner_fetches == 2
+    fake_ca.reject = 2
+    with pytest.raises(StepCAError, match="401"):
+        await _client(cache).sign_certificate(csr, "dev-1", ["dev-1"])
+
+
+async def test_policy_rejection_keeps_the_key_and_is_not_retried(fake_ca: FakeCA) -> None:
+    cache = ProvisionerKeyCache()
+    csr = make_test_csr("dev-1")
+    await _client(cache).sign_certificate(csr, "dev-1", ["dev-1"])
+    fake_ca.rejection = httpx.Response(
+        403, json={"message": "certificate request does not contain the valid DNS names"}
+    )
+    fake_ca.reject = 1
+    with pytest.raises(StepCAError, match="403"):
+        await _client(cache).sign_certificate(csr, "dev-1", ["dev-1"])
+    assert fake_ca.signs == 2
+    assert fake_ca.provisioner_fetches == 1
+    # A 403 that blames the token is a stale key like a 401.
+    fake_ca.rejection = httpx.Response(403, json={"message": "error validating token"})
+    fake_ca.reject = 1
+    assert await _client(cache).sign_certificate(csr, "dev-1", ["dev-1"]) == ("CERT", "CA")
+    assert fake_ca.provisioner_fetches == 2
+
+
+# ── Local signing mode ────────────────────────────────────────────────────────
+
+
+@pytest.fixture()
+def intermediate(tmp_path: Path) -> tuple[x509.Certificate, Path, Path]:
+    """An intermediate CA certificate and its password-protected key on disk."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "CDM Intermediate CA")])
+    now = datetime.datetime.now(datetime.UTC)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(1)
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=365))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=0), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = tmp_path / "intermediate_ca.crt", tmp_path / "intermediate_ca_key"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.BestAvailableEncryption(b"ca-secret"),
+        )
+    )
+    return cert, cert_path, key_path
+
+
+async def test_local_signer_issues_leaf_and_records_it(
+    intermediate: tuple[x509.Certificate, Path, Path], tmp_path: Path
+) -> None:
+    ca_cert, cert_path, key_path = intermediate
+    index = tmp_path / "issued.ndjson"
+    executor = CryptoExecutor("thread", max_workers=2)
+    signer = LocalSigner(
+        cert_path, key_path, index, "ca-secret", validity_hours=1, crypto=executor
+    )
+    try:
+        async with signer.pooled(4) as pooled:
+            leaf_pem, chain_pem = await pooled.sign_certificate(
+                make_test_csr("dev-1"), "dev-1", ["dev-1", "10.13.13.2"]
+            )
+    finally:
+        executor.shutdown()
+
+    assert chain_pem == cert_path.read_text()
+    leaf = x509.load_pem_x509_certificate(leaf_pem.encode())
+    leaf.verify_directly_issued_by(ca_cert)
+    assert leaf.subject.rfc4514_string() == "CN=dev-1"
+    san = leaf.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+    assert san.get_values_for_type(x509.DNSName) == ["dev-1"]
+    assert [str(ip) for ip in san.get_values_for_type(x509.IPAddress)] == ["10.13.13.2"]
+    assert not leaf.extensions.get_extension_for_class(x509.BasicConstraints).value.ca
+    eku = leaf.extensions.get_extension_for_class(x509.ExtendedKeyUsage).value
+    assert set(eku) == {ExtendedKeyUsageOID.SERVER_AUTH, ExtendedKeyUsageOID.CLIENT_AUTH}
+    assert leaf.not_valid_after_utc - leaf.not_valid_before_utc <= datetime.timedelta(minutes=61)
+
+    (record,) = [json.loads(line) for line in index.read_text().splitlines()]
+    assert record["serial"] == f"{leaf.serial_number:x}"
+    assert record["subject"] == "dev-1"
+    assert record["fingerprint"] == leaf.fingerprint(hashes.SHA256()).hex()
+    assert signer.issued == 1
+
+
+async def test_local_signer_reports_an_unusable_key(
+    intermediate: tuple[x509.Certificate, Path, Path], tmp_path: Path
+) -> None:
+    _, cert_path, key_path = intermediate
+    signer = LocalSigner(cert_path, key_path, tmp_path / "issued.ndjson", "wrong")
+    with pytest.raises(StepCAError, match="Local signing failed"):
+        await signer.sign_certificate(make_test_csr("dev-1"), "dev-1", ["dev-1"])
+    assert not (tmp_path / "issued.ndjson").exists()
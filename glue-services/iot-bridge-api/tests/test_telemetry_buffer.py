@@ -0,0 +1,158 @@
+"""Unit tests for the write-behind TelemetryBuffer."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from app.clients.telemetry_buffer import TelemetryBuffer, TelemetryOverloadedError
+from app.clients.timescaledb import TimescaleDBError
+
+
+class RecordingWriter:
+    """In-memory stand-in for TimescaleDBClient.write_metrics."""
+
+    def __init__(self, fail: bool = False) -> None:
+        self.batches: list[list[dict[str, Any]]] = []
+        self.fail = fail
+
+    async def write_metrics(self, rows: list[dict[str, Any]]) -> None:
+        if self.fail:
+            raise TimescaleDBError("connection refused")
+        self.batches.append(list(rows))
+
+
+def _rows(n: int, device: str = "dev") -> list[dict[str, Any]]:
+    return [
+        {"tenant_id": "t", "device_id": device, "metric_name": f"m{i}", "value": float(i)}
+        for i in range(n)
+    ]
+
+
+async def test_not_running_writes_through() -> None:
+    writer = RecordingWriter()
+    buffer = TelemetryBuffer(writer)
+    assert await buffer.submit(_rows(2)) == "written"
+    assert writer.batches == [_rows(2)]
+
+
+async def test_concurrent_submits_are_coalesced_into_one_batch() -> None:
+    writer = RecordingWriter()
+    buffer = TelemetryBuffer(writer, max_rows=1000, max_latency=0.05)
+    await buffer.start()
+    results = await asyncio.gather(*(buffer.submit(_rows(3, f"d{i}")) for i in range(50)))
+    await buffer.stop()
+    assert set(results) == {"written"}
+    assert len(writer.batches) == 1
+    assert len(writer.batches[0]) == 150
+
+
+async def test_row_threshold_triggers_flush_before_latency() -> None:
+    writer = RecordingWriter()
+    buffer = TelemetryBuffer(writer, max_rows=10, max_latency=60)
+    await buffer.start()
+    await asyncio.wait_for(buffer.submit(_rows(10)), timeout=1)
+    assert len(writer.batches) == 1
+    await buffer.stop()
+
+
+async def test_latency_threshold_triggers_flush() -> None:
+    writer = RecordingWriter()
+    buffer = TelemetryBuffer(writer, max_rows=10_000, max_latency=0.02)
+    await buffer.start()
+    await asyncio.wait_for(buffer.submit(_rows(1)), timeout=1)
+    assert writer.batches == [_rows(1)]
+    await buffer.stop()
+
+
+async def test_flush_mode_propagates_write_errors() -> None:
+    buffer = TelemetryBuffer(RecordingWriter(fail=True), max_latency=0.01)
+    await buffer.start()
+    with pytest.raises(TimescaleDBError):
+        await buffer.submit(_rows(1))
+    await buffer.stop()
+
+
+async def test_buffer_mode_acks_before_write_and_drains_on_stop() -> None:
+    writer = RecordingWriter()
+    buffer = TelemetryBuffer(writer, max_rows=10_000, max_latency=60, ack_mode="buffer")
+    await buffer.start()
+    assert await buffer.submit(_rows(5)) == "buffered"
+    assert writer.batches == []
+    assert buffer.stats()["pending_rows"] == 5
+    await buffer.stop()
+    assert writer.batches == [_rows(5)]
+    assert buffer.stats()["rows_flushed"] == 5
+
+
+async def test_buffer_mode_counts_dropped_rows() -> None:
+    buffer = TelemetryBuffer(RecordingWriter(fail=True), max_latency=60, ack_mode="buffer")
+    await buffer.start()
+    await buffer.submit(_rows(4))
+    await buffer.stop()
+    assert buffer.stats()["rows_dropped"] == 4
+
+
+async def test_per_call_buffer_ack_counts_dropped_rows() -> None:
+    buffer = TelemetryBuffer(RecordingWriter(fail=True), max_latency=60)
+    await buffer.start()
+    assert await buffer.submit(_rows(3), ack_mode="buffer") == "buffered"
+    await buffer.stop()
+    assert buffer.stats()["rows_dropped"] == 3
+
+
+# ── Admission control ─────────────────────────────────────────────────────────
+
+
+class SlowWriter(RecordingWriter):
+    """Blocks every write until ``release`` is set."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.release = asyncio.Event()
+
+    async def write_metrics(self, rows: list[dict[str, Any]]) -> None:
+        await self.release.wait()
+        await super().write_metrics(rows)
+
+
+async def test_sheds_above_high_watermark_until_below_low() -> None:
+    writer = SlowWriter()
+    buffer = TelemetryBuffer(writer, max_rows=1, high_watermark=10, low_watermark=4)
+    await buffer.start()
+    first = asyncio.create_task(buffer.submit(_rows(8)))
+    await asyncio.sleep(0.01)
+    assert buffer.pending_rows == 8
+
+    with pytest.raises(TelemetryOverloadedError) as excinfo:
+        await buffer.submit(_rows(3))
+    assert excinfo.value.retry_after >= 1
+    assert not excinfo.value.writer_failing
+    # Hysteresis: even a small request is shed until the backlog drains.
+    with pytest.raises(TelemetryOverloadedError):
+        await buffer.submit(_rows(1))
+    assert buffer.stats()["shedding"] is True
+    assert buffer.stats()["occupancy"] == 0.8
+
+    writer.release.set()
+    await first
+    assert await buffer.submit(_rows(1)) == "written"
+    await buffer.stop()
+    stats = buffer.stats()
+    assert stats["shedding"] is False
+    assert stats["requests_shed"] == 2
+    assert stats["rows_shed"] == 4
+
+
+async def test_oversized_request_is_admitted_into_empty_queue() -> None:
+    buffer = TelemetryBuffer(RecordingWriter(), high_watermark=10)
+    assert await buffer.submit(_rows(25)) == "written"
+
+
+async def test_retry_after_follows_drain_rate() -> None:
+    buffer = TelemetryBuffer(RecordingWriter(), high_watermark=100, low_watermark=5)
+    buffer._drain_rate = 10.0
+    assert buffer._retry_after(55) == 5
+    assert buffer._retry_after(10_000) == 60
@@ -0,0 +1,297 @@
+"""Unit tests for the AMQP telemetry consumer against an in-memory broker."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import pytest
+
+from app.clients.latest_values import LatestValueCache
+from app.clients.telemetry_buffer import TelemetryBuffer
+from app.clients.telemetry_consumer import TelemetryConsumer
+from app.clients.timescaledb import TimescaleDBError
+from app.routers.webhooks import message_rows
+
+
+class RecordingWriter:
+    def __init__(self, fail: bool = False) -> None:
+        self.batches: list[list[dict[str, Any]]] = []
+        self.fail = fail
+
+    async def write_metrics(self, rows: list[dict[str, Any]]) -> None:
+        if self.fail:
+            raise TimescaleDBError("connection refused")
+        self.batches.append(list(rows))
+
+
+class FakeMessage:
+    def __init__(
+        self,
+        channel: FakeChannel,
+        tag: int,
+        body: bytes,
+        routing_key: str = "",
+        headers: dict[str, Any] | None = None,
+    ) -> None:
+        self._channel = channel
+        self.delivery_tag = tag
+        self.body = body
+        self.routing_key = routing_key
+        self.headers = headers or {}
+
+    async def ack(self, multiple: bool = False) -> None:
+        self._channel.settle(self.delivery_tag, "ack", multiple)
+
+    async def nack(self, multiple: bool = False, requeue: bool = True) -> None:
+        self._channel.settle(self.delivery_tag, "requeue" if requeue else "nack", multiple)
+
+    async def reject(self, requeue: bool = False) -> None:
+        self._channel.settle(self.delivery_tag, "requeue" if requeue else "reject", False)
+
+
+class FakeChannel:
+    """One channel of a broker that honours basic.qos prefetch and multiple acks."""
+
+    def __init__(self) -> None:
+        self.prefetch = 0
+        self.queue: str | None = None
+        self.bindings: list[tuple[str, str]] = []
+        self.ready: list[tuple[bytes, str]] = []
+        self.unacked: dict[int, tuple[bytes, str]] = {}
+        self.settled: list[tuple[int, str]] = []
+        self.max_unacked = 0
+        self._callback: Callable[[Any], Awaitable[None]] | None = None
+        self._tag = 0
+
+    async def set_qos(self, prefetch_count: int) -> None:
+        self.prefetch = prefetch_count
+
+    async def declare_queue(self, name: str, durable: bool = False) -> FakeChannel:
+        assert durable
+        self.queue = name
+        return self
+
+    async def bind(self, exchange: str, routing_key: str) -> None:
+        self.bindings.append((exchange, routing_key))
+
+    async def consume(self, callback: Callable[[Any], Awaitable[None]]) -> None:
+        self._callback = callback
+        await self._deliver()
+
+    def publish(self, body: bytes | dict[str, Any], routing_key: str = "telemetry") -> None:
+        data = json.dumps(body).encode() if isinstance(body, dict) else body
+        self.ready.append((data, routing_key))
+        asyncio.get_running_loop().create_task(self._deliver())
+
+    async def _deliver(self) -> None:
+        while self._callback and self.ready and len(self.unacked) < self.prefetch:
+            self._tag += 1
+            body, routing_key = self.ready.pop(0)
+            self.unacked[self._tag] = (body, routing_key)
+            self.max_unacked = max(self.max_unacked, len(self.unacked))
+            await self._callback(FakeMessage(self, self._tag, body, routing_key))
+
+    def settle(self, tag: int, outcome: str, multiple: bool) -> None:
+        tags = [t for t in sorted(self.unacked) if t <= tag] if multiple else [tag]
+        for t in tags:
+            message = self.unacked.pop(t)
+            self.settled.append((t, outcome))
+            if outcome == "requeue":
+                self.ready.append(message)
+        asyncio.get_running_loop().create_task(self._deliver())
+
+
+class FakeConnection:
+    def __init__(self, channel: FakeChannel) -> None:
+        self._channel = channel
+        self.closed = False
+
+    async def channel(self) -> FakeChannel:
+        return self._channel
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def _event(device: str, **values: Any) -> dict[str, Any]:
+    return {
+        "msgType": "POST_TELEMETRY_REQUEST",
+        "metadata": {"deviceName": device, "tenantId": "spoofed", "ts": "1714521600000"},
+        "data": values,
+    }
+
+
+def _consumer(
+    buffer: TelemetryBuffer, channels: dict[str, FakeChannel], **kwargs: Any
+) -> TelemetryConsumer:
+    async def connect(vhost: str) -> FakeConnection:
+        return FakeConnection(channels[vhost])
+
+    async def vhosts() -> list[str]:
+        return list(channels)
+
+    kwargs.setdefault("max_latency", 0.01)
+    kwargs.setdefault("retry_interval", 0.01)
+    return TelemetryConsumer(buffer, message_rows, connect, vhosts, **kwargs)
+
+
+async def _until(predicate: Callable[[], bool]) -> None:
+    for _ in range(200):
+        if predicate():
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError("condition not reached")
+
+
+def test_message_rows_stamps_vhost_tenant_and_device_time() -> None:
+    body = (json.dumps(_event("dev-1", cpu=1)) + "\n" + json.dumps(_event("dev-2", t=2))).encode()
+    rows = message_rows(body, "tenant1")
+    assert [(r["tenant_id"], r["device_id"], r["metric_name"]) for r in rows] == [
+        ("tenant1", "dev-1", "cpu"),
+        ("tenant1", "dev-2", "t"),
+    ]
+    assert rows[0]["time"].timestamp() == 1714521600
+
+
+def test_message_rows_rejects_garbage() -> None:
+    with pytest.raises(ValueError):
+        message_rows(b"not json", "tenant1")
+    with pytest.raises(ValueError):
+        message_rows(b'{"data": 5}', "tenant1")
+
+
+def test_message_rows_takes_the_device_of_plain_payloads_from_the_topic() -> None:
+    rows = message_rows(b'{"cpu": 5, "t": 1}', "tenant1", "devices.dev-7.telemetry")
+    assert [(r["tenant_id"], r["device_id"], r["metric_name"]) for r in rows] == [
+        ("tenant1", "dev-7", "cpu"),
+        ("tenant1", "dev-7", "t"),
+    ]
+    sample = b'[{"ts": 1714521600000, "values": {"cpu": 5}}]'
+    rows = message_rows(sample, "tenant1", "v1.devices.me.telemetry", {"deviceId": b"dev-8"})
+    assert rows[0]["device_id"] == "dev-8"
+    assert rows[0]["time"].timestamp() == 1714521600
+
+
+def test_message_rows_rejects_plain_payloads_without_a_device_or_fields() -> None:
+    with pytest.raises(ValueError, match="no device"):
+        message_rows(b'{"cpu": 5}', "tenant1", "v1.devices.me.telemetry")
+    with pytest.raises(ValueError, match="no telemetry fields"):
+        message_rows(b"{}", "tenant1", "devices.dev-1.telemetry")
+    with pytest.raises(ValueError):
+        message_rows(json.dumps({"metadata": {}, "data": {"cpu": 1}}).encode(), "tenant1")
+
+
+async def test_batches_are_written_then_acked_per_vhost() -> None:
+    writer = RecordingWriter()
+    buffer = TelemetryBuffer(writer)
+    latest = LatestValueCache()
+    channels = {"tenant1": FakeChannel(), "tenant2": FakeChannel()}
+    consumer = _consumer(buffer, channels, prefetch=10, latest=latest)
+    await consumer.start()
+    await _until(lambda: consumer.vhosts == ["tenant1", "tenant2"])
+    for i in range(5):
+        channels["tenant1"].publish(_event(f"dev-{i}", cpu=i))
+    channels["tenant2"].publish(_event("dev-x", cpu=9))
+    await _until(lambda: consumer.stats()["messages_acked"] == 6)
+    await consumer.stop()
+
+    assert channels["tenant1"].queue == "iot-bridge.telemetry"
+    assert channels["tenant1"].bindings == [("amq.topic", "#.telemetry")]
+    assert channels["tenant1"].prefetch == 10
+    assert not channels["tenant1"].unacked
+    assert {row["tenant_id"] for batch in writer.batches for row in batch} == {
+        "tenant1",
+        "tenant2",
+    }
+    assert sum(len(batch) for batch in writer.batches) == 6
+    assert len(latest) == 6
+
+
+async def test_prefetch_bounds_unacked_messages_and_batch_size() -> None:
+    writer = RecordingWriter()
+    buffer = TelemetryBuffer(writer)
+    channel = FakeChannel()
+    consumer = _consumer(buffer, {"t": channel}, prefetch=4, max_latency=1)
+    await consumer.start()
+    await _until(lambda: consumer.vhosts == ["t"])
+    for i in range(10):
+        channel.publish(_event(f"dev-{i}", cpu=i))
+    await _until(lambda: consumer.stats()["messages_acked"] == 10)
+    await consumer.stop()
+    assert channel.max_unacked == 4
+    assert max(len(batch) for batch in writer.batches) <= 4
+
+
+async def test_undecodable_message_is_rejected_without_requeue() -> None:
+    writer = RecordingWriter()
+    channel = FakeChannel()
+    consumer = _consumer(TelemetryBuffer(writer), {"t": channel}, prefetch=10)
+    await consumer.start()
+    await _until(lambda: consumer.vhosts == ["t"])
+    channel.publish(b"{broken")
+    channel.publish(_event("dev-1", cpu=1))
+    await _until(lambda: consumer.stats()["messages_acked"] == 1)
+    await consumer.stop()
+    assert (1, "reject") in channel.settled
+    assert consumer.stats()["messages_rejected"] == 1
+    assert len(writer.batches) == 1
+
+
+async def test_plain_payload_without_a_device_is_dead_lettered_not_acked() -> None:
+    writer = RecordingWriter()
+    channel = FakeChannel()
+    consumer = _consumer(TelemetryBuffer(writer), {"t": channel}, prefetch=10)
+    await consumer.start()
+    await _until(lambda: consumer.vhosts == ["t"])
+    channel.publish({"cpu": 5}, routing_key="v1.devices.me.telemetry")
+    channel.publish({"cpu": 6}, routing_key="devices.dev-1.telemetry")
+    await _until(lambda: consumer.stats()["messages_acked"] == 1)
+    await consumer.stop()
+    assert (1, "reject") in channel.settled
+    assert consumer.stats()["messages_rejected"] == 1
+    assert [(r["device_id"], r["value"]) for r in writer.batches[0]] == [("dev-1", 6.0)]
+
+
+async def test_failed_write_requeues_the_batch_until_it_succeeds() -> None:
+    writer = RecordingWriter(fail=True)
+    channel = FakeChannel()
+    consumer = _consumer(TelemetryBuffer(writer), {"t": channel}, prefetch=10)
+    await consumer.start()
+    await _until(lambda: consumer.vhosts == ["t"])
+    channel.publish(_event("dev-1", cpu=1))
+    await _until(lambda: consumer.stats()["messages_requeued"] >= 1)
+    assert writer.batches == []
+    writer.fail = False
+    await _until(lambda: consumer.stats()["messages_acked"] == 1)
+    await consumer.stop()
+    assert [outcome for _, outcome in channel.settled][-1] == "ack"
+    assert len(writer.batches) == 1
+
+
+async def test_buffered_ack_mode_still_waits_for_the_flush() -> None:
+    writer = RecordingWriter()
+    buffer = TelemetryBuffer(writer, max_latency=0.05, ack_mode="buffer")
+    await buffer.start()
+    channel = FakeChannel()
+    consumer = _consumer(buffer, {"t": channel}, prefetch=10)
+    await consumer.start()
+    await _until(lambda: consumer.vhosts == ["t"])
+    channel.publish(_event("dev-1", cpu=1))
+    await _until(lambda: consumer.stats()["messages_acked"] == 1)
+    assert len(writer.batches) == 1
+    await consumer.stop()
+    await buffer.stop()
+
+
+async def test_refresh_stops_consumers_of_removed_vhosts() -> None:
+    channels = {"a": FakeChannel(), "b": FakeChannel()}
+    consumer = _consumer(TelemetryBuffer(RecordingWriter()), channels)
+    await consumer.refresh()
+    assert consumer.vhosts == ["a", "b"]
+    del channels["b"]
+    await consumer.refresh()
+    assert consumer.vhosts == ["a"]
+    await consumer.stop()
@@ -0,0 +1,103 @@
+"""Unit tests for the time-windowed DuplicateFilter and message keys."""
+
+from __future__ import annotations
+
+import pytest
+
+from app.clients import telemetry_dedup
+from app.clients.telemetry_dedup import DuplicateFilter, DuplicateInFlightError, message_key
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(telemetry_dedup.time, "monotonic", fake)
+    return fake
+
+
+def test_message_key_prefers_message_id_over_payload() -> None:
+    meta = {"ts": "1714521600000", "msgId": "m-1"}
+    assert message_key("t1", "d1", meta, b"a") == message_key("t1", "d2", meta, b"b")
+    assert message_key("t1", "d1", meta, b"a") != message_key("t2", "d1", meta, b"a")
+    assert message_key("t1", "d1", {}, b"a", "m-1") == message_key("t1", "d1", meta, b"x")
+
+
+def test_message_key_hashes_device_ts_and_payload() -> None:
+    meta = {"ts": "1714521600000"}
+    key = message_key("t1", "d1", meta, b'{"cpu":1}')
+    assert key == message_key("t1", "d1", dict(meta), b'{"cpu":1}')
+    assert key != message_key("t1", "d1", meta, b'{"cpu":2}')
+    assert key != message_key("t1", "d1", {"ts": "1714521600001"}, b'{"cpu":1}')
+    assert key != message_key("t1", "d2", meta, b'{"cpu":1}')
+
+
+def test_message_without_id_or_ts_has_no_key() -> None:
+    assert message_key("t1", "d1", {}, b'{"cpu":1}') is None
+    assert not DuplicateFilter().seen(None)
+
+
+def test_seen_reports_repeats_until_forgotten(clock: FakeClock) -> None:
+    dedup = DuplicateFilter(window=60)
+    assert not dedup.seen(1)
+    dedup.commit([1, None])
+    assert dedup.seen(1)
+    dedup.forget([1, None])
+    assert not dedup.seen(1)
+    assert dedup.stats()["duplicates"] == 1
+
+
+def test_key_in_flight_is_neither_new_nor_a_duplicate(clock: FakeClock) -> None:
+    dedup = DuplicateFilter(window=60)
+    assert not dedup.seen(1)
+    with pytest.raises(DuplicateInFlightError):
+        dedup.seen(1)
+    assert dedup.stats()["in_flight"] == 1
+    assert len(dedup) == 0
+    dedup.forget([1])  # the write failed: the retry is new
+    assert not dedup.seen(1)
+    dedup.commit([1])
+    assert dedup.seen(1)
+    assert dedup.stats()["in_flight"] == 0
+
+
+def test_keys_are_remembered_for_one_to_two_windows(clock: FakeClock) -> None:
+    dedup = DuplicateFilter(window=60)
+    dedup.seen(1)
+    dedup.commit([1])
+    clock.now += 59
+    assert dedup.seen(1)
+    clock.now += 2  # rotation: key 1 moves to the previous generation
+    assert dedup.seen(1)
+    clock.now += 60  # rotation: previous generation dropped
+    assert not dedup.seen(1)
+    dedup.commit([1])
+    clock.now += 500  # idle for more than two windows: everything expired
+    assert not dedup.seen(1)
+    dedup.commit([1])
+    assert len(dedup) == 1
+
+
+def test_memory_is_bounded_by_two_generations(clock: FakeClock) -> None:
+    dedup = DuplicateFilter(window=3600, max_keys=100)
+    for key in range(1000):
+        dedup.seen(key)
+        dedup.commit([key])
+    assert len(dedup) <= 200
+    assert dedup.seen(999)
+    assert not dedup.seen(0)
+    assert dedup.stats()["rotations"] >= 9
+
+
+def test_zero_window_disables_the_filter(clock: FakeClock) -> None:
+    dedup = DuplicateFilter(window=0)
+    assert not dedup.seen(1)
+    assert not dedup.seen(1)
+    assert dedup.stats()["enabled"] is False
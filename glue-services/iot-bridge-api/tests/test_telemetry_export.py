@@ -0,0 +1,215 @@
+"""Unit tests for the streaming telemetry export."""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.clients import telemetry_arrow
+from app.clients.telemetry_export import build_export_query, encode_ndjson
+from app.clients.timescaledb import TimescaleDBClient, TimescaleDBError
+from app.config import Settings
+from app.deps import get_settings
+from app.main import app
+
+_T0 = datetime(2024, 5, 1, tzinfo=UTC)
+
+_RANGE = {"start": "2024-05-01T00:00:00Z", "end": "2024-05-02T00:00:00Z"}
+
+
+def _row(i: int) -> dict[str, Any]:
+    return {
+        "time": _T0 + timedelta(seconds=i),
+        "tenant_id": "t1",
+        "device_id": "dev-1",
+        "metric_name": "cpu",
+        "value": float(i),
+        "tags": '{"raw_type": "float"}',
+    }
+
+
+class FakeCursor:
+    def __init__(self, rows: list[dict[str, Any]], fetches: list[int]) -> None:
+        self._rows = rows
+        self._fetches = fetches
+
+    async def fetch(self, n: int) -> list[dict[str, Any]]:
+        self._fetches.append(n)
+        batch, self._rows = self._rows[:n], self._rows[n:]
+        return batch
+
+
+class FakeConnection:
+    def __init__(self, rows: list[dict[str, Any]]) -> None:
+        self.rows = rows
+        self.calls: list[tuple[str, tuple[Any, ...]]] = []
+        self.fetches: list[int] = []
+        self.readonly: bool | None = None
+
+    @asynccontextmanager
+    async def transaction(self, readonly: bool = False) -> AsyncIterator[None]:
+        self.readonly = readonly
+        yield
+
+    async def cursor(self, sql: str, *args: Any) -> FakeCursor:
+        self.calls.append((sql, args))
+        return FakeCursor(list(self.rows), self.fetches)
+
+
+@pytest.fixture()
+def conn(mock_timescaledb: TimescaleDBClient) -> FakeConnection:
+    fake = FakeConnection([_row(i) for i in range(5)])
+
+    @asynccontextmanager
+    async def connection() -> AsyncIterator[FakeConnection]:
+        yield fake
+
+    mock_timescaledb.connection = connection  # type: ignore[method-assign]
+    mock_timescaledb.storage_mode = "wide"  # type: ignore[misc]
+    return fake
+
+
+def test_build_export_query_filters_and_dictionary_tags() -> None:
+    sql = build_export_query(device_filter=True, metric_filter=True)
+    assert "FROM device_telemetry " in sql
+    assert "tenant_id = $1" in sql
+    assert "device_id = ANY($4::text[])" in sql
+    assert "metric_name = ANY($5::text[])" in sql
+    assert sql.endswith("ORDER BY time")
+
+    compact = build_export_query("dictionary", metric_filter=True)
+    assert "FROM device_telemetry_decoded" in compact
+    assert "json_build_object('raw_type', raw_type)::text AS tags" in compact
+    assert "metric_name = ANY($4::text[])" in compact
+
+
+def test_encode_ndjson_escapes_strings_and_keeps_null_tags() -> None:
+    row = _row(0) | {"device_id": 'dev "1"', "value": None, "tags": None}
+    line = json.loads(encode_ndjson([row]))
+    assert line["device_id"] == 'dev "1"'
+    assert line["value"] is None
+    assert line["tags"] is None
+
+
+def test_encode_ndjson_matches_the_json_codec() -> None:
+    row = _row(0) | {"value": float("nan"), "tags": '{"raw_type": "float"}'}
+    line = encode_ndjson([row])
+    assert line.endswith(b"\n")
+    decoded = json.loads(line)
+    assert decoded["value"] is None  # NaN is null, as on every other endpoint
+    assert decoded["time"] == row["time"].isoformat()
+    assert decoded["tags"] == {"raw_type": "float"}
+
+
+def test_export_ndjson_streams_all_rows(test_client: TestClient, conn: FakeConnection) -> None:
+    resp = test_client.get(
+        "/tenants/t1/telemetry/export",
+        params=_RANGE | {"device_id": ["dev-1"], "metric": ["cpu"]},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    assert "telemetry-t1-20240501T000000.ndjson" in resp.headers["content-disposition"]
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["value"] for line in lines] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert lines[0]["tags"] == {"raw_type": "float"}
+    assert lines[0]["time"] == "2024-05-01T00:00:00+00:00"
+
+    _, args = conn.calls[0]
+    assert args[0] == "t1"
+    assert args[3:] == (["dev-1"], ["cpu"])
+    assert conn.readonly is True
+
+
+def test_export_csv_has_header_once(test_client: TestClient, conn: FakeConnection) -> None:
+    resp = test_client.get("/tenants/t1/telemetry/export", params=_RANGE | {"format": "csv"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(resp.text)))
+    assert rows[0] == ["time", "tenant_id", "device_id", "metric_name", "value", "tags"]
+    assert len(rows) == 6
+    assert rows[1][4] == "0.0"
+    assert json.loads(rows[1][5]) == {"raw_type": "float"}
+
+
+def test_export_fetches_in_batches(test_client: TestClient, conn: FakeConnection) -> None:
+    app.dependency_overrides[get_settings] = lambda: Settings(telemetry_export_batch_rows=2)
+    resp = test_client.get("/tenants/t1/telemetry/export", params=_RANGE)
+    assert resp.status_code == 200
+    assert len(resp.text.splitlines()) == 5
+    # 2 + 2 + 1 rows, then the empty fetch that ends the cursor.
+    assert conn.fetches == [2, 2, 2, 2]
+
+
+def test_export_requires_start(test_client: TestClient, conn: FakeConnection) -> None:
+    assert test_client.get("/tenants/t1/telemetry/export").status_code == 422
+    assert conn.calls == []
+
+
+def test_export_error_returns_503(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    @asynccontextmanager
+    async def failing() -> AsyncIterator[Any]:
+        raise TimescaleDBError("connection refused")
+        yield
+
+    mock_timescaledb.connection = failing  # type: ignore[method-assign]
+    mock_timescaledb.storage_mode = "wide"  # type: ignore[misc]
+    resp = test_client.get("/tenants/t1/telemetry/export", params=_RANGE)
+    assert resp.status_code == 503
+
+
+def test_export_arrow_rejects_unsupported_codec(
+    test_client: TestClient, conn: FakeConnection
+) -> None:
+    resp = test_client.get(
+        "/tenants/t1/telemetry/export", params=_RANGE | {"format": "arrow", "compression": "gzip"}
+    )
+    assert resp.status_code == 400
+    assert conn.calls == []
+
+
+def test_export_parquet_without_pyarrow_returns_501(
+    test_client: TestClient, conn: FakeConnection, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def missing() -> Any:
+        raise telemetry_arrow.ArrowUnavailableError("columnar export requires the pyarrow package")
+
+    monkeypatch.setattr(telemetry_arrow, "_pyarrow", missing)
+    resp = test_client.get("/tenants/t1/telemetry/export", params=_RANGE | {"format": "parquet"})
+    assert resp.status_code == 501
+    assert conn.calls == []
+
+
+def test_export_parquet_row_group_per_batch(test_client: TestClient, conn: FakeConnection) -> None:
+    pq = pytest.importorskip("pyarrow.parquet")
+    app.dependency_overrides[get_settings] = lambda: Settings(telemetry_export_batch_rows=2)
+    resp = test_client.get(
+        "/tenants/t1/telemetry/export",
+        params=_RANGE | {"format": "parquet", "compression": "snappy"},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/vnd.apache.parquet"
+    parquet = pq.ParquetFile(io.BytesIO(resp.content))
+    assert parquet.metadata.num_row_groups == 3
+    assert parquet.metadata.row_group(0).column(0).compression == "SNAPPY"
+    table = parquet.read()
+    assert table.column("value").to_pylist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert table.column("time").to_pylist()[0] == _T0
+
+
+def test_export_arrow_ipc_stream(test_client: TestClient, conn: FakeConnection) -> None:
+    ipc = pytest.importorskip("pyarrow.ipc")
+    resp = test_client.get("/tenants/t1/telemetry/export", params=_RANGE | {"format": "arrow"})
+    assert resp.status_code == 200
+    table = ipc.open_stream(resp.content).read_all()
+    assert table.num_rows == 5
+    assert table.column_names == ["time", "tenant_id", "device_id", "metric_name", "value", "tags"]
@@ -0,0 +1,299 @@
+"""Unit tests for the telemetry read API and its query builder."""
+
+from __future__ import annotations
+
+import base64
+import json
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.clients.telemetry_query import align, build_query, choose_bucket, choose_source
+from app.clients.tenant_map import TenantMap
+from app.clients.timescaledb import TimescaleDBClient, TimescaleDBError
+from app.deps import get_tenant_map
+from app.main import app
+from app.routers import telemetry
+from app.routers.telemetry import require_telemetry_reader
+
+_T0 = datetime(2024, 5, 1, tzinfo=UTC)
+
+
+class RecordingConnection:
+    def __init__(self, rows: list[dict[str, Any]] | None = None) -> None:
+        self.rows = rows or []
+        self.calls: list[tuple[str, tuple[Any, ...]]] = []
+
+    async def fetch(self, sql: str, *args: Any) -> list[dict[str, Any]]:
+        self.calls.append((sql, args))
+        return self.rows
+
+
+@pytest.fixture()
+def conn(mock_timescaledb: TimescaleDBClient) -> RecordingConnection:
+    recording = RecordingConnection(
+        [
+            {
+                "bucket": _T0,
+                "device_id": "dev-1",
+                "metric_name": "cpu",
+                "avg": 1.5,
+                "min": 1.0,
+                "max": 2.0,
+                "count": 2,
+            }
+        ]
+    )
+
+    @asynccontextmanager
+    async def connection() -> AsyncIterator[RecordingConnection]:
+        yield recording
+
+    mock_timescaledb.connection = connection  # type: ignore[method-assign]
+    mock_timescaledb.storage_mode = "wide"  # type: ignore[misc]
+    return recording
+
+
+# ── Query planning ────────────────────────────────────────────────────────────
+
+
+@pytest.mark.parametrize(
+    ("span", "bucket"),
+    [
+        (timedelta(minutes=10), timedelta(seconds=1)),
+        (timedelta(hours=1), timedelta(seconds=5)),
+        (timedelta(days=1), timedelta(minutes=5)),
+        (timedelta(days=30), timedelta(hours=1)),
+        (timedelta(days=365), timedelta(hours=12)),
+    ],
+)
+def test_choose_bucket_caps_points(span: timedelta, bucket: timedelta) -> None:
+    assert choose_bucket(_T0, _T0 + span, 1000) == bucket
+
+
+def test_choose_source_prefers_coarsest_aggregate() -> None:
+    assert choose_source(timedelta(seconds=30)) == "raw"
+    assert choose_source(timedelta(minutes=5)) == "1m"
+    assert choose_source(timedelta(seconds=90)) == "raw"
+    assert choose_source(timedelta(hours=6)) == "1h"
+    assert choose_source(timedelta(hours=6), use_aggregates=False) == "raw"
+    assert choose_source(timedelta(hours=6), storage_mode="dictionary") == "raw"
+
+
+def test_build_query_rebuckets_aggregates_and_scopes_tenant() -> None:
+    sql = build_query("1h", per_device=False, metric_filter=True)
+    assert "FROM device_telemetry_1h" in sql
+    assert "sum(sum) / NULLIF(sum(count), 0)" in sql
+    assert "tenant_id = $2" in sql
+    assert "metric_name = ANY($5::text[])" in sql
+    assert "NULL::text AS device_id" in sql
+
+    raw = build_query("raw", storage_mode="dictionary", device_filter=True)
+    assert "FROM device_telemetry_decoded" in raw
+    assert "device_id = ANY($5::text[])" in raw
+
+
+def test_align_floors_to_bucket() -> None:
+    ts = datetime(2024, 5, 1, 10, 37, 12, tzinfo=UTC)
+    assert align(ts, timedelta(minutes=15)) == datetime(2024, 5, 1, 10, 30, tzinfo=UTC)
+    # Like time_bucket, weeks start on Mondays and odd widths count from 2000-01-03.
+    assert align(ts, timedelta(days=7)) == datetime(2024, 4, 29, tzinfo=UTC)
+    assert align(ts, timedelta(minutes=7)) == datetime(2024, 5, 1, 10, 34, tzinfo=UTC)
+    old = datetime(1999, 12, 31, 12, tzinfo=UTC)
+    assert align(old, timedelta(days=7)) == datetime(1999, 12, 27, tzinfo=UTC)
+
+
+# ── Endpoints ─────────────────────────────────────────────────────────────────
+
+
+def test_device_telemetry_reads_hourly_aggregate_for_30_days(
+    test_client: TestClient, conn: RecordingConnection
+) -> None:
+    resp = test_client.get(
+        "/devices/dev-1/telemetry",
+        params={
+            "tenant_id": "t1",
+            "start": "2024-04-01T00:00:00Z",
+            "end": "2024-05-01T00:00:00Z",
+            "metric": ["cpu", "temp"],
+        },
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["source"] == "1h"
+    assert body["bucket_seconds"] == 3600
+    assert body["device_id"] == "dev-1"
+    assert body["buckets"][0] == {
+        "time": "2024-05-01T00:00:00Z",
+        "device_id": "dev-1",
+        "metric_name": "cpu",
+        "avg": 1.5,
+        "min": 1.0,
+        "max": 2.0,
+        "count": 2,
+    }
+    sql, args = conn.calls[0]
+    assert "device_telemetry_1h" in sql
+    assert args[1] == "t1"
+    assert args[4] == ["dev-1"]
+    assert args[5] == ["cpu", "temp"]
+
+
+def test_tenant_telemetry_rolls_up_devices(
+    test_client: TestClient, conn: RecordingConnection
+) -> None:
+    resp = test_client.get(
+        "/tenants/t1/telemetry",
+        params={"start": "2024-05-01T00:00:00Z", "end": "2024-05-01T00:10:00Z", "bucket": 10},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["source"] == "raw"
+    sql, args = conn.calls[0]
+    assert "NULL::text AS device_id" in sql
+    assert args[0] == timedelta(seconds=10)
+    assert args[1] == "t1"
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"start": "2024-05-02T00:00:00Z", "end": "2024-05-01T00:00:00Z"},
+        {"start": "2024-01-01T00:00:00Z", "end": "2024-05-01T00:00:00Z", "bucket": 1},
+    ],
+)
+def test_tenant_telemetry_rejects_bad_ranges(
+    test_client: TestClient, conn: RecordingConnection, params: dict[str, Any]
+) -> None:
+    assert test_client.get("/tenants/t1/telemetry", params=params).status_code == 400
+    assert conn.calls == []
+
+
+def test_device_telemetry_requires_tenant(test_client: TestClient) -> None:
+    assert test_client.get("/devices/dev-1/telemetry").status_code == 422
+
+
+def test_telemetry_query_error_returns_503(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    @asynccontextmanager
+    async def failing() -> AsyncIterator[Any]:
+        raise TimescaleDBError("connection refused")
+        yield
+
+    mock_timescaledb.connection = failing  # type: ignore[method-assign]
+    mock_timescaledb.storage_mode = "wide"  # type: ignore[misc]
+    resp = test_client.get("/tenants/t1/telemetry")
+    assert resp.status_code == 503
+
+
+# ── Authorisation ─────────────────────────────────────────────────────────────
+
+
+def _token(claims: dict[str, Any]) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+    return f"eyJhbGciOiJSUzI1NiJ9.{payload}.signature"
+
+
+@pytest.fixture()
+def keycloak(monkeypatch: pytest.MonkeyPatch) -> list[httpx.Request]:
+    """Keycloak userinfo stub accepting only tokens whose signature part is ``signature``."""
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        valid = request.headers["Authorization"].endswith(".signature")
+        return httpx.Response(200 if valid else 401, json={})
+
+    real_client = httpx.AsyncClient
+
+    def client(**kwargs: Any) -> httpx.AsyncClient:
+        return real_client(transport=httpx.MockTransport(handler), **kwargs)
+
+    monkeypatch.setattr(telemetry.httpx, "AsyncClient", client)
+    app.dependency_overrides.pop(require_telemetry_reader)
+    return requests
+
+
+def test_telemetry_requires_credentials(test_client: TestClient, keycloak: list) -> None:
+    assert test_client.get("/tenants/t1/telemetry").status_code == 401
+    assert test_client.get("/devices/dev-1/latest").status_code == 401
+    assert test_client.get("/tenants/t1/telemetry/export").status_code == 401
+    assert keycloak == []
+
+
+def test_bearer_token_is_verified_by_its_realm_and_scoped_to_it(
+    test_client: TestClient, conn: RecordingConnection, keycloak: list[httpx.Request]
+) -> None:
+    token = _token(
+        {"iss": "https://cdm.example/auth/realms/t1", "realm_access": {"roles": ["cdm-viewer"]}}
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    assert test_client.get("/devices/dev-1/telemetry", headers=headers).status_code == 200
+    assert conn.calls[0][1][1] == "t1"  # tenant taken from the token's realm
+    assert keycloak[0].url.path.endswith("/realms/t1/protocol/openid-connect/userinfo")
+
+    other = test_client.get("/tenants/t2/telemetry", headers=headers)
+    assert other.status_code == 403
+    forged = test_client.get(
+        "/tenants/t1/telemetry", headers={"Authorization": f"Bearer {token}x"}
+    )
+    assert forged.status_code == 401
+
+
+def test_token_without_cdm_role_is_forbidden(test_client: TestClient, keycloak: list) -> None:
+    token = _token({"iss": "http://kc/auth/realms/t1", "realm_access": {"roles": ["guest"]}})
+    resp = test_client.get("/tenants/t1/telemetry", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 403
+
+
+def test_tenant_session_cannot_name_another_tenant(
+    test_client: TestClient, conn: RecordingConnection
+) -> None:
+    app.dependency_overrides[require_telemetry_reader] = lambda: {
+        "realm": "t1",
+        "roles": ["cdm-admin"],
+    }
+    params = {"tenant_id": "t2"}
+    assert test_client.get("/devices/dev-1/telemetry", params=params).status_code == 403
+    assert test_client.get("/devices/dev-1/latest", params=params).status_code == 403
+    assert test_client.get("/tenants/t2/telemetry/export").status_code == 403
+    assert conn.calls == []
+
+
+def test_webhook_telemetry_is_readable_by_its_tenant_realm(
+    test_client: TestClient, conn: RecordingConnection
+) -> None:
+    """ThingsBoard tags rows with its tenant UUID; they are stored under the realm."""
+    tb_tenant = "13814000-1dd2-11b2-8080-808080808080"
+    app.dependency_overrides[get_tenant_map] = lambda: TenantMap("cdm", {tb_tenant: "acme"})
+    event = {
+        "msgType": "POST_TELEMETRY_REQUEST",
+        "metadata": {"deviceId": "dev-1", "tenantId": tb_tenant},
+        "data": {"cpu": 42},
+    }
+    written = test_client.post("/webhooks/thingsboard/telemetry", json=event)
+    assert written.json()["tenant_id"] == "acme"
+
+    app.dependency_overrides[require_telemetry_reader] = lambda: {
+        "realm": "acme",
+        "roles": ["cdm-viewer"],
+    }
+    conn.rows = []
+    resp = test_client.get("/devices/dev-1/latest")
+    assert resp.status_code == 200
+    assert resp.json()["tenant_id"] == "acme"
+    assert resp.json()["values"]["cpu"]["value"] == 42
+    assert all("acme" in args for _, args in conn.calls)
+
+
+def test_tenant_map_resolves_thingsboard_ids_to_realms() -> None:
+    tenants = TenantMap("acme", {"13814000-1DD2-11B2-8080-808080808080": "beta"})
+    assert tenants.resolve("13814000-1dd2-11b2-8080-808080808080") == "beta"
+    assert tenants.resolve("00000000-0000-0000-0000-000000000001") == "acme"
+    assert tenants.resolve("tenant2") == "tenant2"  # already a realm
+    assert tenants.resolve(None) == "acme"
@@ -0,0 +1,173 @@
+"""Unit tests for the telemetry schema bootstrapper (catalog emulated in memory)."""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import Any
+
+from app.clients.telemetry_schema import bootstrap_schema
+
+
+class FakeCatalog:
+    """Just enough of the PostgreSQL / TimescaleDB catalog for the bootstrapper."""
+
+    def __init__(self) -> None:
+        self.relations: set[str] = set()
+        self.chunk_interval: dict[str, timedelta] = {}
+        self.compressed: set[str] = set()
+        self.policies: dict[tuple[str, str], timedelta] = {}
+        self.refresh_policies: dict[str, timedelta | None] = {}
+        self.executed: list[str] = []
+        self.in_transaction = False
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        self.in_transaction = True
+        try:
+            yield
+        finally:
+            self.in_transaction = False
+
+    async def fetchval(self, sql: str, *args: Any) -> Any:
+        if "to_regclass" in sql:
+            return args[0] in self.relations
+        if "dimensions" in sql:
+            return self.chunk_interval.get(args[0])
+        if "compression_enabled" in sql:
+            return args[0] in self.compressed
+        if "jobs" in sql:
+            return self.policies.get((args[0], args[1]))
+        raise AssertionError(sql)
+
+    async def fetchrow(self, sql: str, *args: Any) -> dict[str, Any] | None:
+        assert "policy_refresh_continuous_aggregate" in sql
+        if args[0] not in self.refresh_policies:
+            return None
+        return {"start_offset": self.refresh_policies[args[0]]}
+
+    async def execute(self, sql: str, *args: Any) -> str:
+        assert self.in_transaction
+        self.executed.append(sql)
+        sql = sql.strip()
+        if sql.startswith("CREATE TABLE"):
+            self.relations.add("device_telemetry")
+        elif "create_hypertable" in sql:
+            self.chunk_interval.setdefault("device_telemetry", args[0])
+        elif "set_chunk_time_interval" in sql:
+            self.chunk_interval["device_telemetry"] = args[0]
+        elif sql.startswith("CREATE MATERIALIZED VIEW"):
+            self.relations.add(sql.split()[6])
+        elif sql.startswith("CREATE INDEX"):
+            self.relations.add(sql.split()[5])
+        elif "timescaledb.compress," in sql:
+            self.compressed.add("device_telemetry")
+        elif "add_compression_policy" in sql:
+            self.policies[("device_telemetry", "policy_compression")] = args[0]
+        elif "remove_compression_policy" in sql:
+            self.policies.pop(("device_telemetry", "policy_compression"), None)
+        elif "add_retention_policy" in sql:
+            self.policies[("device_telemetry", "policy_retention")] = args[0]
+        elif "remove_retention_policy" in sql:
+            self.policies.pop(("device_telemetry", "policy_retention"), None)
+        elif "add_continuous_aggregate_policy" in sql:
+            self.refresh_policies[sql.split("'")[1]] = args[0]
+        elif "remove_continuous_aggregate_policy" in sql:
+            self.refresh_policies.pop(sql.split("'")[1], None)
+        return "OK"
+
+
+async def test_bootstrap_creates_everything_on_empty_database() -> None:
+    db = FakeCatalog()
+    changes = await bootstrap_schema(
+        db,
+        chunk_interval=timedelta(days=1),
+        compress_after=timedelta(days=7),
+        retention=timedelta(days=90),
+    )
+    assert "created hypertable device_telemetry" in changes
+    assert "created index device_telemetry_tenant_device_time_idx" in changes
+    assert db.chunk_interval["device_telemetry"] == timedelta(days=1)
+    assert "device_telemetry" in db.compressed
+    assert db.policies == {
+        ("device_telemetry", "policy_compression"): timedelta(days=7),
+        ("device_telemetry", "policy_retention"): timedelta(days=90),
+    }
+    alter = next(sql for sql in db.executed if "timescaledb.compress," in sql)
+    assert "compress_segmentby = 'tenant_id, device_id'" in alter
+    assert any("(tenant_id, device_id, time DESC)" in sql for sql in db.executed)
+    assert "pg_advisory_xact_lock" in db.executed[0]
+
+
+async def test_bootstrap_is_idempotent() -> None:
+    db = FakeCatalog()
+    options: dict[str, Any] = {
+        "chunk_interval": timedelta(days=1),
+        "compress_after": timedelta(days=7),
+        "retention": timedelta(days=90),
+    }
+    await bootstrap_schema(db, **options)
+    assert await bootstrap_schema(db, **options) == []
+
+
+async def test_bootstrap_migrates_changed_settings() -> None:
+    db = FakeCatalog()
+    await bootstrap_schema(
+        db,
+        chunk_interval=timedelta(days=7),
+        compress_after=timedelta(days=7),
+        retention=timedelta(days=90),
+    )
+    changes = await bootstrap_schema(
+        db, chunk_interval=timedelta(hours=6), compress_after=timedelta(days=2), retention=None
+    )
+    assert db.chunk_interval["device_telemetry"] == timedelta(hours=6)
+    assert db.policies == {("device_telemetry", "policy_compression"): timedelta(days=2)}
+    assert "removed retention policy" in changes
+    # The aggregates' refresh windows follow the retention period.
+    assert "device_telemetry_1h refresh window 90 days, 0:00:00 -> all data" in changes
+    assert len(changes) == 5
+
+
+async def test_bootstrap_creates_continuous_aggregates_once() -> None:
+    db = FakeCatalog()
+    changes = await bootstrap_schema(db)
+    assert "created continuous aggregate device_telemetry_1m" in changes
+    assert "created continuous aggregate device_telemetry_1h" in changes
+    hourly = next(sql for sql in db.executed if "VIEW IF NOT EXISTS device_telemetry_1h" in sql)
+    assert "FROM device_telemetry_1m" in hourly
+    assert "materialized_only = false" in hourly
+    assert sum("add_continuous_aggregate_policy" in sql for sql in db.executed) == 2
+
+    assert await bootstrap_schema(db) == []
+    assert await bootstrap_schema(FakeCatalog(), continuous_aggregates=False) == [
+        "created hypertable device_telemetry",
+        "created index device_telemetry_tenant_device_time_idx",
+        "enabled compression (segmentby tenant_id, device_id)",
+        "compression policy None -> 7 days, 0:00:00",
+    ]
+
+
+async def test_aggregates_are_refreshed_over_the_whole_retention_period() -> None:
+    """Backfilled and replayed rows older than a short refresh window would never show."""
+    db = FakeCatalog()
+    await bootstrap_schema(db, retention=timedelta(days=90))
+    assert db.refresh_policies == {
+        "device_telemetry_1m": timedelta(days=90),
+        "device_telemetry_1h": timedelta(days=90),
+    }
+    db.refresh_policies["device_telemetry_1m"] = timedelta(days=1)  # an older deployment
+    changes = await bootstrap_schema(db, retention=None)
+    assert "device_telemetry_1m refresh window 1 day, 0:00:00 -> all data" in changes
+    assert db.refresh_policies == {"device_telemetry_1m": None, "device_telemetry_1h": None}
+
+
+async def test_bootstrap_creates_dictionary_lookup_tables() -> None:
+    db = FakeCatalog()
+    await bootstrap_schema(db, storage_mode="dictionary", continuous_aggregates=False)
+    ddl = "\n".join(db.executed)
+    for table in ("telemetry_tenants", "telemetry_devices", "telemetry_metrics"):
+        assert f"CREATE TABLE IF NOT EXISTS {table}" in ddl
+    assert "create_hypertable('device_telemetry_compact'" in ddl
+    assert "device_telemetry_decoded" in ddl
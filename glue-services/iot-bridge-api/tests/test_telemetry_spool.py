@@ -0,0 +1,199 @@
+"""Unit tests for the on-disk TelemetrySpool and its use by TelemetryBuffer."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.clients import telemetry_spool
+from app.clients.telemetry_buffer import TelemetryBuffer
+from app.clients.telemetry_spool import TelemetrySpool
+from app.clients.timescaledb import TimescaleDBError
+
+_TS = datetime(2024, 5, 1, 12, 0, tzinfo=UTC)
+
+
+class FlakyWriter:
+    """Records written batches; raises while ``fail`` is set."""
+
+    def __init__(self, fail: bool = False) -> None:
+        self.batches: list[list[dict[str, Any]]] = []
+        self.modes: list[Any] = []
+        self.fail = fail
+
+    async def write_metrics(self, rows: list[dict[str, Any]], mode: Any = None) -> None:
+        if self.fail:
+            raise TimescaleDBError("connection refused")
+        self.batches.append(list(rows))
+        self.modes.append(mode)
+
+    @property
+    def rows(self) -> list[dict[str, Any]]:
+        return [row for batch in self.batches for row in batch]
+
+
+def _rows(n: int, start: int = 0) -> list[dict[str, Any]]:
+    return [
+        {
+            "time": _TS,
+            "tenant_id": "t",
+            "device_id": "dev",
+            "metric_name": f"m{i}",
+            "value": float(i),
+            "tags": {"raw_type": "float"},
+        }
+        for i in range(start, start + n)
+    ]
+
+
+def _spool(tmp_path: Path, **kwargs: Any) -> TelemetrySpool:
+    return TelemetrySpool(str(tmp_path / "spool"), fsync_interval=0, **kwargs)
+
+
+async def test_append_and_replay_roundtrip(tmp_path: Path) -> None:
+    spool = _spool(tmp_path)
+    await spool.append(_rows(3))
+    await spool.append(_rows(2, start=3))
+    assert spool.backlogged
+
+    writer = FlakyWriter()
+    spool._writer = writer
+    assert await spool.replay() == 5
+    assert writer.rows == _rows(5)
+    assert writer.modes == ["copy"]
+    assert not spool.backlogged
+    assert spool.stats()["segments"] == 0
+    assert spool.stats()["rows_replayed"] == 5
+
+
+async def test_column_tuples_are_spooled_as_rows(tmp_path: Path) -> None:
+    spool = _spool(tmp_path)
+    await spool.append([(_TS, "t", "dev", "m0", 0.0, b'{"raw_type":"float"}')])
+    writer = FlakyWriter()
+    spool._writer = writer
+    assert await spool.replay() == 1
+    assert writer.rows == _rows(1)
+
+
+async def test_replay_uses_mmap_and_batches_rows(tmp_path: Path) -> None:
+    spool = _spool(tmp_path, use_mmap=True, replay_batch_rows=4)
+    for i in range(5):
+        await spool.append(_rows(2, start=2 * i))
+    writer = FlakyWriter()
+    spool._writer = writer
+    assert await spool.replay() == 10
+    assert [len(b) for b in writer.batches] == [4, 4, 2]
+    assert writer.rows == _rows(10)
+
+
+async def test_failed_replay_resumes_from_offset(tmp_path: Path) -> None:
+    spool = _spool(tmp_path, replay_batch_rows=2)
+    for i in range(3):
+        await spool.append(_rows(2, start=2 * i))
+
+    class FailSecond(FlakyWriter):
+        fail_second = True
+
+        async def write_metrics(self, rows: list[dict[str, Any]], mode: Any = None) -> None:
+            if len(self.batches) == 1 and self.fail_second:
+                raise TimescaleDBError("timeout")
+            await super().write_metrics(rows, mode)
+
+    writer = FailSecond()
+    spool._writer = writer
+    assert await spool.replay() == 0
+    assert spool.backlogged
+    assert spool.stats()["last_replay_error"] == "timeout"
+
+    writer.fail_second = False
+    assert await spool.replay() == 4
+    # The first batch was committed before the failure and is not written twice.
+    assert writer.rows == _rows(6)
+
+
+async def test_replay_waits_for_an_fsync_in_flight(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Closing the segment mid-fsync used to fail the waiting append with EBADF."""
+    fsync, calls = os.fsync, []
+
+    def slow_fsync(fd: int) -> None:
+        calls.append(fd)
+        if len(calls) == 1:  # only the group commit is slow, the close's sync is not
+            time.sleep(0.1)
+        fsync(fd)
+
+    monkeypatch.setattr(telemetry_spool.os, "fsync", slow_fsync)
+    spool = _spool(tmp_path)
+    writer = FlakyWriter()
+    spool._writer = writer
+    append = asyncio.create_task(spool.append(_rows(3)))
+    await asyncio.sleep(0.03)  # the group commit is now in os.fsync
+    assert spool._pending_sync is None
+    assert await spool.replay() == 3
+    await append
+    assert writer.rows == _rows(3)
+
+
+async def test_torn_last_line_is_skipped(tmp_path: Path) -> None:
+    spool = _spool(tmp_path)
+    await spool.append(_rows(2))
+    await spool.stop()
+    segment = next((tmp_path / "spool").glob("segment-*.log"))
+    with segment.open("ab") as fh:
+        fh.write(b'[["2024-05-01T12:00')
+
+    restarted = _spool(tmp_path)
+    assert restarted.backlogged
+    writer = FlakyWriter()
+    restarted._writer = writer
+    assert await restarted.replay() == 2
+
+
+async def test_segments_roll_over_at_size_limit(tmp_path: Path) -> None:
+    spool = _spool(tmp_path, segment_max_bytes=1)
+    await spool.append(_rows(1))
+    await spool.append(_rows(1))
+    assert spool.stats()["segments"] == 2
+
+
+async def test_buffer_spools_batch_when_writer_fails(tmp_path: Path) -> None:
+    writer = FlakyWriter(fail=True)
+    spool = _spool(tmp_path)
+    buffer = TelemetryBuffer(writer, spool=spool)
+
+    assert await buffer.submit(_rows(3)) == "spooled"
+    # While a backlog exists new rows go to the spool to keep ordering.
+    writer.fail = False
+    assert await buffer.submit(_rows(1, start=3)) == "spooled"
+    assert writer.batches == []
+
+    spool._writer = writer
+    assert await spool.replay() == 4
+    assert await buffer.submit(_rows(1, start=4)) == "written"
+    assert writer.rows == _rows(5)
+
+
+async def test_background_replayer_drains_spool(tmp_path: Path) -> None:
+    spool = _spool(tmp_path, replay_interval=0.01)
+    await spool.append(_rows(3))
+    writer = FlakyWriter()
+    await spool.start(writer)
+    for _ in range(100):
+        if not spool.backlogged:
+            break
+        await asyncio.sleep(0.01)
+    await spool.stop()
+    assert writer.rows == _rows(3)
+
+
+async def test_buffer_without_spool_still_raises() -> None:
+    buffer = TelemetryBuffer(FlakyWriter(fail=True))
+    with pytest.raises(TimescaleDBError):
+        await buffer.submit(_rows(1))
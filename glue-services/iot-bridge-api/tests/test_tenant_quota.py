@@ -0,0 +1,114 @@
+"""Unit tests for the per-tenant token-bucket TenantQuota."""
+
+from __future__ import annotations
+
+import pytest
+
+from app.clients import tenant_quota
+from app.clients.tenant_quota import TenantQuota, TenantThrottledError
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(tenant_quota.time, "monotonic", fake)
+    return fake
+
+
+def test_disabled_quota_admits_everything(clock: FakeClock) -> None:
+    quota = TenantQuota()
+    for _ in range(1000):
+        quota.acquire("t1", 10_000)
+    assert quota.usage() == {}
+
+
+def test_points_burst_then_throttle_then_refill(clock: FakeClock) -> None:
+    quota = TenantQuota(points_per_s=10, points_burst=50)
+    quota.acquire("t1", 30)
+    quota.acquire("t1", 20)
+    with pytest.raises(TenantThrottledError) as excinfo:
+        quota.acquire("t1", 25)
+    assert excinfo.value.tenant_id == "t1"
+    assert excinfo.value.retry_after == 3
+
+    clock.now += 3
+    quota.acquire("t1", 25)
+    usage = quota.usage()["t1"]
+    assert usage["points_admitted"] == 75
+    assert usage["points_throttled"] == 25
+    assert usage["requests_throttled"] == 1
+
+
+def test_requests_per_second_limit(clock: FakeClock) -> None:
+    quota = TenantQuota(requests_per_s=2, requests_burst=2)
+    quota.acquire("t1", 1)
+    quota.acquire("t1", 1)
+    with pytest.raises(TenantThrottledError):
+        quota.acquire("t1", 1)
+    clock.now += 0.5
+    quota.acquire("t1", 1)
+
+
+def test_noisy_tenant_does_not_affect_others(clock: FakeClock) -> None:
+    quota = TenantQuota(points_per_s=10, points_burst=10)
+    quota.acquire("noisy", 10)
+    with pytest.raises(TenantThrottledError):
+        quota.acquire("noisy", 1)
+    quota.acquire("quiet", 10)
+
+
+def test_acquire_many_is_all_or_nothing(clock: FakeClock) -> None:
+    quota = TenantQuota(points_per_s=10, points_burst=10)
+    quota.acquire("t2", 10)
+    with pytest.raises(TenantThrottledError) as excinfo:
+        quota.acquire_many({"t1": 5, "t2": 5})
+    assert excinfo.value.tenant_id == "t2"
+    # t1 was not charged for the rejected batch.
+    quota.acquire("t1", 10)
+
+
+def test_oversized_request_admitted_from_full_bucket(clock: FakeClock) -> None:
+    quota = TenantQuota(points_per_s=10, points_burst=10)
+    quota.acquire("t1", 100)
+    with pytest.raises(TenantThrottledError) as excinfo:
+        quota.acquire("t1", 100)
+    # The bucket is 90 tokens in debt and admits the next oversized request once full.
+    assert excinfo.value.retry_after == 10
+
+
+def test_tenant_state_is_bounded(clock: FakeClock) -> None:
+    quota = TenantQuota(points_per_s=1, points_burst=1, max_tenants=3)
+    for i in range(10):
+        quota.acquire(f"t{i}", 1)
+    assert list(quota.usage()) == ["t7", "t8", "t9"]
+    assert quota.limits()["tracked_tenants"] == 3
+
+
+def test_points_only_charge_skips_the_request_bucket(clock: FakeClock) -> None:
+    quota = TenantQuota(points_per_s=100, points_burst=100, requests_per_s=1, requests_burst=1)
+    quota.acquire("t1", 10)
+    for _ in range(5):  # further parts of the same streamed request
+        quota.acquire("t1", 10, requests=0)
+    with pytest.raises(TenantThrottledError):
+        quota.acquire("t1", 10)
+    assert quota.usage()["t1"]["requests_admitted"] == 1
+
+
+def test_release_refunds_a_charge_up_to_the_burst(clock: FakeClock) -> None:
+    quota = TenantQuota(points_per_s=1, points_burst=10, requests_per_s=1, requests_burst=1)
+    quota.acquire("t1", 8)
+    quota.release_many({"t1": 8})  # the write failed
+    quota.acquire("t1", 10)
+    quota.release_many({"t1": 50, "evicted": 5})
+    usage = quota.usage()
+    assert usage["t1"]["points_available"] == 10
+    assert usage["t1"]["requests_admitted"] == 0
+    assert "evicted" not in usage
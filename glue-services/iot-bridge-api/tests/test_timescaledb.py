@@ -0,0 +1,384 @@
+"""Unit tests for TimescaleDBClient – asyncpg is replaced by in-memory fakes."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.clients import timescaledb as tsdb_module
+from app.clients.telemetry_spool import TelemetrySpool
+from app.clients.timescaledb import TimescaleDBClient, TimescaleDBError
+from app.deps import get_telemetry_spool, get_timescaledb_client
+from app.main import app
+
+# ── Fakes ─────────────────────────────────────────────────────────────────────
+
+
+class FakeConnection:
+    """Records every statement executed through it."""
+
+    def __init__(self) -> None:
+        self.executemany_calls: list[tuple[str, list[tuple[Any, ...]]]] = []
+        self.copy_calls: list[tuple[str, list[tuple[Any, ...]], list[str]]] = []
+        self.executed: list[str] = []
+        self.fetch_calls: list[str] = []
+        self.lookup: dict[str, dict[Any, int]] = {}
+
+    async def executemany(self, sql: str, records: list[tuple[Any, ...]]) -> None:
+        self.executemany_calls.append((sql, list(records)))
+
+    async def copy_records_to_table(
+        self, table: str, *, records: list[tuple[Any, ...]], columns: list[str]
+    ) -> None:
+        self.copy_calls.append((table, list(records), columns))
+
+    async def fetchval(self, sql: str) -> int:
+        return 1
+
+    async def execute(self, sql: str, *args: Any) -> str:
+        self.executed.append(sql)
+        return "OK"
+
+    async def fetch(self, sql: str, *args: Any) -> list[dict[str, Any]]:
+        """Emulate the lookup-table upserts of the dictionary storage mode."""
+        self.fetch_calls.append(sql)
+        if "telemetry_devices" in sql:
+            keys = list(zip(args[0], args[1], strict=True))
+            table = self.lookup.setdefault("devices", {})
+            return [
+                {"id": table.setdefault(k, len(table) + 1), "tenant_id": k[0], "name": k[1]}
+                for k in keys
+            ]
+        table = self.lookup.setdefault("tenants" if "tenants" in sql else "metrics", {})
+        return [{"id": table.setdefault(n, len(table) + 1), "name": n} for n in args[0]]
+
+
+class _Acquire:
+    def __init__(self, conn: FakeConnection) -> None:
+        self._conn = conn
+
+    async def __aenter__(self) -> FakeConnection:
+        return self._conn
+
+    async def __aexit__(self, *exc: object) -> None:
+        return None
+
+
+class FakePool:
+    def __init__(self) -> None:
+        self.conn = FakeConnection()
+        self.closed = False
+
+    def acquire(self) -> _Acquire:
+        return _Acquire(self.conn)
+
+    async def close(self) -> None:
+        self.closed = True
+
+    def get_size(self) -> int:
+        return 1
+
+    def get_idle_size(self) -> int:
+        return 1
+
+    def get_min_size(self) -> int:
+        return 1
+
+    def get_max_size(self) -> int:
+        return 10
+
+
+@pytest.fixture()
+def fake_pool(monkeypatch: pytest.MonkeyPatch) -> FakePool:
+    pool = FakePool()
+    create_pool = AsyncMock(return_value=pool)
+    monkeypatch.setattr(tsdb_module.asyncpg, "create_pool", create_pool)
+    pool.create_pool = create_pool  # type: ignore[attr-defined]
+    return pool
+
+
+def _client(**kwargs: Any) -> TimescaleDBClient:
+    return TimescaleDBClient(host="db", port=5432, database="cdm", password="pw", **kwargs)
+
+
+def _rows(n: int) -> list[dict[str, Any]]:
+    return [
+        {"tenant_id": "t", "device_id": "d", "metric_name": f"m{i}", "value": i} for i in range(n)
+    ]
+
+
+# ── Shared pool ───────────────────────────────────────────────────────────────
+
+
+def test_dependency_returns_process_wide_client() -> None:
+    """Every request must receive the same client (and therefore the same pool)."""
+    assert get_timescaledb_client() is get_timescaledb_client()
+
+
+async def test_concurrent_first_use_opens_single_pool(fake_pool: FakePool) -> None:
+    client = _client()
+    pools = await asyncio.gather(*(client._get_pool() for _ in range(20)))
+    assert all(p is fake_pool for p in pools)
+    fake_pool.create_pool.assert_awaited_once()  # type: ignore[attr-defined]
+
+
+async def test_pool_sizes_are_passed_to_asyncpg(fake_pool: FakePool) -> None:
+    client = TimescaleDBClient(
+        host="db", port=5432, database="cdm", min_pool_size=2, max_pool_size=20
+    )
+    await client.connect()
+    kwargs = fake_pool.create_pool.call_args.kwargs  # type: ignore[attr-defined]
+    assert kwargs["min_size"] == 2
+    assert kwargs["max_size"] == 20
+    assert kwargs["max_inactive_connection_lifetime"] > 0
+
+
+async def test_close_releases_pool(fake_pool: FakePool) -> None:
+    client = _client()
+    await client.connect()
+    await client.close()
+    assert fake_pool.closed
+    assert client.pool_stats()["size"] == 0
+
+
+async def test_connect_failure_is_not_fatal(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        tsdb_module.asyncpg, "create_pool", AsyncMock(side_effect=OSError("refused"))
+    )
+    client = _client()
+    await client.connect()  # must not raise
+    assert await client.ping() is False
+    with pytest.raises(TimescaleDBError):
+        await client.write_metrics(
+            [{"tenant_id": "t", "device_id": "d", "metric_name": "m", "value": 1}]
+        )
+
+
+async def test_write_metrics_reuses_pool(fake_pool: FakePool) -> None:
+    client = _client()
+    row = {"tenant_id": "t", "device_id": "d", "metric_name": "m", "value": 1}
+    await client.write_metrics([row])
+    await client.write_metrics([row])
+    fake_pool.create_pool.assert_awaited_once()  # type: ignore[attr-defined]
+    assert len(fake_pool.conn.executemany_calls) == 2
+
+
+# ── Write modes ───────────────────────────────────────────────────────────────
+
+
+async def test_auto_mode_uses_insert_for_small_batches(fake_pool: FakePool) -> None:
+    client = _client(copy_min_rows=10)
+    await client.write_metrics(_rows(3))
+    assert len(fake_pool.conn.executemany_calls) == 1
+    assert fake_pool.conn.copy_calls == []
+
+
+async def test_auto_mode_uses_copy_for_large_batches(fake_pool: FakePool) -> None:
+    client = _client(copy_min_rows=10)
+    await client.write_metrics(_rows(10))
+    assert fake_pool.conn.executemany_calls == []
+    table, records, columns = fake_pool.conn.copy_calls[0]
+    assert table == "device_telemetry"
+    assert len(records) == 10
+    assert columns == ["time", "tenant_id", "device_id", "metric_name", "value", "tags"]
+    assert records[0][1:5] == ("t", "d", "m0", 0.0)
+
+
+async def test_per_call_mode_overrides_setting(fake_pool: FakePool) -> None:
+    client = _client(write_mode="insert")
+    await client.write_metrics(_rows(1), mode="copy")
+    assert len(fake_pool.conn.copy_calls) == 1
+    await client.write_metrics(_rows(500))
+    assert len(fake_pool.conn.executemany_calls) == 1
+
+
+# ── Dictionary storage mode ───────────────────────────────────────────────────
+
+
+async def test_dictionary_mode_writes_integer_ids(fake_pool: FakePool) -> None:
+    client = _client(storage_mode="dictionary", write_mode="copy")
+    rows = [
+        {
+            "tenant_id": "t1",
+            "device_id": "d1",
+            "metric_name": "cpu",
+            "value": 1,
+            "tags": {"raw_type": "int"},
+        },
+        {
+            "tenant_id": "t1",
+            "device_id": "d2",
+            "metric_name": "cpu",
+            "value": 2,
+            "tags": {"raw_type": "float"},
+        },
+        {
+            "tenant_id": "t2",
+            "device_id": "d1",
+            "metric_name": "state",
+            "value": None,
+            "tags": {"raw_type": "str"},
+        },
+    ]
+    await client.write_metrics(rows)
+    assert fake_pool.conn.executed == []  # DML only: the schema belongs to the bootstrapper
+    table, records, columns = fake_pool.conn.copy_calls[0]
+    assert table == "device_telemetry_compact"
+    assert columns[1:4] == ["tenant_id", "device_id", "metric_id"]
+    ids = [r[1:4] for r in records]
+    assert ids[0][0] == ids[1][0] != ids[2][0]  # t1, t1, t2
+    assert len({r[1] for r in ids}) == 3  # t1/d1, t1/d2 and t2/d1 are distinct devices
+    assert ids[0][2] == ids[1][2] != ids[2][2]  # cpu, cpu, state
+    assert [r[5] for r in records] == [2, 1, 4]  # int, float, str codes
+
+
+async def test_dictionary_mode_caches_ids(fake_pool: FakePool) -> None:
+    client = _client(storage_mode="dictionary")
+    row = {"tenant_id": "t", "device_id": "d", "metric_name": "m", "value": 1}
+    await client.write_metrics([row])
+    lookups = len(fake_pool.conn.fetch_calls)
+    await client.write_metrics([row, row])
+    assert len(fake_pool.conn.fetch_calls) == lookups  # no round trip on a cache hit
+
+
+async def test_dictionary_mode_id_cache_is_bounded(fake_pool: FakePool) -> None:
+    client = _client(storage_mode="dictionary", id_cache_size=2)
+    rows = [
+        {"tenant_id": "t", "device_id": f"d{i}", "metric_name": "m", "value": i} for i in range(5)
+    ]
+    await client.write_metrics(rows)
+    _, records = fake_pool.conn.executemany_calls[0]
+    assert len({r[2] for r in records}) == 5  # resolved although the cache holds only 2
+    assert len(client._ids) == 4  # 1 tenant, 2 devices, 1 metric
+    await client.write_metrics(rows[-1:])
+    lookups = len(fake_pool.conn.fetch_calls)
+    await client.write_metrics(rows[-1:])
+    assert len(fake_pool.conn.fetch_calls) == lookups  # recently written device is cached
+    await client.write_metrics(rows[:3])
+    assert len(fake_pool.conn.fetch_calls) == lookups + 1  # evicted devices are upserted again
+
+
+# ── Historical backfill ───────────────────────────────────────────────────────
+
+
+async def _stream(rows: list[dict[str, Any]]) -> AsyncIterator[dict[str, Any]]:
+    for row in rows:
+        yield row
+
+
+async def test_backfill_keeps_device_timestamps_sorted_per_chunk(fake_pool: FakePool) -> None:
+    base = datetime(2026, 1, 1, tzinfo=UTC)
+    # Out of order, spanning three daily chunks.
+    hours = [50, 1, 26, 2, 49, 25]
+    rows = [
+        {
+            "time": base + timedelta(hours=h),
+            "tenant_id": "t",
+            "device_id": "d",
+            "metric_name": "m",
+            "value": h,
+        }
+        for h in hours
+    ]
+    client = _client(write_mode="copy")
+    written = await client.write_backfill(
+        _stream(rows), batch_rows=100, chunk_interval=timedelta(days=1)
+    )
+    assert written == 6
+    batches = [records for _, records, _ in fake_pool.conn.copy_calls]
+    assert [[r[4] for r in b] for b in batches] == [[1.0, 2.0], [25.0, 26.0], [49.0, 50.0]]
+    assert batches[0][0][0] == base + timedelta(hours=1)
+
+
+async def test_backfill_streams_in_bounded_windows(fake_pool: FakePool) -> None:
+    base = datetime(2026, 1, 1, tzinfo=UTC)
+    rows = [
+        {
+            "time": base + timedelta(seconds=i),
+            "tenant_id": "t",
+            "device_id": "d",
+            "metric_name": "m",
+            "value": i,
+        }
+        for i in range(25)
+    ]
+    client = _client(write_mode="copy")
+    assert await client.write_backfill(_stream(rows), batch_rows=10) == 25
+    assert [len(records) for _, records, _ in fake_pool.conn.copy_calls] == [10, 10, 5]
+
+
+# ── Readiness probe ───────────────────────────────────────────────────────────
+
+
+def test_ready_returns_200_when_db_answers(test_client: TestClient) -> None:
+    resp = test_client.get("/health/ready")
+    assert resp.status_code == 200
+    assert resp.json()["timescaledb"] is True
+    assert resp.json()["tsdb_pool"]["max_size"] == 10
+
+
+def test_ready_returns_503_when_db_down(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    mock_timescaledb.ping = AsyncMock(return_value=False)  # type: ignore[method-assign]
+    resp = test_client.get("/health/ready")
+    assert resp.status_code == 503
+    assert resp.json()["status"] == "degraded"
+    assert resp.json()["telemetry_spool_writable"] is None
+
+
+def test_ready_while_db_down_if_the_spool_takes_the_writes(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient, tmp_path: Path
+) -> None:
+    mock_timescaledb.ping = AsyncMock(return_value=False)  # type: ignore[method-assign]
+    app.dependency_overrides[get_telemetry_spool] = lambda: TelemetrySpool(str(tmp_path / "s"))
+    resp = test_client.get("/health/ready")
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "degraded"
+    assert resp.json()["timescaledb"] is False
+    assert resp.json()["telemetry_spool_writable"] is True
+    # A spool directory that cannot be created does not make the pod ready.
+    (tmp_path / "file").write_text("")
+    spool = TelemetrySpool(str(tmp_path / "file" / "s"))
+    app.dependency_overrides[get_telemetry_spool] = lambda: spool
+    resp = test_client.get("/health/ready")
+    assert resp.status_code == 503
+    assert resp.json()["telemetry_spool_writable"] is False
+
+
+# ── JSONB codec ───────────────────────────────────────────────────────────────
+
+
+async def test_pool_registers_binary_jsonb_codec(fake_pool: FakePool) -> None:
+    await _client().connect()
+    init = fake_pool.create_pool.call_args.kwargs["init"]  # type: ignore[attr-defined]
+    conn = AsyncMock()
+    await init(conn)
+    _, kwargs = conn.set_type_codec.call_args
+    assert conn.set_type_codec.call_args.args == ("jsonb",)
+    assert kwargs["format"] == "binary"
+    assert kwargs["encoder"](b'{"a":1}') == b'\x01{"a":1}'
+    assert kwargs["encoder"]({"a": 1}) == b'\x01{"a":1}'
+    assert kwargs["decoder"](b'\x01{"a":1}') == {"a": 1}
+
+
+async def test_tags_are_pre_encoded_json_bytes(fake_pool: FakePool) -> None:
+    client = _client(write_mode="copy")
+    await client.write_metrics([_rows(1)[0] | {"tags": {"raw_type": "int"}}])
+    _, records, _ = fake_pool.conn.copy_calls[0]
+    assert records[0][5] == b'{"raw_type":"int"}'
+
+
+async def test_column_tuples_are_written_unchanged(fake_pool: FakePool) -> None:
+    record = (datetime(2024, 5, 1, tzinfo=UTC), "t", "d", "cpu", 1.0, b'{"raw_type":"int"}')
+    await _client(write_mode="copy").write_metrics([record, _rows(1)[0]])
+    _, records, _ = fake_pool.conn.copy_calls[0]
+    assert records[0] is record
+    assert records[1][1:5] == ("t", "d", "m0", 0.0)
@@ -2,13 +2,23 @@
 
 from __future__ import annotations
 
-from unittest.mock import AsyncMock
+import json
+from collections.abc import AsyncIterator, Iterator
+from datetime import UTC, datetime
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 from fastapi.testclient import TestClient
 
 from app.clients.hawkbit import HawkBitClient, HawkBitError
+from app.clients.telemetry_buffer import TelemetryBuffer, TelemetryOverloadedError
+from app.clients.tenant_quota import TenantQuota
 from app.clients.timescaledb import TimescaleDBClient, TimescaleDBError
+from app.config import Settings
+from app.deps import get_settings, get_telemetry_buffer, get_tenant_quota
+from app.main import app
+from app.routers import webhooks
 
 # ── Happy path ────────────────────────────────────────────────────────────────
 
@@ -290,3 +300,509 @@ def test_telemetry_tenant_isolation_separate_calls(
         rows = _get_written_rows(mock_timescaledb)
         assert all(r["tenant_id"] == tenant for r in rows)
         assert all(r["device_id"] == device for r in rows)
+
+
+# ── Batched telemetry webhook tests ───────────────────────────────────────────
+
+
+def _event(device: str, tenant: str = "t1", **data: object) -> dict:
+    return {
+        "msgType": "POST_TELEMETRY_REQUEST",
+        "metadata": {"deviceId": device, "tenantId": tenant},
+        "data": data,
+    }
+
+
+def test_telemetry_batch_json_array_writes_one_batch(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    events = [_event("dev-1", cpu=1, ram=2), _event("dev-2", cpu=3), _event("dev-3")]
+    resp = test_client.post("/webhooks/thingsboard/telemetry/batch", json=events)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["status"] == "written"
+    assert body["points_written"] == 3
+    assert [e["status"] for e in body["events"]] == ["written", "written", "ignored"]
+    assert [e["points_written"] for e in body["events"]] == [2, 1, 0]
+    mock_timescaledb.write_metrics.assert_called_once()  # type: ignore[attr-defined]
+    rows = _get_written_rows(mock_timescaledb)
+    assert {r["device_id"] for r in rows} == {"dev-1", "dev-2"}
+
+
+def test_telemetry_batch_ndjson_reports_invalid_lines(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    body = "\n".join(
+        [json.dumps(_event("dev-a", temp=20)), "{not json", '{"data": 5}', ""]
+    ).encode()
+    resp = test_client.post(
+        "/webhooks/thingsboard/telemetry/batch",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert resp.status_code == 200
+    statuses = [e["status"] for e in resp.json()["events"]]
+    assert statuses == ["written", "invalid", "invalid"]
+    assert resp.json()["points_written"] == 1
+
+
+def test_telemetry_batch_streamed_in_small_chunks(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    """Elements split across arbitrary chunk boundaries must be reassembled."""
+    payload = json.dumps([_event(f"dev-{i}", v=i, w="x") for i in range(20)]).encode()
+
+    def chunks() -> Iterator[bytes]:
+        for i in range(0, len(payload), 7):
+            yield payload[i : i + 7]
+
+    resp = test_client.post(
+        "/webhooks/thingsboard/telemetry/batch",
+        content=chunks(),
+        headers={"Content-Type": "application/json"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["points_written"] == 40
+    assert len(_get_written_rows(mock_timescaledb)) == 40
+
+
+async def _chunks(*parts: str) -> AsyncIterator[str]:
+    for part in parts:
+        yield part
+
+
+async def test_json_array_number_split_across_chunks_is_one_element() -> None:
+    values = [value async for value in webhooks._iter_json_array(_chunks("34, 5]"), "[12")]
+    assert values == [1234, 5]
+
+
+async def test_event_size_limit_counts_utf8_bytes(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(webhooks, "_MAX_EVENT_BYTES", 100)
+    element = '{"note": "' + "é" * 60  # 70 characters, 130 bytes, not complete yet
+    with pytest.raises(ValueError, match="exceeds 100 bytes"):
+        [value async for value in webhooks._iter_json_array(_chunks('"}]'), "[" + element)]
+    with pytest.raises(ValueError, match="exceeds 100 bytes"):
+        [value async for value in webhooks._iter_ndjson(_chunks(element, '"}\n'))]
+
+
+@pytest.mark.parametrize("body", [b'[{"metadata": {}}', b'[{"a": 1} {"b": 2}]', b"[1] x"])
+def test_telemetry_batch_malformed_array_returns_400(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient, body: bytes
+) -> None:
+    resp = test_client.post(
+        "/webhooks/thingsboard/telemetry/batch",
+        content=body,
+        headers={"Content-Type": "application/json"},
+    )
+    assert resp.status_code == 400
+    mock_timescaledb.write_metrics.assert_not_called()  # type: ignore[attr-defined]
+
+
+def test_telemetry_batch_timescaledb_error_returns_503(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    mock_timescaledb.write_metrics = AsyncMock(  # type: ignore[method-assign]
+        side_effect=TimescaleDBError("connection refused")
+    )
+    resp = test_client.post("/webhooks/thingsboard/telemetry/batch", json=[_event("dev-x", cpu=1)])
+    assert resp.status_code == 503
+
+
+# ── Device timestamps / historical backfill ───────────────────────────────────
+
+
+def test_telemetry_honours_ts_values_samples(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    """``{"ts", "values"}`` payloads keep the device timestamp per sample."""
+    resp = test_client.post(
+        "/webhooks/thingsboard/telemetry",
+        json={
+            "msgType": "POST_TELEMETRY_REQUEST",
+            "metadata": {"deviceId": "dev-ts", "tenantId": "t1"},
+            "data": [
+                {"ts": 1767225600000, "values": {"cpu": 1}},
+                {"ts": 1767225660000, "values": {"cpu": 2, "ram": 3}},
+            ],
+        },
+    )
+    assert resp.status_code == 200
+    assert resp.json()["points_written"] == 3
+    rows = _get_written_rows(mock_timescaledb)
+    assert rows[0]["time"] == datetime(2026, 1, 1, tzinfo=UTC)
+    assert {r["metric_name"] for r in rows} == {"cpu", "ram"}
+
+
+def test_telemetry_backfill_streams_rows_with_timestamps(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    received: list[dict[str, Any]] = []
+
+    async def consume(rows: AsyncIterator[dict[str, Any]], **_: Any) -> int:
+        async for row in rows:
+            received.append(row)
+        return len(received)
+
+    mock_timescaledb.write_backfill = AsyncMock(side_effect=consume)  # type: ignore[method-assign]
+    body = "\n".join(
+        [
+            json.dumps(
+                {
+                    "metadata": {"deviceId": "dev-bf", "tenantId": "t1", "ts": "1767225600000"},
+                    "data": {"cpu": 5},
+                }
+            ),
+            json.dumps(
+                {
+                    "metadata": {"deviceId": "dev-bf", "tenantId": "t1"},
+                    "data": {"ts": 1767229200000, "values": {"cpu": 6}},
+                }
+            ),
+        ]
+    )
+    resp = test_client.post(
+        "/webhooks/thingsboard/telemetry/backfill",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["points_written"] == 2
+    assert [r["time"].hour for r in received] == [0, 1]
+    mock_timescaledb.write_metrics.assert_not_called()  # type: ignore[attr-defined]
+
+
+# ── Admission control ─────────────────────────────────────────────────────────
+
+
+@pytest.mark.parametrize(("writer_failing", "status"), [(False, 429), (True, 503)])
+def test_telemetry_overloaded_is_shed_with_retry_after(
+    test_client: TestClient,
+    mock_timescaledb: TimescaleDBClient,
+    writer_failing: bool,
+    status: int,
+) -> None:
+    buffer = TelemetryBuffer(mock_timescaledb)
+    buffer.submit = AsyncMock(  # type: ignore[method-assign]
+        side_effect=TelemetryOverloadedError(7, writer_failing=writer_failing)
+    )
+    app.dependency_overrides[get_telemetry_buffer] = lambda: buffer
+    resp = test_client.post("/webhooks/thingsboard/telemetry", json=_event("dev-x", cpu=1))
+    assert resp.status_code == status
+    assert resp.headers["Retry-After"] == "7"
+
+
+def test_telemetry_batch_shed_before_reading_body(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    buffer = TelemetryBuffer(mock_timescaledb)
+    buffer.check_admission = MagicMock(  # type: ignore[method-assign]
+        side_effect=TelemetryOverloadedError(3)
+    )
+    app.dependency_overrides[get_telemetry_buffer] = lambda: buffer
+    resp = test_client.post("/webhooks/thingsboard/telemetry/batch", json=[_event("dev-x", cpu=1)])
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "3"
+    mock_timescaledb.write_metrics.assert_not_called()  # type: ignore[attr-defined]
+
+
+def test_telemetry_throttled_tenant_gets_429(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    quota = TenantQuota(points_per_s=1, points_burst=2)
+    app.dependency_overrides[get_tenant_quota] = lambda: quota
+    ok = test_client.post("/webhooks/thingsboard/telemetry", json=_event("d1", "noisy", a=1, b=2))
+    assert ok.status_code == 200
+    resp = test_client.post("/webhooks/thingsboard/telemetry", json=_event("d1", "noisy", a=1))
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
+    other = test_client.post("/webhooks/thingsboard/telemetry", json=_event("d2", "quiet", a=1))
+    assert other.status_code == 200
+    assert mock_timescaledb.write_metrics.await_count == 2  # type: ignore[attr-defined]
+
+
+def test_telemetry_rejected_write_is_refunded_to_the_quota(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    quota = TenantQuota(points_per_s=0.001, points_burst=2)
+    app.dependency_overrides[get_tenant_quota] = lambda: quota
+    mock_timescaledb.write_metrics = AsyncMock(  # type: ignore[method-assign]
+        side_effect=[TimescaleDBError("connection refused"), None]
+    )
+    url = "/webhooks/thingsboard/telemetry"
+    assert test_client.post(url, json=_event("d1", a=1, b=2)).status_code == 503
+    assert test_client.post(url, json=_event("d1", a=1, b=2)).status_code == 200
+    assert quota.usage()["t1"]["points_admitted"] == 2
+
+
+def test_backfill_refunds_the_rows_it_did_not_write(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    quota = TenantQuota(points_per_s=0.001, points_burst=3, requests_per_s=0.001)
+    app.dependency_overrides[get_tenant_quota] = lambda: quota
+
+    async def consume(rows: AsyncIterator[dict[str, Any]], on_flush: Any = None, **_: Any) -> int:
+        async for _row in rows:
+            on_flush()  # the first row is written, then the connection drops
+            raise TimescaleDBError("connection lost")
+        return 0
+
+    mock_timescaledb.write_backfill = AsyncMock(side_effect=consume)  # type: ignore[method-assign]
+    body = [
+        {"metadata": {"deviceId": "dev-bf", "tenantId": "t1", "ts": "1767225600000"}, "data": d}
+        for d in ({"a": 1, "b": 2}, {"c": 3})
+    ]
+    resp = test_client.post("/webhooks/thingsboard/telemetry/backfill", json=body)
+    assert resp.status_code == 503
+    usage = quota.usage()["t1"]
+    assert usage["points_admitted"] == 1
+    assert usage["points_available"] == 2
+    assert usage["requests_admitted"] == 1  # part of the request was served
+
+
+def test_backfill_is_charged_to_the_tenant_quota_and_resumable(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    quota = TenantQuota(points_per_s=0.001, points_burst=2)
+    app.dependency_overrides[get_tenant_quota] = lambda: quota
+    written: list[dict[str, Any]] = []
+
+    async def consume(rows: AsyncIterator[dict[str, Any]], on_flush: Any = None, **_: Any) -> int:
+        async for row in rows:  # one row per window
+            written.append(row)
+            on_flush()
+        return len(written)
+
+    mock_timescaledb.write_backfill = AsyncMock(side_effect=consume)  # type: ignore[method-assign]
+    body = "\n".join(
+        json.dumps(
+            {"metadata": {"deviceId": "dev-bf", "tenantId": "t1", "ts": str(ts)}, "data": {"c": 1}}
+        )
+        for ts in (1767225600000, 1767225660000, 1767225720000)
+    )
+    url, headers = (
+        "/webhooks/thingsboard/telemetry/backfill",
+        {"Content-Type": "application/x-ndjson"},
+    )
+    resp = test_client.post(url, content=body, headers=headers)
+    assert resp.status_code == 429
+    assert len(written) == 2  # the burst
+    quota = TenantQuota(points_per_s=1000, points_burst=1000)
+    resp = test_client.post(url, content=body, headers=headers)
+    assert resp.status_code == 200
+    statuses = [event["status"] for event in resp.json()["events"]]
+    assert statuses == ["duplicate", "duplicate", "written"]
+    assert len(written) == 3  # only the event cut off before is written on retry
+
+
+def test_backfill_retry_rewrites_an_event_split_across_windows(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    written: list[dict[str, Any]] = []
+    fail_second_window = True
+
+    async def consume(rows: AsyncIterator[dict[str, Any]], on_flush: Any = None, **_: Any) -> int:
+        window: list[dict[str, Any]] = []
+        windows = 0
+        async for row in rows:  # batch_rows=2
+            window.append(row)
+            if len(window) == 2:
+                windows += 1
+                if windows == 2 and fail_second_window:
+                    raise TimescaleDBError("connection lost")
+                written.extend(window)
+                window.clear()
+                on_flush()
+        written.extend(window)
+        on_flush()
+        return len(written)
+
+    mock_timescaledb.write_backfill = AsyncMock(side_effect=consume)  # type: ignore[method-assign]
+    samples = [{"ts": 1767225600000 + i * 60000, "values": {"c": i}} for i in range(3)]
+    body = "\n".join(
+        json.dumps(
+            {
+                "metadata": {"deviceId": device, "tenantId": "t1", "ts": "1767225600000"},
+                "data": samples,
+            }
+        )
+        for device in ("dev-a", "dev-b")
+    )
+    url, headers = (
+        "/webhooks/thingsboard/telemetry/backfill",
+        {"Content-Type": "application/x-ndjson"},
+    )
+    assert test_client.post(url, content=body, headers=headers).status_code == 503
+    assert len(written) == 2  # dev-a is only partly written
+    fail_second_window = False
+    resp = test_client.post(url, content=body, headers=headers)
+    assert resp.status_code == 200
+    assert [event["status"] for event in resp.json()["events"]] == ["written", "written"]
+
+
+# ── Duplicate detection ───────────────────────────────────────────────────────
+
+
+def _timed_event(device: str, ts: str = "1714521600000", **data: object) -> dict:
+    event = _event(device, **data)
+    event["metadata"]["ts"] = ts
+    return event
+
+
+def test_telemetry_retry_is_acknowledged_as_duplicate(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    event = _timed_event("dev-1", cpu=1)
+    assert test_client.post("/webhooks/thingsboard/telemetry", json=event).json()["status"] == (
+        "written"
+    )
+    resp = test_client.post("/webhooks/thingsboard/telemetry", json=event)
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "duplicate"
+    assert resp.json()["points_written"] == 0
+    later = _timed_event("dev-1", ts="1714521601000", cpu=1)
+    assert test_client.post("/webhooks/thingsboard/telemetry", json=later).json()["status"] == (
+        "written"
+    )
+    assert mock_timescaledb.write_metrics.await_count == 2  # type: ignore[attr-defined]
+
+
+def test_telemetry_message_id_header_identifies_retries(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    headers = {"X-Message-Id": "4b2f7c1e"}
+    url = "/webhooks/thingsboard/telemetry"
+    assert test_client.post(url, json=_event("d1", cpu=1), headers=headers).status_code == 200
+    resp = test_client.post(url, json=_event("d1", cpu=1), headers=headers)
+    assert resp.json()["status"] == "duplicate"
+    # Without an ID or a timestamp, identical readings are distinct samples.
+    assert test_client.post(url, json=_event("d1", cpu=1)).json()["status"] == "written"
+    assert test_client.post(url, json=_event("d1", cpu=1)).json()["status"] == "written"
+    assert mock_timescaledb.write_metrics.await_count == 3  # type: ignore[attr-defined]
+
+
+def test_telemetry_retry_after_failed_write_is_written(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    mock_timescaledb.write_metrics = AsyncMock(  # type: ignore[method-assign]
+        side_effect=[TimescaleDBError("connection refused"), None]
+    )
+    event = _timed_event("dev-1", cpu=1)
+    assert test_client.post("/webhooks/thingsboard/telemetry", json=event).status_code == 503
+    resp = test_client.post("/webhooks/thingsboard/telemetry", json=event)
+    assert resp.json()["status"] == "written"
+
+
+def test_telemetry_retry_during_the_write_is_asked_to_retry_later(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    url = "/webhooks/thingsboard/telemetry"
+    event = _timed_event("dev-1", cpu=1)
+    retries: list[Any] = []
+
+    def write_while_the_retry_arrives(*args: object, **kwargs: object) -> None:
+        if not retries:
+            retries.append(test_client.post(url, json=event))
+            raise TimescaleDBError("connection refused")
+
+    mock_timescaledb.write_metrics = AsyncMock(  # type: ignore[method-assign]
+        side_effect=write_while_the_retry_arrives
+    )
+    assert test_client.post(url, json=event).status_code == 503
+    assert retries[0].status_code == 409
+    assert retries[0].headers["Retry-After"] == "1"
+    # The original failed, so the next retry is written rather than dropped.
+    assert test_client.post(url, json=event).json()["status"] == "written"
+
+
+def test_telemetry_batch_skips_duplicate_events(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    url = "/webhooks/thingsboard/telemetry/batch"
+    first, second = _timed_event("dev-1", cpu=1), _timed_event("dev-2", cpu=2)
+    resp = test_client.post(url, json=[first, first, second])
+    assert [e["status"] for e in resp.json()["events"]] == ["written", "duplicate", "written"]
+    assert len(_get_written_rows(mock_timescaledb)) == 2
+    resp = test_client.post(url, json=[first, second])
+    assert resp.json()["status"] == "duplicate"
+    assert mock_timescaledb.write_metrics.await_count == 1  # type: ignore[attr-defined]
+
+
+# ── Raw telemetry fast path ───────────────────────────────────────────────────
+
+
+@pytest.fixture()
+def raw_enabled() -> Iterator[None]:
+    app.dependency_overrides[get_settings] = lambda: Settings(telemetry_raw_webhook_enabled=True)
+    yield
+    app.dependency_overrides.pop(get_settings, None)
+
+
+def test_telemetry_raw_is_disabled_by_default(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient
+) -> None:
+    resp = test_client.post("/webhooks/thingsboard/telemetry/raw", json=_event("d1", cpu=1))
+    assert resp.status_code == 404
+    mock_timescaledb.write_metrics.assert_not_called()  # type: ignore[attr-defined]
+
+
+def test_telemetry_raw_writes_numeric_fields_as_tuples(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient, raw_enabled: None
+) -> None:
+    resp = test_client.post(
+        "/webhooks/thingsboard/telemetry/raw",
+        json=_event("dev-raw", "tenant-r", cpu=42, temp=21.5, online=True, state="idle"),
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["status"] == "written"
+    assert (body["device_id"], body["tenant_id"], body["points_written"]) == (
+        "dev-raw",
+        "tenant-r",
+        3,
+    )
+    records = _get_written_rows(mock_timescaledb)
+    assert all(isinstance(r, tuple) for r in records)
+    assert [(r[1], r[2], r[3], r[4]) for r in records] == [
+        ("tenant-r", "dev-raw", "cpu", 42.0),
+        ("tenant-r", "dev-raw", "temp", 21.5),
+        ("tenant-r", "dev-raw", "online", 1.0),
+    ]
+    assert [json.loads(r[5])["raw_type"] for r in records] == ["int", "float", "bool"]
+
+
+def test_telemetry_raw_honours_ts_values_samples(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient, raw_enabled: None
+) -> None:
+    event = _event("dev-raw")
+    event["data"] = [{"ts": 1714521600000, "values": {"cpu": 1}}, {"ts": "bad", "values": {}}]
+    assert test_client.post("/webhooks/thingsboard/telemetry/raw", json=event).status_code == 200
+    (record,) = _get_written_rows(mock_timescaledb)
+    assert record[0] == datetime(2024, 5, 1, tzinfo=UTC)
+
+
+@pytest.mark.parametrize(
+    ("body", "status"),
+    [(b"[1, 2]", 400), (b"{broken", 400), (b'{"metadata": {}, "data": {"a": 1}}', 200)],
+)
+def test_telemetry_raw_rejects_or_ignores_bad_events(
+    test_client: TestClient,
+    mock_timescaledb: TimescaleDBClient,
+    raw_enabled: None,
+    body: bytes,
+    status: int,
+) -> None:
+    resp = test_client.post("/webhooks/thingsboard/telemetry/raw", content=body)
+    assert resp.status_code == status
+    if status == 200:
+        assert resp.json()["status"] == "ignored"
+    mock_timescaledb.write_metrics.assert_not_called()  # type: ignore[attr-defined]
+
+
+def test_telemetry_raw_retry_is_acknowledged_as_duplicate(
+    test_client: TestClient, mock_timescaledb: TimescaleDBClient, raw_enabled: None
+) -> None:
+    event = _timed_event("dev-raw", cpu=1)
+    assert test_client.post("/webhooks/thingsboard/telemetry/raw", json=event).status_code == 200
+    resp = test_client.post("/webhooks/thingsboard/telemetry/raw", json=event)
+    assert resp.json()["status"] == "duplicate"
+    assert mock_timescaledb.write_metrics.await_count == 1  # type: ignore[attr-defined]
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import ipaddress
 import json
+import multiprocessing
 from pathlib import Path
 
 import pytest
@@ -109,3 +110,18 @@ def test_generate_client_config_no_wg0_conf_does_not_crash(
     ip = wg.allocate_ip("dev-noconf")
     cfg = wg.generate_client_config("dev-noconf", ip, device_pubkey="fakepubkey==")
     assert "[Interface]" in cfg  # config returned even without server-side file
+
+
+def _allocate_many(config_dir: str, worker: int) -> list[str]:
+    wg = WireGuardConfig(config_dir=config_dir, subnet="10.13.13.0/24", server_ip="10.13.13.1")
+    return [wg.allocate_ip(f"w{worker}-dev-{i}") for i in range(15)]
+
+
+def test_concurrent_worker_processes_never_share_an_ip(tmp_path: Path) -> None:
+    """Allocations from several processes are serialised by the peers-file lock."""
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(4) as pool:
+        results = pool.starmap(_allocate_many, [(str(tmp_path), w) for w in range(4)])
+    ips = [ip for worker_ips in results for ip in worker_ips]
+    assert len(set(ips)) == len(ips) == 60
+    assert len(json.loads((tmp_path / "cdm_peers.json").read_text())) == 60